@@ -3,7 +3,7 @@
 使用 pydantic-settings 管理环境变量配置
 """
 
-from typing import List
+from typing import List, Dict
 from pydantic_settings import BaseSettings
 from pydantic import Field
 import os
@@ -52,6 +52,14 @@ class Settings(BaseSettings):
     # 模型配置
     MODELS_PATH: str = Field(default=os.path.join(PROJECT_ROOT, "resources", "models"), description="模型文件存储路径")
     BM25_MODEL_NAME: str = Field(default="bm25_zh_default.json", description="BM25模型文件名")
+    TOKENIZER_PATH: str = Field(default=os.path.join(PROJECT_ROOT, "resources", "tokenizers"), description="嵌入模型分词器文件目录（<模型名>/tokenizer.json）")
+    TOKEN_LENGTH_CACHE_SIZE: int = Field(default=200000, description="token长度缓存条数")
+    EMBEDDING_MAX_TOKENS: int = Field(default=8192, description="嵌入模型最大输入token数")
+    EMBEDDING_TRUNCATE_THREAD_MIN_TEXTS: int = Field(default=16, description="一批文本数达到该值时，按token数截断放到工作线程中执行（避免分词阻塞事件循环）")
+    KB_SPARSE_MODEL_PATH: str = Field(default=os.path.join(PROJECT_ROOT, "storage", "knowledge_base_sparse_models"), description="知识库语料拟合的稀疏模型目录")
+    SPARSE_MODEL_CACHE_SIZE: int = Field(default=8, description="同时加载在内存中的稀疏编码器数量（超出时淘汰最久未使用的）")
+    SPARSE_MODEL_RELOAD_INTERVAL: float = Field(default=2.0, description="检查稀疏模型文件是否被更新的最小间隔(秒)")
+    SPARSE_MODEL_SAVE_INTERVAL: float = Field(default=10.0, description="知识库BM25语料统计增量写盘的最小间隔(秒)，流水线或写入任务结束时总会写盘")
     BM25_MODEL_URL: str = Field(default="http://dashvector-data.oss-cn-beijing.aliyuncs.com/public/sparsevector/bm25_zh_default.json", description="BM25模型下载URL")
     
     # Ollama配置
@@ -76,6 +84,10 @@ class Settings(BaseSettings):
     QDRANT_HOST: str = Field(default="localhost", description="Qdrant主机")
     QDRANT_PORT: int = Field(default=6333, description="Qdrant端口")
     QDRANT_API_KEY: str = Field(default="", description="Qdrant API密钥")
+    QDRANT_UPSERT_BATCH_SIZE: int = Field(default=256, description="Qdrant每次upsert的点数")
+    QDRANT_UPSERT_PARALLEL: int = Field(default=4, description="Qdrant并发upsert的批数")
+    QDRANT_UPSERT_MAX_RETRIES: int = Field(default=3, description="Qdrant upsert失败重试次数")
+    QDRANT_UPSERT_RETRY_BACKOFF: float = Field(default=0.5, description="Qdrant upsert重试退避基数(秒)")
     
     # Milvus配置
     MILVUS_HOST: str = Field(default="localhost", description="Milvus主机")
@@ -85,8 +97,87 @@ class Settings(BaseSettings):
     
     # 任务执行器配置
     TASK_EXECUTOR_URL: str = Field(default="http://localhost:8001", description="任务执行器服务地址")
-    TASK_NOTIFIER_TYPE: str = Field(default="http", description="任务通知器类型: http 或 mq")
+    TASK_NOTIFIER_TYPE: str = Field(default="http", description="任务通知器类型: http, inprocess（API进程内运行执行器）或 mq")
+    TASK_MQ_BROKER: str = Field(default="redis", description="MQ通知器的消息代理: redis 或 unix_socket（单机本地替代）")
+    TASK_MQ_URL: str = Field(default="redis://localhost:6379/0", description="Redis（或兼容Redis协议的服务）地址")
+    TASK_MQ_QUEUE_KEY: str = Field(default="rag_studio:task_notify", description="Redis中任务通知队列的键")
+    TASK_MQ_SOCKET_PATH: str = Field(default=os.path.join(PROJECT_ROOT, "storage", "task_notify.sock"), description="Unix域套接字消息代理的套接字文件路径")
+    TASK_NOTIFY_BATCH_SIZE: int = Field(default=100, description="MQ通知单次发布的最大任务数")
+    TASK_NOTIFY_FLUSH_INTERVAL: float = Field(default=0.05, description="MQ通知的缓冲合并时间(秒)")
+    TASK_NOTIFY_QUEUE_SIZE: int = Field(default=1000, description="进程内通知队列和MQ通知发布缓冲的最大长度，超出的通知直接丢弃（任务已持久化，由执行器轮询认领）")
     TASK_EXECUTOR_MAX_CONCURRENT: int = Field(default=5, description="任务执行器最大并发数")
+    TASK_EXECUTOR_WORKER_ID: str = Field(default="", description="执行器ID（为空时使用 主机名-进程号-随机后缀）")
+    TASK_LEASE_SECONDS: float = Field(default=60.0, description="任务认领租约时长(秒)，执行期间通过心跳续约")
+    TASK_HEARTBEAT_INTERVAL: float = Field(default=15.0, description="执行中任务的心跳（续约）间隔(秒)")
+    TASK_POLL_INTERVAL: float = Field(default=1.0, description="执行器轮询待执行任务的间隔(秒)，有空闲并发时才认领")
+    TASK_TYPE_MAX_CONCURRENT: Dict[str, int] = Field(
+        default={"document_write": 4, "evaluation": 2, "test_set_import": 1},
+        description="各任务类型的最大并发数（未列出的类型只受总并发数限制），防止长任务占满执行器"
+    )
+    TASK_TYPE_PRIORITY: Dict[str, int] = Field(
+        default={"document_write": 10, "evaluation": 5, "test_set_import": 0},
+        description="各任务类型的默认优先级（越大越先执行），创建任务时可单独指定"
+    )
+    TASK_RESOURCE_MAX_CONCURRENT: Dict[str, int] = Field(
+        default={"embedding": 3, "db": 4},
+        description="各资源类别同时运行的任务数上限（embedding: 嵌入/LLM密集，db: 数据库/向量库写入密集）"
+    )
+    TASK_SCHEDULE_WINDOW: int = Field(default=64, description="调度时每次读取的候选待执行任务数")
+    TASK_EXECUTOR_WARM_UP_POOLS: bool = Field(default=True, description="任务执行器启动时预热CPU进程池（预先启动分词/稀疏编码/解析进程并加载词典和模型）")
+    TASK_CANCEL_GRACE_SECONDS: float = Field(default=10.0, description="任务取消后等待其在批次边界自行停止的时间(秒)，超时后强制取消")
+    TASK_PROGRESS_BACKEND: str = Field(default="auto", description="任务进度事件的发布后端: auto（通知器为inprocess时用local，否则用redis）、local（进程内，执行器运行在API进程内时使用）或 redis（执行器为独立进程时使用，地址同TASK_MQ_URL）")
+    TASK_PROGRESS_CHANNEL: str = Field(default="rag_studio:task_progress", description="Redis中任务进度事件的发布/订阅频道")
+    TASK_PROGRESS_DB_INTERVAL: float = Field(default=5.0, description="任务进度写入数据库的最小间隔(秒)，进度事件仍逐个用例/批次实时推送")
+    TASK_PROGRESS_SNAPSHOT_INTERVAL: float = Field(default=3.0, description="进度事件流在此时间内没有收到事件时重新读取数据库快照(秒)，同时作为保活间隔")
+    TASK_REAPER_INTERVAL: float = Field(default=30.0, description="回收租约过期任务的检查间隔(秒)")
+    TASK_RETRY_BASE_DELAY: float = Field(default=10.0, description="任务重试的初始退避时间(秒)，每次重试翻倍")
+    TASK_RETRY_MAX_DELAY: float = Field(default=600.0, description="任务重试的最大退避时间(秒)")
+    
+    # CPU进程池核心预算（分词、稀疏编码、文档解析三个进程池同时工作，进程数合计不超过该值）
+    CPU_POOL_CORES: int = Field(default=0, description="CPU进程池共享的核心数，0表示使用CPU核心数")
+    
+    # 文档解析进程池配置
+    PARSER_POOL_WORKERS: int = Field(default=0, description="文档解析进程数，0表示从核心预算中自动分配")
+    PARSER_PDF_PAGES_PER_TASK: int = Field(default=16, description="PDF每个解析任务的页数")
+    PARSER_FILE_TIMEOUT: float = Field(default=300.0, description="单个文件解析超时(秒)，0表示不限制")
+    PARSER_MEMORY_LIMIT_MB: int = Field(default=2048, description="解析进程内存上限(MB)，0表示不限制")
+    
+    # 分词进程池配置
+    TOKENIZER_POOL_WORKERS: int = Field(default=0, description="jieba分词进程数，0表示从核心预算中自动分配，1表示不使用进程池")
+    TOKENIZER_POOL_MIN_TEXTS: int = Field(default=200, description="批量分词的文本数达到该值（或总字符数达到单任务字符数）时使用进程池，0表示不使用")
+    TOKENIZER_POOL_SLICE_CHARS: int = Field(default=200000, description="分词进程池单个任务的字符数，超长文本在换行处切分")
+    
+    # 稀疏编码配置
+    SPARSE_ENCODE_WORKERS: int = Field(default=0, description="预训练BM25稀疏编码进程数，0表示从核心预算中自动分配，1表示不使用进程池")
+    SPARSE_ENCODE_SLICE_SIZE: int = Field(default=1024, description="稀疏编码进程池单个任务的文档数")
+    SPARSE_ENCODE_POOL_MIN_TEXTS: int = Field(default=128, description="一批文档数达到该值时才使用稀疏编码进程池")
+    
+    # 学习型稀疏模型（SPLADE）配置
+    SPLADE_MODEL_PATH: str = Field(default=os.path.join(PROJECT_ROOT, "resources", "models", "splade"), description="SPLADE模型目录（包含ONNX模型文件和tokenizer.json）")
+    SPLADE_MODEL_FILE: str = Field(default="model.onnx", description="SPLADE ONNX模型文件名，可指定量化后的模型（如 model_quantized.onnx）")
+    SPLADE_NUM_THREADS: int = Field(default=min(4, os.cpu_count() or 1), description="SPLADE单次推理使用的CPU线程数")
+    SPLADE_MAX_CONCURRENT_RUNS: int = Field(default=1, description="SPLADE同时进行的推理数（CPU线程总数上限为线程数×并发数）")
+    SPLADE_BATCH_SIZE: int = Field(default=16, description="SPLADE每次推理的文本数")
+    SPLADE_MAX_LENGTH: int = Field(default=256, description="SPLADE输入最大token数，超出部分截断")
+    SPLADE_TOP_K: int = Field(default=256, description="SPLADE文档向量保留的最大非零项数")
+    SPLADE_QUERY_TOP_K: int = Field(default=64, description="SPLADE查询向量保留的最大非零项数")
+    
+    # 分块token缓存配置
+    TOKEN_CACHE_PATH: str = Field(default=os.path.join(PROJECT_ROOT, "storage", "token_cache"), description="分块分词结果缓存目录（按知识库存放）")
+    TOKEN_CACHE_MAX_KBS: int = Field(default=16, description="同时加载到内存中的知识库token缓存数")
+    
+    # 索引写入流水线配置
+    INGESTION_BATCH_SIZE: int = Field(default=256, description="流水线每批处理的分块数（嵌入/稀疏编码/upsert的批大小）")
+    INGESTION_QUEUE_SIZE: int = Field(default=4, description="流水线各阶段间有界队列的深度（批次数），决定内存上限")
+    INGESTION_EMBED_WORKERS: int = Field(default=2, description="流水线并发嵌入批次数")
+    INGESTION_SPARSE_WORKERS: int = Field(default=2, description="流水线并发稀疏编码批次数")
+    INGESTION_UPSERT_WORKERS: int = Field(default=2, description="流水线并发向量写入批次数")
+    
+    # 测试集导入配置
+    TEST_SET_IMPORT_BATCH_SIZE: int = Field(default=256, description="测试集导入每批处理的答案数（批量建档、嵌入和写入向量库）")
+    
+    # 评估任务配置
+    EVALUATION_CHECKPOINT_INTERVAL: int = Field(default=10, description="评估任务每处理多少个测试用例保存一次检查点（失败重试时从检查点继续）")
     
     class Config:
         env_file = ".env"
@@ -15,9 +15,13 @@ from pathlib import Path
 from datetime import datetime
 
 from app.core.response import success_response
-from app.services.document_processor import DocumentProcessor, DocumentParser
+from app.services.document_processor import DocumentProcessor
+from app.services.document_parse_pool import DocumentParsePool
 from app.models.document import Chunk
 from app.services.tokenizer_service import get_tokenizer_service
+from app.services.token_cache_service import get_token_cache_service
+from app.services.sparse_hashing import to_qdrant_format
+from app.repositories.factory import RepositoryFactory
 from app.services.retrieval_service import RetrievalService, RRFFusion
 from app.services.embedding_service import EmbeddingServiceFactory
 from app.models.knowledge_base import EmbeddingProvider
@@ -112,7 +116,8 @@ async def parse_document(file_path: str):
         解析后的文本内容
     """
     try:
-        text = DocumentParser.parse_file(file_path)
+        # 在解析进程池中执行，避免大文件阻塞事件循环
+        text = await DocumentParsePool().parse_file(file_path)
         
         return JSONResponse(
             content=success_response(
@@ -139,12 +144,25 @@ async def chunk_document(request: ChunkRequest):
         分块结果列表
     """
     try:
-        chunks = DocumentProcessor.chunk_document(
-            text=request.text,
-            method=request.method,
+        chunk_kwargs = dict(
             chunk_size=request.chunk_size,
             chunk_overlap=request.chunk_overlap,
-            max_sentences=request.max_sentences
+            max_sentences=request.max_sentences,
+            size_unit=request.size_unit,
+            tokenizer_model=request.tokenizer_model,
+            separators=request.separators
+        )
+        if request.method == "semantic":
+            chunk_kwargs.update(
+                embedding_model=request.embedding_model,
+                embedding_provider=request.embedding_provider,
+                embedding_endpoint=request.embedding_endpoint,
+                breakpoint_percentile=request.breakpoint_percentile
+            )
+        chunks = await DocumentProcessor.chunk_document_async(
+            text=request.text,
+            method=request.method,
+            **chunk_kwargs
         )
         
         # 转换为字典
@@ -275,20 +293,33 @@ async def tokenize_jieba(request: TokenizeRequest):
     """
     try:
         tokenizer = get_tokenizer_service()
-        
-        # 批量分词
-        tokens_list = tokenizer.batch_tokenize(
-            texts=request.texts,
-            mode=request.mode,
-            use_stop_words=request.use_stop_words
-        )
-        
-        # 统计词频
-        word_freq = tokenizer.get_word_freq(
-            texts=request.texts,
-            top_k=20,
-            use_stop_words=request.use_stop_words
-        )
+        texts = request.texts
+        
+        if request.kb_id and request.chunk_ids:
+            # 按分块ID读取已索引的分块
+            chunk_repo = RepositoryFactory.create_document_chunk_repository()
+            chunks = await chunk_repo.get_by_field_values("id", request.chunk_ids, filters={"kb_id": request.kb_id})
+            chunk_map = {chunk.id: chunk for chunk in chunks}
+            missing_ids = [chunk_id for chunk_id in request.chunk_ids if chunk_id not in chunk_map]
+            if missing_ids:
+                raise HTTPException(status_code=404, detail=f"分块不存在: {missing_ids[:5]}")
+            texts = [chunk_map[chunk_id].content for chunk_id in request.chunk_ids]
+        
+        if request.kb_id and request.chunk_ids and request.mode == "default" and request.use_stop_words:
+            # 默认模式直接读取索引时缓存的分词结果
+            token_table = await get_token_cache_service().get_table(request.kb_id, request.chunk_ids, texts)
+            tokens_list = [token_table.tokens(i) for i in range(len(request.chunk_ids))]
+            word_freq = token_table.word_freq(top_k=20)
+        else:
+            # 批量分词
+            tokens_list = await tokenizer.abatch_tokenize(
+                texts=texts,
+                mode=request.mode,
+                use_stop_words=request.use_stop_words
+            )
+            
+            # 统计词频（复用上面的分词结果）
+            word_freq = tokenizer.count_word_freq(tokens_list, top_k=20)
         
         # 构建预览数据
         preview_data = [
@@ -298,11 +329,11 @@ async def tokenize_jieba(request: TokenizeRequest):
                 "tokens": tokens,
                 "token_count": len(tokens)
             }
-            for i, (text, tokens) in enumerate(zip(request.texts, tokens_list))
+            for i, (text, tokens) in enumerate(zip(texts, tokens_list))
         ]
         
         stats = {
-            "total_texts": len(request.texts),
+            "total_texts": len(texts),
             "total_tokens": sum(len(tokens) for tokens in tokens_list),
             "avg_tokens_per_text": sum(len(tokens) for tokens in tokens_list) / len(tokens_list) if tokens_list else 0,
             "unique_tokens": len(set(token for tokens in tokens_list for token in tokens)),
@@ -320,6 +351,8 @@ async def tokenize_jieba(request: TokenizeRequest):
             )
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"分词失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"分词失败: {str(e)}")
@@ -734,17 +767,9 @@ def convert_sparse_vector_to_qdrant_format(
     Returns:
         (indices, values) 元组，Qdrant稀疏向量格式
     """
-    indices = []
-    values = []
-    
-    # 使用token的hash值作为索引
-    for token, weight in sparse_vector.items():
-        if weight != 0:  # 只保留非零权重
-            token_id = abs(hash(token)) % (2**31)  # 确保是正整数
-            indices.append(token_id)
-            values.append(weight)
-    
-    return indices, values
+    # 使用与索引、检索相同的确定性哈希作为索引（不受PYTHONHASHSEED影响），并丢弃零权重
+    qdrant_format = to_qdrant_format([sparse_vector])[0]
+    return qdrant_format["indices"], qdrant_format["values"]
 
 
 # ========== 生成测试 ==========
@@ -4,13 +4,16 @@
 """
 
 from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Optional, Dict, Any, List
 import logging
 
 from app.core.response import success_response, page_response
 from app.models.evaluation import EvaluationType, EvaluationStatus
 from app.services.evaluation_task import EvaluationTaskService
+from app.services.task_progress import (
+    PROGRESS_KIND_EVALUATION_TASK, progress_event_stream, evaluation_task_progress_event
+)
 from app.schemas.test import TestSetCreate
 from app.schemas.evaluation import (
     CreateEvaluationTaskRequest,
@@ -90,8 +93,8 @@ async def execute_evaluation_task(
         if request:
             save_detailed = request.save_detailed_results
         
-        # 创建任务队列任务
-        from app.services.task_queue_service import TaskQueueService
+        # 创建任务队列任务（同一评估任务已在排队或执行时返回已有任务，不重复执行）
+        from app.services.task_queue_service import TaskQueueService, task_idempotency_key
         from app.models.task_queue import TaskType
         
         task_service = TaskQueueService()
@@ -99,8 +102,10 @@ async def execute_evaluation_task(
             task_type=TaskType.EVALUATION,
             payload={
                 "evaluation_task_id": task_id,
+                "kb_id": evaluation_task.kb_id,
                 "save_detailed_results": save_detailed
-            }
+            },
+            idempotency_key=task_idempotency_key(TaskType.EVALUATION, {"evaluation_task_id": task_id})
         )
         
         return JSONResponse(
@@ -212,6 +217,26 @@ async def get_evaluation_task(task_id: str):
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
+@router.get("/tasks/{task_id}/events", response_model=None, summary="订阅评估任务进度（SSE）")
+async def stream_evaluation_task_events(task_id: str):
+    """
+    以Server-Sent Events推送评估任务进度
+    
+    连接后先推送一次当前进度，之后每完成一个用例推送一次，任务结束（completed/failed）后关闭连接
+    """
+    evaluation_service = EvaluationTaskService()
+    
+    async def load_snapshot():
+        task = await evaluation_service.get_evaluation_task(task_id)
+        return evaluation_task_progress_event(task) if task else None
+    
+    return StreamingResponse(
+        progress_event_stream(PROGRESS_KIND_EVALUATION_TASK, task_id, load_snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ========== 评估结果查询 ==========
 
 @router.get("/tasks/{task_id}/summary", response_model=None, summary="获取评估汇总")
@@ -181,6 +181,8 @@ async def get_knowledge_base_config(kb_id: str):
         "chunk_config": {
             "chunk_size": kb.chunk_size,
             "chunk_overlap": kb.chunk_overlap,
+            "chunk_method": kb.chunk_method,
+            "chunking_config": kb.chunking_config or {},
         },
         "retrieval_config": {
             "top_k": kb.retrieval_top_k,
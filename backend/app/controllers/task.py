@@ -0,0 +1,63 @@
+"""
+任务队列控制器
+查询任务队列中任务的状态，并以Server-Sent Events推送任务进度
+"""
+
+from fastapi import APIRouter, Path
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.core.response import success_response
+from app.core.exceptions import NotFoundException
+from app.services.task_queue_service import TaskQueueService
+from app.services.task_progress import PROGRESS_KIND_TASK, progress_event_stream, task_progress_event
+
+router = APIRouter(prefix="/tasks", tags=["任务队列"])
+
+
+@router.get("/{task_id}", response_model=None, summary="获取任务详情")
+async def get_task(task_id: str = Path(..., description="任务ID")):
+    """获取任务队列中任务的状态、进度和执行结果"""
+    task = await TaskQueueService().get_task(task_id)
+    if not task:
+        raise NotFoundException(message=f"任务不存在: {task_id}")
+    
+    return JSONResponse(
+        content=success_response(
+            data={
+                "id": task.id,
+                "task_type": task.task_type.value,
+                "status": task.status.value,
+                "progress": task.progress,
+                "priority": task.priority,
+                "retry_count": task.retry_count,
+                "max_retries": task.max_retries,
+                "result": task.result,
+                "error_message": task.error_message,
+                "started_at": task.started_at.isoformat() if task.started_at else None,
+                "completed_at": task.completed_at.isoformat() if task.completed_at else None,
+                "created_at": task.created_at.isoformat() if task.created_at else None
+            },
+            message="获取成功"
+        )
+    )
+
+
+@router.get("/{task_id}/events", response_model=None, summary="订阅任务进度（SSE）")
+async def stream_task_events(task_id: str = Path(..., description="任务ID")):
+    """
+    以Server-Sent Events推送任务状态和进度
+    
+    连接后先推送一次当前状态，之后在认领、保存检查点、完成、失败或重试时推送，
+    任务到达终态（completed/failed/dead_letter）后关闭连接
+    """
+    task_service = TaskQueueService()
+    
+    async def load_snapshot():
+        task = await task_service.get_task(task_id)
+        return task_progress_event(task) if task else None
+    
+    return StreamingResponse(
+        progress_event_stream(PROGRESS_KIND_TASK, task_id, load_snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -6,7 +6,7 @@
 from typing import List
 from fastapi import APIRouter, Query, Path
 from datetime import datetime
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from app.schemas.test import (
     TestSetCreate,
@@ -29,7 +29,7 @@ from app.schemas.test import (
     TestSetKnowledgeBaseResponse,
 )
 from app.core.response import success_response, page_response, error_response
-from app.core.exceptions import NotFoundException, BadRequestException
+from app.core.exceptions import NotFoundException, BadRequestException, ConflictException
 from app.services.test_service import TestService, RetrieverTestCaseService, GenerationTestCaseService
 from app.repositories.factory import RepositoryFactory
 import logging
@@ -313,6 +313,11 @@ async def import_test_set_to_kb(
             status_code=404,
             content=error_response(message=str(e))
         )
+    except ConflictException as e:
+        return JSONResponse(
+            status_code=409,
+            content=error_response(message=e.message, data=e.details)
+        )
     except Exception as e:
         logger.error(f"创建导入任务失败: {e}", exc_info=True)
         return JSONResponse(
@@ -394,8 +399,36 @@ async def get_import_task(import_task_id: str = Path(..., description="导入任
         )
 
 
+@router.get("/import-tasks/{import_task_id}/events", response_model=None, summary="订阅导入任务进度（SSE）")
+async def stream_import_task_events(import_task_id: str = Path(..., description="导入任务ID")):
+    """
+    以Server-Sent Events推送导入任务进度
+    
+    连接后先推送一次当前进度，之后每导入一批推送一次，任务结束（completed/failed）后关闭连接
+    """
+    from app.services.test_set_import_service import TestSetImportService
+    from app.services.task_progress import (
+        PROGRESS_KIND_IMPORT_TASK, progress_event_stream, import_task_progress_event
+    )
+    
+    import_service = TestSetImportService()
+    
+    async def load_snapshot():
+        import_task = await import_service.get_import_task(import_task_id)
+        return import_task_progress_event(import_task) if import_task else None
+    
+    return StreamingResponse(
+        progress_event_stream(PROGRESS_KIND_IMPORT_TASK, import_task_id, load_snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/import-tasks/{import_task_id}/cancel", response_model=None, summary="终止导入任务")
-async def cancel_import_task(import_task_id: str = Path(..., description="导入任务ID")):
+async def cancel_import_task(
+    import_task_id: str = Path(..., description="导入任务ID"),
+    cleanup: bool = Query(False, description="是否删除本次导入已新建的文档及其分块和向量")
+):
     """
     终止导入任务
     
@@ -405,7 +438,7 @@ async def cancel_import_task(import_task_id: str = Path(..., description="导入
         from app.services.test_set_import_service import TestSetImportService
         
         import_service = TestSetImportService()
-        await import_service.cancel_import_task(import_task_id)
+        await import_service.cancel_import_task(import_task_id, cleanup=cleanup)
         
         return JSONResponse(
             content=success_response(
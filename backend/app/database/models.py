@@ -32,6 +32,7 @@ class TaskStatusEnum(str, enum.Enum):
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
+    DEAD_LETTER = "dead_letter"
 
 
 class TestSetORM(Base):
@@ -290,12 +291,20 @@ class TaskQueueORM(Base):
     task_type = Column(SQLEnum(TaskTypeEnum), nullable=False, index=True)
     status = Column(SQLEnum(TaskStatusEnum), nullable=False, default="pending", index=True)
     payload = Column(JSON, nullable=False)
+    priority = Column(Integer, default=0, nullable=False)
+    idempotency_key = Column(String(64), nullable=True)
     progress = Column(Float, default=0.0, nullable=False)
+    checkpoint = Column(JSON, nullable=True)
     result = Column(JSON, nullable=True)
     error_message = Column(Text, nullable=True)
     retry_count = Column(Integer, default=0, nullable=False)
     max_retries = Column(Integer, default=3, nullable=False)
     
+    worker_id = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    next_run_at = Column(DateTime, nullable=True)
+    
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
@@ -304,6 +313,9 @@ class TaskQueueORM(Base):
     __table_args__ = (
         Index('idx_task_queue_status', 'status'),
         Index('idx_task_queue_type', 'task_type'),
+        Index('idx_task_queue_status_created', 'status', 'created_at'),
+        Index('idx_task_queue_status_priority', 'status', 'priority', 'created_at'),
+        Index('idx_task_queue_idempotency', 'idempotency_key', 'status'),
     )
 
 # 在文件末尾添加
@@ -335,6 +347,8 @@ class KnowledgeBaseORM(Base):
     # 分块配置
     chunk_size = Column(Integer, default=512)
     chunk_overlap = Column(Integer, default=50)
+    chunk_method = Column(String(20), nullable=False, default="fixed_size")
+    chunking_config = Column(JSON, nullable=True)
     
     # 检索配置
     retrieval_top_k = Column(Integer, default=5)
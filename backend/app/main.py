@@ -2,6 +2,7 @@
 FastAPI应用主入口
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -51,10 +52,34 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️  模型初始化出错: {str(e)}")
     
+    # 单进程部署：任务执行器运行在API进程内，通过进程内队列接收通知
+    from app.services.task_notifier.factory import TaskNotifierFactory
+    task_executor = None
+    # 启动时创建进度事件中心，后端与执行器部署方式不匹配时立即告警
+    from app.services.task_progress import TaskProgressHub
+    print(f"📡 任务进度事件后端: {TaskProgressHub().backend}")
+    if TaskNotifierFactory.get_notifier_type() == "inprocess":
+        from app.services.task_worker import get_task_executor
+        task_executor = get_task_executor()
+        task_executor.start()
+        print(f"🔄 进程内任务执行器已启动: {task_executor.worker_id}")
+        if settings.TASK_EXECUTOR_WARM_UP_POOLS:
+            from app.services.cpu_pools import warm_up_cpu_pools
+            asyncio.create_task(warm_up_cpu_pools())
+    
     yield
     
     # 关闭时执行
     print(f"👋 {settings.APP_NAME} 正在关闭...")
+    if task_executor is not None:
+        await task_executor.stop()
+    await TaskNotifierFactory.close()
+    from app.services.task_progress import TaskProgressHub
+    await TaskProgressHub().close()
+    from app.services.sparse_vector_service import SparseVectorServiceFactory
+    SparseVectorServiceFactory.flush_all()
+    from app.services.cpu_pools import shutdown_cpu_pools
+    shutdown_cpu_pools()
 
 
 # 创建FastAPI应用实例
@@ -99,20 +124,36 @@ async def root():
 
 @app.get(f"{settings.API_PREFIX}/health")
 async def health_check():
-    """健康检查接口"""
-    return JSONResponse(
-        content={
-            "status": "healthy",
-            "app_name": settings.APP_NAME,
-            "version": settings.APP_VERSION,
-            "storage_type": settings.STORAGE_TYPE,
-            "vector_db": settings.VECTOR_DB_TYPE,
+    """健康检查接口（进程内运行任务执行器时附带执行器和任务队列深度指标）"""
+    content = {
+        "status": "healthy",
+        "app_name": settings.APP_NAME,
+        "version": settings.APP_VERSION,
+        "storage_type": settings.STORAGE_TYPE,
+        "vector_db": settings.VECTOR_DB_TYPE,
+    }
+    
+    from app.services.task_notifier.factory import TaskNotifierFactory
+    if TaskNotifierFactory.get_notifier_type() == "inprocess":
+        from app.services.task_worker import get_task_executor
+        from app.services.task_notifier.inprocess_notifier import InProcessTaskChannel
+        executor = get_task_executor()
+        try:
+            queue_depth = await executor.task_queue_service.get_queue_depth()
+        except Exception:
+            queue_depth = None
+        content["task_executor"] = {
+            "worker_id": executor.worker_id,
+            **executor.stats(),
+            "notify_queue": InProcessTaskChannel().stats(),
+            "queue_depth": queue_depth,
         }
-    )
+    
+    return JSONResponse(content=content)
 
 
 # 导入并注册路由
-from app.controllers import knowledge_base, document, test_management, debug_pipeline, evaluation
+from app.controllers import knowledge_base, document, test_management, debug_pipeline, evaluation, task
 
 app.include_router(knowledge_base.router, prefix=settings.API_PREFIX)
 app.include_router(document.router, prefix=settings.API_PREFIX)
@@ -121,6 +162,7 @@ app.include_router(test_management.retriever_router, prefix=settings.API_PREFIX)
 app.include_router(test_management.generation_router, prefix=settings.API_PREFIX)
 app.include_router(debug_pipeline.router, prefix=settings.API_PREFIX)
 app.include_router(evaluation.router, prefix=settings.API_PREFIX)
+app.include_router(task.router, prefix=settings.API_PREFIX)
 
 
 # 注意：不要直接运行此文件
@@ -58,6 +58,14 @@ class KnowledgeBase(BaseModelMixin):
     # 分块配置
     chunk_size: int = Field(default=512, description="分块大小", ge=100, le=2000)
     chunk_overlap: int = Field(default=50, description="分块重叠", ge=0, le=500)
+    chunk_method: str = Field(
+        default="fixed_size",
+        description="分块方法: fixed_size, paragraph, sentence, recursive, semantic"
+    )
+    chunking_config: Optional[Dict[str, Any]] = Field(
+        None,
+        description="分块方法参数（如size_unit、separators、breakpoint_percentile）"
+    )
     
     # 检索配置
     retrieval_top_k: int = Field(default=5, description="检索返回数量", ge=1, le=50)
@@ -23,6 +23,7 @@ class TaskStatus(str, Enum):
     RUNNING = "running"    # 执行中
     COMPLETED = "completed" # 已完成
     FAILED = "failed"      # 失败
+    DEAD_LETTER = "dead_letter"  # 重试耗尽（死信），需人工处理后重新入队
 
 
 class TaskQueue(BaseModelMixin):
@@ -31,12 +32,21 @@ class TaskQueue(BaseModelMixin):
     task_type: TaskType = Field(..., description="任务类型")
     status: TaskStatus = Field(default=TaskStatus.PENDING, description="任务状态")
     payload: Dict[str, Any] = Field(default_factory=dict, description="任务参数（JSON格式）")
+    priority: int = Field(default=0, description="优先级（越大越先执行，同优先级按知识库公平分配、先进先出）")
+    idempotency_key: Optional[str] = Field(None, description="幂等键（任务类型+规范化payload的哈希），相同幂等键的待执行或执行中任务只保留一个")
     progress: float = Field(default=0.0, ge=0.0, le=1.0, description="进度（0.0-1.0）")
+    checkpoint: Optional[Dict[str, Any]] = Field(None, description="检查点（进度游标，重试或租约回收后从此处继续执行）")
     result: Optional[Dict[str, Any]] = Field(None, description="执行结果（JSON格式）")
     error_message: Optional[str] = Field(None, description="错误信息")
     retry_count: int = Field(default=0, ge=0, description="重试次数")
     max_retries: int = Field(default=3, ge=0, description="最大重试次数")
     
+    # 认领信息（执行器原子认领任务后持有租约，执行期间通过心跳续约）
+    worker_id: Optional[str] = Field(None, description="认领任务的执行器ID")
+    lease_expires_at: Optional[datetime] = Field(None, description="租约到期时间")
+    heartbeat_at: Optional[datetime] = Field(None, description="最近一次心跳时间")
+    next_run_at: Optional[datetime] = Field(None, description="最早可执行时间（重试退避），为空表示立即可执行")
+    
     # 时间信息
     started_at: Optional[datetime] = Field(None, description="开始时间")
     completed_at: Optional[datetime] = Field(None, description="完成时间")
@@ -47,16 +57,22 @@ class TaskQueue(BaseModelMixin):
                 "id": "task_001",
                 "task_type": "document_write",
                 "status": "pending",
+                "priority": 10,
                 "payload": {
                     "kb_id": "kb_001",
                     "chunks": ["chunk1", "chunk2"],
                     "metadata_list": []
                 },
                 "progress": 0.0,
+                "checkpoint": None,
                 "result": None,
                 "error_message": None,
                 "retry_count": 0,
                 "max_retries": 3,
+                "worker_id": None,
+                "lease_expires_at": None,
+                "heartbeat_at": None,
+                "next_run_at": None,
                 "created_at": "2025-01-15T10:00:00",
                 "started_at": None,
                 "completed_at": None
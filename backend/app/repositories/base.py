@@ -4,7 +4,7 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Optional, List, Dict, Any
+from typing import Generic, TypeVar, Optional, List, Dict, Any, Tuple
 
 from app.models.base import BaseModelMixin
 
@@ -30,6 +30,26 @@ class BaseRepository(ABC, Generic[T]):
         """
         pass
     
+    @abstractmethod
+    async def bulk_create(
+        self,
+        entities: List[T],
+        batch_size: int = 1000
+    ) -> Tuple[List[T], List[Dict[str, Any]]]:
+        """
+        批量创建实体
+        
+        冲突（ID已存在或批次内重复）按条目报告，不影响其他实体写入
+        
+        Args:
+            entities: 实体对象列表
+            batch_size: 每批写入数量
+        
+        Returns:
+            (成功创建的实体列表, 失败记录列表[{index, id, error}])
+        """
+        pass
+    
     @abstractmethod
     async def get_by_id(self, entity_id: str) -> Optional[T]:
         """
@@ -65,6 +85,26 @@ class BaseRepository(ABC, Generic[T]):
         """
         pass
     
+    @abstractmethod
+    async def get_by_field_values(
+        self,
+        field_name: str,
+        values: List[Any],
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[T]:
+        """
+        根据字段取值集合批量获取实体（IN查询）
+        
+        Args:
+            field_name: 字段名
+            values: 字段取值列表
+            filters: 额外的等值过滤条件
+        
+        Returns:
+            实体列表（不保证顺序）
+        """
+        pass
+    
     @abstractmethod
     async def count(self, filters: Optional[Dict[str, Any]] = None) -> int:
         """
@@ -92,6 +132,20 @@ class BaseRepository(ABC, Generic[T]):
         """
         pass
     
+    @abstractmethod
+    async def bulk_update(self, entities: List[T], batch_size: int = 1000) -> int:
+        """
+        批量更新实体（按ID整体覆盖）
+        
+        Args:
+            entities: 更新后的实体对象列表
+            batch_size: 每批写入数量
+        
+        Returns:
+            更新的实体数量
+        """
+        pass
+    
     @abstractmethod
     async def delete(self, entity_id: str) -> bool:
         """
@@ -105,6 +159,20 @@ class BaseRepository(ABC, Generic[T]):
         """
         pass
     
+    @abstractmethod
+    async def bulk_delete(self, entity_ids: List[str], batch_size: int = 1000) -> int:
+        """
+        批量删除实体
+        
+        Args:
+            entity_ids: 实体ID列表
+            batch_size: 每批删除数量
+        
+        Returns:
+            删除的实体数量
+        """
+        pass
+    
     @abstractmethod
     async def exists(self, entity_id: str) -> bool:
         """
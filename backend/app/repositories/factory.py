@@ -133,7 +133,17 @@ class RepositoryFactory:
     
     @staticmethod
     def create_task_queue_repository():
-        """创建任务队列仓储"""
-        from app.models.task_queue import TaskQueue
-        return RepositoryFactory.create(TaskQueue, "task_queue")
+        """创建任务队列仓储（支持原子认领和租约续约）"""
+        from app.repositories.task_queue_repository import JsonTaskQueueRepository, MySQLTaskQueueRepository
+        
+        storage_type = settings.STORAGE_TYPE.lower()
+        if storage_type == "json":
+            return JsonTaskQueueRepository()
+        elif storage_type == "mysql":
+            return MySQLTaskQueueRepository()
+        else:
+            raise ValueError(
+                f"不支持的存储类型: {storage_type}，"
+                f"支持的类型: json, mysql"
+            )
 
@@ -5,7 +5,8 @@ JSON文件存储实现
 
 import json
 import os
-from typing import Type, Optional, List, Dict, Any, Generic
+import tempfile
+from typing import Type, Optional, List, Dict, Any, Generic, Tuple
 from pathlib import Path
 
 from app.repositories.base import BaseRepository, T
@@ -50,11 +51,26 @@ class JsonRepository(BaseRepository[T], Generic[T]):
             )
     
     def _save_data(self, data: List[Dict[str, Any]]) -> None:
-        """保存数据到JSON文件"""
+        """
+        保存数据到JSON文件
+        
+        先写同目录下的临时文件再原子替换：其他进程（如独立的任务执行器）不加锁读取时
+        只会读到旧文件或新文件，不会读到写了一半的文件
+        """
+        tmp_path = None
         try:
-            with open(self.file_path, "w", encoding="utf-8") as f:
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=self.file_path.parent,
+                prefix=f".{self.file_path.name}.", suffix=".tmp", delete=False
+            ) as f:
+                tmp_path = f.name
                 json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+            # 临时文件权限为0600，沿用原文件的权限
+            os.chmod(tmp_path, self.file_path.stat().st_mode & 0o777 if self.file_path.exists() else 0o644)
+            os.replace(tmp_path, self.file_path)
         except Exception as e:
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
             raise InternalServerException(
                 message=f"保存存储文件失败: {str(e)}",
                 details={"file": str(self.file_path)}
@@ -86,6 +102,39 @@ class JsonRepository(BaseRepository[T], Generic[T]):
         
         return entity
     
+    async def bulk_create(
+        self,
+        entities: List[T],
+        batch_size: int = 1000
+    ) -> Tuple[List[T], List[Dict[str, Any]]]:
+        """批量创建实体（一次读取、一次写入文件）"""
+        if not entities:
+            return [], []
+        
+        data = self._load_data()
+        existing_ids = {item["id"] for item in data}
+        
+        created: List[T] = []
+        failed_records: List[Dict[str, Any]] = []
+        
+        for idx, entity in enumerate(entities):
+            if entity.id in existing_ids:
+                failed_records.append({
+                    "index": idx,
+                    "id": entity.id,
+                    "error": f"实体ID已存在: {entity.id}"
+                })
+                continue
+            
+            existing_ids.add(entity.id)
+            data.append(entity.model_dump())
+            created.append(entity)
+        
+        if created:
+            self._save_data(data)
+        
+        return created, failed_records
+    
     async def get_by_id(self, entity_id: str) -> Optional[T]:
         """根据ID获取实体"""
         data = self._load_data()
@@ -148,6 +197,25 @@ class JsonRepository(BaseRepository[T], Generic[T]):
         # 转换为实体对象
         return [self.entity_type(**item) for item in data]
     
+    async def get_by_field_values(
+        self,
+        field_name: str,
+        values: List[Any],
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[T]:
+        """根据字段取值集合批量获取实体"""
+        if not values:
+            return []
+        
+        value_set = set(values)
+        data = self._load_data()
+        
+        return [
+            self.entity_type(**item) for item in data
+            if item.get(field_name) in value_set
+            and (not filters or self._match_filters(item, filters))
+        ]
+    
     async def count(self, filters: Optional[Dict[str, Any]] = None) -> int:
         """统计实体数量"""
         data = self._load_data()
@@ -174,6 +242,28 @@ class JsonRepository(BaseRepository[T], Generic[T]):
         
         return None
     
+    async def bulk_update(self, entities: List[T], batch_size: int = 1000) -> int:
+        """批量更新实体（一次读取、一次写入文件）"""
+        if not entities:
+            return 0
+        
+        data = self._load_data()
+        positions = {item["id"]: i for i, item in enumerate(data)}
+        
+        updated_count = 0
+        for entity in entities:
+            position = positions.get(entity.id)
+            if position is None:
+                continue
+            entity.update_timestamp()
+            data[position] = entity.model_dump()
+            updated_count += 1
+        
+        if updated_count:
+            self._save_data(data)
+        
+        return updated_count
+    
     async def delete(self, entity_id: str) -> bool:
         """删除实体"""
         data = self._load_data()
@@ -187,6 +277,21 @@ class JsonRepository(BaseRepository[T], Generic[T]):
         
         return False
     
+    async def bulk_delete(self, entity_ids: List[str], batch_size: int = 1000) -> int:
+        """批量删除实体（一次读取、一次写入文件）"""
+        if not entity_ids:
+            return 0
+        
+        id_set = set(entity_ids)
+        data = self._load_data()
+        remaining = [item for item in data if item["id"] not in id_set]
+        deleted_count = len(data) - len(remaining)
+        
+        if deleted_count:
+            self._save_data(remaining)
+        
+        return deleted_count
+    
     async def exists(self, entity_id: str) -> bool:
         """检查实体是否存在"""
         data = self._load_data()
@@ -4,8 +4,8 @@ MySQL ORM 存储实现
 """
 
 import asyncio
-from typing import Type, Optional, List, Dict, Any, Generic
-from sqlalchemy import select, update, delete, and_
+from typing import Type, Optional, List, Dict, Any, Generic, Tuple
+from sqlalchemy import select, insert, update, delete, and_
 from sqlalchemy.orm import Session
 
 from app.repositories.base import BaseRepository, T
@@ -73,6 +73,10 @@ class MySQLRepository(BaseRepository[T], Generic[T]):
     
     def _pydantic_to_orm(self, entity: T) -> Any:
         """将Pydantic模型转换为ORM模型"""
+        return self.orm_model(**self._pydantic_to_orm_dict(entity))
+    
+    def _pydantic_to_orm_dict(self, entity: T) -> Dict[str, Any]:
+        """将Pydantic模型转换为ORM属性字典（供单条和批量写入共用）"""
         entity_dict = entity.model_dump(exclude={'created_at', 'updated_at'})
         
         # 处理 metadata -> meta_data 映射（如果 ORM 模型使用 meta_data）
@@ -91,7 +95,7 @@ class MySQLRepository(BaseRepository[T], Generic[T]):
                 entity_dict['updated_at'] = datetime.fromisoformat(entity.updated_at.replace('Z', '+00:00'))
             else:
                 entity_dict['updated_at'] = entity.updated_at
-        return self.orm_model(**entity_dict)
+        return entity_dict
     
     def _orm_to_pydantic(self, orm_obj: Any) -> T:
         """将ORM模型转换为Pydantic模型"""
@@ -182,6 +186,96 @@ class MySQLRepository(BaseRepository[T], Generic[T]):
         
         return await asyncio.to_thread(_create_sync)
     
+    async def bulk_create(
+        self,
+        entities: List[T],
+        batch_size: int = 1000
+    ) -> Tuple[List[T], List[Dict[str, Any]]]:
+        """批量创建实体（每批一次冲突查询 + 一次executemany）"""
+        if not entities:
+            return [], []
+        
+        def _bulk_create_sync():
+            db = SessionLocal()
+            created: List[T] = []
+            failed_records: List[Dict[str, Any]] = []
+            try:
+                # 批次内重复ID直接判定为冲突
+                seen_ids = set()
+                candidates = []
+                for idx, entity in enumerate(entities):
+                    if entity.id in seen_ids:
+                        failed_records.append({
+                            "index": idx,
+                            "id": entity.id,
+                            "error": f"批量数据中ID重复: {entity.id}"
+                        })
+                        continue
+                    seen_ids.add(entity.id)
+                    candidates.append((idx, entity))
+                
+                for start in range(0, len(candidates), batch_size):
+                    batch = candidates[start:start + batch_size]
+                    
+                    # 一次查询检测整批ID冲突
+                    batch_ids = [entity.id for _, entity in batch]
+                    existing_ids = {
+                        row[0] for row in db.query(self.orm_model.id).filter(
+                            self.orm_model.id.in_(batch_ids)
+                        ).all()
+                    }
+                    
+                    rows = []
+                    row_entities = []
+                    for idx, entity in batch:
+                        if entity.id in existing_ids:
+                            failed_records.append({
+                                "index": idx,
+                                "id": entity.id,
+                                "error": f"实体ID已存在: {entity.id}"
+                            })
+                            continue
+                        rows.append(self._pydantic_to_orm_dict(entity))
+                        row_entities.append((idx, entity))
+                    
+                    if not rows:
+                        continue
+                    
+                    try:
+                        db.execute(insert(self.orm_model), rows)
+                        db.commit()
+                        created.extend(entity for _, entity in row_entities)
+                    except Exception as e:
+                        db.rollback()
+                        logger.warning(f"批量写入失败，逐条定位失败记录: {e}")
+                        # 使用savepoint逐条写入，隔离失败条目
+                        for (idx, entity), row in zip(row_entities, rows):
+                            try:
+                                with db.begin_nested():
+                                    db.execute(insert(self.orm_model), [row])
+                                created.append(entity)
+                            except Exception as row_error:
+                                failed_records.append({
+                                    "index": idx,
+                                    "id": entity.id,
+                                    "error": str(row_error)
+                                })
+                        db.commit()
+                
+                failed_records.sort(key=lambda record: record["index"])
+                return created, failed_records
+            except Exception as e:
+                db.rollback()
+                logger.error(f"批量创建实体失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"批量创建实体失败: {str(e)}",
+                    details={"created_count": len(created)}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_bulk_create_sync)
+    
     async def get_by_id(self, entity_id: str) -> Optional[T]:
         """根据ID获取实体"""
         def _get_sync():
@@ -253,6 +347,49 @@ class MySQLRepository(BaseRepository[T], Generic[T]):
         
         return await asyncio.to_thread(_get_all_sync)
     
+    async def get_by_field_values(
+        self,
+        field_name: str,
+        values: List[Any],
+        filters: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000
+    ) -> List[T]:
+        """根据字段取值集合批量获取实体（分批IN查询）"""
+        if not values:
+            return []
+        if not hasattr(self.orm_model, field_name):
+            raise ValueError(f"表 {self.table_name} 不存在字段: {field_name}")
+        
+        def _get_by_values_sync():
+            db = SessionLocal()
+            try:
+                column = getattr(self.orm_model, field_name)
+                unique_values = list(dict.fromkeys(values))
+                results = []
+                for start in range(0, len(unique_values), batch_size):
+                    query = db.query(self.orm_model).filter(
+                        column.in_(unique_values[start:start + batch_size])
+                    )
+                    if filters:
+                        conditions = []
+                        for key, value in filters.items():
+                            if hasattr(self.orm_model, key):
+                                conditions.append(getattr(self.orm_model, key) == value)
+                        if conditions:
+                            query = query.filter(and_(*conditions))
+                    results.extend(self._orm_to_pydantic(obj) for obj in query.all())
+                return results
+            except Exception as e:
+                logger.error(f"批量获取实体失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"批量获取实体失败: {str(e)}",
+                    details={"field": field_name}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_get_by_values_sync)
+    
     async def count(self, filters: Optional[Dict[str, Any]] = None) -> int:
         """统计实体数量"""
         def _count_sync():
@@ -313,6 +450,38 @@ class MySQLRepository(BaseRepository[T], Generic[T]):
         
         return await asyncio.to_thread(_update_sync)
     
+    async def bulk_update(self, entities: List[T], batch_size: int = 1000) -> int:
+        """批量更新实体（按主键executemany）"""
+        if not entities:
+            return 0
+        
+        def _bulk_update_sync():
+            db = SessionLocal()
+            try:
+                updated_count = 0
+                for start in range(0, len(entities), batch_size):
+                    rows = []
+                    for entity in entities[start:start + batch_size]:
+                        entity.update_timestamp()
+                        row = self._pydantic_to_orm_dict(entity)
+                        row.pop('created_at', None)
+                        rows.append(row)
+                    db.execute(update(self.orm_model), rows)
+                    db.commit()
+                    updated_count += len(rows)
+                return updated_count
+            except Exception as e:
+                db.rollback()
+                logger.error(f"批量更新实体失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"批量更新实体失败: {str(e)}",
+                    details={"entity_count": len(entities)}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_bulk_update_sync)
+    
     async def delete(self, entity_id: str) -> bool:
         """删除实体"""
         def _delete_sync():
@@ -340,6 +509,36 @@ class MySQLRepository(BaseRepository[T], Generic[T]):
         
         return await asyncio.to_thread(_delete_sync)
     
+    async def bulk_delete(self, entity_ids: List[str], batch_size: int = 1000) -> int:
+        """批量删除实体（分批 DELETE ... WHERE id IN）"""
+        if not entity_ids:
+            return 0
+        
+        def _bulk_delete_sync():
+            db = SessionLocal()
+            try:
+                deleted_count = 0
+                for start in range(0, len(entity_ids), batch_size):
+                    result = db.execute(
+                        delete(self.orm_model).where(
+                            self.orm_model.id.in_(entity_ids[start:start + batch_size])
+                        )
+                    )
+                    deleted_count += result.rowcount or 0
+                db.commit()
+                return deleted_count
+            except Exception as e:
+                db.rollback()
+                logger.error(f"批量删除实体失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"批量删除实体失败: {str(e)}",
+                    details={"entity_count": len(entity_ids)}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_bulk_delete_sync)
+    
     async def exists(self, entity_id: str) -> bool:
         """检查实体是否存在"""
         def _exists_sync():
@@ -0,0 +1,837 @@
+"""
+任务队列仓储
+在通用CRUD之外提供原子认领、租约续约和过期租约回收：
+MySQL 使用条件UPDATE和 SELECT ... FOR UPDATE SKIP LOCKED，
+JSON 存储使用文件锁串行化读-改-写作为本地替代
+"""
+
+import asyncio
+import fcntl
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Callable, Tuple
+
+from sqlalchemy import select, update, func, or_, and_, text
+
+from app.models.task_queue import TaskQueue, TaskStatus, TaskType
+from app.repositories.json_repository import JsonRepository
+from app.repositories.mysql_repository import MySQLRepository
+from app.database import SessionLocal, engine
+from app.core.exceptions import InternalServerException
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    """解析JSON存储中的时间字段（ISO字符串或str(datetime)）"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _is_runnable(item: Dict[str, Any], now: datetime) -> bool:
+    """JSON记录是否为已到可执行时间的待执行任务"""
+    if item.get("status") != TaskStatus.PENDING.value:
+        return False
+    next_run_at = _parse_time(item.get("next_run_at"))
+    return next_run_at is None or next_run_at <= now
+
+
+def _schedule_order(item: Dict[str, Any]):
+    """JSON记录的调度顺序：优先级降序，创建时间升序"""
+    return (-int(item.get("priority") or 0), str(item.get("created_at") or ""), item["id"])
+
+
+def _is_lease_expired(item: Dict[str, Any], now: datetime, lease_seconds: float) -> bool:
+    """JSON记录是否为租约已过期的执行中任务（无租约的旧记录按最近更新时间判断）"""
+    if item.get("status") != TaskStatus.RUNNING.value:
+        return False
+    lease_expires_at = _parse_time(item.get("lease_expires_at"))
+    if lease_expires_at is not None:
+        return lease_expires_at < now
+    updated_at = _parse_time(item.get("updated_at"))
+    return updated_at is None or updated_at < now - timedelta(seconds=lease_seconds)
+
+
+def retry_values(
+    retry_count: int,
+    max_retries: int,
+    now: datetime,
+    retry_delay: Callable[[int], float],
+    error_message: str
+) -> Dict[str, Any]:
+    """
+    计算一次失败后的任务字段：未超过最大重试次数时退避后重新入队，否则进入死信
+    
+    Args:
+        retry_count: 计入本次失败后的重试次数
+        max_retries: 最大重试次数
+        now: 当前时间
+        retry_delay: 重试次数 → 退避秒数
+        error_message: 错误信息
+    
+    Returns:
+        需要写入的字段（status为TaskStatus）
+    """
+    values: Dict[str, Any] = {
+        "retry_count": retry_count,
+        "error_message": error_message,
+        "worker_id": None,
+        "lease_expires_at": None,
+    }
+    if retry_count <= max_retries:
+        values.update(
+            status=TaskStatus.PENDING,
+            started_at=None,
+            next_run_at=now + timedelta(seconds=retry_delay(retry_count))
+        )
+    else:
+        values.update(status=TaskStatus.DEAD_LETTER, completed_at=now, next_run_at=None)
+    return values
+
+
+class JsonTaskQueueRepository(JsonRepository[TaskQueue]):
+    """
+    JSON任务队列仓储
+    
+    认领、续约和更新在同一把文件锁（跨进程）内完成读-改-写，
+    多个执行器进程共享同一个存储目录时也不会重复认领
+    """
+    
+    # 同一进程内各实例共享的线程锁（fcntl锁只在进程之间互斥）
+    _thread_lock = threading.RLock()
+    
+    def __init__(self):
+        super().__init__(TaskQueue, "task_queue")
+        self.lock_path = self.file_path.with_suffix(".lock")
+    
+    @contextmanager
+    def _locked(self):
+        """持有存储文件的独占锁"""
+        with self._thread_lock:
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    @staticmethod
+    def _apply_claim(item: Dict[str, Any], worker_id: str, now: datetime, lease_seconds: float):
+        """把待执行任务记录改为被worker_id认领的执行中状态"""
+        item["status"] = TaskStatus.RUNNING.value
+        item["worker_id"] = worker_id
+        item["heartbeat_at"] = now.isoformat()
+        item["lease_expires_at"] = (now + timedelta(seconds=lease_seconds)).isoformat()
+        item["started_at"] = item.get("started_at") or now.isoformat()
+        item["updated_at"] = now.isoformat()
+    
+    async def update(self, entity_id: str, entity: TaskQueue) -> Optional[TaskQueue]:
+        """更新实体（与认领互斥）"""
+        with self._locked():
+            return await super().update(entity_id, entity)
+    
+    async def claim(self, task_id: str, worker_id: str, lease_seconds: float) -> Optional[TaskQueue]:
+        """
+        原子认领指定的待执行任务
+        
+        Args:
+            task_id: 任务ID
+            worker_id: 执行器ID
+            lease_seconds: 租约时长（秒）
+        
+        Returns:
+            认领成功返回任务对象，任务不存在、已不是pending或未到重试时间时返回None
+        """
+        with self._locked():
+            data = self._load_data()
+            for item in data:
+                if item["id"] == task_id:
+                    now = datetime.now()
+                    if not _is_runnable(item, now):
+                        return None
+                    self._apply_claim(item, worker_id, now, lease_seconds)
+                    self._save_data(data)
+                    return TaskQueue(**item)
+            return None
+    
+    async def claim_next(self, worker_id: str, lease_seconds: float, limit: int = 1) -> List[TaskQueue]:
+        """
+        原子认领优先级最高、最早创建的若干个待执行任务
+        
+        Args:
+            worker_id: 执行器ID
+            lease_seconds: 租约时长（秒）
+            limit: 最多认领的任务数
+        
+        Returns:
+            认领到的任务列表（按优先级降序、创建时间升序）
+        """
+        if limit <= 0:
+            return []
+        
+        with self._locked():
+            data = self._load_data()
+            now = datetime.now()
+            pending = sorted(
+                (item for item in data if _is_runnable(item, now)),
+                key=_schedule_order
+            )[:limit]
+            if not pending:
+                return []
+            
+            for item in pending:
+                self._apply_claim(item, worker_id, now, lease_seconds)
+            self._save_data(data)
+            return [TaskQueue(**item) for item in pending]
+    
+    async def list_runnable(self, limit: int) -> List[TaskQueue]:
+        """
+        按调度顺序读取已到可执行时间的待执行任务（只读，认领需再调用claim）
+        
+        Args:
+            limit: 最多返回的任务数
+        
+        Returns:
+            任务列表（按优先级降序、创建时间升序）
+        """
+        data = self._load_data()
+        now = datetime.now()
+        return [
+            TaskQueue(**item)
+            for item in sorted((item for item in data if _is_runnable(item, now)), key=_schedule_order)[:limit]
+        ]
+    
+    async def renew_lease(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """
+        续约（心跳）
+        
+        Args:
+            task_id: 任务ID
+            worker_id: 执行器ID
+            lease_seconds: 新的租约时长（秒）
+        
+        Returns:
+            是否续约成功（任务已不属于该执行器或已结束时返回False）
+        """
+        with self._locked():
+            data = self._load_data()
+            for item in data:
+                if item["id"] == task_id:
+                    if item.get("status") != TaskStatus.RUNNING.value or item.get("worker_id") != worker_id:
+                        return False
+                    now = datetime.now()
+                    item["heartbeat_at"] = now.isoformat()
+                    item["lease_expires_at"] = (now + timedelta(seconds=lease_seconds)).isoformat()
+                    self._save_data(data)
+                    return True
+            return False
+    
+    async def find_active_by_payload(self, task_type: TaskType, key: str, value: str) -> List[TaskQueue]:
+        """
+        按payload字段查找待执行或执行中的任务（如按evaluation_task_id找到对应的队列任务）
+        
+        Args:
+            task_type: 任务类型
+            key: payload字段名
+            value: 字段值
+        
+        Returns:
+            任务列表
+        """
+        active = {TaskStatus.PENDING.value, TaskStatus.RUNNING.value}
+        return [
+            TaskQueue(**item)
+            for item in self._load_data()
+            if item.get("task_type") == task_type.value
+            and item.get("status") in active
+            and (item.get("payload") or {}).get(key) == value
+        ]
+    
+    async def queue_depth(self) -> Dict[str, int]:
+        """
+        队列深度：各状态的任务数，以及其中已到可执行时间的待执行任务数（runnable）
+        
+        Returns:
+            {状态: 任务数, "runnable": 可立即执行的任务数}
+        """
+        data = self._load_data()
+        now = datetime.now()
+        depth = {status.value: 0 for status in TaskStatus}
+        depth.update(Counter(item.get("status") for item in data))
+        depth["runnable"] = sum(1 for item in data if _is_runnable(item, now))
+        return depth
+    
+    async def create_idempotent(self, entity: TaskQueue) -> Tuple[TaskQueue, bool]:
+        """
+        按幂等键创建任务：已有相同幂等键的待执行或执行中任务时返回该任务，不再创建
+        
+        检查和写入在同一把文件锁内完成，多个进程并发提交相同任务时也只创建一个
+        
+        Args:
+            entity: 待创建的任务（idempotency_key为空时直接创建）
+        
+        Returns:
+            (任务, 是否新建)
+        """
+        with self._locked():
+            if entity.idempotency_key:
+                active = {TaskStatus.PENDING.value, TaskStatus.RUNNING.value}
+                for item in self._load_data():
+                    if item.get("idempotency_key") == entity.idempotency_key and item.get("status") in active:
+                        return TaskQueue(**item), False
+            return await super().create(entity), True
+    
+    async def save_checkpoint(
+        self,
+        task_id: str,
+        worker_id: Optional[str],
+        checkpoint: Dict[str, Any],
+        progress: Optional[float] = None
+    ) -> bool:
+        """
+        保存执行中任务的检查点（同时刷新心跳）
+        
+        Args:
+            task_id: 任务ID
+            worker_id: 持有租约的执行器ID（为空时不校验，用于未经认领直接执行的任务）
+            checkpoint: 检查点（可JSON序列化的进度游标）
+            progress: 进度（0.0-1.0），为空时不更新
+        
+        Returns:
+            是否保存成功（任务已不属于该执行器或已结束时返回False）
+        """
+        with self._locked():
+            data = self._load_data()
+            for item in data:
+                if item["id"] == task_id:
+                    if item.get("status") != TaskStatus.RUNNING.value:
+                        return False
+                    if worker_id is not None and item.get("worker_id") != worker_id:
+                        return False
+                    now = datetime.now()
+                    item["checkpoint"] = checkpoint
+                    if progress is not None:
+                        item["progress"] = progress
+                    item["heartbeat_at"] = now.isoformat()
+                    item["updated_at"] = now.isoformat()
+                    self._save_data(data)
+                    return True
+            return False
+    
+    async def finish(self, task_id: str, worker_id: Optional[str], values: Dict[str, Any]) -> Optional[TaskQueue]:
+        """
+        写入执行中任务的最终状态（完成、失败或重试退避），只有仍持有租约时才写入
+        
+        任务已被取消、租约已被回收或已被其他执行器接管时不写入，避免覆盖取消状态或重复计数失败
+        
+        Args:
+            task_id: 任务ID
+            worker_id: 持有租约的执行器ID（为空时不校验，用于未经认领直接执行的任务）
+            values: 需要写入的字段（status为TaskStatus）
+        
+        Returns:
+            更新后的任务对象，租约已丢失时返回None
+        """
+        with self._locked():
+            data = self._load_data()
+            for item in data:
+                if item["id"] == task_id:
+                    if item.get("status") != TaskStatus.RUNNING.value:
+                        return None
+                    if worker_id is not None and item.get("worker_id") != worker_id:
+                        return None
+                    item.update({
+                        key: value.value if isinstance(value, TaskStatus)
+                        else value.isoformat() if isinstance(value, datetime) else value
+                        for key, value in values.items()
+                    })
+                    item["updated_at"] = datetime.now().isoformat()
+                    self._save_data(data)
+                    return TaskQueue(**item)
+            return None
+    
+    async def cancel(self, task_id: str, values: Dict[str, Any]) -> Optional[Tuple[TaskQueue, bool]]:
+        """
+        取消待执行或执行中的任务，已结束（完成、失败、死信）的任务不写入
+        
+        Args:
+            task_id: 任务ID
+            values: 需要写入的字段（status为TaskStatus）
+        
+        Returns:
+            (更新后的任务对象, 取消前是否在执行)，任务不存在或已结束时返回None
+        """
+        with self._locked():
+            data = self._load_data()
+            for item in data:
+                if item["id"] == task_id:
+                    status = item.get("status")
+                    if status not in (TaskStatus.PENDING.value, TaskStatus.RUNNING.value):
+                        return None
+                    item.update({
+                        key: value.value if isinstance(value, TaskStatus)
+                        else value.isoformat() if isinstance(value, datetime) else value
+                        for key, value in values.items()
+                    })
+                    item["updated_at"] = datetime.now().isoformat()
+                    self._save_data(data)
+                    return TaskQueue(**item), status == TaskStatus.RUNNING.value
+            return None
+    
+    async def requeue_expired(
+        self,
+        lease_seconds: float,
+        retry_delay: Callable[[int], float],
+        limit: int = 100
+    ) -> List[TaskQueue]:
+        """
+        回收租约过期的执行中任务（执行器崩溃或失联），计为一次失败：退避后重新入队或进入死信
+        
+        Args:
+            lease_seconds: 租约时长（用于判断没有租约的旧记录）
+            retry_delay: 重试次数 → 退避秒数
+            limit: 单次最多回收的任务数
+        
+        Returns:
+            被回收的任务列表（已更新后的状态）
+        """
+        with self._locked():
+            data = self._load_data()
+            now = datetime.now()
+            expired = [item for item in data if _is_lease_expired(item, now, lease_seconds)][:limit]
+            if not expired:
+                return []
+            
+            for item in expired:
+                values = retry_values(
+                    item.get("retry_count", 0) + 1,
+                    item.get("max_retries", 0),
+                    now,
+                    retry_delay,
+                    f"执行器 {item.get('worker_id')} 的租约已过期"
+                )
+                values["status"] = values["status"].value
+                item.update({
+                    key: value.isoformat() if isinstance(value, datetime) else value
+                    for key, value in values.items()
+                })
+                item["updated_at"] = now.isoformat()
+            self._save_data(data)
+            return [TaskQueue(**item) for item in expired]
+
+
+class MySQLTaskQueueRepository(MySQLRepository[TaskQueue]):
+    """
+    MySQL任务队列仓储
+    
+    指定任务通过带状态条件的UPDATE认领（影响行数为1即认领成功）；
+    轮询取任务使用 SELECT ... FOR UPDATE SKIP LOCKED，多个执行器并发取任务互不阻塞也不会重复
+    """
+    
+    def __init__(self):
+        super().__init__(TaskQueue, "task_queue")
+    
+    def _claim_values(self, worker_id: str, now: datetime, lease_seconds: float) -> Dict[str, Any]:
+        """认领时写入的字段"""
+        from app.database.models import TaskStatusEnum
+        return {
+            "status": TaskStatusEnum.RUNNING,
+            "worker_id": worker_id,
+            "heartbeat_at": now,
+            "lease_expires_at": now + timedelta(seconds=lease_seconds),
+            "started_at": func.coalesce(self.orm_model.started_at, now),
+        }
+    
+    def _runnable_condition(self, now: datetime):
+        """已到可执行时间的待执行任务"""
+        from app.database.models import TaskStatusEnum
+        return and_(
+            self.orm_model.status == TaskStatusEnum.PENDING,
+            or_(self.orm_model.next_run_at.is_(None), self.orm_model.next_run_at <= now)
+        )
+    
+    def _schedule_order(self):
+        """调度顺序：优先级降序，创建时间升序"""
+        return (self.orm_model.priority.desc(), self.orm_model.created_at, self.orm_model.id)
+    
+    async def list_runnable(self, limit: int) -> List[TaskQueue]:
+        """按调度顺序读取已到可执行时间的待执行任务（参数和返回值同JsonTaskQueueRepository.list_runnable）"""
+        def _list_sync():
+            db = SessionLocal()
+            try:
+                orm_objs = db.query(self.orm_model).filter(
+                    self._runnable_condition(datetime.now())
+                ).order_by(*self._schedule_order()).limit(limit).all()
+                return [self._orm_to_pydantic(obj) for obj in orm_objs]
+            except Exception as e:
+                logger.error(f"读取待执行任务失败: {e}", exc_info=True)
+                raise InternalServerException(message=f"读取待执行任务失败: {str(e)}")
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_list_sync)
+    
+    async def claim(self, task_id: str, worker_id: str, lease_seconds: float) -> Optional[TaskQueue]:
+        """原子认领指定的待执行任务（参数和返回值同JsonTaskQueueRepository.claim）"""
+        def _claim_sync():
+            db = SessionLocal()
+            try:
+                now = datetime.now()
+                result = db.execute(
+                    update(self.orm_model)
+                    .where(self.orm_model.id == task_id, self._runnable_condition(now))
+                    .values(**self._claim_values(worker_id, now, lease_seconds))
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                if result.rowcount != 1:
+                    return None
+                orm_obj = db.get(self.orm_model, task_id)
+                return self._orm_to_pydantic(orm_obj) if orm_obj else None
+            except Exception as e:
+                db.rollback()
+                logger.error(f"认领任务失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"认领任务失败: {str(e)}",
+                    details={"task_id": task_id}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_claim_sync)
+    
+    async def claim_next(self, worker_id: str, lease_seconds: float, limit: int = 1) -> List[TaskQueue]:
+        """原子认领优先级最高、最早创建的若干个待执行任务（参数和返回值同JsonTaskQueueRepository.claim_next）"""
+        if limit <= 0:
+            return []
+        
+        def _claim_next_sync():
+            db = SessionLocal()
+            try:
+                now = datetime.now()
+                # 锁定最早的可执行pending行，已被其他执行器锁定的行直接跳过
+                task_ids = db.execute(
+                    select(self.orm_model.id)
+                    .where(self._runnable_condition(now))
+                    .order_by(*self._schedule_order())
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                ).scalars().all()
+                if not task_ids:
+                    db.commit()
+                    return []
+                
+                db.execute(
+                    update(self.orm_model)
+                    .where(self.orm_model.id.in_(task_ids))
+                    .values(**self._claim_values(worker_id, now, lease_seconds))
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                
+                orm_objs = db.query(self.orm_model).filter(
+                    self.orm_model.id.in_(task_ids)
+                ).order_by(*self._schedule_order()).all()
+                return [self._orm_to_pydantic(obj) for obj in orm_objs]
+            except Exception as e:
+                db.rollback()
+                logger.error(f"认领待执行任务失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"认领待执行任务失败: {str(e)}",
+                    details={"worker_id": worker_id}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_claim_next_sync)
+    
+    async def renew_lease(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """续约（心跳）（参数和返回值同JsonTaskQueueRepository.renew_lease）"""
+        from app.database.models import TaskStatusEnum
+        
+        def _renew_sync():
+            db = SessionLocal()
+            try:
+                now = datetime.now()
+                result = db.execute(
+                    update(self.orm_model)
+                    .where(
+                        self.orm_model.id == task_id,
+                        self.orm_model.worker_id == worker_id,
+                        self.orm_model.status == TaskStatusEnum.RUNNING
+                    )
+                    .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=lease_seconds))
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                return result.rowcount == 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"任务续约失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"任务续约失败: {str(e)}",
+                    details={"task_id": task_id}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_renew_sync)
+    
+    async def find_active_by_payload(self, task_type: TaskType, key: str, value: str) -> List[TaskQueue]:
+        """按payload字段查找待执行或执行中的任务（参数和返回值同JsonTaskQueueRepository.find_active_by_payload）"""
+        from app.database.models import TaskStatusEnum, TaskTypeEnum
+        
+        def _find_sync():
+            db = SessionLocal()
+            try:
+                orm_objs = db.query(self.orm_model).filter(
+                    self.orm_model.status.in_([TaskStatusEnum.PENDING, TaskStatusEnum.RUNNING]),
+                    self.orm_model.task_type == TaskTypeEnum(task_type.value),
+                    self.orm_model.payload[key].as_string() == value
+                ).all()
+                return [self._orm_to_pydantic(obj) for obj in orm_objs]
+            except Exception as e:
+                logger.error(f"按payload查找任务失败: {e}", exc_info=True)
+                raise InternalServerException(message=f"按payload查找任务失败: {str(e)}")
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_find_sync)
+    
+    async def queue_depth(self) -> Dict[str, int]:
+        """队列深度（返回值同JsonTaskQueueRepository.queue_depth），按状态分组计数走状态索引"""
+        def _count_sync():
+            db = SessionLocal()
+            try:
+                depth = {status.value: 0 for status in TaskStatus}
+                rows = db.query(self.orm_model.status, func.count(self.orm_model.id)).group_by(
+                    self.orm_model.status
+                ).all()
+                for status, count in rows:
+                    depth[getattr(status, "value", status)] = count
+                depth["runnable"] = db.query(func.count(self.orm_model.id)).filter(
+                    self._runnable_condition(datetime.now())
+                ).scalar() or 0
+                return depth
+            except Exception as e:
+                logger.error(f"统计任务队列深度失败: {e}", exc_info=True)
+                raise InternalServerException(message=f"统计任务队列深度失败: {str(e)}")
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_count_sync)
+    
+    async def create_idempotent(self, entity: TaskQueue) -> Tuple[TaskQueue, bool]:
+        """
+        按幂等键创建任务（参数和返回值同JsonTaskQueueRepository.create_idempotent）
+        
+        用MySQL命名锁（GET_LOCK）串行化同一幂等键的检查和写入：锁属于数据库连接，
+        因此在独占的连接上持锁，写入提交后再释放，多个API进程并发提交相同任务时也只创建一个
+        """
+        from app.database.models import TaskStatusEnum
+        
+        if not entity.idempotency_key:
+            return await self.create(entity), True
+        
+        lock_name = f"task_queue:{entity.idempotency_key[:48]}"
+        
+        def _create_sync():
+            with engine.connect() as conn:
+                if not conn.execute(text("SELECT GET_LOCK(:name, 10)"), {"name": lock_name}).scalar():
+                    raise InternalServerException(message=f"获取任务幂等锁超时: {entity.idempotency_key}")
+                conn.commit()
+                db = SessionLocal(bind=conn)
+                try:
+                    existing = db.query(self.orm_model).filter(
+                        self.orm_model.idempotency_key == entity.idempotency_key,
+                        self.orm_model.status.in_([TaskStatusEnum.PENDING, TaskStatusEnum.RUNNING])
+                    ).order_by(self.orm_model.created_at).first()
+                    if existing:
+                        return self._orm_to_pydantic(existing), False
+                    
+                    orm_obj = self._pydantic_to_orm(entity)
+                    db.add(orm_obj)
+                    db.commit()
+                    db.refresh(orm_obj)
+                    return self._orm_to_pydantic(orm_obj), True
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"按幂等键创建任务失败: {e}", exc_info=True)
+                    raise InternalServerException(message=f"创建任务失败: {str(e)}")
+                finally:
+                    db.close()
+                    conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+                    conn.commit()
+        
+        return await asyncio.to_thread(_create_sync)
+    
+    async def save_checkpoint(
+        self,
+        task_id: str,
+        worker_id: Optional[str],
+        checkpoint: Dict[str, Any],
+        progress: Optional[float] = None
+    ) -> bool:
+        """保存执行中任务的检查点（参数和返回值同JsonTaskQueueRepository.save_checkpoint）"""
+        from app.database.models import TaskStatusEnum
+        
+        def _save_sync():
+            db = SessionLocal()
+            try:
+                conditions = [self.orm_model.id == task_id, self.orm_model.status == TaskStatusEnum.RUNNING]
+                if worker_id is not None:
+                    conditions.append(self.orm_model.worker_id == worker_id)
+                values = {"checkpoint": checkpoint, "heartbeat_at": datetime.now()}
+                if progress is not None:
+                    values["progress"] = progress
+                result = db.execute(
+                    update(self.orm_model)
+                    .where(*conditions)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                return result.rowcount == 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"保存任务检查点失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"保存任务检查点失败: {str(e)}",
+                    details={"task_id": task_id}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_save_sync)
+    
+    async def finish(self, task_id: str, worker_id: Optional[str], values: Dict[str, Any]) -> Optional[TaskQueue]:
+        """写入执行中任务的最终状态（参数和返回值同JsonTaskQueueRepository.finish），以带租约条件的UPDATE实现"""
+        from app.database.models import TaskStatusEnum
+        
+        def _finish_sync():
+            db = SessionLocal()
+            try:
+                conditions = [self.orm_model.id == task_id, self.orm_model.status == TaskStatusEnum.RUNNING]
+                if worker_id is not None:
+                    conditions.append(self.orm_model.worker_id == worker_id)
+                orm_values = {
+                    key: TaskStatusEnum(value.value) if isinstance(value, TaskStatus) else value
+                    for key, value in values.items()
+                }
+                result = db.execute(
+                    update(self.orm_model)
+                    .where(*conditions)
+                    .values(**orm_values)
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                if result.rowcount != 1:
+                    return None
+                orm_obj = db.query(self.orm_model).filter(self.orm_model.id == task_id).first()
+                return self._orm_to_pydantic(orm_obj)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"写入任务最终状态失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"写入任务最终状态失败: {str(e)}",
+                    details={"task_id": task_id}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_finish_sync)
+    
+    async def cancel(self, task_id: str, values: Dict[str, Any]) -> Optional[Tuple[TaskQueue, bool]]:
+        """取消待执行或执行中的任务（参数和返回值同JsonTaskQueueRepository.cancel），锁定任务行后按状态条件UPDATE"""
+        from app.database.models import TaskStatusEnum
+        
+        def _cancel_sync():
+            db = SessionLocal()
+            try:
+                active = [TaskStatusEnum.PENDING, TaskStatusEnum.RUNNING]
+                status = db.execute(
+                    select(self.orm_model.status)
+                    .where(self.orm_model.id == task_id, self.orm_model.status.in_(active))
+                    .with_for_update()
+                ).scalar_one_or_none()
+                if status is None:
+                    db.commit()
+                    return None
+                
+                orm_values = {
+                    key: TaskStatusEnum(value.value) if isinstance(value, TaskStatus) else value
+                    for key, value in values.items()
+                }
+                result = db.execute(
+                    update(self.orm_model)
+                    .where(self.orm_model.id == task_id, self.orm_model.status.in_(active))
+                    .values(**orm_values)
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                if result.rowcount != 1:
+                    return None
+                orm_obj = db.query(self.orm_model).filter(self.orm_model.id == task_id).first()
+                return self._orm_to_pydantic(orm_obj), status == TaskStatusEnum.RUNNING
+            except Exception as e:
+                db.rollback()
+                logger.error(f"取消任务失败: {e}", exc_info=True)
+                raise InternalServerException(
+                    message=f"取消任务失败: {str(e)}",
+                    details={"task_id": task_id}
+                )
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_cancel_sync)
+    
+    async def requeue_expired(
+        self,
+        lease_seconds: float,
+        retry_delay: Callable[[int], float],
+        limit: int = 100
+    ) -> List[TaskQueue]:
+        """回收租约过期的执行中任务（参数和返回值同JsonTaskQueueRepository.requeue_expired）"""
+        from app.database.models import TaskStatusEnum
+        
+        def _requeue_sync():
+            db = SessionLocal()
+            try:
+                now = datetime.now()
+                # 多个执行器同时回收时跳过已被锁定的行，每个任务只被回收一次
+                orm_objs = db.query(self.orm_model).filter(
+                    self.orm_model.status == TaskStatusEnum.RUNNING,
+                    or_(
+                        self.orm_model.lease_expires_at < now,
+                        and_(
+                            self.orm_model.lease_expires_at.is_(None),
+                            self.orm_model.updated_at < now - timedelta(seconds=lease_seconds)
+                        )
+                    )
+                ).limit(limit).with_for_update(skip_locked=True).all()
+                
+                for orm_obj in orm_objs:
+                    values = retry_values(
+                        orm_obj.retry_count + 1,
+                        orm_obj.max_retries,
+                        now,
+                        retry_delay,
+                        f"执行器 {orm_obj.worker_id} 的租约已过期"
+                    )
+                    values["status"] = TaskStatusEnum(values["status"].value)
+                    for key, value in values.items():
+                        setattr(orm_obj, key, value)
+                db.commit()
+                return [self._orm_to_pydantic(orm_obj) for orm_obj in orm_objs]
+            except Exception as e:
+                db.rollback()
+                logger.error(f"回收过期任务失败: {e}", exc_info=True)
+                raise InternalServerException(message=f"回收过期任务失败: {str(e)}")
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(_requeue_sync)
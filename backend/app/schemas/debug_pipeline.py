@@ -9,17 +9,26 @@ from pydantic import BaseModel, Field
 class ChunkRequest(BaseModel):
     """分块请求"""
     text: str = Field(..., description="输入文本")
-    method: str = Field("fixed_size", description="分块方法: fixed_size, paragraph, sentence")
-    chunk_size: int = Field(500, description="分块大小（字符数）")
-    chunk_overlap: int = Field(50, description="重叠大小（字符数）")
+    method: str = Field("fixed_size", description="分块方法: fixed_size, paragraph, sentence, recursive, semantic")
+    chunk_size: int = Field(500, description="分块大小（以size_unit计）")
+    chunk_overlap: int = Field(50, description="重叠大小（以size_unit计）")
+    size_unit: str = Field("chars", description="固定大小分块的大小单位: chars, estimated_tokens, tokens")
+    tokenizer_model: Optional[str] = Field(None, description="计算token数使用的嵌入模型（默认系统嵌入模型）")
+    separators: Optional[List[str]] = Field(None, description="递归分块的分隔符层级（默认段落/行/句/分句/空格/字符）")
+    embedding_model: Optional[str] = Field(None, description="语义分块使用的Embedding模型（默认系统嵌入模型）")
+    embedding_provider: str = Field("ollama", description="语义分块使用的Embedding服务提供商")
+    embedding_endpoint: Optional[str] = Field(None, description="语义分块使用的Embedding服务地址")
+    breakpoint_percentile: float = Field(95.0, description="语义分块断点的相邻距离分位数（0-100）", ge=0, le=100)
     max_sentences: int = Field(5, description="句子分块时每块的最大句子数")
 
 
 class TokenizeRequest(BaseModel):
     """分词请求"""
-    texts: List[str] = Field(..., description="文本列表")
+    texts: List[str] = Field(default_factory=list, description="文本列表（提供kb_id和chunk_ids时忽略）")
     mode: str = Field("default", description="分词模式: default, search, all")
     use_stop_words: bool = Field(True, description="是否过滤停用词")
+    kb_id: Optional[str] = Field(None, description="知识库ID（与chunk_ids一起使用）")
+    chunk_ids: Optional[List[str]] = Field(None, description="已索引的分块ID列表，默认模式下直接读取索引时缓存的分词结果")
 
 
 class EmbedRequest(BaseModel):
@@ -2,12 +2,16 @@
 知识库相关的请求和响应Schema
 """
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 from pydantic import BaseModel, Field
 
 from app.models.knowledge_base import EmbeddingProvider, ChatProvider, VectorDBType
 
 
+# 与 DocumentProcessor.chunk_document_async 支持的分块方法保持一致
+ChunkMethod = Literal["fixed_size", "paragraph", "sentence", "recursive", "semantic"]
+
+
 class AIModelConfigRequest(BaseModel):
     """AI模型配置请求"""
     
@@ -52,6 +56,14 @@ class KnowledgeBaseCreate(BaseModel):
     
     chunk_size: int = Field(default=512, description="分块大小", ge=100, le=2000)
     chunk_overlap: int = Field(default=50, description="分块重叠", ge=0, le=500)
+    chunk_method: ChunkMethod = Field(
+        default="fixed_size",
+        description="分块方法: fixed_size, paragraph, sentence, recursive, semantic"
+    )
+    chunking_config: Optional[Dict[str, Any]] = Field(
+        None,
+        description="分块方法参数（如size_unit、separators、breakpoint_percentile）"
+    )
     
     retrieval_top_k: int = Field(default=5, description="检索返回数量", ge=1, le=50)
     retrieval_score_threshold: float = Field(
@@ -88,6 +100,11 @@ class KnowledgeBaseUpdate(BaseModel):
     
     chunk_size: Optional[int] = Field(None, description="分块大小", ge=100, le=2000)
     chunk_overlap: Optional[int] = Field(None, description="分块重叠", ge=0, le=500)
+    chunk_method: Optional[ChunkMethod] = Field(
+        None,
+        description="分块方法: fixed_size, paragraph, sentence, recursive, semantic"
+    )
+    chunking_config: Optional[Dict[str, Any]] = Field(None, description="分块方法参数")
     
     retrieval_top_k: Optional[int] = Field(None, description="检索返回数量", ge=1, le=50)
     retrieval_score_threshold: Optional[float] = Field(
@@ -121,6 +138,8 @@ class KnowledgeBaseResponse(BaseModel):
     
     chunk_size: int
     chunk_overlap: int
+    chunk_method: str = "fixed_size"
+    chunking_config: Optional[Dict[str, Any]] = None
     
     retrieval_top_k: int
     retrieval_score_threshold: float
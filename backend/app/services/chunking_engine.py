@@ -0,0 +1,372 @@
+"""
+流式分块引擎
+一次扫描预先定位句子/段落边界，按边界单元顺序装箱生成分块；
+输入可以是完整文本，也可以是分段到达的文本流（PDF页、文件块），内存只与分块大小相关
+"""
+
+from typing import List, Optional, Callable, Iterable, Iterator, Tuple
+from collections import deque
+import codecs
+import re
+
+from app.models.document import Chunk
+from app.services.token_length_service import estimate_token_count, get_token_length_service
+
+
+# 分块边界：句末标点或换行（连续的结束符视为一个边界），与原固定大小分块的句末字符一致
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'[。！？.!?\n]+')
+
+# 句子结束符（不含换行），用于按句子分块
+SENTENCE_END_PATTERN = re.compile(r'[。！？.!?]+')
+
+# 支持的大小单位
+SIZE_UNITS = ("chars", "estimated_tokens", "tokens")
+
+
+def get_size_function(
+    size_unit: str,
+    token_counter: Optional[Callable[[str], int]] = None,
+    tokenizer_model: Optional[str] = None
+) -> Callable[[str], float]:
+    """
+    获取文本大小度量函数
+    
+    Args:
+        size_unit: 大小单位 (chars, estimated_tokens, tokens)
+        token_counter: tokens单位时使用的计数函数（默认使用嵌入模型分词器）
+        tokenizer_model: tokens单位时使用的嵌入模型名称
+    
+    Returns:
+        度量函数
+    """
+    if size_unit == "chars":
+        return len
+    if size_unit == "estimated_tokens":
+        return estimate_token_count
+    if size_unit == "tokens":
+        return token_counter or get_token_length_service().get_counter(tokenizer_model)
+    raise ValueError(f"不支持的大小单位: {size_unit}")
+
+
+class BoundaryScanner:
+    """
+    增量边界扫描器
+    
+    每个字符只被正则扫描一次，输出相邻边界之间的文本单元 (全局起始偏移, 文本)；
+    长时间没有边界时在 max_unit_chars 处强制切分，保证缓冲区有界。
+    """
+    
+    def __init__(self, pattern: re.Pattern = SENTENCE_BOUNDARY_PATTERN, max_unit_chars: int = 8192):
+        self.pattern = pattern
+        self.max_unit_chars = max(1, max_unit_chars)
+        self._pending = ""
+        self._pending_start = 0
+    
+    def feed(self, text: str) -> List[Tuple[int, str]]:
+        """输入一段文本，返回已完整的单元"""
+        if not text:
+            return []
+        
+        buffer = self._pending + text
+        base = self._pending_start
+        units: List[Tuple[int, str]] = []
+        last = 0
+        
+        for match in self.pattern.finditer(buffer):
+            # 位于缓冲区末尾的边界可能在下一段继续（如跨页的连续换行），留待下次确认
+            if match.end() == len(buffer):
+                break
+            units.extend(self._split_long(base + last, buffer[last:match.end()]))
+            last = match.end()
+        
+        rest = buffer[last:]
+        rest_start = base + last
+        if len(rest) > self.max_unit_chars:
+            cut = (len(rest) - 1) // self.max_unit_chars * self.max_unit_chars
+            units.extend(self._split_long(rest_start, rest[:cut]))
+            rest_start += cut
+            rest = rest[cut:]
+        
+        self._pending = rest
+        self._pending_start = rest_start
+        return units
+    
+    def finish(self) -> List[Tuple[int, str]]:
+        """输入结束，返回剩余单元"""
+        units = self._split_long(self._pending_start, self._pending) if self._pending else []
+        self._pending_start += len(self._pending)
+        self._pending = ""
+        return units
+    
+    def _split_long(self, start: int, text: str) -> List[Tuple[int, str]]:
+        """将超过 max_unit_chars 的单元按固定长度切开"""
+        if len(text) <= self.max_unit_chars:
+            return [(start, text)]
+        return [
+            (start + i, text[i:i + self.max_unit_chars])
+            for i in range(0, len(text), self.max_unit_chars)
+        ]
+
+
+class StreamingChunker:
+    """
+    流式分块器（推模式：feed/finish）
+    
+    以边界单元为粒度顺序装箱：每个单元只度量一次，超出chunk_size的单元按比例预先切开；
+    剩余空间大于 max_backtrack 时切分下一个单元填满分块（与原固定大小分块“最多回退100字符
+    寻找句末”的行为一致），否则在边界处结束分块。重叠部分取上一个分块末尾的单元。
+    """
+    
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        size_unit: str = "chars",
+        token_counter: Optional[Callable[[str], int]] = None,
+        max_backtrack: Optional[int] = None,
+        chunk_method: str = "fixed_size",
+        tokenizer_model: Optional[str] = None
+    ):
+        """
+        初始化分块器
+        
+        Args:
+            chunk_size: 分块大小（以size_unit计）
+            chunk_overlap: 重叠大小（以size_unit计）
+            size_unit: 大小单位 (chars, estimated_tokens, tokens)
+            token_counter: tokens单位时使用的计数函数
+            max_backtrack: 为对齐句末最多留空的大小（默认 chunk_size 的 1/5）
+            chunk_method: 写入分块元数据的分块方法名
+            tokenizer_model: tokens单位时使用的嵌入模型名称
+        """
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_overlap = min(max(0, chunk_overlap), self.chunk_size - 1)
+        self.size_unit = size_unit
+        self.measure = get_size_function(size_unit, token_counter, tokenizer_model)
+        self.max_backtrack = max_backtrack if max_backtrack is not None else self.chunk_size // 5
+        self.chunk_method = chunk_method
+        
+        self._scanner = BoundaryScanner(max_unit_chars=max(self.chunk_size * 4, 4096))
+        # 当前分块中的单元: (全局起始偏移, 文本, 大小)
+        self._units: deque = deque()
+        self._size = 0.0
+        # 当前分块开头属于上一分块重叠部分的单元数
+        self._carried = 0
+        self._index = 0
+    
+    def feed(self, text: str) -> List[Chunk]:
+        """输入一段文本，返回已完成的分块"""
+        chunks: List[Chunk] = []
+        for start, unit_text in self._scanner.feed(text):
+            self._add_unit(start, unit_text, chunks)
+        return chunks
+    
+    def finish(self) -> List[Chunk]:
+        """输入结束，返回剩余分块"""
+        chunks: List[Chunk] = []
+        for start, unit_text in self._scanner.finish():
+            self._add_unit(start, unit_text, chunks)
+        return chunks + self.flush()
+    
+    def add_units(self, units: Iterable[Tuple[int, str]]) -> List[Chunk]:
+        """直接装入调用方切好的单元 (全局起始偏移, 文本)，跳过边界扫描"""
+        chunks: List[Chunk] = []
+        for start, unit_text in units:
+            self._add_unit(start, unit_text, chunks)
+        return chunks
+    
+    def flush(self) -> List[Chunk]:
+        """立即结束当前分块（不保留重叠），用于在外部断点处强制切分"""
+        chunks: List[Chunk] = []
+        if self._has_new_content():
+            self._emit(chunks, carry_overlap=False)
+        return chunks
+    
+    def chunk_stream(self, segments: Iterable[str]) -> Iterator[Chunk]:
+        """对文本段序列进行分块"""
+        for segment in segments:
+            yield from self.feed(segment)
+        yield from self.finish()
+    
+    # ========== 内部实现 ==========
+    
+    def _add_unit(self, start: int, text: str, chunks: List[Chunk]):
+        """将一个边界单元装入当前分块"""
+        size = self.measure(text)
+        
+        # 超大单元按字符比例预先切开，每片只度量一次
+        if size > self.chunk_size and len(text) > 1:
+            piece_chars = max(1, int(len(text) * self.chunk_size / size))
+            for i in range(0, len(text), piece_chars):
+                piece = text[i:i + piece_chars]
+                self._pack(start + i, piece, self.measure(piece), chunks)
+            return
+        
+        self._pack(start, text, size, chunks)
+    
+    def _pack(self, start: int, text: str, size: float, chunks: List[Chunk]):
+        """装箱：放得下则追加，否则先结束当前分块"""
+        while self._size + size > self.chunk_size:
+            room = self.chunk_size - self._size
+            # 分块中只有重叠部分，或附近没有句末（剩余空间大于max_backtrack）时切分当前单元填满分块
+            if not self._has_new_content() or room > self.max_backtrack:
+                if len(text) <= 1:
+                    break
+                head_chars = min(len(text) - 1, max(1, int(len(text) * room / size)))
+                head = text[:head_chars]
+                head_size = self.measure(head)
+                # 非字符单位下按比例估算可能偏大，收缩直到放得下
+                while head_size > room and head_chars > 1:
+                    head_chars = max(1, int(head_chars * room / head_size))
+                    head = text[:head_chars]
+                    head_size = self.measure(head)
+                self._append(start, head, head_size)
+                start, text, size = start + head_chars, text[head_chars:], max(size - head_size, 0)
+            self._emit(chunks, carry_overlap=True)
+        
+        self._append(start, text, size)
+    
+    def _append(self, start: int, text: str, size: float):
+        self._units.append((start, text, size))
+        self._size += size
+    
+    def _has_new_content(self) -> bool:
+        """当前分块是否包含重叠部分之外的新内容"""
+        return len(self._units) > self._carried
+    
+    def _emit(self, chunks: List[Chunk], carry_overlap: bool):
+        """输出当前分块，并保留末尾单元作为下一个分块的重叠部分"""
+        raw = ''.join(unit[1] for unit in self._units)
+        start_pos = self._units[0][0]
+        
+        # 去除首尾空白，偏移量与内容严格对应
+        content = raw.strip()
+        if content:
+            leading = len(raw) - len(raw.lstrip())
+            chunk_start = start_pos + leading
+            chunks.append(Chunk(
+                index=self._index,
+                content=content,
+                start_pos=chunk_start,
+                end_pos=chunk_start + len(content),
+                char_count=len(content),
+                # tokens单位下各单元的token数已知，直接累加；其他单位由调用方批量计算
+                token_count=int(round(sum(unit[2] for unit in self._units))) if self.size_unit == "tokens" else None,
+                metadata={"chunk_method": self.chunk_method, "size_unit": self.size_unit}
+            ))
+            self._index += 1
+        
+        carried: deque = deque()
+        carried_size = 0.0
+        if carry_overlap and self.chunk_overlap > 0:
+            while self._units:
+                unit_start, unit_text, unit_size = self._units.pop()
+                if carried_size + unit_size <= self.chunk_overlap:
+                    carried.appendleft((unit_start, unit_text, unit_size))
+                    carried_size += unit_size
+                    continue
+                # 只取该单元的末尾部分补足重叠
+                remaining = self.chunk_overlap - carried_size
+                tail_chars = int(len(unit_text) * remaining / unit_size) if unit_size else 0
+                if tail_chars > 0:
+                    tail = unit_text[-tail_chars:]
+                    tail_size = self.measure(tail)
+                    carried.appendleft((unit_start + len(unit_text) - tail_chars, tail, tail_size))
+                    carried_size += tail_size
+                break
+        
+        self._units = carried
+        self._size = carried_size
+        self._carried = len(carried)
+
+
+def iter_text_file(file_path: str, block_size: int = 1 << 20) -> Iterator[str]:
+    """
+    分块读取文本文件（UTF-8，失败时回退GBK）
+    
+    Args:
+        file_path: 文件路径
+        block_size: 每次读取的字节数
+    
+    Yields:
+        解码后的文本段
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(block_size)
+        encoding = 'utf-8'
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        except UnicodeDecodeError:
+            encoding = 'gbk'
+        
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        block = head
+        while block:
+            text = decoder.decode(block)
+            if text:
+                yield text
+            block = f.read(block_size)
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+
+# 递归分块的默认分隔符层级：段落 → 行 → 句 → 分句 → 词 → 字符
+DEFAULT_RECURSIVE_SEPARATORS = ["\n\n", "\n", "。", "！", "？", ".", "!", "?", "；", ";", "，", ",", " ", ""]
+
+
+def split_recursive(
+    text: str,
+    chunk_size: int,
+    measure: Callable[[str], float],
+    separators: Optional[List[str]] = None
+) -> List[Tuple[int, str]]:
+    """
+    按分隔符层级递归切分文本，直到每段不超过chunk_size
+    
+    每层使用文本中出现的第一个分隔符切分（分隔符保留在片段末尾），
+    仍超限的片段用下一级分隔符继续切分，空分隔符表示按字符切分。
+    
+    Args:
+        text: 输入文本
+        chunk_size: 片段大小上限（以measure计）
+        measure: 文本大小度量函数
+        separators: 分隔符层级（默认 DEFAULT_RECURSIVE_SEPARATORS）
+    
+    Returns:
+        片段列表 (起始偏移, 文本)
+    """
+    separators = separators if separators is not None else DEFAULT_RECURSIVE_SEPARATORS
+    spans: List[Tuple[int, str]] = []
+    
+    def split(start: int, piece: str, level: int):
+        size = measure(piece)
+        if size <= chunk_size:
+            spans.append((start, piece))
+            return
+        
+        for i in range(level, len(separators)):
+            separator = separators[i]
+            if separator == "":
+                # 最后一级：按字符比例切分
+                step = max(1, int(len(piece) * chunk_size / size))
+                for offset in range(0, len(piece), step):
+                    spans.append((start + offset, piece[offset:offset + step]))
+                return
+            if separator not in piece:
+                continue
+            
+            offset = 0
+            while offset < len(piece):
+                position = piece.find(separator, offset)
+                end = len(piece) if position == -1 else position + len(separator)
+                split(start + offset, piece[offset:end], i + 1)
+                offset = end
+            return
+        
+        # 没有可用的分隔符，整体保留
+        spans.append((start, piece))
+    
+    if text:
+        split(0, text, 0)
+    return spans
@@ -0,0 +1,103 @@
+"""
+CPU进程池管理
+统一预热和关闭CPU密集型阶段使用的进程池（jieba分词、BM25稀疏编码、文档解析）。
+任务执行器启动时预先拉起全部进程并加载词典和模型，首个任务不必承担冷启动开销，
+所有核心从一开始就可用。
+
+三个进程池在流水线中同时工作，进程数从共享的核心预算（CPU_POOL_CORES）中分配，
+避免每个进程池都按CPU核心数创建进程导致超额订阅
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 进程池名称 → 进程数配置项（分配余数时按此顺序优先）
+POOL_WORKER_SETTINGS = {
+    "tokenizer": "TOKENIZER_POOL_WORKERS",
+    "sparse_encode": "SPARSE_ENCODE_WORKERS",
+    "parser": "PARSER_POOL_WORKERS",
+}
+
+
+def pool_workers(pool: str) -> int:
+    """
+    计算进程池的进程数
+    
+    显式配置了进程数（大于0）的进程池直接使用配置值；其余进程池平分核心预算中剩下的核心，
+    每个至少1个进程
+    
+    Args:
+        pool: 进程池名称（tokenizer、sparse_encode、parser）
+    
+    Returns:
+        进程数
+    """
+    from app.config import settings
+    
+    configured = {name: getattr(settings, key) for name, key in POOL_WORKER_SETTINGS.items()}
+    if configured[pool] > 0:
+        return configured[pool]
+    
+    budget = settings.CPU_POOL_CORES or os.cpu_count() or 1
+    auto_pools = [name for name, workers in configured.items() if workers <= 0]
+    remaining = budget - sum(workers for workers in configured.values() if workers > 0)
+    share, extra = divmod(max(remaining, 0), len(auto_pools))
+    return max(1, share + (1 if auto_pools.index(pool) < extra else 0))
+
+
+def _worker_pid() -> int:
+    """在子进程中执行的空任务（进程初始化函数已在此之前完成预加载）"""
+    return os.getpid()
+
+
+async def start_workers(executor: ProcessPoolExecutor, count: int) -> int:
+    """
+    拉起进程池中的全部进程
+    
+    spawn方式的进程池按需创建进程：在任何进程空闲之前同时提交count个任务，
+    进程池会为每个任务启动一个进程，进程初始化函数（加载词典、模型）随之执行
+    
+    Args:
+        executor: 进程池
+        count: 进程数
+    
+    Returns:
+        已启动的进程数
+    """
+    loop = asyncio.get_running_loop()
+    pids = await asyncio.gather(*[loop.run_in_executor(executor, _worker_pid) for _ in range(count)])
+    return len(getattr(executor, "_processes", None) or set(pids))
+
+
+async def warm_up_cpu_pools() -> None:
+    """预热全部CPU进程池（失败只记录日志，使用时仍会按需创建）"""
+    from app.services.tokenizer_service import get_tokenizer_service
+    from app.services.sparse_encode_pool import SparseEncodePool
+    from app.services.document_parse_pool import DocumentParsePool
+    
+    pools = {
+        "分词": get_tokenizer_service(),
+        "稀疏编码": SparseEncodePool(),
+        "文档解析": DocumentParsePool(),
+    }
+    results = await asyncio.gather(*[pool.warm_up() for pool in pools.values()], return_exceptions=True)
+    for name, result in zip(pools, results):
+        if isinstance(result, Exception):
+            logger.warning(f"{name}进程池预热失败: {result}")
+        elif result:
+            logger.info(f"{name}进程池已预热: {result} 个进程")
+
+
+def shutdown_cpu_pools() -> None:
+    """关闭全部CPU进程池"""
+    from app.services.tokenizer_service import get_tokenizer_service
+    from app.services.sparse_encode_pool import SparseEncodePool
+    from app.services.document_parse_pool import DocumentParsePool
+    
+    DocumentParsePool().shutdown()
+    get_tokenizer_service().shutdown()
+    SparseEncodePool().shutdown()
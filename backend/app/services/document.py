@@ -3,16 +3,24 @@
 """
 
 from typing import Optional, List, Tuple, Dict
+from collections import defaultdict
+import asyncio
+import logging
 import uuid
 from pathlib import Path
 from fastapi import UploadFile
 
 from app.models.document import Document, DocumentChunk, DocumentStatus, DocumentType
+from app.models.knowledge_base import VectorDBType
 from app.repositories.factory import RepositoryFactory
 from app.core.exceptions import NotFoundException, BadRequestException
 from app.config import settings
 from app.core.singleton import singleton
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.services.token_cache_service import get_token_cache_service
+from app.services.sparse_vector_service import SparseVectorServiceFactory
 
+logger = logging.getLogger(__name__)
 
 @singleton
 class DocumentService:
@@ -77,7 +85,8 @@ class DocumentService:
         self,
         kb_id: str,
         documents: dict[str, str],
-        source: str = "import"
+        source: str = "import",
+        metadata_map: Optional[dict[str, dict]] = None
     ) -> Tuple[List[Document], List[dict]]:
         """
         批量从字典创建文档
@@ -86,12 +95,13 @@ class DocumentService:
             kb_id: 知识库ID
             documents: 文档字典 {external_id: content}
             source: 数据来源标识
+            metadata_map: 可选的附加元数据 {external_id: metadata}，合并到文档metadata中
         
         Returns:
             (成功创建的文档列表, 失败记录列表)
         """
-        created_docs = []
         failed_records = []
+        pending_docs = []
         
         for external_id, content in documents.items():
             try:
@@ -110,12 +120,11 @@ class DocumentService:
                     status=DocumentStatus.UPLOADED,
                     metadata={
                         "source": source,
-                        "import_method": "batch_create_from_dict"
+                        "import_method": "batch_create_from_dict",
+                        **((metadata_map or {}).get(external_id) or {})
                     }
                 )
-                
-                await self.doc_repository.create(document)
-                created_docs.append(document)
+                pending_docs.append(document)
                 
             except Exception as e:
                 failed_records.append({
@@ -123,6 +132,17 @@ class DocumentService:
                     "error": str(e)
                 })
         
+        if not pending_docs:
+            return [], failed_records
+        
+        # 批量写入，冲突按条目返回
+        created_docs, bulk_failed = await self.doc_repository.bulk_create(pending_docs)
+        for record in bulk_failed:
+            failed_records.append({
+                "external_id": pending_docs[record["index"]].external_id,
+                "error": record["error"]
+            })
+        
         return created_docs, failed_records
     
     async def get_document(self, document_id: str) -> Optional[Document]:
@@ -186,20 +206,91 @@ class DocumentService:
         if not document:
             raise NotFoundException(message=f"文档不存在: {document_id}")
         
+        if document.status == DocumentStatus.COMPLETED and not force_reprocess:
+            return
+        
+        # 先清理旧分块：强制重新处理时是上次完成的结果，否则是上次失败或中断时残留的部分结果
+        await self.delete_document_chunks([document_id])
+        
         # 更新状态为处理中
         document.status = DocumentStatus.PROCESSING
+        document.error_message = None
         await self.doc_repository.update(document_id, document)
         
-        # TODO: 异步执行处理流程
-        # 1. 解析文档内容
-        # 2. 分块
-        # 3. 嵌入
-        # 4. 写入向量数据库
+        # 解析 → 分块 → 嵌入 → 写入向量数据库，各阶段由流水线并发执行
+        try:
+            pipeline = IngestionPipeline(document.kb_id)
+            result = await pipeline.run_documents([document])
+        except Exception as e:
+            # 清理已写入的部分分块和向量，避免检索到不完整的文档
+            try:
+                await self.delete_document_chunks([document_id])
+            except Exception as cleanup_error:
+                logger.warning(f"清理文档 {document_id} 的部分分块失败（重新处理时会再次清理）: {cleanup_error}")
+            document.status = DocumentStatus.FAILED
+            document.error_message = str(e)
+            await self.doc_repository.update(document_id, document)
+            raise
         
-        # 临时：直接标记为完成
         document.status = DocumentStatus.COMPLETED
+        document.chunk_count = result["document_chunk_counts"].get(document_id, 0)
         await self.doc_repository.update(document_id, document)
     
+    async def delete_document_chunks(self, document_ids: List[str]) -> int:
+        """
+        批量删除文档的所有分块：向量库中的向量、分块记录、分块token缓存和知识库BM25统计
+        
+        Args:
+            document_ids: 文档ID列表
+        
+        Returns:
+            删除的分块数量
+        """
+        if not document_ids:
+            return 0
+        
+        chunks = await self.chunk_repository.get_by_field_values("document_id", document_ids)
+        if not chunks:
+            return 0
+        
+        chunks_by_kb: Dict[str, List[DocumentChunk]] = defaultdict(list)
+        for chunk in chunks:
+            chunks_by_kb[chunk.kb_id].append(chunk)
+        
+        # 先从向量库中删除向量（分块ID每次处理都重新生成，不删除会留下检索得到的过期向量）
+        from app.services.knowledge_base import KnowledgeBaseService
+        from app.services.vector_db_service import VectorDBServiceFactory
+        kb_service = KnowledgeBaseService()
+        for kb_id, kb_chunks in chunks_by_kb.items():
+            vector_ids = [chunk.vector_id for chunk in kb_chunks if chunk.vector_id]
+            if not vector_ids:
+                continue
+            try:
+                kb = await kb_service.get_knowledge_base(kb_id)
+                if kb:
+                    vector_db = VectorDBServiceFactory.create(
+                        VectorDBType(kb.vector_db_type),
+                        config=kb.vector_db_config if kb.vector_db_config else None
+                    )
+                    await vector_db.delete_vectors(kb_id, vector_ids)
+                    logger.info(f"已从向量库删除 {len(vector_ids)} 个向量")
+            except Exception as e:
+                logger.warning(f"从向量库删除向量失败: {e}", exc_info=True)
+        
+        # 批量删除分块记录
+        deleted_count = await self.chunk_repository.bulk_delete([chunk.id for chunk in chunks])
+        
+        # 清理分块token缓存，并从知识库BM25语料统计中扣减
+        for kb_id, kb_chunks in chunks_by_kb.items():
+            await get_token_cache_service().remove_chunks(kb_id, [chunk.id for chunk in kb_chunks])
+            await asyncio.to_thread(
+                SparseVectorServiceFactory.remove_kb_documents,
+                kb_id, [chunk.content for chunk in kb_chunks]
+            )
+        
+        logger.info(f"已删除 {len(document_ids)} 个文档的 {deleted_count} 个分块")
+        return deleted_count
+    
     async def list_document_chunks(
         self,
         document_id: str,
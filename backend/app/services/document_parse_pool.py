@@ -0,0 +1,235 @@
+"""
+文档解析进程池
+PDF/DOCX 等解析在独立进程中执行，避免阻塞事件循环并利用多核；
+大PDF按页区间拆分为多个任务并行解析，并以页为单位流式产出
+"""
+
+from typing import Any, Callable, List, Optional, AsyncIterator, Deque, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+import asyncio
+import multiprocessing
+import logging
+import time
+import weakref
+
+from app.config import settings
+from app.core.singleton import singleton
+from app.services.cpu_pools import start_workers, pool_workers
+
+logger = logging.getLogger(__name__)
+
+
+# ========== 子进程中执行的函数（需为模块级函数以便序列化） ==========
+
+def _init_worker(memory_limit_mb: int):
+    """子进程初始化：设置地址空间上限，超限时解析抛出MemoryError而不是拖垮整机"""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        # Windows无resource模块，或当前硬限制更低
+        logging.getLogger(__name__).warning(f"无法设置解析进程内存上限: {e}")
+
+
+def _count_pdf_pages(file_path: str) -> int:
+    """统计PDF页数"""
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """提取PDF中[start, end)页的文本"""
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _parse_whole_file(file_path: str) -> str:
+    """整体解析非PDF文件（DOCX/TXT/MD）"""
+    from app.services.document_processor import DocumentParser
+    return DocumentParser.parse_file(file_path)
+
+
+@dataclass
+class _ParseJob:
+    """提交到进程池的一个解析任务（进程池被重置后可重新提交）"""
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...]
+    executor: Optional[ProcessPoolExecutor] = None
+    future: Optional[asyncio.Future] = None
+    crash_retried: bool = False
+
+
+@singleton
+class DocumentParsePool:
+    """文档解析进程池服务"""
+    
+    def __init__(self):
+        self.max_workers = pool_workers("parser")
+        self.pages_per_task = max(1, settings.PARSER_PDF_PAGES_PER_TASK)
+        self.file_timeout = settings.PARSER_FILE_TIMEOUT
+        self.memory_limit_mb = settings.PARSER_MEMORY_LIMIT_MB
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 因某个文件解析超时而被主动终止的进程池：其上其他文件的任务是被连带中断的，应重新提交
+        self._timed_out_executors: "weakref.WeakSet[ProcessPoolExecutor]" = weakref.WeakSet()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """懒加载进程池（使用spawn，避免在多线程进程中fork）"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.memory_limit_mb,)
+            )
+        return self._executor
+    
+    def _reset_executor(self, executor: ProcessPoolExecutor, timed_out: bool = False):
+        """
+        终止并丢弃进程池（超时或子进程崩溃后调用），下次使用时重建
+        
+        进程池中其他文件的在途和排队任务随之以BrokenProcessPool结束，由各自的调用方重新提交
+        
+        Args:
+            executor: 出现超时/崩溃的任务所在的进程池（已被其他调用方重置时不再处理）
+            timed_out: 是否因解析超时而主动终止
+        """
+        if executor is not self._executor:
+            return
+        self._executor = None
+        if timed_out:
+            self._timed_out_executors.add(executor)
+        # ProcessPoolExecutor无法取消运行中的任务，只能直接终止子进程；
+        # 不取消排队的任务，让它们以BrokenProcessPool结束而不是被静默取消
+        processes = list(getattr(executor, "_processes", {}).values())
+        executor.shutdown(wait=False)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    
+    def _submit(self, job: _ParseJob) -> _ParseJob:
+        """把解析任务提交到当前进程池"""
+        job.executor = self._get_executor()
+        job.future = asyncio.get_running_loop().run_in_executor(job.executor, job.fn, *job.args)
+        return job
+    
+    async def warm_up(self) -> int:
+        """
+        预先启动全部解析进程
+        
+        Returns:
+            已启动的进程数
+        """
+        return await start_workers(self._get_executor(), self.max_workers)
+    
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+    
+    async def parse_file(self, file_path: str, timeout: Optional[float] = None) -> str:
+        """
+        解析文件为文本
+        
+        Args:
+            file_path: 文件路径
+            timeout: 整个文件的解析超时（秒），默认 PARSER_FILE_TIMEOUT
+        
+        Returns:
+            解析后的文本内容
+        """
+        pages = [page async for page in self.iter_pages(file_path, timeout=timeout)]
+        return '\n\n'.join(pages)
+    
+    async def iter_pages(self, file_path: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        按页流式解析文件
+        
+        PDF按页区间并行解析、按页序产出，调用方无需持有全文；
+        其他格式整体解析后作为一页产出。
+        
+        Args:
+            file_path: 文件路径
+            timeout: 整个文件的解析超时（秒），默认 PARSER_FILE_TIMEOUT
+        
+        Yields:
+            每页的文本
+        """
+        timeout = timeout if timeout is not None else self.file_timeout
+        deadline = time.monotonic() + timeout if timeout and timeout > 0 else None
+        
+        if Path(file_path).suffix.lower() != '.pdf':
+            yield await self._await_with_deadline(
+                self._submit(_ParseJob(_parse_whole_file, (file_path,))), deadline, file_path
+            )
+            return
+        
+        page_count = await self._await_with_deadline(
+            self._submit(_ParseJob(_count_pdf_pages, (file_path,))), deadline, file_path
+        )
+        
+        # 滑动窗口提交页区间：最多同时在途 2×worker 个任务，按顺序等待以保证页序，
+        # 已解析但未被消费的文本量因此有上限
+        ranges = [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        window = self.max_workers * 2
+        jobs: Deque[_ParseJob] = deque()
+        next_range = 0
+        try:
+            while jobs or next_range < len(ranges):
+                while next_range < len(ranges) and len(jobs) < window:
+                    start, end = ranges[next_range]
+                    jobs.append(self._submit(_ParseJob(_extract_pdf_pages, (file_path, start, end))))
+                    next_range += 1
+                
+                for page_text in await self._await_with_deadline(jobs.popleft(), deadline, file_path):
+                    yield page_text
+        finally:
+            for job in jobs:
+                job.future.cancel()
+    
+    async def _await_with_deadline(self, job: _ParseJob, deadline: Optional[float], file_path: str):
+        """
+        等待子进程任务，超时或进程池损坏时重置进程池
+        
+        进程池是各文件共享的：因其他文件超时被终止的，本任务重新提交到新进程池继续解析；
+        子进程崩溃时无法判断是哪个文件导致的，每个受影响的任务重新提交一次，再次崩溃才报错
+        
+        Raises:
+            TimeoutError: 本文件解析超时
+            MemoryError: 重新提交后解析进程仍异常退出（通常是超出内存上限）
+        """
+        while True:
+            try:
+                if deadline is None:
+                    return await job.future
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                return await asyncio.wait_for(job.future, timeout=remaining)
+            except asyncio.TimeoutError:
+                self._reset_executor(job.executor, timed_out=True)
+                raise TimeoutError(f"文档解析超时: {file_path}")
+            except BrokenProcessPool:
+                collateral = job.executor in self._timed_out_executors
+                self._reset_executor(job.executor)
+                if not collateral:
+                    if job.crash_retried:
+                        raise MemoryError(f"文档解析进程异常退出（可能超出内存上限）: {file_path}")
+                    job.crash_retried = True
+                logger.warning(
+                    f"解析进程池已被{'其他文件的超时' if collateral else '子进程崩溃'}终止，重新提交解析任务: {file_path}"
+                )
+                self._submit(job)
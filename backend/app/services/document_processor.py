@@ -3,11 +3,16 @@
 提供文档解析和分块功能
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from pathlib import Path
+import asyncio
 import logging
 
 from app.models.document import Chunk
+from app.services.chunking_engine import (
+    StreamingChunker, BoundaryScanner, SENTENCE_END_PATTERN, split_recursive
+)
+from app.services.token_length_service import estimate_token_count, get_token_length_service
 
 logger = logging.getLogger(__name__)
 
@@ -39,61 +44,33 @@ class DocumentProcessor:
         text: str,
         chunk_size: int = 500,
         chunk_overlap: int = 50,
+        size_unit: str = "chars",
+        token_counter: Optional[Callable[[str], int]] = None,
+        tokenizer_model: Optional[str] = None,
         **kwargs
     ) -> List[Chunk]:
         """
-        固定大小分块
+        固定大小分块（单遍扫描，在句子边界处结束分块）
         
         Args:
             text: 输入文本
-            chunk_size: 分块大小（字符数）
-            chunk_overlap: 重叠大小（字符数）
+            chunk_size: 分块大小（以size_unit计）
+            chunk_overlap: 重叠大小（以size_unit计）
+            size_unit: 大小单位 (chars, estimated_tokens, tokens)
+            token_counter: tokens单位时使用的计数函数
+            tokenizer_model: tokens单位时使用的嵌入模型名称（默认 OLLAMA_EMBEDDING_MODEL）
             
         Returns:
             分块列表
         """
-        chunks = []
-        text_length = len(text)
-        
-        start = 0
-        index = 0
-        
-        while start < text_length:
-            end = min(start + chunk_size, text_length)
-            
-            # 提取分块内容
-            chunk_content = text[start:end]
-            
-            # 如果不是最后一个分块，尝试在句子边界结束
-            if end < text_length:
-                # 查找句子结束符
-                sentence_endings = ['。', '！', '？', '\n', '.', '!', '?']
-                for i in range(len(chunk_content) - 1, max(0, len(chunk_content) - 100), -1):
-                    if chunk_content[i] in sentence_endings:
-                        end = start + i + 1
-                        chunk_content = text[start:end]
-                        break
-            
-            # 创建分块对象
-            chunk = Chunk(
-                index=index,
-                content=chunk_content.strip(),
-                start_pos=start,
-                end_pos=end,
-                char_count=len(chunk_content),
-                token_count=None,  # 后续可以添加token计数
-                metadata={"chunk_method": "fixed_size"}
-            )
-            
-            chunks.append(chunk)
-            
-            # 移动到下一个分块
-            start = end - chunk_overlap
-            index += 1
-            
-            # 避免无限循环
-            if end >= text_length:
-                break
+        chunker = StreamingChunker(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            size_unit=size_unit,
+            token_counter=token_counter,
+            tokenizer_model=tokenizer_model
+        )
+        chunks = list(chunker.chunk_stream([text]))
         
         logger.info(f"文本分块完成: {len(chunks)} 个分块")
         return chunks
@@ -150,34 +127,71 @@ class DocumentProcessor:
         Returns:
             分块列表
         """
-        import re
-        
-        # 简单的句子分割（中英文）
-        sentence_pattern = r'[^。！？.!?]+[。！？.!?]+'
-        sentences = re.findall(sentence_pattern, text)
+        # 一次扫描得到带精确偏移的句子
+        scanner = BoundaryScanner(pattern=SENTENCE_END_PATTERN, max_unit_chars=len(text) or 1)
+        sentences = scanner.feed(text) + scanner.finish()
         
         chunks = []
-        current_pos = 0
-        
         for i in range(0, len(sentences), max_sentences):
             chunk_sentences = sentences[i:i + max_sentences]
-            chunk_content = ''.join(chunk_sentences)
+            raw = ''.join(sentence for _, sentence in chunk_sentences)
+            chunk_content = raw.strip()
+            if not chunk_content:
+                continue
             
+            start_pos = chunk_sentences[0][0] + len(raw) - len(raw.lstrip())
             chunk = Chunk(
                 index=len(chunks),
-                content=chunk_content.strip(),
-                start_pos=current_pos,
-                end_pos=current_pos + len(chunk_content),
+                content=chunk_content,
+                start_pos=start_pos,
+                end_pos=start_pos + len(chunk_content),
                 char_count=len(chunk_content),
                 metadata={"chunk_method": "sentence", "sentence_count": len(chunk_sentences)}
             )
             
             chunks.append(chunk)
-            current_pos += len(chunk_content)
         
         logger.info(f"句子分块完成: {len(chunks)} 个分块")
         return chunks
     
+    @staticmethod
+    def chunk_by_recursive(
+        text: str,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        separators: Optional[List[str]] = None,
+        size_unit: str = "chars",
+        tokenizer_model: Optional[str] = None,
+        **kwargs
+    ) -> List[Chunk]:
+        """
+        递归分块：按分隔符层级（段落 → 行 → 句 → 分句 → 词 → 字符）切分后合并
+        
+        Args:
+            text: 输入文本
+            chunk_size: 分块大小（以size_unit计）
+            chunk_overlap: 重叠大小（以size_unit计）
+            separators: 分隔符层级（默认段落/行/句/分句/空格/字符）
+            size_unit: 大小单位 (chars, estimated_tokens, tokens)
+            tokenizer_model: tokens单位时使用的嵌入模型名称
+            
+        Returns:
+            分块列表
+        """
+        chunker = StreamingChunker(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            size_unit=size_unit,
+            tokenizer_model=tokenizer_model,
+            max_backtrack=chunk_size,
+            chunk_method="recursive"
+        )
+        spans = split_recursive(text, chunker.chunk_size, chunker.measure, separators)
+        chunks = chunker.add_units(spans) + chunker.flush()
+        
+        logger.info(f"递归分块完成: {len(chunks)} 个分块")
+        return chunks
+    
     @classmethod
     def chunk_document(
         cls,
@@ -190,8 +204,8 @@ class DocumentProcessor:
         
         Args:
             text: 输入文本
-            method: 分块方法 (fixed_size, paragraph, sentence)
-            **kwargs: 方法特定参数
+            method: 分块方法 (fixed_size, paragraph, sentence, recursive)；semantic需使用chunk_document_async
+            **kwargs: 方法特定参数（fixed_size/recursive支持size_unit: chars, estimated_tokens, tokens）
             
         Returns:
             分块列表
@@ -201,13 +215,92 @@ class DocumentProcessor:
         
         # 根据方法分块
         if method == "fixed_size":
-            return cls.chunk_by_fixed_size(text, **kwargs)
+            chunks = cls.chunk_by_fixed_size(text, **kwargs)
         elif method == "paragraph":
-            return cls.chunk_by_paragraph(text, **kwargs)
+            chunks = cls.chunk_by_paragraph(text, **kwargs)
         elif method == "sentence":
-            return cls.chunk_by_sentence(text, **kwargs)
+            chunks = cls.chunk_by_sentence(text, **kwargs)
+        elif method == "recursive":
+            chunks = cls.chunk_by_recursive(text, **kwargs)
+        elif method == "semantic":
+            raise ValueError("semantic分块需要调用嵌入服务，请使用 chunk_document_async")
         else:
             raise ValueError(f"不支持的分块方法: {method}")
+        
+        cls.fill_token_counts(chunks, kwargs.get("tokenizer_model"))
+        return chunks
+    
+    @classmethod
+    async def chunk_document_async(
+        cls,
+        text: str,
+        method: str = "fixed_size",
+        **kwargs
+    ) -> List[Chunk]:
+        """
+        文档分块（异步入口，支持semantic）
+        
+        非semantic方法在工作线程中执行chunk_document；
+        semantic方法批量嵌入句子后按语义断点合并。
+        
+        Args:
+            text: 输入文本
+            method: 分块方法 (fixed_size, paragraph, sentence, recursive, semantic)
+            **kwargs: 方法特定参数；semantic支持 embedding_provider、embedding_model、
+                embedding_endpoint、breakpoint_percentile、buffer_size、chunk_size、size_unit
+            
+        Returns:
+            分块列表
+        """
+        if method != "semantic":
+            return await asyncio.to_thread(cls.chunk_document, text, method, **kwargs)
+        
+        from app.services.embedding_service import EmbeddingServiceFactory
+        from app.services.semantic_chunker import chunk_by_semantic
+        from app.models.knowledge_base import EmbeddingProvider
+        from app.config import settings
+        
+        embedding_model = kwargs.get("embedding_model") or settings.OLLAMA_EMBEDDING_MODEL
+        embedding_service = EmbeddingServiceFactory.create(
+            provider=EmbeddingProvider(kwargs.get("embedding_provider") or "ollama"),
+            model_name=embedding_model,
+            service_url=kwargs.get("embedding_endpoint")
+        )
+        tokenizer_model = kwargs.get("tokenizer_model") or embedding_model
+        
+        chunks = await chunk_by_semantic(
+            cls.parse_text(text),
+            embedding_service,
+            chunk_size=kwargs.get("chunk_size", 512),
+            size_unit=kwargs.get("size_unit", "tokens"),
+            tokenizer_model=tokenizer_model,
+            breakpoint_percentile=kwargs.get("breakpoint_percentile", 95.0),
+            buffer_size=kwargs.get("buffer_size", 1),
+            embed_batch_size=kwargs.get("embed_batch_size", 256)
+        )
+        await asyncio.to_thread(cls.fill_token_counts, chunks, tokenizer_model)
+        return chunks
+    
+    @staticmethod
+    def fill_token_counts(chunks: List[Chunk], tokenizer_model: Optional[str] = None) -> List[Chunk]:
+        """
+        批量计算并填充分块的token数（已填充的跳过）
+        
+        Args:
+            chunks: 分块列表
+            tokenizer_model: 嵌入模型名称（默认 OLLAMA_EMBEDDING_MODEL）
+            
+        Returns:
+            分块列表
+        """
+        pending = [chunk for chunk in chunks if chunk.token_count is None]
+        if pending:
+            counts = get_token_length_service().batch_count(
+                [chunk.content for chunk in pending], tokenizer_model
+            )
+            for chunk, count in zip(pending, counts):
+                chunk.token_count = count
+        return chunks
     
     @staticmethod
     def estimate_tokens(text: str) -> int:
@@ -216,12 +309,7 @@ class DocumentProcessor:
         中文: 1字 ≈ 1.5 tokens
         英文: 1词 ≈ 1 token
         """
-        chinese_chars = len([c for c in text if '\u4e00' <= c <= '\u9fff'])
-        other_chars = len(text) - chinese_chars
-        
-        # 粗略估算
-        tokens = int(chinese_chars * 1.5 + other_chars / 4)
-        return tokens
+        return int(estimate_token_count(text))
 
 
 class DocumentParser:
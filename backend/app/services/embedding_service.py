@@ -3,7 +3,7 @@
 支持多种嵌入模型提供商
 """
 
-from typing import List
+from typing import List, Optional
 from abc import ABC, abstractmethod
 import logging
 import httpx
@@ -11,6 +11,7 @@ import asyncio
 
 from app.models.knowledge_base import EmbeddingProvider
 from app.config import settings
+from app.services.token_length_service import get_token_length_service
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +20,13 @@ class BaseEmbeddingService(ABC):
     """嵌入服务抽象基类"""
     
     @abstractmethod
-    async def embed_text(self, text: str, max_chars: int = 8192) -> List[float]:
+    async def embed_text(self, text: str, max_chars: Optional[int] = None) -> List[float]:
         """
         嵌入单个文本
         
         Args:
             text: 输入文本
-            max_chars: 最大字符长度，超过此长度的文本将被截断（默认8192）
+            max_chars: 最大字符长度；不指定时按模型token上限（EMBEDDING_MAX_TOKENS）截断
         
         Returns:
             向量嵌入
@@ -33,18 +34,75 @@ class BaseEmbeddingService(ABC):
         pass
     
     @abstractmethod
-    async def embed_texts(self, texts: List[str], max_chars: int = 8192) -> List[List[float]]:
+    async def embed_texts(self, texts: List[str], max_chars: Optional[int] = None) -> List[List[float]]:
         """
         批量嵌入文本
         
         Args:
             texts: 文本列表
-            max_chars: 最大字符长度，超过此长度的文本将被截断（默认8192）
+            max_chars: 最大字符长度；不指定时按模型token上限（EMBEDDING_MAX_TOKENS）截断
         
         Returns:
             向量嵌入列表
         """
         pass
+    
+    async def _truncate_texts_async(self, texts: List[str], max_chars: Optional[int] = None) -> List[str]:
+        """
+        截断超长文本（批量嵌入使用）
+        
+        按token数截断需要分词，是CPU密集型操作：文本数达到EMBEDDING_TRUNCATE_THREAD_MIN_TEXTS时
+        放到工作线程中执行，避免阻塞事件循环；按字符截断和小批量直接在当前线程执行
+        
+        Args:
+            texts: 文本列表
+            max_chars: 最大字符长度（可选）
+        
+        Returns:
+            处理后的文本列表
+        """
+        if max_chars is None and len(texts) >= settings.EMBEDDING_TRUNCATE_THREAD_MIN_TEXTS:
+            return await asyncio.to_thread(self._truncate_texts, texts, max_chars)
+        return self._truncate_texts(texts, max_chars)
+    
+    def _truncate_texts(self, texts: List[str], max_chars: Optional[int] = None) -> List[str]:
+        """
+        截断超长文本
+        
+        指定max_chars时按字符截断；否则批量计算token数，只截断超过模型token上限的文本
+        
+        Args:
+            texts: 文本列表
+            max_chars: 最大字符长度（可选）
+        
+        Returns:
+            处理后的文本列表
+        """
+        if max_chars is not None:
+            processed = []
+            for i, text in enumerate(texts):
+                if len(text) > max_chars:
+                    logger.warning(
+                        f"第 {i+1} 个文本长度 {len(text)} 超过限制 {max_chars}，"
+                        f"将截断到前 {max_chars} 个字符"
+                    )
+                    text = text[:max_chars]
+                processed.append(text)
+            return processed
+        
+        model_name = getattr(self, "model_name", None)
+        max_tokens = settings.EMBEDDING_MAX_TOKENS
+        token_service = get_token_length_service()
+        counts = token_service.batch_count(texts, model_name)
+        
+        processed = list(texts)
+        for i, count in enumerate(counts):
+            if count > max_tokens:
+                logger.warning(
+                    f"第 {i+1} 个文本token数 {count} 超过模型上限 {max_tokens}，将截断"
+                )
+                processed[i] = token_service.truncate(texts[i], max_tokens, model_name)
+        return processed
 
 
 class OllamaEmbeddingService(BaseEmbeddingService):
@@ -137,13 +195,13 @@ class OllamaEmbeddingService(BaseEmbeddingService):
             logger.error(f"Ollama API调用失败: {str(e)}", exc_info=True)
             raise
     
-    async def embed_text(self, text: str, max_chars: int = 8192) -> List[float]:
+    async def embed_text(self, text: str, max_chars: Optional[int] = None) -> List[float]:
         """
         嵌入单个文本
         
         Args:
             text: 输入文本
-            max_chars: 最大字符长度，超过此长度的文本将被截断（默认8192）
+            max_chars: 最大字符长度；不指定时按模型token上限（EMBEDDING_MAX_TOKENS）截断
         
         Returns:
             向量嵌入
@@ -152,16 +210,11 @@ class OllamaEmbeddingService(BaseEmbeddingService):
             raise ValueError("输入文本不能为空")
         
         # 截断超长文本
-        if len(text) > max_chars:
-            logger.warning(
-                f"文本长度 {len(text)} 超过限制 {max_chars}，"
-                f"将截断到前 {max_chars} 个字符"
-            )
-            text = text[:max_chars]
+        text = self._truncate_texts([text], max_chars)[0]
         
         return await self._call_ollama_api(text)
     
-    async def embed_texts(self, texts: List[str], max_chars: int = 8192) -> List[List[float]]:
+    async def embed_texts(self, texts: List[str], max_chars: Optional[int] = None) -> List[List[float]]:
         """
         批量嵌入文本
         
@@ -169,7 +222,7 @@ class OllamaEmbeddingService(BaseEmbeddingService):
         
         Args:
             texts: 文本列表
-            max_chars: 最大字符长度，超过此长度的文本将被截断（默认8192）
+            max_chars: 最大字符长度；不指定时按模型token上限（EMBEDDING_MAX_TOKENS）截断
         
         Returns:
             向量嵌入列表
@@ -178,20 +231,10 @@ class OllamaEmbeddingService(BaseEmbeddingService):
             return []
         
         # 验证输入并截断超长文本
-        processed_texts = []
         for i, text in enumerate(texts):
             if not text or not text.strip():
                 raise ValueError(f"第 {i+1} 个文本不能为空")
-            
-            # 截断超长文本
-            if len(text) > max_chars:
-                logger.warning(
-                    f"第 {i+1} 个文本长度 {len(text)} 超过限制 {max_chars}，"
-                    f"将截断到前 {max_chars} 个字符"
-                )
-                text = text[:max_chars]
-            
-            processed_texts.append(text)
+        processed_texts = await self._truncate_texts_async(texts, max_chars)
         
         # 使用信号量限制并发数（避免过多并发请求导致Ollama过载）
         semaphore = asyncio.Semaphore(10)  # 最多10个并发请求
@@ -222,15 +265,10 @@ class CustomEmbeddingService(BaseEmbeddingService):
         self.api_key = api_key
         self.model_name = model_name
     
-    async def embed_text(self, text: str, max_chars: int = 8192) -> List[float]:
+    async def embed_text(self, text: str, max_chars: Optional[int] = None) -> List[float]:
         """嵌入单个文本（待实现）"""
         # 截断超长文本
-        if len(text) > max_chars:
-            logger.warning(
-                f"文本长度 {len(text)} 超过限制 {max_chars}，"
-                f"将截断到前 {max_chars} 个字符"
-            )
-            text = text[:max_chars]
+        text = self._truncate_texts([text], max_chars)[0]
         
         # TODO: 调用自研服务API
         # import httpx
@@ -244,23 +282,13 @@ class CustomEmbeddingService(BaseEmbeddingService):
         
         return [0.0] * 768
     
-    async def embed_texts(self, texts: List[str], max_chars: int = 8192) -> List[List[float]]:
+    async def embed_texts(self, texts: List[str], max_chars: Optional[int] = None) -> List[List[float]]:
         """批量嵌入文本（待实现）"""
         # 验证输入并截断超长文本
-        processed_texts = []
         for i, text in enumerate(texts):
             if not text or not text.strip():
                 raise ValueError(f"第 {i+1} 个文本不能为空")
-            
-            # 截断超长文本
-            if len(text) > max_chars:
-                logger.warning(
-                    f"第 {i+1} 个文本长度 {len(text)} 超过限制 {max_chars}，"
-                    f"将截断到前 {max_chars} 个字符"
-                )
-                text = text[:max_chars]
-            
-            processed_texts.append(text)
+        processed_texts = await self._truncate_texts_async(texts, max_chars)
         
         embeddings = []
         for text in processed_texts:
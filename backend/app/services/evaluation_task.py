@@ -3,7 +3,7 @@
 负责评估任务的创建、执行和管理
 """
 
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 import uuid
 import logging
 from datetime import datetime
@@ -18,10 +18,19 @@ from app.repositories.factory import RepositoryFactory
 from app.services.ragas_evaluation import RAGASEvaluationService
 from app.services.retrieval_service import RetrievalService
 from app.services.rag_service import RAGService
+from app.services.task_queue_service import TaskCheckpoint
+from app.services.task_cancellation import CancellationToken, TaskCancelledError, run_cancellable
+from app.services.task_progress import (
+    PROGRESS_KIND_EVALUATION_TASK, ProgressThrottle, publish_progress, evaluation_task_progress_event
+)
+from app.config import settings
 from app.core.exceptions import NotFoundException
 
 logger = logging.getLogger(__name__)
 
+# 分页读取用例结果时的每页条数
+CASE_RESULT_PAGE_SIZE = 500
+
 
 class EvaluationTaskService:
     """评估任务服务"""
@@ -112,7 +121,9 @@ class EvaluationTaskService:
     async def execute_evaluation_task(
         self,
         task_id: str,
-        save_detailed_results: bool = True
+        save_detailed_results: bool = True,
+        checkpoint: Optional[TaskCheckpoint] = None,
+        cancel_token: Optional[CancellationToken] = None
     ) -> EvaluationTask:
         """
         执行评估任务
@@ -120,19 +131,26 @@ class EvaluationTaskService:
         Args:
             task_id: 评估任务ID
             save_detailed_results: 是否保存详细结果
+            checkpoint: 任务队列检查点，定期保存已处理的用例游标，重试时从检查点继续
+                （生成器评估不保存详细结果时无法恢复已完成用例的RAGAS输入，总是从头执行）
+            cancel_token: 取消令牌，每个用例开始前检查，取消时中断进行中的检索和LLM调用
         
         Returns:
             更新后的评估任务
+        
+        Raises:
+            TaskCancelledError: 任务被取消
         """
         # 获取任务
         task = await self.task_repo.get_by_id(task_id)
         if not task:
             raise NotFoundException(message=f"评估任务不存在: {task_id}")
         
-        # 更新状态为运行中
+        # 更新状态为运行中（从检查点继续时保留首次开始时间）
         task.status = EvaluationStatus.RUNNING
-        task.started_at = datetime.now()
-        await self.task_repo.update(task_id, task)
+        if not (checkpoint and checkpoint.state and task.started_at):
+            task.started_at = datetime.now()
+        await self._update_task(task)
         
         try:
             # 获取测试集和测试用例
@@ -161,30 +179,32 @@ class EvaluationTaskService:
                 except Exception as e:
                     logger.warning(f"无法检查知识库集合: {e}")
             
-            # 根据评估类型获取对应的测试用例
+            # 根据评估类型获取对应的测试用例（按ID排序：检查点按位置记录游标，顺序需在多次执行间一致）
             if task.evaluation_type == EvaluationType.RETRIEVAL:
                 filters = {"test_set_id": task.test_set_id}
                 test_cases = await self.retriever_case_repo.get_all(
                     skip=0,
                     limit=10000,
-                    filters=filters
+                    filters=filters,
+                    order_by="id"
                 )
                 if not test_cases:
                     raise ValueError(f"测试集 {task.test_set_id} 中没有检索器测试用例")
                 await self._execute_retrieval_evaluation(
-                    task, test_set, test_cases, save_detailed_results
+                    task, test_set, test_cases, save_detailed_results, checkpoint, cancel_token
                 )
             elif task.evaluation_type == EvaluationType.GENERATION:
                 filters = {"test_set_id": task.test_set_id}
                 test_cases = await self.generation_case_repo.get_all(
                     skip=0,
                     limit=10000,
-                    filters=filters
+                    filters=filters,
+                    order_by="id"
                 )
                 if not test_cases:
                     raise ValueError(f"测试集 {task.test_set_id} 中没有生成器测试用例")
                 await self._execute_generation_evaluation(
-                    task, test_set, test_cases, save_detailed_results
+                    task, test_set, test_cases, save_detailed_results, checkpoint, cancel_token
                 )
             else:
                 raise ValueError(f"不支持的评估类型: {task.evaluation_type}")
@@ -192,15 +212,22 @@ class EvaluationTaskService:
             # 更新任务状态
             task.status = EvaluationStatus.COMPLETED
             task.completed_at = datetime.now()
-            await self.task_repo.update(task_id, task)
+            await self._update_task(task)
             
             # 创建评估汇总
             await self._create_evaluation_summary(task_id)
             
+        except TaskCancelledError as e:
+            logger.info(f"评估任务 {task_id} 已取消: {e.reason}")
+            task.status = EvaluationStatus.FAILED
+            task.error_message = e.reason
+            task.completed_at = datetime.now()
+            await self._update_task(task)
+            raise
         except Exception as e:
             logger.error(f"执行评估任务失败: {e}", exc_info=True)
             task.status = EvaluationStatus.FAILED
-            await self.task_repo.update(task_id, task)
+            await self._update_task(task)
             raise
         
         return task
@@ -210,7 +237,9 @@ class EvaluationTaskService:
         task: EvaluationTask,
         test_set: TestSet,
         test_cases: List[RetrieverTestCase],
-        save_detailed_results: bool
+        save_detailed_results: bool,
+        checkpoint: Optional[TaskCheckpoint] = None,
+        cancel_token: Optional[CancellationToken] = None
     ):
         """执行检索器评估"""
         retrieval_service = RetrievalService()
@@ -220,25 +249,46 @@ class EvaluationTaskService:
         retrieved_contexts = []
         ground_truth_contexts = []
         
-        completed_count = 0
-        failed_count = 0
-        
-        for test_case in test_cases:
+        cursor = await self._restore_checkpoint(task, test_cases, checkpoint)
+        progress_throttle = ProgressThrottle()
+        start_index = cursor["next_index"]
+        completed_count = cursor["completed"]
+        failed_count = cursor["failed"]
+        
+        # 从检查点继续时，已完成用例的RAGAS输入从已保存的结果中恢复
+        if start_index > 0 and save_detailed_results:
+            completed_results = await self._get_completed_case_results(task.id)
+            for test_case in test_cases[:start_index]:
+                case_result = completed_results.get(test_case.id)
+                if not case_result:
+                    continue
+                queries.append(case_result.query)
+                retrieved_contexts.append([chunk.get("content", "") for chunk in case_result.retrieved_chunks or []])
+                ground_truth_contexts.append([
+                    answer["answer_text"] for answer in test_case.expected_answers if answer.get("answer_text")
+                ])
+        
+        for index, test_case in enumerate(test_cases[start_index:], start=start_index):
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
             try:
                 # 执行检索
                 retrieval_config = task.retrieval_config
                 
                 # 使用统一检索服务，支持多种检索模式
-                results = await retrieval_service.unified_search(
-                    kb_id=task.kb_id,
-                    query=test_case.question,
-                    retrieval_mode=retrieval_config.get("retrieval_mode", "hybrid"),
-                    top_k=retrieval_config.get("top_k", 10),
-                    score_threshold=retrieval_config.get("score_threshold", 0.0),
-                    fusion_method=retrieval_config.get("fusion_method", "rrf"),
-                    semantic_weight=retrieval_config.get("semantic_weight", 0.7),
-                    keyword_weight=retrieval_config.get("keyword_weight", 0.3),
-                    rrf_k=retrieval_config.get("rrf_k", 60)
+                results = await run_cancellable(
+                    retrieval_service.unified_search(
+                        kb_id=task.kb_id,
+                        query=test_case.question,
+                        retrieval_mode=retrieval_config.get("retrieval_mode", "hybrid"),
+                        top_k=retrieval_config.get("top_k", 10),
+                        score_threshold=retrieval_config.get("score_threshold", 0.0),
+                        fusion_method=retrieval_config.get("fusion_method", "rrf"),
+                        semantic_weight=retrieval_config.get("semantic_weight", 0.7),
+                        keyword_weight=retrieval_config.get("keyword_weight", 0.3),
+                        rrf_k=retrieval_config.get("rrf_k", 60)
+                    ),
+                    cancel_token
                 )
                 
                 # 提取检索结果
@@ -322,10 +372,12 @@ class EvaluationTaskService:
                 
                 completed_count += 1
                 
-                # 更新任务进度
+                # 每个用例发布进度事件，按节流间隔写库
                 task.completed_cases = completed_count
-                await self.task_repo.update(task.id, task)
+                await self._report_progress(task, progress_throttle, index + 1 == len(test_cases))
                 
+            except TaskCancelledError:
+                raise
             except Exception as e:
                 logger.error(f"评估测试用例失败 {test_case.id}: {e}", exc_info=True)
                 failed_count += 1
@@ -342,7 +394,9 @@ class EvaluationTaskService:
                     await self.case_result_repo.create(case_result)
                 
                 task.failed_cases = failed_count
-                await self.task_repo.update(task.id, task)
+                await self._report_progress(task, progress_throttle, index + 1 == len(test_cases))
+            
+            await self._save_checkpoint(checkpoint, cursor, index + 1, len(test_cases), completed_count, failed_count)
         
         # 批量RAGAS评估（所有用例完成后）
         if len(queries) > 0 and save_detailed_results:
@@ -356,12 +410,15 @@ class EvaluationTaskService:
                     from app.config import settings
                     llm_base_url = settings.OLLAMA_BASE_URL
                 
-                ragas_result = await self.ragas_service.evaluate_retrieval(
-                    queries=queries,
-                    retrieved_contexts=retrieved_contexts,
-                    ground_truth_contexts=ground_truth_contexts,
-                    llm_model=llm_model,
-                    llm_base_url=llm_base_url
+                ragas_result = await run_cancellable(
+                    self.ragas_service.evaluate_retrieval(
+                        queries=queries,
+                        retrieved_contexts=retrieved_contexts,
+                        ground_truth_contexts=ground_truth_contexts,
+                        llm_model=llm_model,
+                        llm_base_url=llm_base_url
+                    ),
+                    cancel_token
                 )
                 
                 # RAGAS返回的结果格式处理
@@ -399,6 +456,8 @@ class EvaluationTaskService:
                     await self.case_result_repo.update(case_result.id, case_result)
                     
                 logger.info(f"批量RAGAS评估完成，更新了 {len(case_results)} 个用例结果")
+            except TaskCancelledError:
+                raise
             except Exception as e:
                 logger.error(f"批量RAGAS评估失败: {e}", exc_info=True)
                 # 不阻止任务完成，只是RAGAS指标会缺失
@@ -408,7 +467,9 @@ class EvaluationTaskService:
         task: EvaluationTask,
         test_set: TestSet,
         test_cases: List[GenerationTestCase],
-        save_detailed_results: bool
+        save_detailed_results: bool,
+        checkpoint: Optional[TaskCheckpoint] = None,
+        cancel_token: Optional[CancellationToken] = None
     ):
         """执行生成器评估"""
         rag_service = RAGService(kb_id=task.kb_id)
@@ -419,18 +480,40 @@ class EvaluationTaskService:
         contexts = []
         ground_truth_answers = []
         
-        completed_count = 0
-        failed_count = 0
+        # 批量RAGAS评估需要全部用例的输入，不保存详细结果时无处恢复，只能从头执行
+        cursor = await self._restore_checkpoint(task, test_cases, checkpoint, resumable=save_detailed_results)
+        progress_throttle = ProgressThrottle()
+        start_index = cursor["next_index"]
+        completed_count = cursor["completed"]
+        failed_count = cursor["failed"]
+        
+        # 从检查点继续时，已完成用例的RAGAS输入从已保存的结果中恢复
+        if start_index > 0 and save_detailed_results:
+            completed_results = await self._get_completed_case_results(task.id)
+            for test_case in test_cases[:start_index]:
+                case_result = completed_results.get(test_case.id)
+                if not case_result:
+                    continue
+                queries.append(case_result.query)
+                answers.append(case_result.generated_answer or "")
+                contexts.append([chunk.get("content", "") for chunk in case_result.retrieved_chunks or []])
+                if test_case.reference_answer:
+                    ground_truth_answers.append(test_case.reference_answer)
         
-        for test_case in test_cases:
+        for index, test_case in enumerate(test_cases[start_index:], start=start_index):
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
             try:
                 # 执行RAG生成
                 # 先检索上下文
                 retrieval_config = generation_config.get("retrieval_config", {})
                 top_k = retrieval_config.get("top_k", 10)
-                retrieved_chunks = await rag_service.retrieve(
-                    query=test_case.question,
-                    top_k=top_k
+                retrieved_chunks = await run_cancellable(
+                    rag_service.retrieve(
+                        query=test_case.question,
+                        top_k=top_k
+                    ),
+                    cancel_token
                 )
                 
                 # 调用LLM生成（使用debug_pipeline中的call_llm逻辑）
@@ -448,13 +531,16 @@ class EvaluationTaskService:
 答案："""
                 prompt = prompt_template.format(context=context_str, query=test_case.question)
                 
-                answer = await call_llm(
-                    prompt=prompt,
-                    provider=generation_config.get("llm_provider", "ollama"),
-                    model=generation_config.get("llm_model", "deepseek-r1:1.5b"),
-                    temperature=generation_config.get("temperature", 0.7),
-                    max_tokens=generation_config.get("max_tokens"),
-                    stream=False
+                answer = await run_cancellable(
+                    call_llm(
+                        prompt=prompt,
+                        provider=generation_config.get("llm_provider", "ollama"),
+                        model=generation_config.get("llm_model", "deepseek-r1:1.5b"),
+                        temperature=generation_config.get("temperature", 0.7),
+                        max_tokens=generation_config.get("max_tokens"),
+                        stream=False
+                    ),
+                    cancel_token
                 )
                 
                 result = {
@@ -488,8 +574,10 @@ class EvaluationTaskService:
                 
                 completed_count += 1
                 task.completed_cases = completed_count
-                await self.task_repo.update(task.id, task)
+                await self._report_progress(task, progress_throttle, index + 1 == len(test_cases))
                 
+            except TaskCancelledError:
+                raise
             except Exception as e:
                 logger.error(f"评估测试用例失败 {test_case.id}: {e}", exc_info=True)
                 failed_count += 1
@@ -506,7 +594,9 @@ class EvaluationTaskService:
                     await self.case_result_repo.create(case_result)
                 
                 task.failed_cases = failed_count
-                await self.task_repo.update(task.id, task)
+                await self._report_progress(task, progress_throttle, index + 1 == len(test_cases))
+            
+            await self._save_checkpoint(checkpoint, cursor, index + 1, len(test_cases), completed_count, failed_count)
         
         # 批量RAGAS评估
         if len(queries) > 0:
@@ -517,13 +607,16 @@ class EvaluationTaskService:
                 from app.config import settings
                 llm_base_url = settings.OLLAMA_BASE_URL
             
-            ragas_result = await self.ragas_service.evaluate_generation(
-                queries=queries,
-                answers=answers,
-                contexts=contexts,
-                ground_truth_answers=ground_truth_answers if ground_truth_answers else None,
-                llm_model=llm_model,
-                llm_base_url=llm_base_url
+            ragas_result = await run_cancellable(
+                self.ragas_service.evaluate_generation(
+                    queries=queries,
+                    answers=answers,
+                    contexts=contexts,
+                    ground_truth_answers=ground_truth_answers if ground_truth_answers else None,
+                    llm_model=llm_model,
+                    llm_base_url=llm_base_url
+                ),
+                cancel_token
             )
             
             # 更新已保存的结果中的RAGAS指标
@@ -550,6 +643,114 @@ class EvaluationTaskService:
                         case_result.ragas_score = ragas_result.get("ragas_score", 0.0)
                         await self.case_result_repo.update(case_result.id, case_result)
     
+    async def _restore_checkpoint(
+        self,
+        task: EvaluationTask,
+        test_cases: List[Any],
+        checkpoint: Optional[TaskCheckpoint],
+        resumable: bool = True
+    ) -> Dict[str, Any]:
+        """
+        恢复评估进度
+        
+        检查点与当前用例数一致时从游标继续，否则从头开始；并删除游标之后的用例写入的结果
+        （上次执行中断前未记录到检查点），避免重复
+        
+        Args:
+            task: 评估任务
+            test_cases: 测试用例（按执行顺序）
+            checkpoint: 任务队列检查点（为空时从头执行且不清理已有结果）
+            resumable: 是否允许从游标继续（否则从头执行并删除已有结果）
+        
+        Returns:
+            进度游标 {total, next_index, completed, failed}
+        """
+        total_cases = len(test_cases)
+        state = checkpoint.state if checkpoint and resumable else {}
+        if state.get("total") != total_cases:
+            state = {}
+        cursor = {
+            "total": total_cases,
+            "next_index": state.get("next_index", 0),
+            "completed": state.get("completed", 0),
+            "failed": state.get("failed", 0)
+        }
+        
+        if checkpoint:
+            kept_case_ids = {test_case.id for test_case in test_cases[:cursor["next_index"]]}
+            stale_ids = [
+                case_result.id
+                async for case_result in self._iter_case_results({"evaluation_task_id": task.id})
+                if case_result.test_case_id not in kept_case_ids
+            ]
+            if stale_ids:
+                await self.case_result_repo.bulk_delete(stale_ids)
+                logger.info(f"删除评估任务 {task.id} 检查点之后的 {len(stale_ids)} 个用例结果")
+        
+        if cursor["next_index"]:
+            logger.info(f"评估任务 {task.id} 从检查点继续: {cursor['next_index']}/{total_cases}")
+        return cursor
+    
+    async def _iter_case_results(self, filters: Dict[str, Any]) -> AsyncIterator[EvaluationCaseResult]:
+        """按ID顺序分页读取用例结果"""
+        skip = 0
+        while True:
+            page = await self.case_result_repo.get_all(
+                skip=skip,
+                limit=CASE_RESULT_PAGE_SIZE,
+                filters=filters,
+                order_by="id"
+            )
+            for case_result in page:
+                yield case_result
+            if len(page) < CASE_RESULT_PAGE_SIZE:
+                return
+            skip += CASE_RESULT_PAGE_SIZE
+    
+    async def _update_task(self, task: EvaluationTask):
+        """写库并发布任务状态事件（状态变化时调用，不节流）"""
+        await self.task_repo.update(task.id, task)
+        await publish_progress(PROGRESS_KIND_EVALUATION_TASK, task.id, evaluation_task_progress_event(task))
+    
+    async def _report_progress(self, task: EvaluationTask, throttle: ProgressThrottle, force: bool = False):
+        """
+        报告用例进度：每个用例都发布进度事件，数据库只按TASK_PROGRESS_DB_INTERVAL间隔写入
+        
+        Args:
+            task: 评估任务
+            throttle: 本次执行的写库节流器
+            force: 强制写库（最后一个用例）
+        """
+        await publish_progress(PROGRESS_KIND_EVALUATION_TASK, task.id, evaluation_task_progress_event(task))
+        if throttle.due(force):
+            await self.task_repo.update(task.id, task)
+    
+    async def _get_completed_case_results(self, task_id: str) -> Dict[str, EvaluationCaseResult]:
+        """获取已完成的用例结果 {test_case_id: 结果}"""
+        return {
+            case_result.test_case_id: case_result
+            async for case_result in self._iter_case_results(
+                {"evaluation_task_id": task_id, "status": EvaluationStatus.COMPLETED.value}
+            )
+        }
+    
+    async def _save_checkpoint(
+        self,
+        checkpoint: Optional[TaskCheckpoint],
+        cursor: Dict[str, Any],
+        next_index: int,
+        total_cases: int,
+        completed_count: int,
+        failed_count: int
+    ):
+        """每处理EVALUATION_CHECKPOINT_INTERVAL个用例（以及最后一个用例）保存一次检查点"""
+        if not checkpoint:
+            return
+        if next_index % max(1, settings.EVALUATION_CHECKPOINT_INTERVAL) and next_index < total_cases:
+            return
+        cursor.update(next_index=next_index, completed=completed_count, failed=failed_count)
+        await checkpoint.save(cursor, progress=next_index / total_cases)
+    
     async def _create_evaluation_summary(self, task_id: str):
         """创建评估汇总"""
         # 获取所有用例结果
@@ -696,7 +897,15 @@ class EvaluationTaskService:
             task.started_at = datetime.now()
         task.completed_at = datetime.now()
         
-        await self.task_repo.update(task_id, task)
+        await self._update_task(task)
+        
+        # 取消任务队列中对应的任务，执行器在当前用例边界停止并中断进行中的检索和LLM调用
+        from app.services.task_queue_service import TaskQueueService
+        from app.models.task_queue import TaskType
+        
+        task_service = TaskQueueService()
+        for queue_task in await task_service.find_active_tasks(TaskType.EVALUATION, "evaluation_task_id", task_id):
+            await task_service.cancel_task(queue_task.id, task.error_message)
         logger.info(f"评估任务 {task_id} 已被终止")
         
         return True
@@ -4,11 +4,14 @@
 """
 
 from typing import List, Dict, Any, Optional, Tuple
+import asyncio
 import logging
 
 from app.services.knowledge_base import KnowledgeBaseService
 from app.services.embedding_service import EmbeddingServiceFactory
-from app.services.sparse_vector_service import SparseVectorServiceFactory
+from app.services.sparse_vector_service import SparseVectorServiceFactory, get_kb_sparse_method, get_bm25_model_path
+from app.services.sparse_hashing import to_sparse_arrays
+from app.services.sparse_encode_pool import SparseEncodePool
 from app.services.vector_db_service import VectorDBServiceFactory
 from app.models.knowledge_base import VectorDBType, EmbeddingProvider
 from app.core.exceptions import NotFoundException
@@ -47,6 +50,17 @@ class IndexWritingService:
         if not chunks:
             raise ValueError("chunks不能为空")
         
+        # 大批量写入走流式流水线：嵌入、稀疏编码和upsert按批并发，内存受队列深度约束
+        if len(chunks) > settings.INGESTION_BATCH_SIZE:
+            from app.services.ingestion_pipeline import IngestionPipeline
+            pipeline = IngestionPipeline(kb_id)
+            return await pipeline.run_texts(
+                chunks,
+                metadata_list=metadata_list,
+                dense_vectors=dense_vectors,
+                sparse_vectors=sparse_vectors
+            )
+        
         # 获取知识库配置和schema
         kb = await self.kb_service.get_knowledge_base(kb_id)
         if not kb:
@@ -54,13 +68,14 @@ class IndexWritingService:
         
         kb_schema = await self.kb_service.get_knowledge_base_schema(kb_id)
         
-        # 生成或使用提供的稠密向量
-        if dense_vectors is None:
-            dense_vectors = await self._generate_dense_embeddings(kb, chunks)
+        # 生成稠密向量与稀疏向量（两者互不依赖，并发执行）
+        async def _dense():
+            return dense_vectors if dense_vectors is not None else await self._generate_dense_embeddings(kb, chunks)
+        
+        async def _sparse():
+            return sparse_vectors if sparse_vectors is not None else await self._generate_sparse_vectors(kb, kb_schema, chunks)
         
-        # 生成或使用提供的稀疏向量
-        if sparse_vectors is None:
-            sparse_vectors = await self._generate_sparse_vectors(kb, kb_schema, chunks)
+        dense_vectors, sparse_vectors = await asyncio.gather(_dense(), _sparse())
         
         # 准备元数据
         metadatas = self._prepare_metadata(kb_id, chunks, metadata_list, kb_schema)
@@ -76,6 +91,9 @@ class IndexWritingService:
         # 写入向量数据库
         await self._write_to_vector_db(kb, kb_id, vectors, metadatas, ids)
         
+        # 知识库BM25的语料统计按间隔写盘，写入结束时写入剩余增量
+        await asyncio.to_thread(SparseVectorServiceFactory.flush_kb_model, kb_id)
+        
         return {
             "kb_id": kb_id,
             "written_count": len(vectors),
@@ -127,43 +145,50 @@ class IndexWritingService:
         Returns:
             稀疏向量列表，如果没有配置则返回空列表
         """
-        sparse_vectors = []
+        # 预训练BM25的大批量编码分发到稀疏编码进程池，利用多核
+        sparse_pool = SparseEncodePool()
+        if (
+            kb_schema
+            and get_kb_sparse_method(kb, kb_schema) == "bm25"
+            and sparse_pool.enabled
+            and len(chunks) >= settings.SPARSE_ENCODE_POOL_MIN_TEXTS
+        ):
+            try:
+                sparse_vectors = await sparse_pool.encode_documents(get_bm25_model_path(), chunks)
+                logger.info(f"为 {len(chunks)} 个chunk生成了稀疏向量（进程池）")
+                return sparse_vectors
+            except Exception as e:
+                logger.warning(f"稀疏编码进程池失败，回退到工作线程: {e}")
         
-        # 检查schema中是否配置了稀疏向量字段
-        has_sparse_vector_field = False
-        sparse_vector_method = None
+        # 稀疏编码是CPU密集型操作，放到工作线程中执行，避免阻塞事件循环
+        return await asyncio.to_thread(self._encode_sparse_vectors_sync, kb, kb_schema, chunks)
+    
+    def _encode_sparse_vectors_sync(
+        self,
+        kb: Any,
+        kb_schema: Optional[Dict[str, Any]],
+        chunks: List[str]
+    ) -> List[Dict[str, Any]]:
+        """生成稀疏向量（同步实现，在工作线程中运行）"""
+        sparse_vectors = []
         
-        if kb_schema:
-            for field in kb_schema.get("fields", []):
-                if field.get("type") == "sparse_vector":
-                    has_sparse_vector_field = True
-                    # 从字段配置中获取生成方法，默认为 bm25
-                    sparse_vector_method = field.get("method", "bm25")
-                    break
+        # 检查schema中是否配置了稀疏向量字段，以及字段配置的生成方法
+        sparse_vector_method = get_kb_sparse_method(kb, kb_schema) if kb_schema else None
         
         # 如果配置了稀疏向量字段，生成稀疏向量
-        if has_sparse_vector_field and sparse_vector_method:
+        if sparse_vector_method:
             try:
-                # 创建稀疏向量服务
-                # BM25需要model_path参数，使用通用函数获取
-                from app.services.sparse_vector_service import get_bm25_model_path
-                
-                model_path = None
-                if sparse_vector_method == "bm25":
-                    model_path = get_bm25_model_path()
+                # 从注册表获取该方法对应的稀疏向量服务（按需加载）
+                sparse_service = SparseVectorServiceFactory.create(sparse_vector_method, kb_id=kb.id)
                 
-                sparse_service = SparseVectorServiceFactory.create(
-                    sparse_vector_method,
-                    model_path=model_path
-                )
+                if sparse_vector_method == "bm25_kb":
+                    # 知识库语料拟合的BM25：先用本批分块更新语料统计，再编码
+                    sparse_vectors = to_sparse_arrays(sparse_service.fit_documents(chunks))
+                    logger.info(f"为 {len(chunks)} 个chunk生成了稀疏向量（知识库BM25 v{sparse_service.version}）")
+                    return sparse_vectors
                 
-                # 为每个chunk生成稀疏向量
-                # BM25SparseVectorService使用预训练模型，不需要先添加文档到语料库
-                for chunk_content in chunks:
-                    sparse_vector_dict = sparse_service.generate_document_sparse_vector(chunk_content)
-                    # 转换为Qdrant格式
-                    qdrant_format = sparse_service.convert_to_qdrant_format(sparse_vector_dict)
-                    sparse_vectors.append(qdrant_format)
+                # 整批编码，直接得到 indices/values 数组
+                sparse_vectors = sparse_service.encode_documents_batch(chunks)
                 
                 logger.info(f"为 {len(chunks)} 个chunk生成了稀疏向量")
             except Exception as e:
@@ -177,7 +202,8 @@ class IndexWritingService:
         kb_id: str,
         chunks: List[str],
         metadata_list: Optional[List[Dict[str, Any]]],
-        kb_schema: Optional[Dict[str, Any]]
+        kb_schema: Optional[Dict[str, Any]],
+        offset: int = 0
     ) -> List[Dict[str, Any]]:
         """
         准备元数据
@@ -187,6 +213,7 @@ class IndexWritingService:
             chunks: 文本分块列表
             metadata_list: 可选的元数据列表
             kb_schema: 知识库schema配置
+            offset: 当前批次在整体输入中的起始序号（用于生成默认chunk_id）
         
         Returns:
             元数据列表
@@ -208,7 +235,7 @@ class IndexWritingService:
             if "char_count" not in metadata:
                 metadata["char_count"] = len(chunk)
             if "chunk_id" not in metadata:
-                metadata["chunk_id"] = f"chunk_{i}"
+                metadata["chunk_id"] = f"chunk_{offset + i}"
             
             # 根据schema添加字段
             for field in schema_fields:
@@ -245,7 +272,8 @@ class IndexWritingService:
         sparse_vectors: List[Dict[str, Any]],
         chunks: List[str],
         kb_schema: Optional[Dict[str, Any]],
-        metadata_list: Optional[List[Dict[str, Any]]] = None
+        metadata_list: Optional[List[Dict[str, Any]]] = None,
+        offset: int = 0
     ) -> Tuple[List[Dict[str, Any]], List[Any]]:
         """
         准备向量数据
@@ -256,6 +284,7 @@ class IndexWritingService:
             chunks: 文本分块列表
             kb_schema: 知识库schema配置
             metadata_list: 可选的元数据列表
+            offset: 当前批次在整体输入中的起始序号（用于生成默认ID）
         
         Returns:
             (向量数据列表, ID列表)
@@ -300,6 +329,9 @@ class IndexWritingService:
                             vector_data[sparse_field_name] = sparse_data["qdrant_format"]
                         elif "indices" in sparse_data and "values" in sparse_data:
                             vector_data[sparse_field_name] = sparse_data
+                    # {词或下标: 权重} 格式，按统一的哈希规则转换
+                    else:
+                        vector_data[sparse_field_name] = to_sparse_arrays([sparse_vector])[0]
                 else:
                     # 其他格式，尝试直接使用
                     vector_data[sparse_field_name] = sparse_vector
@@ -307,7 +339,7 @@ class IndexWritingService:
             vectors.append(vector_data)
             
             # 生成ID：优先使用metadata_list中的chunk_id，否则使用索引
-            chunk_id = f"chunk_{i}"
+            chunk_id = f"chunk_{offset + i}"
             if metadata_list and i < len(metadata_list):
                 metadata = metadata_list[i]
                 if "chunk_id" in metadata:
@@ -0,0 +1,447 @@
+"""
+流式索引写入流水线
+解析 → 分块 → 稠密嵌入 → 稀疏编码 → 向量写入 各阶段通过有界队列串联并发运行
+"""
+
+from typing import List, Dict, Any, Optional, Callable, Awaitable, AsyncIterator, Iterator
+from dataclasses import dataclass, field
+import asyncio
+import uuid
+import logging
+
+from app.config import settings
+from app.models.document import Document, DocumentChunk, Chunk
+from app.repositories.factory import RepositoryFactory
+from app.services.knowledge_base import KnowledgeBaseService
+from app.services.index_writing_service import IndexWritingService
+from app.services.document_processor import DocumentProcessor
+from app.services.chunking_engine import StreamingChunker
+from app.services.document_parse_pool import DocumentParsePool
+from app.services.token_cache_service import get_token_cache_service
+from app.services.sparse_vector_service import SparseVectorServiceFactory
+from app.core.exceptions import NotFoundException
+
+logger = logging.getLogger(__name__)
+
+# 队列结束标记
+_SENTINEL = object()
+
+# 已有文档内容送入分块器时的分段长度（字符，在此长度之前最近的换行处切分）
+_TEXT_SEGMENT_CHARS = 1 << 20
+
+Emit = Callable[[Any], Awaitable[None]]
+
+
+def _split_lines(text: str, max_chars: int) -> Iterator[str]:
+    """
+    在行边界处把文本切成约max_chars长的段，不在词或句子中间切断
+    
+    Args:
+        text: 文本
+        max_chars: 每段的目标长度（单行超过该长度时整行作为一段）
+    
+    Yields:
+        以换行结尾的段（最后一段除外）
+    """
+    start = 0
+    while len(text) - start > max_chars:
+        cut = text.rfind("\n", start, start + max_chars)
+        if cut < 0:
+            cut = text.find("\n", start + max_chars)
+            if cut < 0:
+                break
+        yield text[start:cut + 1]
+        start = cut + 1
+    if start < len(text):
+        yield text[start:]
+
+
+@dataclass
+class ChunkBatch:
+    """流水线中流转的一批分块"""
+    offset: int
+    texts: List[str]
+    metadatas: List[Dict[str, Any]]
+    dense_vectors: Optional[List[List[float]]] = None
+    sparse_vectors: Optional[List[Dict[str, Any]]] = None
+    chunk_records: List[DocumentChunk] = field(default_factory=list)
+
+
+class IngestionPipeline:
+    """
+    流式索引写入流水线
+    
+    各阶段之间使用有界队列（asyncio.Queue(maxsize)）连接：下游变慢时上游在put处等待，
+    因此同时驻留内存的分块数上限约为 阶段数 × 队列深度 × 批大小，与语料规模无关；
+    嵌入服务和向量库在不同批次上同时工作，而不是串行轮流。
+    """
+    
+    def __init__(
+        self,
+        kb_id: str,
+        batch_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        embed_workers: Optional[int] = None,
+        sparse_workers: Optional[int] = None,
+        upsert_workers: Optional[int] = None
+    ):
+        """
+        初始化流水线
+        
+        Args:
+            kb_id: 知识库ID
+            batch_size: 每批分块数（默认 INGESTION_BATCH_SIZE）
+            queue_size: 阶段间队列深度（默认 INGESTION_QUEUE_SIZE）
+            embed_workers: 嵌入阶段并发数（默认 INGESTION_EMBED_WORKERS）
+            sparse_workers: 稀疏编码阶段并发数（默认 INGESTION_SPARSE_WORKERS）
+            upsert_workers: 写入阶段并发数（默认 INGESTION_UPSERT_WORKERS）
+        """
+        self.kb_id = kb_id
+        self.batch_size = max(1, batch_size or settings.INGESTION_BATCH_SIZE)
+        self.queue_size = max(1, queue_size or settings.INGESTION_QUEUE_SIZE)
+        self.embed_workers = max(1, embed_workers or settings.INGESTION_EMBED_WORKERS)
+        self.sparse_workers = max(1, sparse_workers or settings.INGESTION_SPARSE_WORKERS)
+        self.upsert_workers = max(1, upsert_workers or settings.INGESTION_UPSERT_WORKERS)
+        
+        self.kb_service = KnowledgeBaseService()
+        self.index_writing_service = IndexWritingService()
+        self.chunk_repo = RepositoryFactory.create_document_chunk_repository()
+        self.token_cache = get_token_cache_service()
+        self.parse_pool = DocumentParsePool()
+        
+        self.kb = None
+        self.kb_schema: Optional[Dict[str, Any]] = None
+        self._collection_lock = asyncio.Lock()
+        self._collection_ready = False
+        
+        # 统计信息
+        self.written_count = 0
+        self.batch_count = 0
+        self.has_dense = False
+        self.has_sparse = False
+        self.document_chunk_counts: Dict[str, int] = {}
+    
+    async def run_texts(
+        self,
+        texts: List[str],
+        metadata_list: Optional[List[Dict[str, Any]]] = None,
+        dense_vectors: Optional[List[List[float]]] = None,
+        sparse_vectors: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        将已分块的文本写入索引（嵌入 → 稀疏编码 → 写入）
+        
+        Args:
+            texts: 文本分块列表
+            metadata_list: 可选的元数据列表
+            dense_vectors: 可选的稠密向量（提供则跳过嵌入）
+            sparse_vectors: 可选的稀疏向量（提供则跳过稀疏编码）
+        
+        Returns:
+            写入结果字典（与 IndexWritingService.write_chunks_to_index 一致）
+        """
+        await self._load_context()
+        
+        async def source(emit: Emit):
+            for start in range(0, len(texts), self.batch_size):
+                end = start + self.batch_size
+                await emit(ChunkBatch(
+                    offset=start,
+                    texts=texts[start:end],
+                    metadatas=metadata_list[start:end] if metadata_list else [],
+                    dense_vectors=dense_vectors[start:end] if dense_vectors else None,
+                    sparse_vectors=sparse_vectors[start:end] if sparse_vectors is not None else None
+                ))
+        
+        await self._run(source, self._index_stages())
+        
+        return self._build_result()
+    
+    async def run_documents(
+        self,
+        documents: List[Document],
+        chunk_method: Optional[str] = None,
+        **chunk_kwargs
+    ) -> Dict[str, Any]:
+        """
+        处理文档（解析 → 分块 → 嵌入 → 稀疏编码 → 写入），并写入分块记录
+        
+        Args:
+            documents: 文档列表
+            chunk_method: 分块方法（默认使用知识库的chunk_method）
+            **chunk_kwargs: 分块参数（默认使用知识库的chunk_size/chunk_overlap/chunking_config）
+        
+        Returns:
+            写入结果字典，document_chunk_counts 为每个文档的分块数
+        """
+        await self._load_context()
+        
+        chunk_method = chunk_method or self.kb.chunk_method
+        for key, value in (self.kb.chunking_config or {}).items():
+            chunk_kwargs.setdefault(key, value)
+        chunk_kwargs.setdefault("chunk_size", self.kb.chunk_size)
+        chunk_kwargs.setdefault("chunk_overlap", self.kb.chunk_overlap)
+        chunk_kwargs.setdefault("tokenizer_model", self.kb.embedding_model)
+        # semantic分块使用知识库的嵌入模型
+        chunk_kwargs.setdefault("embedding_provider", self.kb.embedding_provider)
+        chunk_kwargs.setdefault("embedding_model", self.kb.embedding_model)
+        chunk_kwargs.setdefault("embedding_endpoint", self.kb.embedding_endpoint)
+        offset_counter = [0]
+        
+        async def source(emit: Emit):
+            for document in documents:
+                await emit(document)
+        
+        async def emit_chunks(document: Document, chunks: List[Chunk], emit: Emit):
+            await asyncio.to_thread(
+                DocumentProcessor.fill_token_counts, chunks, chunk_kwargs["tokenizer_model"]
+            )
+            batch = ChunkBatch(offset=offset_counter[0], texts=[], metadatas=[])
+            for item_chunk in chunks:
+                if not item_chunk.content:
+                    continue
+                record = DocumentChunk(
+                    id=f"chunk_{uuid.uuid4().hex[:12]}",
+                    document_id=document.id,
+                    kb_id=self.kb_id,
+                    content=item_chunk.content,
+                    chunk_index=item_chunk.index,
+                    start_pos=item_chunk.start_pos,
+                    end_pos=item_chunk.end_pos,
+                    token_count=item_chunk.token_count,
+                    embedding_model=self.kb.embedding_model,
+                    metadata=item_chunk.metadata or {}
+                )
+                batch.chunk_records.append(record)
+                batch.texts.append(item_chunk.content)
+                batch.metadatas.append({
+                    "document_id": document.id,
+                    "chunk_id": record.id,
+                    "chunk_index": item_chunk.index,
+                    "content": item_chunk.content,
+                    "char_count": item_chunk.char_count,
+                    "source": (document.metadata or {}).get("source", "upload"),
+                    "external_id": document.external_id or "",
+                })
+            if batch.texts:
+                offset_counter[0] += len(batch.texts)
+                self.document_chunk_counts[document.id] = (
+                    self.document_chunk_counts.get(document.id, 0) + len(batch.texts)
+                )
+                await emit(batch)
+        
+        async def chunk(document: Document, emit: Emit):
+            self.document_chunk_counts[document.id] = 0
+            
+            if chunk_method != "fixed_size":
+                text = document.content or await self.parse_pool.parse_file(document.file_path)
+                chunks = await DocumentProcessor.chunk_document_async(text, chunk_method, **chunk_kwargs)
+                for start in range(0, len(chunks), self.batch_size):
+                    await emit_chunks(document, chunks[start:start + self.batch_size], emit)
+                return
+            
+            # 固定大小分块：解析结果按页流入分块器，攒够一批即向下游发送，不持有全文
+            chunker = StreamingChunker(
+                chunk_size=chunk_kwargs["chunk_size"],
+                chunk_overlap=chunk_kwargs["chunk_overlap"],
+                size_unit=chunk_kwargs.get("size_unit", "chars"),
+                tokenizer_model=chunk_kwargs["tokenizer_model"]
+            )
+            # 各段都在行边界处切分，逐段清理后以换行相连，与整体清理的结果一致
+            pending: List[Chunk] = []
+            separator = ""
+            async for segment in self._iter_document_text(document):
+                cleaned = DocumentProcessor.parse_text(segment)
+                if not cleaned:
+                    continue
+                pending.extend(await asyncio.to_thread(chunker.feed, separator + cleaned))
+                separator = "\n"
+                while len(pending) >= self.batch_size:
+                    await emit_chunks(document, pending[:self.batch_size], emit)
+                    pending = pending[self.batch_size:]
+            pending.extend(chunker.finish())
+            for start in range(0, len(pending), self.batch_size):
+                await emit_chunks(document, pending[start:start + self.batch_size], emit)
+        
+        stages = [(chunk, 1)] + self._index_stages()
+        await self._run(source, stages)
+        
+        result = self._build_result()
+        result["document_chunk_counts"] = dict(self.document_chunk_counts)
+        return result
+    
+    # ========== 阶段实现 ==========
+    
+    async def _iter_document_text(self, document: Document) -> AsyncIterator[str]:
+        """按段产出文档文本：已有内容在行边界处切段，否则由解析进程池按页解析"""
+        if document.content:
+            for segment in _split_lines(document.content, _TEXT_SEGMENT_CHARS):
+                yield segment
+            return
+        async for page in self.parse_pool.iter_pages(document.file_path):
+            yield page
+    
+    def _index_stages(self) -> List[tuple]:
+        """嵌入 → 稀疏编码 → 写入 三个阶段"""
+        return [
+            (self._embed_stage, self.embed_workers),
+            (self._sparse_stage, self.sparse_workers),
+            (self._upsert_stage, self.upsert_workers),
+        ]
+    
+    async def _embed_stage(self, batch: ChunkBatch, emit: Emit):
+        """稠密嵌入阶段"""
+        if batch.dense_vectors is None:
+            batch.dense_vectors = await self.index_writing_service._generate_dense_embeddings(
+                self.kb, batch.texts
+            )
+        await emit(batch)
+    
+    async def _sparse_stage(self, batch: ChunkBatch, emit: Emit):
+        """稀疏编码阶段（编码在工作线程或稀疏编码进程池中执行，与嵌入阶段的其他批次并行）"""
+        if batch.sparse_vectors is None:
+            batch.sparse_vectors = await self.index_writing_service._generate_sparse_vectors(
+                self.kb, self.kb_schema, batch.texts
+            )
+        await emit(batch)
+    
+    async def _upsert_stage(self, batch: ChunkBatch, emit: Emit):
+        """向量写入阶段"""
+        service = self.index_writing_service
+        
+        # 首个批次确定维度后创建集合，之后不再重复检查
+        if not self._collection_ready:
+            async with self._collection_lock:
+                if not self._collection_ready:
+                    await service._ensure_collection_exists(
+                        self.kb, self.kb_schema, self.kb_id, batch.dense_vectors
+                    )
+                    self._collection_ready = True
+        
+        metadatas = service._prepare_metadata(
+            self.kb_id, batch.texts, batch.metadatas, self.kb_schema, offset=batch.offset
+        )
+        vectors, ids = service._prepare_vectors(
+            batch.dense_vectors or [], batch.sparse_vectors or [], batch.texts,
+            self.kb_schema, batch.metadatas, offset=batch.offset
+        )
+        await service._write_to_vector_db(self.kb, self.kb_id, vectors, metadatas, ids)
+        
+        if batch.chunk_records:
+            for record in batch.chunk_records:
+                record.vector_id = record.id
+                record.is_indexed = True
+            _, failed_records = await self.chunk_repo.bulk_create(batch.chunk_records)
+            if failed_records:
+                logger.warning(f"{len(failed_records)} 个分块记录写入失败: {failed_records[:3]}")
+            
+            # 缓存分词结果，关键词检索和词频统计不再重复分词
+            try:
+                await self.token_cache.index_chunks(
+                    self.kb_id,
+                    [record.id for record in batch.chunk_records],
+                    [record.content for record in batch.chunk_records]
+                )
+            except Exception as e:
+                logger.warning(f"写入分块token缓存失败（检索时将重新分词）: {e}")
+        
+        self.written_count += len(vectors)
+        self.batch_count += 1
+        self.has_dense = self.has_dense or bool(batch.dense_vectors)
+        self.has_sparse = self.has_sparse or bool(batch.sparse_vectors)
+    
+    # ========== 流水线调度 ==========
+    
+    async def _load_context(self):
+        """加载知识库配置和schema（整个流水线只加载一次）"""
+        if self.kb is not None:
+            return
+        self.kb = await self.kb_service.get_knowledge_base(self.kb_id)
+        if not self.kb:
+            raise NotFoundException(message=f"知识库不存在: {self.kb_id}")
+        self.kb_schema = await self.kb_service.get_knowledge_base_schema(self.kb_id)
+    
+    async def _run(
+        self,
+        source: Callable[[Emit], Awaitable[None]],
+        stages: List[tuple]
+    ):
+        """
+        启动数据源和所有阶段，任一阶段异常时取消其余阶段并抛出
+        
+        Args:
+            source: 数据源协程函数，通过emit向第一个队列投递
+            stages: [(handler, workers), ...]，handler(item, emit)
+        """
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in stages]
+        
+        tasks = [asyncio.create_task(self._run_source(source, queues[0]))]
+        for i, (handler, workers) in enumerate(stages):
+            out_queue = queues[i + 1] if i + 1 < len(queues) else None
+            tasks.append(asyncio.create_task(
+                self._run_stage(queues[i], out_queue, handler, workers)
+            ))
+        
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 知识库BM25的语料统计按间隔写盘，流水线结束时写入剩余增量
+            try:
+                await asyncio.to_thread(SparseVectorServiceFactory.flush_kb_model, self.kb_id)
+            except Exception as e:
+                logger.warning(f"保存知识库BM25语料统计失败: kb_id={self.kb_id}, error={e}")
+        
+        logger.info(
+            f"流水线写入完成: kb_id={self.kb_id}, 批次数={self.batch_count}, 向量数={self.written_count}"
+        )
+    
+    @staticmethod
+    async def _run_source(source: Callable[[Emit], Awaitable[None]], out_queue: asyncio.Queue):
+        """运行数据源，结束后投递结束标记"""
+        await source(out_queue.put)
+        await out_queue.put(_SENTINEL)
+    
+    @staticmethod
+    async def _run_stage(
+        in_queue: asyncio.Queue,
+        out_queue: Optional[asyncio.Queue],
+        handler: Callable[[Any, Emit], Awaitable[None]],
+        workers: int
+    ):
+        """运行一个阶段的多个worker，全部结束后向下游投递结束标记"""
+        async def discard(_item):
+            return None
+        
+        emit = out_queue.put if out_queue is not None else discard
+        
+        async def worker():
+            while True:
+                item = await in_queue.get()
+                if item is _SENTINEL:
+                    # 放回结束标记，通知同阶段的其他worker
+                    await in_queue.put(_SENTINEL)
+                    return
+                await handler(item, emit)
+        
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        
+        if out_queue is not None:
+            await out_queue.put(_SENTINEL)
+    
+    def _build_result(self) -> Dict[str, Any]:
+        """构建写入结果"""
+        return {
+            "kb_id": self.kb_id,
+            "written_count": self.written_count,
+            "batch_count": self.batch_count,
+            "has_dense": self.has_dense,
+            "has_sparse": self.has_sparse,
+            "status": "success"
+        }
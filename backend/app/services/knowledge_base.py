@@ -240,6 +240,12 @@ class KnowledgeBaseService:
             if schema_file.exists():
                 schema_file.unlink()
         
+        # 删除分块token缓存和知识库BM25模型
+        from app.services.token_cache_service import get_token_cache_service
+        from app.services.sparse_vector_service import SparseVectorServiceFactory
+        await get_token_cache_service().drop_knowledge_base(kb_id)
+        await asyncio.to_thread(SparseVectorServiceFactory.drop_kb_model, kb_id)
+        
         return await self.repository.delete(kb_id)
     
     async def get_knowledge_base_stats(self, kb_id: str) -> dict:
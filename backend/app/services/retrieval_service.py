@@ -8,10 +8,12 @@ from collections import defaultdict
 import logging
 import math
 
+import numpy as np
+
 # 添加导入
 from app.services.knowledge_base import KnowledgeBaseService
 from app.services.vector_db_service import VectorDBServiceFactory, QdrantService
-from app.services.sparse_vector_service import SparseVectorServiceFactory
+from app.services.sparse_vector_service import SparseVectorServiceFactory, get_kb_sparse_method
 from app.models.knowledge_base import VectorDBType
 from app.models.retrieval import RetrievalResult
 
@@ -223,18 +225,9 @@ class RetrievalService:
         
         # 2. 如果没有提供稀疏向量，生成稀疏向量
         if query_sparse_vector is None:
-            sparse_method = kb.vector_db_config.get("sparse_method", "bm25") if kb.vector_db_config else "bm25"
-            
-            # 获取BM25模型路径（如果需要）
-            model_path = None
-            if sparse_method == "bm25":
-                from app.services.sparse_vector_service import get_bm25_model_path
-                model_path = get_bm25_model_path()
-            
-            sparse_service = SparseVectorServiceFactory.create(
-                sparse_method,
-                model_path=model_path if sparse_method == "bm25" else None
-            )
+            # 使用与索引时相同的稀疏向量方法（schema字段method，其次vector_db_config.sparse_method）
+            kb_schema = await self.kb_service.get_knowledge_base_schema(kb_id)
+            sparse_service = SparseVectorServiceFactory.create(get_kb_sparse_method(kb, kb_schema) or "bm25", kb_id=kb_id)
             query_sparse_dict = sparse_service.generate_query_sparse_vector(query)
             converted_sparse = sparse_service.convert_to_qdrant_format(query_sparse_dict)
             # 确保是字典类型
@@ -385,36 +378,21 @@ class RetrievalService:
         # 5. 初始化BM25算法
         bm25 = BM25()
         
-        # 6. 计算文档频率和平均文档长度
-        doc_freq = defaultdict(int)
-        total_docs = len(all_chunks)
-        total_length = 0
-        
-        # 为每个分块分词并统计词频
-        chunk_tokens = {}
-        for chunk in all_chunks:
-            from app.services.tokenizer_service import get_tokenizer_service
-            tokenizer = get_tokenizer_service()
-            tokens = tokenizer.tokenize(chunk.content)
-            chunk_tokens[chunk.id] = tokens
-            total_length += len(tokens)
-            
-            # 统计包含每个词的文档数
-            unique_tokens = set(tokens)
-            for token in unique_tokens:
-                doc_freq[token] += 1
-        
-        avg_doc_length = total_length / total_docs if total_docs > 0 else 0
+        # 6. 读取分块的分词结果（索引时已缓存，未缓存的分块即时分词并补写）
+        from app.services.token_cache_service import get_token_cache_service
+        token_table = await get_token_cache_service().get_table(
+            kb_id,
+            [chunk.id for chunk in all_chunks],
+            [chunk.content for chunk in all_chunks]
+        )
         
         # 7. 计算每个分块的BM25分数
-        scores = []
-        for chunk in all_chunks:
-            chunk_id = chunk.id
-            tokens = chunk_tokens.get(chunk_id, [])
-            score = bm25.score(query_tokens, tokens, doc_freq, total_docs, avg_doc_length)
-            
-            if score >= score_threshold:
-                scores.append((chunk_id, score))
+        chunk_scores = bm25.score_table(query_tokens, token_table)
+        scores = [
+            (chunk.id, float(score))
+            for chunk, score in zip(all_chunks, chunk_scores.tolist())
+            if score >= score_threshold
+        ]
         
         # 8. 按分数排序
         scores.sort(key=lambda x: x[1], reverse=True)
@@ -556,19 +534,9 @@ class RetrievalService:
         
         # 5. 如果没有提供稀疏向量，但知识库配置了稀疏向量字段，则尝试生成稀疏向量
         if query_sparse_vector is None:
-            # 生成BM25稀疏向量
-            from app.services.sparse_vector_service import SparseVectorServiceFactory, get_bm25_model_path
-            
-            # todo service_type从kb配置来 目前仅支持bm25
-            service_type = "bm25"
-            
-            # 获取BM25模型路径
-            model_path = get_bm25_model_path()
-            
-            sparse_service = SparseVectorServiceFactory.create(
-                service_type="bm25",
-                model_path=model_path
-            )
+            # 按知识库配置的稀疏向量方法生成查询稀疏向量
+            kb_schema = await self.kb_service.get_knowledge_base_schema(kb_id)
+            sparse_service = SparseVectorServiceFactory.create(get_kb_sparse_method(kb, kb_schema) or "bm25", kb_id=kb_id)
             
             sparse_vector = sparse_service.generate_query_sparse_vector(query=query)
             query_sparse_vector = sparse_service.convert_to_qdrant_format(sparse_vector) # pyright: ignore[reportAssignmentType]
@@ -780,6 +748,45 @@ class BM25:
             score += idf * norm_tf
         
         return score
+    
+    def score_table(self, query_tokens: List[str], token_table) -> np.ndarray:
+        """
+        批量计算一组分块的BM25分数（与 score 逐分块计算的结果一致）
+        
+        Args:
+            query_tokens: 查询分词
+            token_table: 分块token数据（ChunkTokenTable）
+            
+        Returns:
+            与 token_table.chunk_ids 对应的分数数组
+        """
+        total_docs = len(token_table.chunk_ids)
+        scores = np.zeros(total_docs, dtype=np.float64)
+        query_ids = token_table.lookup(query_tokens)
+        if total_docs == 0 or len(query_ids) == 0:
+            return scores
+        
+        # 查询中重复出现的词按出现次数累加
+        query_weight = np.bincount(query_ids, minlength=len(token_table.vocab)).astype(np.float64)
+        
+        doc_lengths = token_table.lengths
+        avg_doc_length = doc_lengths.mean() or 1.0
+        doc_freq = token_table.doc_freq()
+        
+        # 只处理命中查询词的 (分块, 词) 项
+        hit = query_weight[token_table.term_ids] > 0
+        rows = np.repeat(np.arange(total_docs), np.diff(token_table.term_indptr))[hit]
+        term_ids = token_table.term_ids[hit]
+        tf = token_table.term_counts[hit].astype(np.float64)
+        
+        df = doc_freq[term_ids]
+        idf = np.log((total_docs - df + 0.5) / (df + 0.5) + 1.0)
+        norm_tf = (tf * (self.k1 + 1)) / (
+            tf + self.k1 * (1 - self.b + self.b * doc_lengths[rows] / avg_doc_length)
+        )
+        
+        np.add.at(scores, rows, idf * norm_tf * query_weight[term_ids])
+        return scores
 
 
 class VectorSimilarity:
@@ -0,0 +1,124 @@
+"""
+语义分块
+按句子批量嵌入，用相邻句向量的余弦距离确定断点，再在token预算内合并句子
+"""
+
+from typing import List, Optional
+import logging
+
+import numpy as np
+
+from app.models.document import Chunk
+from app.services.chunking_engine import BoundaryScanner, StreamingChunker
+from app.services.embedding_service import BaseEmbeddingService
+
+logger = logging.getLogger(__name__)
+
+
+async def embed_in_batches(
+    embedding_service: BaseEmbeddingService,
+    texts: List[str],
+    batch_size: int
+) -> np.ndarray:
+    """
+    分批嵌入文本并返回L2归一化后的矩阵
+    
+    Args:
+        embedding_service: 嵌入服务
+        texts: 文本列表
+        batch_size: 每批文本数
+    
+    Returns:
+        形状为 (len(texts), dim) 的矩阵
+    """
+    vectors: List[List[float]] = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(await embedding_service.embed_texts(texts[start:start + batch_size]))
+    
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def find_breakpoints(embeddings: np.ndarray, breakpoint_percentile: float) -> np.ndarray:
+    """
+    计算相邻句子的语义断点
+    
+    Args:
+        embeddings: 归一化后的句向量矩阵
+        breakpoint_percentile: 距离分位数阈值（0-100），高于该分位的相邻距离视为断点
+    
+    Returns:
+        断点句子下标数组（在该句之后切分）
+    """
+    if len(embeddings) < 2:
+        return np.array([], dtype=np.int64)
+    
+    # 相邻句向量的余弦距离（向量已归一化，点积即余弦相似度）
+    distances = 1.0 - np.einsum("ij,ij->i", embeddings[:-1], embeddings[1:])
+    threshold = np.percentile(distances, breakpoint_percentile)
+    return np.flatnonzero(distances > threshold)
+
+
+async def chunk_by_semantic(
+    text: str,
+    embedding_service: BaseEmbeddingService,
+    chunk_size: int = 512,
+    size_unit: str = "tokens",
+    tokenizer_model: Optional[str] = None,
+    breakpoint_percentile: float = 95.0,
+    buffer_size: int = 1,
+    embed_batch_size: int = 256
+) -> List[Chunk]:
+    """
+    语义分块
+    
+    Args:
+        text: 输入文本
+        embedding_service: 嵌入服务
+        chunk_size: 分块大小上限（以size_unit计）
+        size_unit: 大小单位 (chars, estimated_tokens, tokens)
+        tokenizer_model: tokens单位时使用的嵌入模型名称
+        breakpoint_percentile: 断点距离分位数（0-100）
+        buffer_size: 嵌入时拼接的前后句数，用于平滑单句噪声
+        embed_batch_size: 每批嵌入的句子数
+    
+    Returns:
+        分块列表
+    """
+    scanner = BoundaryScanner()
+    sentences = [
+        (start, sentence) for start, sentence in scanner.feed(text) + scanner.finish()
+        if sentence.strip()
+    ]
+    if not sentences:
+        return []
+    
+    # 每句与前后buffer_size句拼接后嵌入
+    contents = [sentence.strip() for _, sentence in sentences]
+    windows = [
+        ''.join(contents[max(0, i - buffer_size):i + buffer_size + 1])
+        for i in range(len(contents))
+    ]
+    embeddings = await embed_in_batches(embedding_service, windows, embed_batch_size)
+    breakpoints = set(find_breakpoints(embeddings, breakpoint_percentile).tolist())
+    
+    # 断点处强制切分，断点之间在大小预算内合并句子（超出预算时在句子边界切分）
+    chunker = StreamingChunker(
+        chunk_size=chunk_size,
+        chunk_overlap=0,
+        size_unit=size_unit,
+        tokenizer_model=tokenizer_model,
+        max_backtrack=chunk_size,
+        chunk_method="semantic"
+    )
+    chunks: List[Chunk] = []
+    for i, unit in enumerate(sentences):
+        chunks.extend(chunker.add_units([unit]))
+        if i in breakpoints:
+            chunks.extend(chunker.flush())
+    chunks.extend(chunker.flush())
+    
+    logger.info(f"语义分块完成: {len(sentences)} 个句子, {len(breakpoints)} 个断点, {len(chunks)} 个分块")
+    return chunks
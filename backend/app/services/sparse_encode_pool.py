@@ -0,0 +1,137 @@
+"""
+稀疏编码进程池
+预训练BM25（dashtext）的分词和编码是纯Python的CPU密集型操作，受GIL限制；
+大批量索引时按片分发到多个进程，每个进程启动时预加载默认模型，结果以NumPy数组回传
+"""
+
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
+import logging
+
+import numpy as np
+
+from app.config import settings
+from app.core.singleton import singleton
+from app.services.cpu_pools import start_workers, pool_workers
+
+logger = logging.getLogger(__name__)
+
+
+# ========== 子进程中执行的函数（需为模块级函数以便序列化） ==========
+
+# 子进程内已加载的编码器 {模型路径: 编码器}
+_worker_encoders: Dict[str, Any] = {}
+
+
+def _load_encoder(model_path: str) -> Any:
+    """加载（或复用子进程内已加载的）编码器"""
+    encoder = _worker_encoders.get(model_path)
+    if encoder is None:
+        from dashtext import SparseVectorEncoder
+        encoder = SparseVectorEncoder()
+        encoder.load(path=model_path)
+        _worker_encoders[model_path] = encoder
+    return encoder
+
+
+def _init_sparse_worker(preload_paths: List[str]):
+    """子进程初始化：预加载默认BM25模型，每个进程只执行一次"""
+    for model_path in preload_paths:
+        try:
+            _load_encoder(model_path)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"稀疏编码进程预加载模型失败: {model_path}, {e}")
+
+
+def _encode_slice(model_path: str, texts: List[str]) -> List[Dict[str, np.ndarray]]:
+    """在子进程中编码一片文档（预加载以外的模型在首次使用时加载，之后复用）"""
+    from app.services.sparse_hashing import to_sparse_arrays
+    
+    return to_sparse_arrays(_load_encoder(model_path).encode_documents(texts))
+
+
+@singleton
+class SparseEncodePool:
+    """稀疏编码进程池服务"""
+    
+    def __init__(self):
+        self.max_workers = pool_workers("sparse_encode")
+        self.slice_size = max(1, settings.SPARSE_ENCODE_SLICE_SIZE)
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    @property
+    def enabled(self) -> bool:
+        """进程数为1时不使用进程池"""
+        return self.max_workers > 1
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """懒加载进程池（使用spawn，避免在多线程进程中fork）"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_sparse_worker,
+                initargs=(self._preload_paths(),)
+            )
+        return self._executor
+    
+    @staticmethod
+    def _preload_paths() -> List[str]:
+        """子进程启动时预加载的模型（默认BM25模型，不存在时不预加载）"""
+        from app.services.sparse_vector_service import get_bm25_model_path
+        try:
+            return [get_bm25_model_path()]
+        except ValueError:
+            return []
+    
+    async def warm_up(self) -> int:
+        """
+        预先启动全部进程并加载默认模型
+        
+        Returns:
+            已启动的进程数（不使用进程池时为0）
+        """
+        if not self.enabled:
+            return 0
+        return await start_workers(self._get_executor(), self.max_workers)
+    
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+    
+    async def encode_documents(self, model_path: str, texts: List[str]) -> List[Dict[str, np.ndarray]]:
+        """
+        批量编码文档
+        
+        Args:
+            model_path: BM25模型文件路径
+            texts: 文档文本列表
+        
+        Returns:
+            稀疏向量列表 [{"indices": uint32数组, "values": float32数组}, ...]
+        
+        Raises:
+            RuntimeError: 子进程异常退出
+        """
+        if not texts:
+            return []
+        
+        # 按片均分到各进程，每片不超过 slice_size
+        slice_size = min(self.slice_size, -(-len(texts) // self.max_workers))
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, _encode_slice, model_path, texts[start:start + slice_size])
+                for start in range(0, len(texts), slice_size)
+            ])
+        except BrokenProcessPool as e:
+            self._executor = None
+            raise RuntimeError(f"稀疏编码进程异常退出: {e}") from e
+        
+        return [vector for result in results for vector in result]
@@ -0,0 +1,117 @@
+"""
+稀疏向量词下标映射
+所有稀疏向量路径共用：词 → 下标使用固定种子的CRC32（与进程、重启和PYTHONHASHSEED无关），
+{词/下标: 权重} → indices/values 数组的转换整批向量化完成
+"""
+
+from typing import List, Dict, Iterable, Union
+import itertools
+import zlib
+
+import numpy as np
+
+# 稀疏向量下标与权重的数组类型（Qdrant稀疏向量下标为32位无符号整数）
+SPARSE_INDEX_DTYPE = np.uint32
+SPARSE_VALUE_DTYPE = np.float32
+
+# 哈希种子（CRC32初始值）。修改后已写入的稀疏向量与新查询不再匹配，需要重建索引
+SPARSE_HASH_SEED = 0
+
+TokenWeights = Dict[Union[str, int], float]
+
+
+def hash_token(token: str) -> int:
+    """
+    词 → 稀疏向量下标
+    
+    Args:
+        token: 词
+    
+    Returns:
+        [0, 2^32) 范围内的下标
+    """
+    return zlib.crc32(token.encode("utf-8"), SPARSE_HASH_SEED)
+
+
+def hash_tokens(tokens: Iterable[str], count: int = -1) -> np.ndarray:
+    """
+    批量计算词下标
+    
+    Args:
+        tokens: 词序列
+        count: 词数（已知时传入可预分配数组）
+    
+    Returns:
+        uint32下标数组
+    """
+    return np.fromiter(
+        (zlib.crc32(token.encode("utf-8"), SPARSE_HASH_SEED) for token in tokens),
+        dtype=SPARSE_INDEX_DTYPE,
+        count=count
+    )
+
+
+def to_sparse_arrays(token_weights_list: List[TokenWeights]) -> List[Dict[str, np.ndarray]]:
+    """
+    批量把 {词或下标: 权重} 字典转换为 {indices, values} 数组
+    
+    所有字典的键和值各读入一个连续数组后按长度切分，不逐个构建Python列表。
+    键为词时先哈希为下标，同一向量内哈希冲突的词权重相加；权重为0的项被丢弃。
+    
+    Args:
+        token_weights_list: 稀疏向量字典列表
+    
+    Returns:
+        [{"indices": uint32数组, "values": float32数组}, ...]
+    """
+    if not token_weights_list:
+        return []
+    
+    lengths = np.fromiter((len(weights) for weights in token_weights_list), dtype=np.int64, count=len(token_weights_list))
+    total = int(lengths.sum())
+    keys = list(itertools.chain.from_iterable(weights.keys() for weights in token_weights_list))
+    values = np.fromiter(
+        itertools.chain.from_iterable(weights.values() for weights in token_weights_list),
+        dtype=SPARSE_VALUE_DTYPE,
+        count=total
+    )
+    
+    hashed = bool(keys) and isinstance(keys[0], str)
+    if hashed:
+        indices = hash_tokens(keys, total)
+    else:
+        indices = np.fromiter(keys, dtype=np.int64, count=total).astype(SPARSE_INDEX_DTYPE)
+    
+    rows = np.repeat(np.arange(len(token_weights_list), dtype=np.uint64), lengths)
+    keep = values != 0
+    rows, indices, values = rows[keep], indices[keep], values[keep]
+    
+    if hashed and len(indices):
+        # 按 (向量, 下标) 合并哈希冲突，结果按向量、下标有序
+        combined = (rows << np.uint64(32)) | indices.astype(np.uint64)
+        unique, inverse = np.unique(combined, return_inverse=True)
+        values = np.bincount(inverse, weights=values).astype(SPARSE_VALUE_DTYPE)
+        rows = unique >> np.uint64(32)
+        indices = (unique & np.uint64(0xFFFFFFFF)).astype(SPARSE_INDEX_DTYPE)
+    
+    splits = np.searchsorted(rows, np.arange(1, len(token_weights_list), dtype=np.uint64))
+    return [
+        {"indices": index_array, "values": value_array}
+        for index_array, value_array in zip(np.split(indices, splits), np.split(values, splits))
+    ]
+
+
+def to_qdrant_format(token_weights_list: List[TokenWeights]) -> List[Dict[str, list]]:
+    """
+    批量转换为可JSON序列化的Qdrant格式
+    
+    Args:
+        token_weights_list: 稀疏向量字典列表
+    
+    Returns:
+        [{"indices": [...], "values": [...]}, ...]
+    """
+    return [
+        {"indices": arrays["indices"].tolist(), "values": arrays["values"].tolist()}
+        for arrays in to_sparse_arrays(token_weights_list)
+    ]
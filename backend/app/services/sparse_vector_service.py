@@ -1,16 +1,40 @@
 """
 稀疏向量服务
-支持多种稀疏向量生成方法：TF-IDF、Simple
+支持多种稀疏向量生成方法：预训练BM25（dashtext）、知识库语料拟合的BM25、本地学习型稀疏模型（SPLADE）
 """
 
-from typing import List, Dict, Tuple, Optional, Union, Any
+from typing import List, Dict, Tuple, Optional, Union, Any, Callable
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
 import math
-from collections import Counter, defaultdict
+from collections import Counter, OrderedDict, defaultdict
 import dashtext
+import json
 import logging
+import os
+import threading
+import time
+
+import numpy as np
 
 from app.services.tokenizer_service import get_tokenizer_service
+from app.services.sparse_hashing import (
+    hash_token, to_sparse_arrays, to_qdrant_format, SPARSE_INDEX_DTYPE, SPARSE_VALUE_DTYPE
+)
+
+# 可选依赖：学习型稀疏模型（SPLADE）的本地ONNX推理
+try:
+    import onnxruntime
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+try:
+    from tokenizers import Tokenizer
+    TOKENIZERS_AVAILABLE = True
+except ImportError:
+    TOKENIZERS_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +67,20 @@ class BaseSparseVectorService(ABC):
             {indices: [...], values: [...]} 格式
         """
         pass
+    
+    def encode_documents_batch(self, texts: List[str]) -> List[Dict[str, np.ndarray]]:
+        """
+        批量编码文档，直接产出数组格式的稀疏向量（一次调用编码整批文档）
+        
+        Args:
+            texts: 文档文本列表
+            
+        Returns:
+            [{"indices": uint32数组, "values": float32数组}, ...]
+        """
+        if not texts:
+            return []
+        return to_sparse_arrays(self.generate_document_sparse_vector(list(texts)))
 
 
 class BM25SparseVectorService(BaseSparseVectorService):
@@ -100,16 +138,564 @@ class BM25SparseVectorService(BaseSparseVectorService):
             {indices: [...], values: [...]} 格式
         """
         if isinstance(token_weights, list):
-            return [self._convert_to_qdrant_format(item) for item in token_weights]
-        return self._convert_to_qdrant_format(token_weights)
+            return to_qdrant_format(token_weights)
+        return to_qdrant_format([token_weights or {}])[0]
+
+
+class KBBM25SparseVectorService(BaseSparseVectorService):
+    """
+    基于知识库自身语料拟合的 BM25 稀疏向量服务
+    
+    文档频率、文档数和总长度以可合并的计数器保存：索引新分块时增量累加，
+    删除分块时扣减；保存时与磁盘上其他进程写入的结果合并，
+    因此API进程和任务执行器可以同时为同一知识库拟合。
+    
+    文档向量的权重为BM25的词频部分，查询向量的权重为IDF，
+    两者点积即为BM25分数。
+    """
+    
+    FORMAT_VERSION = 2
+    
+    def __init__(self, kb_id: str, model_path: str, k1: float = 1.2, b: float = 0.75):
+        """
+        初始化知识库 BM25 稀疏向量服务
+        
+        Args:
+            kb_id: 知识库ID
+            model_path: 模型文件路径（不存在时从空语料开始拟合）
+            k1: 词频饱和度参数
+            b: 长度归一化参数
+        """
+        self.kb_id = kb_id
+        self.model_path = Path(model_path)
+        self.legacy_path = self.model_path.with_suffix(".json")
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = get_tokenizer_service()
+        
+        # 全量统计
+        self.version = 0
+        self.num_docs = 0
+        self.total_length = 0
+        self.doc_freq: Counter = Counter()
+        
+        # 上次保存后本进程新增的统计（保存时合并到磁盘上的最新结果）
+        self._pending_docs = 0
+        self._pending_length = 0
+        self._pending_doc_freq: Counter = Counter()
+        
+        self._lock = threading.RLock()
+        self._mtime_ns: Optional[int] = None
+        self._last_check = 0.0
+        self._last_save = time.monotonic()
+        self._reloading = False
+        
+        if self.model_path.exists() or self.legacy_path.exists():
+            self._load()
+    
+    @property
+    def avg_doc_length(self) -> float:
+        """平均文档长度"""
+        return self.total_length / self.num_docs if self.num_docs else 0.0
+    
+    @property
+    def has_pending(self) -> bool:
+        """是否有尚未保存的增量"""
+        return bool(self._pending_docs or self._pending_length or self._pending_doc_freq)
+    
+    # ========== 拟合 ==========
+    
+    def partial_fit(self, tokens_list: List[List[str]], sign: int = 1):
+        """
+        增量更新语料统计
+        
+        Args:
+            tokens_list: 文档分词结果列表
+            sign: 1为新增文档，-1为移除文档
+        """
+        doc_freq: Counter = Counter()
+        total_length = 0
+        for tokens in tokens_list:
+            total_length += len(tokens)
+            doc_freq.update({hash_token(token) for token in tokens})
+        
+        if sign < 0:
+            doc_freq = Counter({term: -count for term, count in doc_freq.items()})
         
-    def _convert_to_qdrant_format(self, token_weights: Dict[str, float]) -> Dict[str, Any]:
-        if not token_weights or len(token_weights) == 0:
-            return {"indices": [], "values": []}
+        with self._lock:
+            for counter in (self.doc_freq, self._pending_doc_freq):
+                counter.update(doc_freq)
+            self.num_docs += sign * len(tokens_list)
+            self.total_length += sign * total_length
+            self._pending_docs += sign * len(tokens_list)
+            self._pending_length += sign * total_length
+            # 扣减后计数归零的词从词表中去掉
+            if sign < 0:
+                self.doc_freq = +self.doc_freq
+    
+    def merge(self, other: "KBBM25SparseVectorService"):
+        """合并另一个编码器的语料统计（如分别拟合的分片）"""
+        with self._lock:
+            self.doc_freq.update(other.doc_freq)
+            self.num_docs += other.num_docs
+            self.total_length += other.total_length
+            self._pending_doc_freq.update(other.doc_freq)
+            self._pending_docs += other.num_docs
+            self._pending_length += other.total_length
+    
+    def fit_documents(self, texts: List[str]) -> List[Dict[int, float]]:
+        """
+        用一批新文档更新语料统计，再编码这些文档（索引写入时调用）
+        
+        增量按SPARSE_MODEL_SAVE_INTERVAL间隔写盘，不在每批都重写整个模型；
+        流水线或写入任务结束时由 SparseVectorServiceFactory.flush_kb_model 写入剩余增量
+        
+        Args:
+            texts: 文档文本列表
+            
+        Returns:
+            文档稀疏向量列表
+        """
+        tokens_list = self.tokenizer.batch_tokenize(texts)
+        self.partial_fit(tokens_list)
+        self.save_if_due()
+        return [self._encode_document_tokens(tokens) for tokens in tokens_list]
+    
+    def remove_documents(self, texts: List[str]):
+        """
+        从语料统计中移除文档（重新处理或删除分块时调用）
+        
+        Args:
+            texts: 被移除文档的文本列表
+        """
+        self.partial_fit(self.tokenizer.batch_tokenize(texts), sign=-1)
+        self.save()
+    
+    # ========== 编码 ==========
+    
+    def _encode_document_tokens(self, tokens: List[str]) -> Dict[int, float]:
+        """按BM25词频部分计算文档权重"""
+        if not tokens:
+            return {}
+        avg_doc_length = self.avg_doc_length or len(tokens)
+        length_norm = self.k1 * (1 - self.b + self.b * len(tokens) / avg_doc_length)
+        term_freq = Counter(hash_token(token) for token in tokens)
         return {
-            "indices": list(token_weights.keys()),
-            "values": list(token_weights.values())
+            term: tf * (self.k1 + 1) / (tf + length_norm)
+            for term, tf in term_freq.items()
         }
+    
+    def _encode_query_tokens(self, tokens: List[str]) -> Dict[int, float]:
+        """按IDF计算查询权重（查询中重复的词累加）"""
+        weights: Dict[int, float] = defaultdict(float)
+        with self._lock:
+            num_docs = self.num_docs
+            for token in tokens:
+                term = hash_token(token)
+                df = self.doc_freq.get(term, 0)
+                if df > 0:
+                    weights[term] += math.log((num_docs - df + 0.5) / (df + 0.5) + 1.0)
+        return dict(weights)
+    
+    def generate_query_sparse_vector(self, query: str|list[str]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        生成查询的稀疏向量
+        """
+        if isinstance(query, list):
+            return [self._encode_query_tokens(tokens) for tokens in self.tokenizer.batch_tokenize(query)]
+        return self._encode_query_tokens(self.tokenizer.tokenize(query))
+    
+    def generate_document_sparse_vector(self, text: str|list[str]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        生成文档的稀疏向量（只编码，不更新语料统计）
+        """
+        if isinstance(text, list):
+            return [self._encode_document_tokens(tokens) for tokens in self.tokenizer.batch_tokenize(text)]
+        return self._encode_document_tokens(self.tokenizer.tokenize(text))
+    
+    def convert_to_qdrant_format(self, token_weights: Union[Dict[str, Any], List[Dict[str, Any]]]) -> Union[Dict[str, Any],list[Dict[str,Any]]]:
+        """
+        将 token:weight 格式转换为 Qdrant 格式
+        
+        Args:
+            token_weights: {token: weight} 格式
+            
+        Returns:
+            {indices: [...], values: [...]} 格式
+        """
+        if isinstance(token_weights, list):
+            return to_qdrant_format(token_weights)
+        return to_qdrant_format([token_weights or {}])[0]
+    
+    # ========== 持久化与热加载 ==========
+    
+    def _read_file(self) -> Dict[str, Any]:
+        """读取模型文件（npz：词下标和文档频率数组；旧版JSON格式仍可读取）"""
+        if not self.model_path.exists() and self.legacy_path.exists():
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("format") != 1:
+                raise RuntimeError(f"不支持的知识库BM25模型格式: {data.get('format')}")
+            data["terms"] = np.asarray(data["terms"], dtype=np.int64)
+            data["doc_freq"] = np.asarray(data["doc_freq"], dtype=np.int64)
+            return data
+        
+        with np.load(self.model_path) as npz:
+            header = npz["header"].tolist()
+            params = npz["params"].tolist()
+            data = {
+                "format": header[0],
+                "version": header[1],
+                "num_docs": header[2],
+                "total_length": header[3],
+                "k1": params[0],
+                "b": params[1],
+                "terms": npz["terms"],
+                "doc_freq": npz["doc_freq"],
+            }
+        if data["format"] != self.FORMAT_VERSION:
+            raise RuntimeError(f"不支持的知识库BM25模型格式: {data['format']}")
+        return data
+    
+    def _load(self):
+        """
+        从磁盘加载全量统计，并叠加本进程尚未保存的增量
+        
+        文件读取和解析不持有self._lock，不阻塞查询编码；读到的版本比内存中旧时（并发保存已写入更新的版本）不覆盖
+        """
+        path = self.model_path if self.model_path.exists() else self.legacy_path
+        mtime_ns = path.stat().st_mtime_ns
+        data = self._read_file()
+        doc_freq = Counter(dict(zip(data["terms"].tolist(), data["doc_freq"].tolist())))
+        with self._lock:
+            if data["version"] < self.version:
+                return
+            self.version = data["version"]
+            self.k1 = data.get("k1", self.k1)
+            self.b = data.get("b", self.b)
+            self.num_docs = data["num_docs"] + self._pending_docs
+            self.total_length = data["total_length"] + self._pending_length
+            doc_freq.update(self._pending_doc_freq)
+            self.doc_freq = +doc_freq
+            self._mtime_ns = mtime_ns if path == self.model_path else None
+        logger.info(f"已加载知识库BM25模型: {self.kb_id} v{self.version}, {self.num_docs} 个文档")
+    
+    def save(self):
+        """
+        保存语料统计
+        
+        持文件锁时先读取磁盘上的最新结果（可能由其他进程写入），合并本进程的增量后原子替换，
+        版本号加一。只在取快照时持有self._lock，写文件时查询编码不被阻塞。
+        """
+        with _file_lock(self.model_path.with_suffix(".lock")):
+            if self.model_path.exists() and self.model_path.stat().st_mtime_ns != self._mtime_ns:
+                self._load()
+            
+            with self._lock:
+                self.version += 1
+                header = np.asarray(
+                    [self.FORMAT_VERSION, self.version, self.num_docs, self.total_length], dtype=np.int64
+                )
+                params = np.asarray([self.k1, self.b], dtype=np.float64)
+                terms = np.fromiter(self.doc_freq.keys(), dtype=np.int64, count=len(self.doc_freq))
+                doc_freq = np.fromiter(self.doc_freq.values(), dtype=np.int64, count=len(self.doc_freq))
+                pending = (self._pending_docs, self._pending_length, self._pending_doc_freq)
+                self._pending_docs = 0
+                self._pending_length = 0
+                self._pending_doc_freq = Counter()
+            
+            try:
+                self.model_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.model_path.with_suffix(".tmp")
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, header=header, params=params, terms=terms, doc_freq=doc_freq)
+                os.replace(tmp_path, self.model_path)
+            except Exception:
+                # 写入失败时把增量和版本号放回，下次保存时重试
+                with self._lock:
+                    self.version -= 1
+                    self._pending_docs += pending[0]
+                    self._pending_length += pending[1]
+                    self._pending_doc_freq.update(pending[2])
+                raise
+            
+            self._mtime_ns = self.model_path.stat().st_mtime_ns
+            self._last_save = time.monotonic()
+            self.legacy_path.unlink(missing_ok=True)
+    
+    def save_if_due(self):
+        """距上次保存超过SPARSE_MODEL_SAVE_INTERVAL且有增量时保存"""
+        from app.config import settings
+        if self.has_pending and time.monotonic() - self._last_save >= settings.SPARSE_MODEL_SAVE_INTERVAL:
+            self.save()
+    
+    def flush(self):
+        """保存全部尚未保存的增量"""
+        if self.has_pending:
+            self.save()
+    
+    def reload_if_changed(self, min_interval: float = 0.0, background: bool = False) -> bool:
+        """
+        模型文件被其他进程更新时重新加载（热加载）
+        
+        Args:
+            min_interval: 两次检查文件的最小间隔（秒）
+            background: 在后台线程中重新加载（在事件循环中调用时使用，加载完成前继续使用旧统计）
+            
+        Returns:
+            是否重新加载（background时为是否已开始重新加载）
+        """
+        now = time.monotonic()
+        if now - self._last_check < min_interval:
+            return False
+        self._last_check = now
+        
+        try:
+            mtime_ns = self.model_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime_ns == self._mtime_ns:
+            return False
+        
+        if not background:
+            self._load()
+            return True
+        
+        with self._lock:
+            if self._reloading:
+                return False
+            self._reloading = True
+        threading.Thread(
+            target=self._background_reload, name=f"kb-bm25-reload-{self.kb_id}", daemon=True
+        ).start()
+        return True
+    
+    def _background_reload(self):
+        """后台重新加载模型文件"""
+        try:
+            self._load()
+        except Exception as e:
+            logger.warning(f"重新加载知识库BM25模型失败: {self.kb_id}, {e}")
+        finally:
+            self._reloading = False
+
+
+class SpladeSparseVectorService(BaseSparseVectorService):
+    """
+    本地学习型稀疏模型（SPLADE类）服务
+    
+    在CPU上用ONNX Runtime推理（支持量化后的模型文件），词权重为 log(1 + ReLU(logits)) 在序列上的最大值，
+    下标为模型词表ID。每个向量只保留权重最高的top_k项，限制向量大小。
+    模型目录需包含 ONNX 模型文件和 tokenizer.json。
+    """
+    
+    def __init__(
+        self,
+        model_dir: str,
+        model_file: str = "model.onnx",
+        num_threads: int = 4,
+        max_concurrent_runs: int = 1,
+        batch_size: int = 16,
+        max_length: int = 256,
+        top_k: int = 256,
+        query_top_k: int = 64
+    ):
+        """
+        初始化 SPLADE 稀疏向量服务
+        
+        Args:
+            model_dir: 模型目录
+            model_file: 目录中的ONNX模型文件名（如量化后的 model_quantized.onnx）
+            num_threads: 单次推理使用的CPU线程数
+            max_concurrent_runs: 同时进行的推理数（CPU线程总数上限为 num_threads * max_concurrent_runs）
+            batch_size: 每次推理的文本数
+            max_length: 输入最大token数（超出截断）
+            top_k: 文档向量保留的最大项数
+            query_top_k: 查询向量保留的最大项数
+            
+        Raises:
+            FileNotFoundError: 模型文件不存在
+            RuntimeError: 依赖未安装或模型加载失败
+        """
+        if not (ONNXRUNTIME_AVAILABLE and TOKENIZERS_AVAILABLE):
+            raise RuntimeError("SPLADE 稀疏向量需要安装 onnxruntime 和 tokenizers")
+        
+        model_path = Path(model_dir) / model_file
+        tokenizer_path = Path(model_dir) / "tokenizer.json"
+        for path in (model_path, tokenizer_path):
+            if not path.exists():
+                raise FileNotFoundError(f"SPLADE 模型文件不存在: {path}")
+        
+        self.batch_size = max(1, batch_size)
+        self.max_length = max(8, max_length)
+        self.top_k = max(1, top_k)
+        self.query_top_k = max(1, query_top_k)
+        self._run_semaphore = threading.BoundedSemaphore(max(1, max_concurrent_runs))
+        
+        try:
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = max(1, num_threads)
+            options.inter_op_num_threads = 1
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.session = onnxruntime.InferenceSession(
+                str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+            )
+            self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+            
+            self.tokenizer = Tokenizer.from_file(str(tokenizer_path))
+            self.tokenizer.enable_truncation(max_length=self.max_length)
+            self.tokenizer.no_padding()
+            logger.info(f"✅ SPLADE 模型加载成功: {model_path}（{options.intra_op_num_threads} 线程）")
+        except Exception as e:
+            raise RuntimeError(f"SPLADE 模型加载失败: {str(e)}") from e
+    
+    def _infer(self, texts: List[str]) -> np.ndarray:
+        """
+        对一批文本推理，返回池化后的词权重矩阵
+        
+        Args:
+            texts: 文本列表（长度不超过batch_size）
+            
+        Returns:
+            形状为 (len(texts), 词表大小) 的float32矩阵
+        """
+        encodings = self.tokenizer.encode_batch(texts)
+        # 按本批最长序列动态补齐，避免补齐到max_length的无效计算
+        seq_len = max(1, max(len(encoding.ids) for encoding in encodings))
+        input_ids = np.zeros((len(texts), seq_len), dtype=np.int64)
+        attention_mask = np.zeros((len(texts), seq_len), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+        
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+        
+        with self._run_semaphore:
+            logits = self.session.run(None, feeds)[0]
+        
+        if logits.ndim == 2:
+            # 模型已在图内完成池化
+            return logits.astype(np.float32, copy=False)
+        
+        # log1p单调递增，先在序列上取 ReLU(logits) 的最大值再取log1p，只需对 (batch, 词表) 计算
+        np.maximum(logits, 0, out=logits)
+        logits *= attention_mask[:, :, None].astype(logits.dtype)
+        pooled = logits.max(axis=1)
+        return np.log1p(pooled, out=pooled).astype(np.float32, copy=False)
+    
+    @staticmethod
+    def _prune(weights: np.ndarray, top_k: int) -> List[Dict[str, np.ndarray]]:
+        """
+        每行只保留权重最高的top_k个非零项
+        
+        Args:
+            weights: (n, 词表大小) 词权重矩阵
+            top_k: 每行保留的最大项数
+            
+        Returns:
+            [{"indices": uint32数组（升序）, "values": float32数组}, ...]
+        """
+        vectors = []
+        for row in weights:
+            indices = np.flatnonzero(row > 0)
+            if len(indices) > top_k:
+                indices = indices[np.argpartition(row[indices], -top_k)[-top_k:]]
+                indices.sort()
+            vectors.append({
+                "indices": indices.astype(SPARSE_INDEX_DTYPE),
+                "values": row[indices].astype(SPARSE_VALUE_DTYPE)
+            })
+        return vectors
+    
+    def _encode(self, texts: List[str], top_k: int) -> List[Dict[str, np.ndarray]]:
+        """分批推理并剪枝（按长度排序分批，减少补齐）"""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[Dict[str, np.ndarray]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            weights = self._infer([texts[i] for i in batch])
+            for i, vector in zip(batch, self._prune(weights, top_k)):
+                vectors[i] = vector
+        return vectors  # type: ignore[return-value]
+    
+    @staticmethod
+    def _to_dicts(vectors: List[Dict[str, np.ndarray]]) -> List[Dict[int, float]]:
+        """数组格式转换为 {词表ID: 权重} 字典"""
+        return [
+            dict(zip(vector["indices"].tolist(), vector["values"].tolist()))
+            for vector in vectors
+        ]
+    
+    def generate_query_sparse_vector(self, query: str|list[str]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        生成查询的稀疏向量（{词表ID: 权重}）
+        """
+        if isinstance(query, str):
+            return self._to_dicts(self._encode([query], self.query_top_k))[0]
+        return self._to_dicts(self._encode(list(query), self.query_top_k))
+    
+    def generate_document_sparse_vector(self, text: str|list[str]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        生成文档的稀疏向量（{词表ID: 权重}）
+        """
+        if isinstance(text, str):
+            return self._to_dicts(self._encode([text], self.top_k))[0]
+        return self._to_dicts(self._encode(list(text), self.top_k))
+    
+    def encode_documents_batch(self, texts: List[str]) -> List[Dict[str, np.ndarray]]:
+        """
+        批量编码文档，推理结果直接剪枝为数组，不经过字典
+        
+        Args:
+            texts: 文档文本列表
+            
+        Returns:
+            [{"indices": uint32数组, "values": float32数组}, ...]
+        """
+        if not texts:
+            return []
+        return self._encode(list(texts), self.top_k)
+    
+    def convert_to_qdrant_format(self, token_weights: Union[Dict[str, Any], list[Dict[str, Any]]]) -> Union[Dict[str, Any],list[Dict[str,Any]]]:
+        """
+        将 {词表ID: 权重} 格式转换为 Qdrant 格式
+        
+        Args:
+            token_weights: {词表ID: 权重} 格式
+            
+        Returns:
+            {indices: [...], values: [...]} 格式
+        """
+        if isinstance(token_weights, list):
+            return to_qdrant_format(token_weights)
+        return to_qdrant_format([token_weights or {}])[0]
+
+
+@contextmanager
+def _file_lock(lock_path: Path):
+    """跨进程文件锁（不支持fcntl的平台上退化为无锁）"""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_kb_bm25_model_path(kb_id: str) -> str:
+    """获取知识库BM25模型文件路径"""
+    from app.config import settings
+    return os.path.join(settings.KB_SPARSE_MODEL_PATH, f"{kb_id}.bm25.npz")
 
 
 def get_bm25_model_path() -> str:
@@ -153,11 +739,124 @@ def get_bm25_model_path() -> str:
     )
 
 
+class SparseEncoderRegistry:
+    """
+    已加载稀疏编码器的注册表
+    
+    按 (方法, 模型路径, 版本) 缓存编码器实例：首次使用时加载，超出容量时淘汰最久未使用的实例。
+    同一个键只加载一次（其他线程等待该键加载完成），加载不同模型的线程互不阻塞。
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self._instances: "OrderedDict[Tuple[str, str, str], BaseSparseVectorService]" = OrderedDict()
+        self._loading_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+    
+    def get_or_load(
+        self,
+        key: Tuple[str, str, str],
+        loader: Callable[[], BaseSparseVectorService]
+    ) -> BaseSparseVectorService:
+        """
+        获取编码器，不存在时调用loader加载
+        
+        Args:
+            key: (方法, 模型路径, 版本)
+            loader: 加载函数
+            
+        Returns:
+            编码器实例
+        """
+        with self._lock:
+            instance = self._instances.get(key)
+            if instance is not None:
+                self._instances.move_to_end(key)
+                return instance
+            loading_lock = self._loading_locks.setdefault(key, threading.Lock())
+        
+        with loading_lock:
+            with self._lock:
+                instance = self._instances.get(key)
+                if instance is not None:
+                    self._instances.move_to_end(key)
+                    return instance
+            
+            instance = loader()
+            
+            evicted = []
+            with self._lock:
+                self._instances[key] = instance
+                self._loading_locks.pop(key, None)
+                while len(self._instances) > self.max_size:
+                    evicted.append(self._instances.popitem(last=False))
+            for evicted_key, evicted_instance in evicted:
+                # 知识库BM25淘汰前保存尚未写盘的增量
+                if isinstance(evicted_instance, KBBM25SparseVectorService):
+                    try:
+                        evicted_instance.flush()
+                    except Exception as e:
+                        logger.warning(f"保存被淘汰的知识库BM25模型失败: {evicted_key}, {e}")
+                logger.info(f"稀疏编码器已从内存中淘汰: {evicted_key}")
+            return instance
+    
+    def discard(self, predicate: Callable[[Tuple[str, str, str]], bool]):
+        """移除满足条件的编码器"""
+        with self._lock:
+            for key in [key for key in self._instances if predicate(key)]:
+                del self._instances[key]
+    
+    def instances(self, predicate: Callable[[Tuple[str, str, str]], bool]) -> List[BaseSparseVectorService]:
+        """满足条件的已加载编码器"""
+        with self._lock:
+            return [instance for key, instance in self._instances.items() if predicate(key)]
+    
+    def keys(self) -> List[Tuple[str, str, str]]:
+        """当前已加载的编码器键"""
+        with self._lock:
+            return list(self._instances.keys())
+
+
+def get_kb_sparse_method(kb: Any, kb_schema: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    获取知识库配置的稀疏向量方法
+    
+    优先使用schema中稀疏向量字段的method，其次是向量库配置中的sparse_method，默认bm25；
+    schema存在但没有稀疏向量字段时返回None。
+    
+    Args:
+        kb: 知识库对象
+        kb_schema: 知识库schema配置
+    
+    Returns:
+        稀疏向量方法，未配置稀疏向量字段时为None
+    """
+    vector_db_config = getattr(kb, "vector_db_config", None) or {}
+    default_method = vector_db_config.get("sparse_method") or "bm25"
+    if kb_schema is None:
+        return default_method
+    for field in kb_schema.get("fields", []):
+        if field.get("type") == "sparse_vector":
+            return field.get("method") or default_method
+    return None
+
+
 class SparseVectorServiceFactory:
     """稀疏向量服务工厂"""
     
-    # 单例实例
-    _bm25_instance = None
+    # 已加载的编码器（懒加载 + LRU淘汰）
+    _registry: Optional[SparseEncoderRegistry] = None
+    _registry_lock = threading.Lock()
+    
+    @staticmethod
+    def get_registry() -> SparseEncoderRegistry:
+        """获取编码器注册表"""
+        if SparseVectorServiceFactory._registry is None:
+            with SparseVectorServiceFactory._registry_lock:
+                if SparseVectorServiceFactory._registry is None:
+                    from app.config import settings
+                    SparseVectorServiceFactory._registry = SparseEncoderRegistry(settings.SPARSE_MODEL_CACHE_SIZE)
+        return SparseVectorServiceFactory._registry
     
     @staticmethod
     def create(service_type: str, **kwargs) -> BaseSparseVectorService:
@@ -165,9 +864,11 @@ class SparseVectorServiceFactory:
         创建稀疏向量服务实例
         
         Args:
-            service_type: 服务类型 ('bm25', 'tf-idf', 'simple')
+            service_type: 服务类型 ('bm25', 'bm25_kb', 'splade')
             **kwargs: 其他参数
-                - model_path: BM25 模型路径 (service_type='bm25' 时必需)
+                - model_path: BM25 模型路径（service_type='bm25' 时可选，默认 get_bm25_model_path()）；
+                  SPLADE 模型目录（service_type='splade' 时可选，默认 SPLADE_MODEL_PATH）
+                - kb_id: 知识库ID (service_type='bm25_kb' 时必需)
             
         Returns:
             稀疏向量服务实例
@@ -178,20 +879,129 @@ class SparseVectorServiceFactory:
             RuntimeError: 模型加载失败
         """
         service_type = service_type.lower().strip()
+        registry = SparseVectorServiceFactory.get_registry()
         
         if service_type == "bm25":
-            # BM25 使用单例模式，避免重复加载模型
-            if SparseVectorServiceFactory._bm25_instance is None:
-                model_path = kwargs.get('model_path')
-                # 如果未提供model_path，尝试自动获取
-                if not model_path:
-                    try:
-                        model_path = get_bm25_model_path()
-                    except ValueError as e:
-                        raise ValueError(f"创建 BM25 服务失败: {e}")
-                SparseVectorServiceFactory._bm25_instance = BM25SparseVectorService(model_path)
-            return SparseVectorServiceFactory._bm25_instance
+            model_path = kwargs.get('model_path')
+            # 如果未提供model_path，尝试自动获取
+            if not model_path:
+                try:
+                    model_path = get_bm25_model_path()
+                except ValueError as e:
+                    raise ValueError(f"创建 BM25 服务失败: {e}")
+            model_path = os.path.abspath(model_path)
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"BM25 模型文件不存在: {model_path}")
+            # 模型文件被替换后版本变化，按新键加载，旧实例随LRU淘汰
+            version = str(os.stat(model_path).st_mtime_ns)
+            return registry.get_or_load(
+                (service_type, model_path, version),
+                lambda: BM25SparseVectorService(model_path)
+            )
+        
+        elif service_type == "bm25_kb":
+            # 每个知识库一个实例；模型文件被其他进程更新后实例原地重新加载，无需重启
+            kb_id = kwargs.get('kb_id')
+            if not kb_id:
+                raise ValueError("创建知识库 BM25 服务失败: 缺少 kb_id")
+            model_path = os.path.abspath(get_kb_bm25_model_path(kb_id))
+            instance = registry.get_or_load(
+                (service_type, model_path, str(KBBM25SparseVectorService.FORMAT_VERSION)),
+                lambda: KBBM25SparseVectorService(kb_id, model_path)
+            )
+            from app.config import settings
+            # 检索时在事件循环中调用，文件变化时在后台线程中重新加载
+            instance.reload_if_changed(min_interval=settings.SPARSE_MODEL_RELOAD_INTERVAL, background=True)
+            return instance
+        
+        elif service_type == "splade":
+            from app.config import settings
+            model_dir = os.path.abspath(kwargs.get('model_path') or settings.SPLADE_MODEL_PATH)
+            model_file = os.path.join(model_dir, settings.SPLADE_MODEL_FILE)
+            if not os.path.exists(model_file):
+                raise FileNotFoundError(f"SPLADE 模型文件不存在: {model_file}")
+            # 模型文件被替换（如换成量化版本）后版本变化，按新键加载
+            version = f"{settings.SPLADE_MODEL_FILE}:{os.stat(model_file).st_mtime_ns}"
+            return registry.get_or_load(
+                (service_type, model_dir, version),
+                lambda: SpladeSparseVectorService(
+                    model_dir,
+                    model_file=settings.SPLADE_MODEL_FILE,
+                    num_threads=settings.SPLADE_NUM_THREADS,
+                    max_concurrent_runs=settings.SPLADE_MAX_CONCURRENT_RUNS,
+                    batch_size=settings.SPLADE_BATCH_SIZE,
+                    max_length=settings.SPLADE_MAX_LENGTH,
+                    top_k=settings.SPLADE_TOP_K,
+                    query_top_k=settings.SPLADE_QUERY_TOP_K
+                )
+            )
         
         else:
-            raise ValueError(f"不支持的稀疏向量服务类型: {service_type}。支持的类型: bm25, tf-idf, simple")
+            raise ValueError(f"不支持的稀疏向量服务类型: {service_type}。支持的类型: bm25, bm25_kb, splade")
+    
+    @staticmethod
+    def create_for_kb(kb: Any, kb_schema: Optional[Dict[str, Any]] = None) -> Optional[BaseSparseVectorService]:
+        """
+        按知识库配置的稀疏向量方法创建服务
+        
+        Args:
+            kb: 知识库对象
+            kb_schema: 知识库schema配置
+        
+        Returns:
+            稀疏向量服务实例，知识库未配置稀疏向量字段时为None
+        """
+        sparse_method = get_kb_sparse_method(kb, kb_schema)
+        if sparse_method is None:
+            return None
+        return SparseVectorServiceFactory.create(sparse_method, kb_id=kb.id)
+    
+    @staticmethod
+    def remove_kb_documents(kb_id: str, texts: List[str]):
+        """
+        从知识库BM25模型中移除文档（知识库未使用语料拟合的BM25时不做任何事）
+        
+        Args:
+            kb_id: 知识库ID
+            texts: 被移除文档的文本列表
+        """
+        if not texts:
+            return
+        model_path = Path(get_kb_bm25_model_path(kb_id))
+        if not model_path.exists() and not model_path.with_suffix(".json").exists():
+            return
+        SparseVectorServiceFactory.create("bm25_kb", kb_id=kb_id).remove_documents(texts)
+    
+    @staticmethod
+    def flush_kb_model(kb_id: str):
+        """
+        保存知识库BM25模型尚未写盘的增量（流水线或写入任务结束时调用；模型未加载时不做任何事）
+        
+        Args:
+            kb_id: 知识库ID
+        """
+        model_path = os.path.abspath(get_kb_bm25_model_path(kb_id))
+        for instance in SparseVectorServiceFactory.get_registry().instances(
+            lambda key: key[0] == "bm25_kb" and key[1] == model_path
+        ):
+            instance.flush()
+    
+    @staticmethod
+    def flush_all():
+        """保存所有已加载的知识库BM25模型尚未写盘的增量（进程退出前调用）"""
+        for instance in SparseVectorServiceFactory.get_registry().instances(lambda key: key[0] == "bm25_kb"):
+            try:
+                instance.flush()
+            except Exception as e:
+                logger.warning(f"保存知识库BM25模型失败: {instance.kb_id}, {e}")
+    
+    @staticmethod
+    def drop_kb_model(kb_id: str):
+        """删除知识库BM25模型"""
+        model_path = Path(os.path.abspath(get_kb_bm25_model_path(kb_id)))
+        SparseVectorServiceFactory.get_registry().discard(
+            lambda key: key[0] == "bm25_kb" and key[1] == str(model_path)
+        )
+        for path in (model_path, model_path.with_suffix(".json"), model_path.with_suffix(".lock")):
+            path.unlink(missing_ok=True)
 
@@ -0,0 +1,111 @@
+"""
+任务协作式取消
+执行器为每个运行中的任务创建取消令牌并传给业务服务：业务循环在批次边界检查令牌，
+耗时的外部调用（嵌入、检索、LLM）通过令牌执行，取消时立即中断正在进行的请求
+"""
+
+import asyncio
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class TaskCancelledError(Exception):
+    """任务已被取消"""
+    
+    def __init__(self, reason: str = "任务已被取消", cleanup: bool = False):
+        """
+        Args:
+            reason: 取消原因
+            cleanup: 是否清理已部分写入的数据
+        """
+        super().__init__(reason)
+        self.reason = reason
+        self.cleanup = cleanup
+
+
+class CancellationToken:
+    """取消令牌"""
+    
+    def __init__(self):
+        self._event = asyncio.Event()
+        self.reason: Optional[str] = None
+        self.cleanup = False
+    
+    @property
+    def cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._event.is_set()
+    
+    def cancel(self, reason: str = "任务已被取消", cleanup: bool = False) -> None:
+        """
+        请求取消（重复调用时保留第一次的原因，清理标记取并集）
+        
+        Args:
+            reason: 取消原因
+            cleanup: 是否清理已部分写入的数据
+        """
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+        self.cleanup = self.cleanup or cleanup
+    
+    def raise_if_cancelled(self) -> None:
+        """
+        已请求取消时抛出TaskCancelledError（在批次边界调用）
+        
+        Raises:
+            TaskCancelledError: 已请求取消
+        """
+        if self._event.is_set():
+            raise TaskCancelledError(self.reason, self.cleanup)
+    
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """
+        执行一个可被取消中断的调用：取消时立即中断调用并抛出TaskCancelledError
+        
+        Args:
+            awaitable: 协程（如嵌入、检索、LLM请求）
+        
+        Returns:
+            调用结果
+        
+        Raises:
+            TaskCancelledError: 调用前或调用期间请求了取消
+        """
+        self.raise_if_cancelled()
+        call = asyncio.ensure_future(awaitable)
+        waiter = asyncio.ensure_future(self._event.wait())
+        try:
+            await asyncio.wait({call, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # 外层协程被直接取消时一并取消调用，避免调用在后台继续运行
+            call.cancel()
+            raise
+        finally:
+            waiter.cancel()
+        if call.done():
+            return call.result()
+        
+        call.cancel()
+        try:
+            await call
+        except (asyncio.CancelledError, Exception):
+            pass
+        raise TaskCancelledError(self.reason, self.cleanup)
+
+
+async def run_cancellable(awaitable: Awaitable[T], cancel_token: Optional[CancellationToken]) -> T:
+    """
+    有取消令牌时通过令牌执行调用，否则直接等待
+    
+    Args:
+        awaitable: 协程
+        cancel_token: 取消令牌（可为空）
+    
+    Returns:
+        调用结果
+    """
+    if cancel_token is None:
+        return await awaitable
+    return await cancel_token.run(awaitable)
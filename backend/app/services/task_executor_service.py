@@ -4,10 +4,11 @@
 """
 
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from app.models.task_queue import TaskQueue, TaskType, TaskStatus
-from app.services.task_queue_service import TaskQueueService
+from app.services.task_queue_service import TaskQueueService, TaskCheckpoint
+from app.services.task_cancellation import CancellationToken, TaskCancelledError
 from app.services.index_writing_service import IndexWritingService
 from app.services.evaluation_task import EvaluationTaskService
 from app.services.test_set_import_service import TestSetImportService
@@ -24,37 +25,45 @@ class TaskExecutorService:
         self.evaluation_service = EvaluationTaskService()
         self.test_set_import_service = TestSetImportService()
     
-    async def execute_task(self, task: TaskQueue) -> None:
+    async def execute_task(self, task: TaskQueue, cancel_token: Optional[CancellationToken] = None) -> None:
         """
         执行任务
         
         Args:
             task: 任务对象
+            cancel_token: 取消令牌（由执行器在任务被取消时置位）
         """
         task_id = task.id
         
         try:
-            # 更新状态为running
-            await self.task_queue_service.update_task_status(
-                task_id, TaskStatus.RUNNING
-            )
+            # 更新状态为running（经执行器认领的任务已是running，无需再写）
+            if task.status != TaskStatus.RUNNING:
+                await self.task_queue_service.update_task_status(
+                    task_id, TaskStatus.RUNNING
+                )
             
             # 根据任务类型执行
             if task.task_type == TaskType.DOCUMENT_WRITE:
                 await self._execute_document_write_task(task)
             elif task.task_type == TaskType.EVALUATION:
-                await self._execute_evaluation_task(task)
+                await self._execute_evaluation_task(task, cancel_token)
             elif task.task_type == TaskType.TEST_SET_IMPORT:
-                await self._execute_test_set_import_task(task)
+                await self._execute_test_set_import_task(task, cancel_token)
             else:
                 raise ValueError(f"不支持的任务类型: {task.task_type}")
             
             logger.info(f"任务执行完成: task_id={task_id}")
             
+        except TaskCancelledError as e:
+            # 已取消的任务不再重试（取消时任务队列中已标记为失败，此时按租约条件写入会跳过）
+            logger.info(f"任务已取消: task_id={task_id}, reason={e.reason}")
+            await self.task_queue_service.mark_task_failed(
+                task_id, e.reason, retry=False, worker_id=task.worker_id
+            )
         except Exception as e:
             logger.error(f"任务执行失败: task_id={task_id}, error={str(e)}", exc_info=True)
             await self.task_queue_service.mark_task_failed(
-                task_id, str(e), retry=True
+                task_id, str(e), retry=True, worker_id=task.worker_id
             )
             raise
     
@@ -85,10 +94,10 @@ class TaskExecutorService:
         
         # 标记任务完成
         await self.task_queue_service.mark_task_completed(
-            task_id, result=result
+            task_id, result=result, worker_id=task.worker_id
         )
     
-    async def _execute_evaluation_task(self, task: TaskQueue) -> None:
+    async def _execute_evaluation_task(self, task: TaskQueue, cancel_token: Optional[CancellationToken] = None) -> None:
         """执行评估任务"""
         task_id = task.id
         payload = task.payload
@@ -99,10 +108,12 @@ class TaskExecutorService:
         if not evaluation_task_id:
             raise ValueError("payload中缺少evaluation_task_id")
         
-        # 执行评估（这里会更新评估任务的状态和进度）
+        # 执行评估（这里会更新评估任务的状态和进度），重试时从检查点继续
         evaluation_task = await self.evaluation_service.execute_evaluation_task(
             task_id=evaluation_task_id,
-            save_detailed_results=save_detailed_results
+            save_detailed_results=save_detailed_results,
+            checkpoint=TaskCheckpoint(self.task_queue_service, task),
+            cancel_token=cancel_token
         )
         
         # 标记任务完成
@@ -115,10 +126,10 @@ class TaskExecutorService:
         }
         
         await self.task_queue_service.mark_task_completed(
-            task_id, result=result
+            task_id, result=result, worker_id=task.worker_id
         )
     
-    async def _execute_test_set_import_task(self, task: TaskQueue) -> None:
+    async def _execute_test_set_import_task(self, task: TaskQueue, cancel_token: Optional[CancellationToken] = None) -> None:
         """执行测试集导入任务"""
         task_id = task.id
         payload = task.payload
@@ -129,10 +140,12 @@ class TaskExecutorService:
         if not import_task_id:
             raise ValueError("payload中缺少import_task_id")
         
-        # 执行导入（这里会更新导入任务的状态和进度）
+        # 执行导入（这里会更新导入任务的状态和进度），重试时从检查点继续
         # 注意：这里直接调用内部方法，因为导入逻辑已经在TestSetImportService中
         await self.test_set_import_service._execute_import_task(
-            import_task_id, update_existing
+            import_task_id, update_existing,
+            checkpoint=TaskCheckpoint(self.task_queue_service, task),
+            cancel_token=cancel_token
         )
         
         # 获取导入任务的最新状态
@@ -150,16 +163,17 @@ class TaskExecutorService:
         
         if import_task and import_task.status == "completed":
             await self.task_queue_service.mark_task_completed(
-                task_id, result=result
+                task_id, result=result, worker_id=task.worker_id
             )
         elif import_task and import_task.status == "failed":
             await self.task_queue_service.mark_task_failed(
-                task_id, import_task.error_message or "导入失败", retry=True
+                task_id, import_task.error_message or "导入失败", retry=True,
+                worker_id=task.worker_id
             )
         else:
             # 如果导入任务还在运行中，等待完成（这种情况不应该发生）
             logger.warning(f"导入任务状态异常: import_task_id={import_task_id}, status={import_task.status if import_task else 'None'}")
             await self.task_queue_service.mark_task_completed(
-                task_id, result=result
+                task_id, result=result, worker_id=task.worker_id
             )
 
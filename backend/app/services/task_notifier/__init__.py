@@ -1,15 +1,24 @@
 """
 任务通知组件
-支持HTTP通知（当前）和MQ通知（后续扩展）
+支持HTTP通知、进程内通知（单进程部署）和MQ通知（Redis / Unix域套接字）
 """
 
 from app.services.task_notifier.interface import TaskNotifierInterface
 from app.services.task_notifier.http_notifier import HTTPTaskNotifier
+from app.services.task_notifier.inprocess_notifier import InProcessTaskNotifier, InProcessTaskChannel
+from app.services.task_notifier.mq_notifier import MQTaskNotifier
+from app.services.task_notifier.brokers import TaskBrokerInterface, RedisTaskBroker, UnixSocketTaskBroker
 from app.services.task_notifier.factory import TaskNotifierFactory
 
 __all__ = [
     "TaskNotifierInterface",
     "HTTPTaskNotifier",
+    "InProcessTaskNotifier",
+    "InProcessTaskChannel",
+    "MQTaskNotifier",
+    "TaskBrokerInterface",
+    "RedisTaskBroker",
+    "UnixSocketTaskBroker",
     "TaskNotifierFactory",
 ]
 
@@ -0,0 +1,169 @@
+"""
+任务通知消息代理
+MQ通知器的可插拔后端：Redis列表（多执行器竞争消费，每条通知只投递给一个执行器）
+和Unix域套接字（单机本地替代，无需额外服务）
+"""
+
+import asyncio
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import List, Callable, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 可选依赖：Redis（以及兼容Redis协议的服务）
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class TaskBrokerInterface(ABC):
+    """任务通知消息代理接口"""
+    
+    @abstractmethod
+    async def publish(self, task_ids: List[str]) -> None:
+        """
+        批量发布任务ID
+        
+        Args:
+            task_ids: 任务ID列表
+        
+        Raises:
+            Exception: 投递失败
+        """
+        pass
+    
+    @abstractmethod
+    async def consume(self, handler: Callable[[str], Awaitable[None]]) -> None:
+        """
+        持续消费任务ID（直到被取消）
+        
+        Args:
+            handler: 任务ID处理函数
+        """
+        pass
+    
+    async def close(self) -> None:
+        """释放连接"""
+        pass
+
+
+class RedisTaskBroker(TaskBrokerInterface):
+    """Redis列表消息代理（RPUSH发布，BLPOP消费）"""
+    
+    def __init__(self, url: str, queue_key: str, block_timeout: int = 5):
+        """
+        初始化Redis消息代理
+        
+        Args:
+            url: Redis地址，如 redis://localhost:6379/0
+            queue_key: 通知队列的键
+            block_timeout: 消费时单次阻塞等待秒数
+        
+        Raises:
+            RuntimeError: redis未安装
+        """
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("Redis消息代理需要安装 redis：pip install redis")
+        self.url = url
+        self.queue_key = queue_key
+        self.block_timeout = block_timeout
+        self._client = None
+    
+    def _get_client(self):
+        """懒加载Redis客户端（自带连接池）"""
+        if self._client is None:
+            self._client = aioredis.from_url(self.url, decode_responses=True)
+        return self._client
+    
+    async def publish(self, task_ids: List[str]) -> None:
+        """一次RPUSH发布整批任务ID"""
+        if task_ids:
+            await self._get_client().rpush(self.queue_key, *task_ids)
+    
+    async def consume(self, handler: Callable[[str], Awaitable[None]]) -> None:
+        """BLPOP循环消费，连接异常时退避重连"""
+        while True:
+            try:
+                item = await self._get_client().blpop(self.queue_key, timeout=self.block_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis消费任务通知失败，稍后重试: {str(e)}")
+                await asyncio.sleep(self.block_timeout)
+                continue
+            if item:
+                await handler(item[1])
+    
+    async def close(self) -> None:
+        """关闭Redis客户端"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class UnixSocketTaskBroker(TaskBrokerInterface):
+    """
+    Unix域套接字消息代理（单机本地替代）
+    
+    执行器监听套接字文件，发布方每批建立一次连接并按行写入任务ID
+    """
+    
+    def __init__(self, socket_path: str, timeout: float = 2.0):
+        """
+        初始化Unix域套接字消息代理
+        
+        Args:
+            socket_path: 套接字文件路径
+            timeout: 发布时连接和写入的超时时间（秒）
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    async def publish(self, task_ids: List[str]) -> None:
+        """建立一次连接写入整批任务ID"""
+        if not task_ids:
+            return
+        _, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(self.socket_path), timeout=self.timeout
+        )
+        try:
+            writer.write("".join(f"{task_id}\n" for task_id in task_ids).encode("utf-8"))
+            await asyncio.wait_for(writer.drain(), timeout=self.timeout)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+    
+    async def consume(self, handler: Callable[[str], Awaitable[None]]) -> None:
+        """监听套接字，逐行处理收到的任务ID"""
+        async def _on_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    task_id = line.decode("utf-8").strip()
+                    if task_id:
+                        await handler(task_id)
+            except Exception as e:
+                logger.error(f"处理套接字任务通知失败: {str(e)}", exc_info=True)
+            finally:
+                writer.close()
+        
+        # 清理上次异常退出遗留的套接字文件
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        
+        self._server = await asyncio.start_unix_server(_on_connection, path=self.socket_path)
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
@@ -3,18 +3,31 @@
 根据配置创建相应的通知器实例
 """
 
+from typing import Optional
+
 from app.config import settings
 from app.services.task_notifier.interface import TaskNotifierInterface
 from app.services.task_notifier.http_notifier import HTTPTaskNotifier
+from app.services.task_notifier.inprocess_notifier import InProcessTaskNotifier
+from app.services.task_notifier.mq_notifier import MQTaskNotifier
+from app.services.task_notifier.brokers import TaskBrokerInterface, RedisTaskBroker, UnixSocketTaskBroker
 
 
 class TaskNotifierFactory:
     """任务通知器工厂类"""
     
+    # 进程内共享的通知器（复用连接和发布缓冲）
+    _instance: Optional[TaskNotifierInterface] = None
+    
+    @staticmethod
+    def get_notifier_type() -> str:
+        """配置的通知器类型"""
+        return getattr(settings, 'TASK_NOTIFIER_TYPE', 'http').lower()
+    
     @staticmethod
     def create() -> TaskNotifierInterface:
         """
-        创建通知器实例
+        获取通知器实例（同一进程内共享）
         
         Returns:
             通知器实例
@@ -22,17 +35,58 @@ class TaskNotifierFactory:
         Raises:
             ValueError: 不支持的通知器类型
         """
-        notifier_type = getattr(settings, 'TASK_NOTIFIER_TYPE', 'http').lower()
+        if TaskNotifierFactory._instance is None:
+            TaskNotifierFactory._instance = TaskNotifierFactory._create()
+        return TaskNotifierFactory._instance
+    
+    @staticmethod
+    def _create() -> TaskNotifierInterface:
+        """按配置创建通知器"""
+        notifier_type = TaskNotifierFactory.get_notifier_type()
         executor_url = getattr(settings, 'TASK_EXECUTOR_URL', 'http://localhost:8001')
         
         if notifier_type == "http":
             return HTTPTaskNotifier(executor_url)
+        elif notifier_type == "inprocess":
+            return InProcessTaskNotifier()
         elif notifier_type == "mq":
-            # 后续实现MQ通知器
-            raise NotImplementedError("MQ通知器尚未实现")
+            return MQTaskNotifier(
+                TaskNotifierFactory.create_broker(),
+                batch_size=settings.TASK_NOTIFY_BATCH_SIZE,
+                flush_interval=settings.TASK_NOTIFY_FLUSH_INTERVAL,
+                max_buffer_size=settings.TASK_NOTIFY_QUEUE_SIZE
+            )
         else:
             raise ValueError(
                 f"不支持的通知器类型: {notifier_type}，"
-                f"支持的类型: http, mq"
+                f"支持的类型: http, inprocess, mq"
             )
-
+    
+    @staticmethod
+    def create_broker() -> TaskBrokerInterface:
+        """
+        创建MQ消息代理（通知器发布和执行器消费共用）
+        
+        Returns:
+            消息代理实例
+        
+        Raises:
+            ValueError: 不支持的消息代理类型
+        """
+        broker_type = settings.TASK_MQ_BROKER.lower()
+        if broker_type == "redis":
+            return RedisTaskBroker(settings.TASK_MQ_URL, settings.TASK_MQ_QUEUE_KEY)
+        elif broker_type == "unix_socket":
+            return UnixSocketTaskBroker(settings.TASK_MQ_SOCKET_PATH)
+        else:
+            raise ValueError(
+                f"不支持的消息代理类型: {broker_type}，"
+                f"支持的类型: redis, unix_socket"
+            )
+    
+    @staticmethod
+    async def close():
+        """关闭共享的通知器"""
+        if TaskNotifierFactory._instance is not None:
+            await TaskNotifierFactory._instance.close()
+            TaskNotifierFactory._instance = None
@@ -25,6 +25,20 @@ class HTTPTaskNotifier(TaskNotifierInterface):
         """
         self.executor_url = executor_url.rstrip('/')
         self.timeout = timeout
+        # 复用连接池，避免每次通知都新建连接
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """懒加载共享的HTTP客户端"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+    
+    async def close(self) -> None:
+        """关闭HTTP客户端"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     async def notify(self, task_id: str) -> bool:
         """
@@ -37,25 +51,44 @@ class HTTPTaskNotifier(TaskNotifierInterface):
             是否通知成功
         """
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.executor_url}/internal/notify",
-                    json={"task_id": task_id}
+            response = await self._get_client().post(
+                f"{self.executor_url}/internal/notify",
+                json={"task_id": task_id}
+            )
+            if response.status_code == 200:
+                logger.info(f"成功通知task_executor: task_id={task_id}")
+                return True
+            else:
+                logger.warning(
+                    f"通知task_executor失败: task_id={task_id}, "
+                    f"status_code={response.status_code}, "
+                    f"response={response.text}"
                 )
-                if response.status_code == 200:
-                    logger.info(f"成功通知task_executor: task_id={task_id}")
-                    return True
-                else:
-                    logger.warning(
-                        f"通知task_executor失败: task_id={task_id}, "
-                        f"status_code={response.status_code}, "
-                        f"response={response.text}"
-                    )
-                    return False
+                return False
         except httpx.TimeoutException:
             logger.warning(f"通知task_executor超时: task_id={task_id}")
             return False
         except Exception as e:
             logger.warning(f"通知task_executor异常: task_id={task_id}, error={str(e)}")
             return False
+    
+    async def cancel(self, task_id: str) -> bool:
+        """
+        通过HTTP通知task_executor取消任务
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            是否通知成功
+        """
+        try:
+            response = await self._get_client().post(
+                f"{self.executor_url}/internal/cancel",
+                json={"task_id": task_id}
+            )
+            return response.status_code == 200
+        except Exception as e:
+            logger.warning(f"通知task_executor取消任务失败，将在心跳时取消: task_id={task_id}, error={str(e)}")
+            return False
 
@@ -0,0 +1,136 @@
+"""
+进程内任务通知实现
+单进程部署时API与任务执行器运行在同一个事件循环中，通过asyncio队列传递任务ID
+"""
+
+import asyncio
+import logging
+from typing import Optional, Callable, Awaitable, Dict
+
+from app.config import settings
+from app.core.singleton import singleton
+from app.services.task_notifier.interface import TaskNotifierInterface
+
+logger = logging.getLogger(__name__)
+
+
+@singleton
+class InProcessTaskChannel:
+    """进程内任务通知通道"""
+    
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self.consumers = 0
+        self.dropped = 0
+        self.cancel_handler: Optional[Callable[[str], Awaitable[bool]]] = None
+    
+    @property
+    def queue(self) -> asyncio.Queue:
+        """懒加载有界队列（在事件循环中首次使用时创建）"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=max(1, settings.TASK_NOTIFY_QUEUE_SIZE))
+        return self._queue
+    
+    def stats(self) -> Dict[str, int]:
+        """通知队列深度指标"""
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "dropped": self.dropped,
+        }
+    
+    def publish(self, task_id: str) -> bool:
+        """
+        投递任务ID
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            是否有消费者接收（没有进程内执行器时返回False）。队列已满时丢弃通知，
+            任务已持久化，执行器有空闲槽位时会轮询认领
+        """
+        if self.consumers == 0:
+            return False
+        try:
+            self.queue.put_nowait(task_id)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.debug(f"进程内通知队列已满，丢弃通知: task_id={task_id}")
+        return True
+    
+    async def cancel(self, task_id: str) -> bool:
+        """
+        转交给进程内执行器取消任务
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            是否已转交
+        """
+        if self.cancel_handler is None:
+            return False
+        await self.cancel_handler(task_id)
+        return True
+    
+    async def consume(
+        self,
+        handler: Callable[[str], Awaitable[None]],
+        cancel_handler: Optional[Callable[[str], Awaitable[bool]]] = None
+    ) -> None:
+        """
+        持续消费任务ID（直到被取消）
+        
+        Args:
+            handler: 任务ID处理函数
+            cancel_handler: 取消任务的处理函数
+        """
+        self.consumers += 1
+        if cancel_handler is not None:
+            self.cancel_handler = cancel_handler
+        try:
+            while True:
+                task_id = await self.queue.get()
+                try:
+                    await handler(task_id)
+                except Exception as e:
+                    logger.error(f"处理进程内任务通知失败: task_id={task_id}, error={str(e)}", exc_info=True)
+        finally:
+            self.consumers -= 1
+            if cancel_handler is not None and self.cancel_handler is cancel_handler:
+                self.cancel_handler = None
+
+
+class InProcessTaskNotifier(TaskNotifierInterface):
+    """进程内任务通知器"""
+    
+    def __init__(self):
+        self.channel = InProcessTaskChannel()
+    
+    async def notify(self, task_id: str) -> bool:
+        """
+        投递到进程内执行器
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            是否通知成功
+        """
+        if self.channel.publish(task_id):
+            return True
+        logger.warning(f"进程内没有运行中的任务执行器: task_id={task_id}")
+        return False
+    
+    async def cancel(self, task_id: str) -> bool:
+        """
+        通知进程内执行器取消任务
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            是否通知成功
+        """
+        return await self.channel.cancel(task_id)
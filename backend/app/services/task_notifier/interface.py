@@ -21,4 +21,21 @@ class TaskNotifierInterface(ABC):
             是否通知成功
         """
         pass
-
+    
+    async def cancel(self, task_id: str) -> bool:
+        """
+        通知task_executor立即取消执行中的任务
+        
+        不支持即时取消的通知器返回False，执行器在下一次心跳时发现任务已取消
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            是否通知成功
+        """
+        return False
+    
+    async def close(self) -> None:
+        """释放通知器持有的连接等资源"""
+        pass
@@ -0,0 +1,83 @@
+"""
+MQ任务通知实现
+通知先进入本地有界缓冲，由后台协程按批发布到消息代理；
+缓冲已满或投递失败时丢弃通知，任务已持久化在任务队列中，由执行器轮询认领
+"""
+
+import asyncio
+import logging
+from typing import List, Optional
+
+from app.services.task_notifier.interface import TaskNotifierInterface
+from app.services.task_notifier.brokers import TaskBrokerInterface
+
+logger = logging.getLogger(__name__)
+
+
+class MQTaskNotifier(TaskNotifierInterface):
+    """MQ任务通知器（批量发布）"""
+    
+    def __init__(
+        self,
+        broker: TaskBrokerInterface,
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+        max_buffer_size: int = 1000
+    ):
+        """
+        初始化MQ通知器
+        
+        Args:
+            broker: 消息代理
+            batch_size: 单次发布的最大任务数
+            flush_interval: 缓冲等待时间（秒），在此时间内到达的通知合并发布
+            max_buffer_size: 缓冲的最大通知数（消息代理不可用时内存不会无限增长）
+        """
+        self.broker = broker
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max(1, max_buffer_size)
+        self.dropped = 0
+        self._buffer: List[str] = []
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    async def notify(self, task_id: str) -> bool:
+        """
+        缓冲通知，立即返回
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            是否已接收（缓冲已满或投递失败时由执行器轮询兜底）
+        """
+        if len(self._buffer) >= self.max_buffer_size:
+            self.dropped += 1
+            logger.debug(f"任务通知缓冲已满，丢弃通知: task_id={task_id}")
+            return True
+        self._buffer.append(task_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        return True
+    
+    async def _flush_loop(self) -> None:
+        """等待一个缓冲间隔后按批发布，直到缓冲区清空"""
+        while self._buffer:
+            if len(self._buffer) < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+            batch = self._buffer[:self.batch_size]
+            del self._buffer[:self.batch_size]
+            try:
+                await self.broker.publish(batch)
+                logger.info(f"已发布 {len(batch)} 个任务通知")
+            except Exception as e:
+                logger.warning(f"发布任务通知失败，将由task_executor轮询认领: count={len(batch)}, error={str(e)}")
+    
+    async def close(self) -> None:
+        """发布剩余通知并关闭消息代理连接"""
+        if self._flush_task is not None and not self._flush_task.done():
+            try:
+                await self._flush_task
+            except Exception:
+                pass
+        await self.broker.close()
@@ -0,0 +1,286 @@
+"""
+任务进度事件
+执行中的任务每处理一个用例/批次就发布一次进度事件，订阅者（SSE接口）实时收到；
+数据库只按TASK_PROGRESS_DB_INTERVAL的粗粒度间隔写入进度，前端不再需要轮询任务详情接口。
+
+发布后端：
+- local：进程内分发，执行器运行在API进程内（inprocess通知器）时使用
+- redis：通过Redis发布/订阅转发，执行器作为独立进程运行时使用，API进程订阅频道后在本地分发
+- auto（默认）：通知器为inprocess时用local，否则用redis
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.config import settings
+from app.core.singleton import singleton
+from app.models.evaluation import EvaluationTask
+from app.models.task_queue import TaskQueue
+from app.models.test import ImportTask
+
+logger = logging.getLogger(__name__)
+
+# 可选依赖：Redis（以及兼容Redis协议的服务）
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# 进度事件的实体类型
+PROGRESS_KIND_TASK = "task"
+PROGRESS_KIND_IMPORT_TASK = "import_task"
+PROGRESS_KIND_EVALUATION_TASK = "evaluation_task"
+
+# 到达后不再有进度变化的状态（任务队列的failed也是终态，重试时状态为pending）
+FINAL_STATUSES = {"completed", "failed", "dead_letter", "archived"}
+
+# 单个订阅者缓冲的最大事件数，消费过慢时丢弃最旧的事件（进度事件后者覆盖前者）
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def task_progress_event(task: TaskQueue) -> Dict[str, Any]:
+    """任务队列任务的进度事件数据"""
+    return {
+        "status": task.status.value,
+        "progress": task.progress,
+        "retry_count": task.retry_count,
+        "error_message": task.error_message,
+    }
+
+
+def import_task_progress_event(import_task: ImportTask) -> Dict[str, Any]:
+    """导入任务的进度事件数据"""
+    return {
+        "status": import_task.status,
+        "progress": import_task.progress,
+        "total_docs": import_task.total_docs,
+        "imported_docs": import_task.imported_docs,
+        "failed_docs": import_task.failed_docs,
+        "error_message": import_task.error_message,
+    }
+
+
+def evaluation_task_progress_event(task: EvaluationTask) -> Dict[str, Any]:
+    """评估任务的进度事件数据"""
+    processed = task.completed_cases + task.failed_cases
+    return {
+        "status": task.status.value,
+        "progress": processed / task.total_cases if task.total_cases else 0.0,
+        "total_cases": task.total_cases,
+        "completed_cases": task.completed_cases,
+        "failed_cases": task.failed_cases,
+    }
+
+
+class ProgressThrottle:
+    """
+    进度写库节流
+    
+    每个用例/批次都发布进度事件，但只有距上次写库超过间隔时才写数据库
+    """
+    
+    def __init__(self, interval: Optional[float] = None):
+        """
+        Args:
+            interval: 写库间隔(秒)，为空时使用TASK_PROGRESS_DB_INTERVAL
+        """
+        self.interval = settings.TASK_PROGRESS_DB_INTERVAL if interval is None else interval
+        self._last_write: Optional[float] = None
+    
+    def due(self, force: bool = False) -> bool:
+        """
+        判断本次是否需要写库（返回True时记为已写入）
+        
+        Args:
+            force: 强制写库（如最后一个用例、状态变化）
+        
+        Returns:
+            是否需要写库
+        """
+        now = time.monotonic()
+        if force or self._last_write is None or now - self._last_write >= self.interval:
+            self._last_write = now
+            return True
+        return False
+
+
+@singleton
+class TaskProgressHub:
+    """任务进度事件的发布/订阅中心"""
+    
+    def __init__(self):
+        from app.services.task_notifier.factory import TaskNotifierFactory
+        executor_in_process = TaskNotifierFactory.get_notifier_type() == "inprocess"
+        
+        self.backend = settings.TASK_PROGRESS_BACKEND.lower()
+        if self.backend == "auto":
+            self.backend = "local" if executor_in_process else "redis"
+        self.channel = settings.TASK_PROGRESS_CHANNEL
+        self._subscribers: Dict[Tuple[str, str], Set[asyncio.Queue]] = defaultdict(set)
+        self._client = None
+        self._relay_task: Optional[asyncio.Task] = None
+        if self.backend == "redis" and not REDIS_AVAILABLE:
+            logger.warning("进度事件的redis后端需要安装 redis：pip install redis，已退回进程内分发")
+            self.backend = "local"
+        if self.backend == "local" and not executor_in_process:
+            logger.warning(
+                "任务执行器运行在独立进程中，但进度事件使用进程内分发：执行器发布的进度事件到达不了API进程，"
+                "SSE订阅者只能按TASK_PROGRESS_SNAPSHOT_INTERVAL读取数据库快照。"
+                "请设置 TASK_PROGRESS_BACKEND=redis（或auto）并安装 redis"
+            )
+    
+    def _get_client(self):
+        """懒加载Redis客户端（自带连接池）"""
+        if self._client is None:
+            self._client = aioredis.from_url(settings.TASK_MQ_URL, decode_responses=True)
+        return self._client
+    
+    async def publish(self, kind: str, entity_id: str, data: Dict[str, Any]) -> None:
+        """
+        发布进度事件（失败只记录日志，不影响任务执行）
+        
+        redis后端只发布到频道，本进程的订阅者由频道转发收到，避免重复；发布失败时退回本地分发
+        
+        Args:
+            kind: 实体类型（task / import_task / evaluation_task）
+            entity_id: 实体ID
+            data: 事件数据（status、progress及各类计数）
+        """
+        event = {"kind": kind, "id": entity_id, "timestamp": time.time(), **data}
+        if self.backend == "redis":
+            try:
+                await self._get_client().publish(self.channel, json.dumps(event, ensure_ascii=False))
+                return
+            except Exception as e:
+                logger.warning(f"发布进度事件失败，仅在本进程分发: kind={kind}, id={entity_id}, error={str(e)}")
+        self._dispatch(event)
+    
+    def _dispatch(self, event: Dict[str, Any]) -> None:
+        """分发给本进程内订阅该实体的队列"""
+        for queue in self._subscribers.get((event["kind"], event["id"]), ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+    
+    @asynccontextmanager
+    async def subscribe(self, kind: str, entity_id: str) -> AsyncIterator[asyncio.Queue]:
+        """
+        订阅某个实体的进度事件
+        
+        Args:
+            kind: 实体类型
+            entity_id: 实体ID
+        
+        Yields:
+            接收事件的队列（退出上下文时取消订阅）
+        """
+        if self.backend == "redis" and (self._relay_task is None or self._relay_task.done()):
+            self._relay_task = asyncio.create_task(self._relay_loop())
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        key = (kind, entity_id)
+        self._subscribers[key].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[key].discard(queue)
+            if not self._subscribers[key]:
+                del self._subscribers[key]
+    
+    async def _relay_loop(self) -> None:
+        """订阅Redis频道并在本进程分发（连接断开后重连）"""
+        while True:
+            pubsub = self._get_client().pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        self._dispatch(json.loads(message["data"]))
+                    except (ValueError, KeyError) as e:
+                        logger.warning(f"忽略无法解析的进度事件: {str(e)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"进度事件频道连接断开，稍后重连: {str(e)}")
+                await asyncio.sleep(1.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+    
+    async def close(self) -> None:
+        """停止频道转发并释放连接"""
+        if self._relay_task is not None:
+            self._relay_task.cancel()
+            try:
+                await self._relay_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._relay_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def publish_progress(kind: str, entity_id: str, data: Dict[str, Any]) -> None:
+    """发布进度事件（TaskProgressHub().publish 的简写）"""
+    await TaskProgressHub().publish(kind, entity_id, data)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """格式化一条SSE消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def progress_event_stream(
+    kind: str,
+    entity_id: str,
+    load_snapshot: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+) -> AsyncIterator[str]:
+    """
+    生成某个实体的SSE进度流
+    
+    先订阅再读取一次数据库快照，之后推送进度事件，到达终态时结束；
+    TASK_PROGRESS_SNAPSHOT_INTERVAL内没有事件时重新读取快照（执行器在其他进程且未配置redis后端、
+    或事件丢失时兜底），快照没有新进度时只发送保活注释
+    
+    Args:
+        kind: 实体类型
+        entity_id: 实体ID
+        load_snapshot: 读取实体当前进度事件数据的函数，实体不存在时返回None
+    
+    Yields:
+        SSE消息文本
+    """
+    async with TaskProgressHub().subscribe(kind, entity_id) as queue:
+        snapshot = await load_snapshot()
+        if snapshot is None:
+            yield _sse("error", {"kind": kind, "id": entity_id, "message": "任务不存在"})
+            return
+        
+        last = {"kind": kind, "id": entity_id, "timestamp": time.time(), **snapshot}
+        yield _sse("progress", last)
+        while last.get("status") not in FINAL_STATUSES:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.TASK_PROGRESS_SNAPSHOT_INTERVAL)
+            except asyncio.TimeoutError:
+                snapshot = await load_snapshot()
+                if snapshot is None:
+                    return
+                # 进度写库有节流，快照可能落后于已推送的事件：只有状态变化或进度前进时才推送
+                if snapshot.get("status") == last.get("status") and \
+                        (snapshot.get("progress") or 0.0) <= (last.get("progress") or 0.0):
+                    yield ": keepalive\n\n"
+                    continue
+                event = {"kind": kind, "id": entity_id, "timestamp": time.time(), **snapshot}
+            last = event
+            yield _sse("progress", event)
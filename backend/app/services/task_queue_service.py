@@ -3,18 +3,95 @@
 负责任务的创建、查询和管理
 """
 
+import json
 import uuid
+import random
+import hashlib
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
+from app.config import settings
 from app.models.task_queue import TaskQueue, TaskType, TaskStatus
 from app.repositories.factory import RepositoryFactory
+from app.repositories.task_queue_repository import retry_values
 from app.services.task_notifier.factory import TaskNotifierFactory
+from app.services.task_progress import PROGRESS_KIND_TASK, publish_progress, task_progress_event
 
 logger = logging.getLogger(__name__)
 
 
+def retry_delay(retry_count: int) -> float:
+    """
+    第retry_count次重试前的退避时间：指数增长并封顶，附加最多10%的随机抖动，避免同时失败的任务同时重试
+    
+    Args:
+        retry_count: 重试次数（从1开始）
+    
+    Returns:
+        退避秒数
+    """
+    delay = min(
+        settings.TASK_RETRY_MAX_DELAY,
+        settings.TASK_RETRY_BASE_DELAY * (2 ** max(0, retry_count - 1))
+    )
+    return delay * (1 + random.random() * 0.1)
+
+
+def task_idempotency_key(task_type: TaskType, payload: Dict[str, Any]) -> str:
+    """
+    计算任务幂等键：任务类型 + 规范化payload（键排序、紧凑分隔符）的SHA-256
+    
+    Args:
+        task_type: 任务类型
+        payload: 任务参数（或能标识同一操作的参数子集）
+    
+    Returns:
+        64位十六进制幂等键
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{task_type.value}:{canonical}".encode("utf-8")).hexdigest()
+
+
+class TaskCheckpoint:
+    """
+    任务检查点
+    
+    长任务在批次边界保存进度游标，失败重试、租约过期回收或取消后重新认领时，
+    从state中恢复游标继续执行，而不是从头开始
+    """
+    
+    def __init__(self, task_queue_service: "TaskQueueService", task: TaskQueue):
+        """
+        初始化检查点
+        
+        Args:
+            task_queue_service: 任务队列服务
+            task: 执行中的任务（state取自上次保存的检查点）
+        """
+        self.task_queue_service = task_queue_service
+        self.task_id = task.id
+        self.worker_id = task.worker_id
+        self.state: Dict[str, Any] = dict(task.checkpoint or {})
+    
+    async def save(self, state: Dict[str, Any], progress: Optional[float] = None) -> bool:
+        """
+        保存检查点
+        
+        Args:
+            state: 进度游标（需可JSON序列化）
+            progress: 任务进度（0.0-1.0）
+        
+        Returns:
+            是否保存成功（租约已丢失时返回False，本地执行会被心跳取消）
+        """
+        self.state = state
+        saved = await self.task_queue_service.save_checkpoint(self.task_id, self.worker_id, state, progress)
+        if not saved:
+            logger.warning(f"保存任务检查点失败（任务已不属于当前执行器）: task_id={self.task_id}")
+        return saved
+
+
 class TaskQueueService:
     """任务队列服务"""
     
@@ -26,20 +103,28 @@ class TaskQueueService:
         self,
         task_type: TaskType,
         payload: Dict[str, Any],
-        max_retries: int = 3
+        max_retries: int = 3,
+        priority: Optional[int] = None,
+        idempotency_key: Optional[str] = None
     ) -> TaskQueue:
         """
         创建任务
         
+        已有相同幂等键的待执行或执行中任务时不再创建，直接返回该任务（重复点击导入、评估不会启动重复的长任务）
+        
         Args:
             task_type: 任务类型
-            payload: 任务参数
+            payload: 任务参数（包含kb_id时按知识库公平调度）
             max_retries: 最大重试次数
+            priority: 优先级（为空时使用TASK_TYPE_PRIORITY中该任务类型的默认值）
+            idempotency_key: 幂等键（为空时由任务类型和完整payload计算）
         
         Returns:
-            创建的任务对象
+            创建的任务对象，或已存在的相同任务
         """
         task_id = f"task_{uuid.uuid4().hex[:12]}"
+        if priority is None:
+            priority = settings.TASK_TYPE_PRIORITY.get(task_type.value, 0)
         
         task = TaskQueue(
             id=task_id,
@@ -47,22 +132,216 @@ class TaskQueueService:
             status=TaskStatus.PENDING,
             payload=payload,
             progress=0.0,
+            priority=priority,
+            idempotency_key=idempotency_key or task_idempotency_key(task_type, payload),
             max_retries=max_retries,
             retry_count=0
         )
         
-        # 保存到数据库
-        task = await self.task_repo.create(task)
+        # 保存到数据库（相同任务已在排队或执行时合并）
+        task, created = await self.task_repo.create_idempotent(task)
+        if not created:
+            logger.info(f"已有相同的待执行或执行中任务，合并提交: task_id={task.id}, task_type={task_type.value}")
+            return task
+        await self._publish_progress(task)
         
         # 通知task_executor
         notify_success = await self.notifier.notify(task_id)
         if not notify_success:
-            logger.warning(f"任务创建成功但通知失败: task_id={task_id}，task_executor可能通过轮询获取")
+            logger.warning(f"任务创建成功但通知失败: task_id={task_id}，将由task_executor轮询认领")
         
         logger.info(f"创建任务: task_id={task_id}, task_type={task_type.value}")
         
         return task
     
+    async def claim_task(self, task_id: str, worker_id: str) -> Optional[TaskQueue]:
+        """
+        原子认领指定任务（pending → running），多个执行器同时认领时只有一个成功
+        
+        Args:
+            task_id: 任务ID
+            worker_id: 执行器ID
+        
+        Returns:
+            认领成功返回任务对象，否则返回None
+        """
+        task = await self.task_repo.claim(task_id, worker_id, settings.TASK_LEASE_SECONDS)
+        await self._publish_progress(task)
+        return task
+    
+    async def claim_pending_tasks(self, worker_id: str, limit: int) -> List[TaskQueue]:
+        """
+        原子认领优先级最高、最早创建的若干个待执行任务
+        
+        Args:
+            worker_id: 执行器ID
+            limit: 最多认领的任务数
+        
+        Returns:
+            认领到的任务列表
+        """
+        tasks = await self.task_repo.claim_next(worker_id, settings.TASK_LEASE_SECONDS, limit)
+        for task in tasks:
+            await self._publish_progress(task)
+        return tasks
+    
+    async def list_runnable_tasks(self, limit: int) -> List[TaskQueue]:
+        """
+        读取调度窗口内的待执行任务（只读，由执行器调度后逐个认领）
+        
+        Args:
+            limit: 窗口大小
+        
+        Returns:
+            按优先级降序、创建时间升序排列的任务列表
+        """
+        return await self.task_repo.list_runnable(limit)
+    
+    async def get_queue_depth(self) -> Dict[str, int]:
+        """
+        获取队列深度指标
+        
+        Returns:
+            {状态: 任务数, "runnable": 已到可执行时间的待执行任务数}
+        """
+        return await self.task_repo.queue_depth()
+    
+    async def renew_lease(self, task_id: str, worker_id: str) -> bool:
+        """
+        续约执行中任务（心跳）
+        
+        Args:
+            task_id: 任务ID
+            worker_id: 执行器ID
+        
+        Returns:
+            是否续约成功，失败说明任务已不属于该执行器
+        """
+        return await self.task_repo.renew_lease(task_id, worker_id, settings.TASK_LEASE_SECONDS)
+    
+    async def save_checkpoint(
+        self,
+        task_id: str,
+        worker_id: Optional[str],
+        checkpoint: Dict[str, Any],
+        progress: Optional[float] = None
+    ) -> bool:
+        """
+        保存执行中任务的检查点（同时刷新心跳），保存成功且带进度时发布进度事件
+        
+        Args:
+            task_id: 任务ID
+            worker_id: 持有租约的执行器ID
+            checkpoint: 进度游标
+            progress: 进度（0.0-1.0）
+        
+        Returns:
+            是否保存成功
+        """
+        if progress is not None:
+            progress = max(0.0, min(1.0, progress))
+        saved = await self.task_repo.save_checkpoint(task_id, worker_id, checkpoint, progress)
+        if saved and progress is not None:
+            await publish_progress(PROGRESS_KIND_TASK, task_id, {"status": TaskStatus.RUNNING.value, "progress": progress})
+        return saved
+    
+    async def requeue_expired_tasks(self) -> List[TaskQueue]:
+        """
+        回收租约过期的执行中任务（执行器崩溃或失联）：退避后重新入队，重试耗尽的进入死信
+        
+        Returns:
+            被回收的任务列表
+        """
+        tasks = await self.task_repo.requeue_expired(settings.TASK_LEASE_SECONDS, retry_delay)
+        for task in tasks:
+            await self._publish_progress(task)
+            if task.status == TaskStatus.DEAD_LETTER:
+                logger.error(f"任务租约过期且重试次数已耗尽，进入死信: task_id={task.id}, retry_count={task.retry_count}")
+            else:
+                logger.warning(f"任务租约过期，重新入队: task_id={task.id}, retry_count={task.retry_count}, next_run_at={task.next_run_at}")
+        return tasks
+    
+    async def requeue_dead_letter_task(self, task_id: str) -> Optional[TaskQueue]:
+        """
+        将死信任务重置后重新入队（人工处理后使用）
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            重新入队的任务对象，任务不存在或不是死信状态时返回None
+        """
+        task = await self.task_repo.get_by_id(task_id)
+        if not task or task.status != TaskStatus.DEAD_LETTER:
+            return None
+        
+        task.status = TaskStatus.PENDING
+        task.retry_count = 0
+        task.next_run_at = None
+        task.started_at = None
+        task.completed_at = None
+        task = await self.task_repo.update(task_id, task)
+        await self._publish_progress(task)
+        
+        await self.notifier.notify(task_id)
+        logger.info(f"死信任务重新入队: task_id={task_id}")
+        return task
+    
+    async def find_active_tasks(self, task_type: TaskType, key: str, value: str) -> List[TaskQueue]:
+        """
+        按payload字段查找待执行或执行中的任务
+        
+        Args:
+            task_type: 任务类型
+            key: payload字段名（如 evaluation_task_id、import_task_id）
+            value: 字段值
+        
+        Returns:
+            任务列表
+        """
+        return await self.task_repo.find_active_by_payload(task_type, key, value)
+    
+    async def cancel_task(
+        self,
+        task_id: str,
+        reason: str = "任务已被用户手动终止",
+        cleanup: bool = False
+    ) -> Optional[TaskQueue]:
+        """
+        取消任务：标记为失败（不再重试），并通知执行器立即中断执行
+        
+        待执行的任务不会再被认领；执行中的任务由执行器通过取消令牌在批次边界停止、中断正在进行的外部调用，
+        通知器不支持即时取消时在下一次心跳时停止
+        
+        Args:
+            task_id: 任务ID
+            reason: 取消原因
+            cleanup: 是否清理任务已部分写入的数据（如导入中途写入的文档和向量）
+        
+        Returns:
+            取消后的任务对象，任务不存在或已结束时返回None
+        """
+        # 按状态条件写入：任务在读取和写入之间刚好完成或进入死信时不覆盖其最终状态
+        cancelled = await self.task_repo.cancel(task_id, {
+            "status": TaskStatus.FAILED,
+            "error_message": reason,
+            "result": {"cancelled": True, "cleanup": cleanup},
+            "completed_at": datetime.now(),
+            "next_run_at": None,
+            "worker_id": None,
+            "lease_expires_at": None,
+        })
+        if not cancelled:
+            return None
+        
+        task, was_running = cancelled
+        await self._publish_progress(task)
+        
+        if was_running and not await self.notifier.cancel(task_id):
+            logger.info(f"执行器将在下一次心跳时停止任务: task_id={task_id}")
+        logger.info(f"取消任务: task_id={task_id}, cleanup={cleanup}")
+        return task
+    
     async def get_task(self, task_id: str) -> Optional[TaskQueue]:
         """
         获取任务
@@ -105,7 +384,7 @@ class TaskQueueService:
         elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
             task.completed_at = datetime.now()
         
-        return await self.task_repo.update(task_id, task)
+        return await self._update_and_publish(task)
     
     async def update_task_progress(
         self,
@@ -132,72 +411,112 @@ class TaskQueueService:
         if result:
             task.result = result
         
-        return await self.task_repo.update(task_id, task)
+        return await self._update_and_publish(task)
     
     async def mark_task_completed(
         self,
         task_id: str,
-        result: Optional[Dict[str, Any]] = None
+        result: Optional[Dict[str, Any]] = None,
+        worker_id: Optional[str] = None
     ) -> Optional[TaskQueue]:
         """
         标记任务完成
         
+        只有任务仍在执行且租约仍归worker_id所有时才写入，
+        任务已被取消或租约已被回收（其他执行器可能已重新认领）时不覆盖其状态
+        
         Args:
             task_id: 任务ID
             result: 执行结果
+            worker_id: 持有租约的执行器ID（为空时只校验任务仍在执行）
         
         Returns:
-            更新后的任务对象
+            更新后的任务对象，租约已丢失时返回None
         """
-        task = await self.task_repo.get_by_id(task_id)
-        if not task:
-            return None
-        
-        task.status = TaskStatus.COMPLETED
-        task.progress = 1.0
-        task.completed_at = datetime.now()
+        values: Dict[str, Any] = {
+            "status": TaskStatus.COMPLETED,
+            "progress": 1.0,
+            "completed_at": datetime.now(),
+            "lease_expires_at": None,
+            "checkpoint": None,
+        }
         if result:
-            task.result = result
+            values["result"] = result
         
-        return await self.task_repo.update(task_id, task)
+        return await self._finish(task_id, worker_id, values)
     
     async def mark_task_failed(
         self,
         task_id: str,
         error_message: str,
-        retry: bool = False
+        retry: bool = False,
+        worker_id: Optional[str] = None
     ) -> Optional[TaskQueue]:
         """
         标记任务失败
         
+        需要重试时按指数退避重新入队（到期后由执行器轮询认领），重试次数耗尽后进入死信；
+        不重试时直接标记为失败。与mark_task_completed相同，租约已丢失时不写入。
+        
         Args:
             task_id: 任务ID
             error_message: 错误信息
             retry: 是否重试
+            worker_id: 持有租约的执行器ID（为空时只校验任务仍在执行）
         
         Returns:
-            更新后的任务对象
+            更新后的任务对象，租约已丢失时返回None
         """
         task = await self.task_repo.get_by_id(task_id)
         if not task:
             return None
         
-        task.retry_count += 1
-        
-        # 如果未超过最大重试次数且需要重试，重置为pending
-        if retry and task.retry_count <= task.max_retries:
-            task.status = TaskStatus.PENDING
-            task.error_message = None
-            task.started_at = None
-            
-            # 通知task_executor重试
-            await self.notifier.notify(task_id)
-            logger.info(f"任务重试: task_id={task_id}, retry_count={task.retry_count}")
+        now = datetime.now()
+        if retry:
+            values = retry_values(task.retry_count + 1, task.max_retries, now, retry_delay, error_message)
         else:
-            task.status = TaskStatus.FAILED
-            task.error_message = error_message
-            task.completed_at = datetime.now()
-            logger.error(f"任务失败: task_id={task_id}, error={error_message}")
+            values = {
+                "status": TaskStatus.FAILED,
+                "error_message": error_message,
+                "completed_at": now,
+                "worker_id": None,
+                "lease_expires_at": None,
+            }
         
-        return await self.task_repo.update(task_id, task)
-
+        task = await self._finish(task_id, worker_id, values)
+        if not task:
+            return None
+        
+        if task.status == TaskStatus.PENDING:
+            logger.warning(
+                f"任务失败，退避后重试: task_id={task_id}, retry_count={task.retry_count}/{task.max_retries}, "
+                f"next_run_at={task.next_run_at}, error={error_message}"
+            )
+        elif task.status == TaskStatus.DEAD_LETTER:
+            logger.error(f"任务重试次数已耗尽，进入死信: task_id={task_id}, error={error_message}")
+        else:
+            logger.error(f"任务失败: task_id={task_id}, error={error_message}")
+        return task
+    
+    async def _finish(self, task_id: str, worker_id: Optional[str], values: Dict[str, Any]) -> Optional[TaskQueue]:
+        """按租约条件写入任务的最终状态并发布事件，租约已丢失时只记录日志"""
+        task = await self.task_repo.finish(task_id, worker_id, values)
+        if not task:
+            logger.warning(
+                f"任务已不在本执行器名下（已取消、已结束或租约已被回收），跳过写入: "
+                f"task_id={task_id}, worker_id={worker_id}, status={values['status'].value}"
+            )
+            return None
+        await self._publish_progress(task)
+        return task
+    
+    async def _update_and_publish(self, task: TaskQueue) -> Optional[TaskQueue]:
+        """写库并发布任务的状态/进度事件"""
+        task = await self.task_repo.update(task.id, task)
+        await self._publish_progress(task)
+        return task
+    
+    async def _publish_progress(self, task: Optional[TaskQueue]) -> None:
+        """发布任务的状态/进度事件（订阅者通过SSE接口实时收到）"""
+        if task:
+            await publish_progress(PROGRESS_KIND_TASK, task.id, task_progress_event(task))
@@ -0,0 +1,138 @@
+"""
+任务调度策略
+在执行器的空闲槽位内，从待执行任务窗口中选出下一批要认领的任务：
+优先级高的先执行；每种任务类型、每类资源（embedding / db）有独立的并发上限，
+避免长时间的导入任务占满执行器而让写入任务排队；同优先级时正在运行任务数少的知识库优先，
+避免单个知识库的大批任务饿死其他知识库
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.models.task_queue import TaskQueue, TaskType
+
+
+@dataclass
+class RunningTaskInfo:
+    """执行中任务的调度信息"""
+    task_type: str
+    fair_share_key: str
+    resource: str
+
+
+class TaskScheduler:
+    """优先级 + 任务类型/资源并发池 + 知识库公平分配的调度器"""
+    
+    def __init__(
+        self,
+        type_limits: Optional[Dict[str, int]] = None,
+        resource_limits: Optional[Dict[str, int]] = None
+    ):
+        """
+        初始化调度器
+        
+        Args:
+            type_limits: 任务类型 -> 最大并发数（未配置的类型只受总并发限制）
+            resource_limits: 资源 -> 最大并发数（未配置的资源只受总并发限制）
+        """
+        self.type_limits = settings.TASK_TYPE_MAX_CONCURRENT if type_limits is None else type_limits
+        self.resource_limits = settings.TASK_RESOURCE_MAX_CONCURRENT if resource_limits is None else resource_limits
+    
+    @staticmethod
+    def resource_of(task: TaskQueue) -> str:
+        """
+        任务主要占用的资源
+        
+        已携带稠密向量的文档写入只写数据库，其余任务都需要调用向量模型
+        
+        Args:
+            task: 任务
+        
+        Returns:
+            资源名称：db 或 embedding
+        """
+        if task.task_type == TaskType.DOCUMENT_WRITE and (task.payload or {}).get("dense_vectors"):
+            return "db"
+        return "embedding"
+    
+    @staticmethod
+    def fair_share_key(task: TaskQueue) -> str:
+        """
+        公平分配的分组键（知识库ID，缺失时按任务类型分组）
+        
+        Args:
+            task: 任务
+        
+        Returns:
+            分组键
+        """
+        kb_id = (task.payload or {}).get("kb_id")
+        return f"kb:{kb_id}" if kb_id else f"type:{task.task_type.value}"
+    
+    def describe(self, task: TaskQueue) -> RunningTaskInfo:
+        """
+        提取任务的调度信息（执行器登记运行中任务时使用）
+        
+        Args:
+            task: 任务
+        
+        Returns:
+            调度信息
+        """
+        return RunningTaskInfo(
+            task_type=task.task_type.value,
+            fair_share_key=self.fair_share_key(task),
+            resource=self.resource_of(task)
+        )
+    
+    def select(
+        self,
+        candidates: List[TaskQueue],
+        running: List[RunningTaskInfo],
+        free_slots: int
+    ) -> List[TaskQueue]:
+        """
+        从候选窗口中选出本轮要认领的任务
+        
+        每次在满足任务类型和资源并发上限的候选中，按（优先级降序、所属知识库运行中任务数升序、
+        窗口内顺序）取一个，并把它计入运行中的占用，直到槽位用完或没有可选任务
+        
+        Args:
+            candidates: 待执行任务（已按优先级降序、创建时间升序排列）
+            running: 执行中任务的调度信息
+            free_slots: 空闲槽位数
+        
+        Returns:
+            选中的任务列表（按选中顺序）
+        """
+        type_counts: Dict[str, int] = {}
+        resource_counts: Dict[str, int] = {}
+        share_counts: Dict[str, int] = {}
+        for info in running:
+            type_counts[info.task_type] = type_counts.get(info.task_type, 0) + 1
+            resource_counts[info.resource] = resource_counts.get(info.resource, 0) + 1
+            share_counts[info.fair_share_key] = share_counts.get(info.fair_share_key, 0) + 1
+        
+        remaining = [(index, task, self.describe(task)) for index, task in enumerate(candidates)]
+        selected: List[TaskQueue] = []
+        while remaining and len(selected) < free_slots:
+            eligible = [
+                item for item in remaining
+                if type_counts.get(item[2].task_type, 0) < self.type_limits.get(item[2].task_type, free_slots + len(running))
+                and resource_counts.get(item[2].resource, 0) < self.resource_limits.get(item[2].resource, free_slots + len(running))
+            ]
+            if not eligible:
+                break
+            
+            index, task, info = min(
+                eligible,
+                key=lambda item: (-item[1].priority, share_counts.get(item[2].fair_share_key, 0), item[0])
+            )
+            selected.append(task)
+            remaining = [item for item in remaining if item[0] != index]
+            type_counts[info.task_type] = type_counts.get(info.task_type, 0) + 1
+            resource_counts[info.resource] = resource_counts.get(info.resource, 0) + 1
+            share_counts[info.fair_share_key] = share_counts.get(info.fair_share_key, 0) + 1
+        
+        return selected
@@ -0,0 +1,347 @@
+"""
+任务执行器
+按并发上限执行任务队列中的任务：调度、认领、执行、取消、心跳续约、轮询和过期租约回收。
+独立执行器进程（task_executor.py）和inprocess通知模式下的API进程共用
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.models.task_queue import TaskQueue
+from app.services.task_executor_service import TaskExecutorService
+from app.services.task_queue_service import TaskQueueService
+from app.services.task_scheduler import TaskScheduler, RunningTaskInfo
+from app.services.task_cancellation import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+
+class TaskExecutor:
+    """
+    任务执行器
+    
+    任务通过原子认领（pending → running）获取，多个执行器实例不会重复执行同一任务；
+    通知（HTTP / 进程内队列 / MQ）用于低延迟触发，轮询兜底认领通知丢失的任务。执行期间定期心跳续约，
+    租约过期（执行器崩溃或失联）的任务由回收循环退避后重新入队或转入死信。
+    
+    通知只唤醒调度，不直接执行：每轮从待执行任务窗口中按优先级、任务类型/资源并发上限和
+    知识库公平分配（TaskScheduler）选出任务后再逐个认领。
+    
+    每个执行中的任务持有一个取消令牌，任务被取消时置位令牌：业务循环在批次边界停止并中断进行中的外部调用，
+    超过宽限时间仍未停止的直接取消协程，保证并发槽位及时释放。
+    
+    准入控制：执行器内存中只保留执行中的任务（不超过max_concurrent），超出的任务留在数据库队列中；
+    并发已满时收到的通知不触发调度（槽位释放时会自动调度），每轮调度只读取有界的候选窗口。
+    """
+    
+    def __init__(self, max_concurrent: int = 5, worker_id: Optional[str] = None):
+        """
+        初始化任务执行器
+        
+        Args:
+            max_concurrent: 最大并发数
+            worker_id: 执行器ID（为空时自动生成）
+        """
+        self.max_concurrent = max_concurrent
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.running_tasks: Dict[str, asyncio.Task] = {}
+        self.running_info: Dict[str, RunningTaskInfo] = {}
+        self.cancel_tokens: Dict[str, CancellationToken] = {}
+        self.scheduler = TaskScheduler()
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.task_queue_service = TaskQueueService()
+        self.executor_service = TaskExecutorService()
+        self._wakeup = asyncio.Event()
+        self.notifications_received = 0
+        self.notifications_deferred = 0
+        self.last_poll: Dict[str, int] = {"window": 0, "selected": 0, "claimed": 0}
+        self._poll_task: Optional[asyncio.Task] = None
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._consumer_task: Optional[asyncio.Task] = None
+    
+    async def process_task(
+        self,
+        task_id: str,
+        task: Optional[TaskQueue] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> None:
+        """
+        处理单个任务（带并发控制）
+        
+        Args:
+            task_id: 任务ID
+            task: 已由轮询认领的任务（为空时先认领task_id）
+            cancel_token: 取消令牌
+        """
+        async with self.semaphore:  # 获取信号量，控制并发
+            try:
+                if task is None:
+                    # 原子认领，其他执行器已认领或任务已结束时跳过
+                    task = await self.task_queue_service.claim_task(task_id, self.worker_id)
+                    if not task:
+                        logger.info(f"任务未能认领（不存在或已被认领），跳过执行: task_id={task_id}")
+                        return
+                
+                # 执行任务，期间定期续约
+                heartbeat = asyncio.create_task(self._heartbeat_loop(task_id))
+                try:
+                    await self.executor_service.execute_task(task, cancel_token)
+                finally:
+                    heartbeat.cancel()
+                
+            except asyncio.CancelledError:
+                logger.warning(f"任务执行被取消: task_id={task_id}")
+                raise
+            except Exception as e:
+                logger.error(
+                    f"任务执行异常: task_id={task_id}, error={str(e)}",
+                    exc_info=True
+                )
+            finally:
+                # 释放出并发槽位，立即尝试认领下一个待执行任务
+                self._wakeup.set()
+    
+    async def _heartbeat_loop(self, task_id: str) -> None:
+        """
+        定期续约执行中的任务；任务已被用户取消时置位取消令牌，
+        租约已被其他执行器接管时直接取消本地执行，避免重复执行
+        
+        Args:
+            task_id: 任务ID
+        """
+        while True:
+            await asyncio.sleep(settings.TASK_HEARTBEAT_INTERVAL)
+            try:
+                renewed = await self.task_queue_service.renew_lease(task_id, self.worker_id)
+            except Exception as e:
+                logger.warning(f"任务续约失败，稍后重试: task_id={task_id}, error={str(e)}")
+                continue
+            if not renewed:
+                try:
+                    if await self.handle_cancel(task_id):
+                        return
+                except Exception as e:
+                    logger.warning(f"检查任务取消状态失败: task_id={task_id}, error={str(e)}")
+                logger.warning(f"任务租约已丢失，停止本地执行: task_id={task_id}, worker_id={self.worker_id}")
+                running = self.running_tasks.get(task_id)
+                if running:
+                    running.cancel()
+                return
+    
+    def _start(self, task_id: str, task: TaskQueue) -> None:
+        """创建执行协程并登记到running_tasks（同时登记调度信息）"""
+        cancel_token = CancellationToken()
+        running = asyncio.create_task(self.process_task(task_id, task, cancel_token))
+        self.running_tasks[task_id] = running
+        self.running_info[task_id] = self.scheduler.describe(task)
+        self.cancel_tokens[task_id] = cancel_token
+        
+        # 任务完成后清理
+        def cleanup(t):
+            self.running_tasks.pop(task_id, None)
+            self.running_info.pop(task_id, None)
+            self.cancel_tokens.pop(task_id, None)
+        
+        running.add_done_callback(cleanup)
+    
+    @property
+    def free_slots(self) -> int:
+        """空闲并发槽位数"""
+        return max(0, self.max_concurrent - len(self.running_tasks))
+    
+    async def handle_notify(self, task_id: str) -> bool:
+        """
+        接收任务通知，唤醒调度（由调度按优先级和并发池决定何时执行）
+        
+        并发已满时不唤醒调度：任务留在数据库队列中，有槽位释放时调度循环按优先级认领
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            是否唤醒了调度（已在执行或并发已满时返回False）
+        """
+        self.notifications_received += 1
+        
+        # 检查任务是否已在运行
+        if task_id in self.running_tasks:
+            logger.info(f"任务已在执行中，跳过: task_id={task_id}")
+            return False
+        
+        if self.free_slots == 0:
+            self.notifications_deferred += 1
+            logger.debug(f"执行器并发已满，任务留在队列中等待调度: task_id={task_id}")
+            return False
+        
+        self._wakeup.set()
+        logger.info(f"已接收任务通知: task_id={task_id}")
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        执行器的并发和调度指标（/health 接口展示）
+        
+        Returns:
+            指标字典
+        """
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running_tasks": len(self.running_tasks),
+            "free_slots": self.free_slots,
+            "running_by_type": dict(Counter(info.task_type for info in self.running_info.values())),
+            "notifications_received": self.notifications_received,
+            "notifications_deferred": self.notifications_deferred,
+            "last_poll": dict(self.last_poll),
+            "polling": self._poll_task is not None and not self._poll_task.done(),
+        }
+    
+    async def handle_cancel(self, task_id: str) -> bool:
+        """
+        取消本执行器上运行中的任务（任务需已在任务队列中标记为取消）
+        
+        置位取消令牌，让任务在批次边界停止（按需清理部分写入的数据）；
+        超过TASK_CANCEL_GRACE_SECONDS仍未停止时直接取消协程
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            是否已取消（任务不在本执行器上运行或未被标记取消时返回False）
+        """
+        cancel_token = self.cancel_tokens.get(task_id)
+        if cancel_token is None:
+            return False
+        
+        task = await self.task_queue_service.get_task(task_id)
+        cancel_info = (task.result or {}) if task else {}
+        if not cancel_info.get("cancelled"):
+            return False
+        
+        if not cancel_token.cancelled:
+            cancel_token.cancel(task.error_message or "任务已被取消", bool(cancel_info.get("cleanup")))
+            asyncio.create_task(self._force_cancel_after_grace(task_id, self.running_tasks.get(task_id)))
+            logger.info(f"已请求取消任务: task_id={task_id}, cleanup={cancel_token.cleanup}")
+        return True
+    
+    async def _force_cancel_after_grace(self, task_id: str, running: Optional[asyncio.Task]) -> None:
+        """宽限时间后任务仍未停止时直接取消协程，释放并发槽位"""
+        if running is None:
+            return
+        await asyncio.sleep(settings.TASK_CANCEL_GRACE_SECONDS)
+        if not running.done():
+            logger.warning(f"任务未在宽限时间内停止，强制取消: task_id={task_id}")
+            running.cancel()
+    
+    async def poll_once(self) -> int:
+        """
+        调度一轮：读取待执行任务窗口，按调度策略选出任务并逐个认领
+        
+        Returns:
+            本次认领的任务数
+        """
+        free_slots = self.free_slots
+        if free_slots == 0:
+            return 0
+        
+        candidates = [
+            task for task in await self.task_queue_service.list_runnable_tasks(settings.TASK_SCHEDULE_WINDOW)
+            if task.id not in self.running_tasks
+        ]
+        selected = self.scheduler.select(candidates, list(self.running_info.values()), free_slots)
+        
+        claimed_count = 0
+        for candidate in selected:
+            # 窗口是只读快照，其他执行器可能已先认领
+            task = await self.task_queue_service.claim_task(candidate.id, self.worker_id)
+            if not task:
+                continue
+            self._start(task.id, task)
+            claimed_count += 1
+            logger.info(
+                f"调度认领任务: task_id={task.id}, task_type={task.task_type.value}, "
+                f"priority={task.priority}, resource={self.running_info[task.id].resource}"
+            )
+        self.last_poll = {"window": len(candidates), "selected": len(selected), "claimed": claimed_count}
+        return claimed_count
+    
+    async def _poll_loop(self) -> None:
+        """调度循环：每个间隔（或收到通知、有并发槽位释放时）调度待执行任务"""
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error(f"轮询待执行任务失败: {str(e)}", exc_info=True)
+            
+            # 等待下一个间隔，或收到通知、有并发槽位释放时提前醒来
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.TASK_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _reaper_loop(self) -> None:
+        """回收循环：定期把租约过期的任务退避后重新入队（或转入死信）"""
+        while True:
+            try:
+                requeued = await self.task_queue_service.requeue_expired_tasks()
+                if requeued:
+                    self._wakeup.set()
+            except Exception as e:
+                logger.error(f"回收过期任务失败: {str(e)}", exc_info=True)
+            await asyncio.sleep(settings.TASK_REAPER_INTERVAL)
+    
+    def _start_notification_consumer(self) -> Optional[asyncio.Task]:
+        """按通知器类型启动通知消费（HTTP通知由执行器服务的接口接收，无需消费）"""
+        from app.services.task_notifier.factory import TaskNotifierFactory
+        from app.services.task_notifier.inprocess_notifier import InProcessTaskChannel
+        
+        notifier_type = TaskNotifierFactory.get_notifier_type()
+        if notifier_type == "inprocess":
+            return asyncio.create_task(InProcessTaskChannel().consume(self.handle_notify, self.handle_cancel))
+        if notifier_type == "mq":
+            return asyncio.create_task(TaskNotifierFactory.create_broker().consume(self.handle_notify))
+        return None
+    
+    def start(self) -> None:
+        """启动通知消费、轮询和回收循环"""
+        if self._consumer_task is None:
+            self._consumer_task = self._start_notification_consumer()
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll_loop())
+        if self._reaper_task is None:
+            self._reaper_task = asyncio.create_task(self._reaper_loop())
+    
+    async def stop(self) -> None:
+        """停止通知消费、轮询和回收循环"""
+        for loop_task in (self._consumer_task, self._poll_task, self._reaper_task):
+            if loop_task is not None:
+                loop_task.cancel()
+                try:
+                    await loop_task
+                except asyncio.CancelledError:
+                    pass
+        self._consumer_task = None
+        self._poll_task = None
+        self._reaper_task = None
+
+
+# 全局executor实例
+_executor: TaskExecutor = None
+
+
+def get_task_executor() -> TaskExecutor:
+    """获取全局executor实例（独立执行器进程，或inprocess通知模式下的API进程）"""
+    global _executor
+    if _executor is None:
+        max_concurrent = getattr(settings, 'TASK_EXECUTOR_MAX_CONCURRENT', 5)
+        _executor = TaskExecutor(
+            max_concurrent=max_concurrent,
+            worker_id=settings.TASK_EXECUTOR_WORKER_ID or None
+        )
+    return _executor
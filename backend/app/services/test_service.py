@@ -25,6 +25,35 @@ from app.core.singleton import singleton
 logger = logging.getLogger(__name__)
 
 
+async def _bulk_create_cases(
+    test_case_repo,
+    test_cases: List[Any],
+    case_indices: List[int],
+    cases_data: List[Dict[str, Any]],
+    failed_records: List[Dict]
+) -> int:
+    """
+    批量写入测试用例，并将仓储返回的失败条目映射回原始输入序号
+    
+    Returns:
+        成功写入数量
+    """
+    if not test_cases:
+        return 0
+    
+    created, bulk_failed = await test_case_repo.bulk_create(test_cases)
+    for record in bulk_failed:
+        original_idx = case_indices[record["index"]]
+        failed_records.append({
+            "index": original_idx,
+            "question": cases_data[original_idx].get("question", ""),
+            "error": record["error"]
+        })
+    failed_records.sort(key=lambda record: record["index"])
+    
+    return len(created)
+
+
 @singleton
 class TestService:
     """测试服务"""
@@ -229,8 +258,9 @@ class RetrieverTestCaseService:
         if not test_set:
             raise NotFoundException(message=f"测试集不存在: {test_set_id}")
         
-        success_count = 0
         failed_records = []
+        test_cases = []
+        case_indices = []
         
         for idx, case_data in enumerate(cases_data):
             try:
@@ -248,9 +278,8 @@ class RetrieverTestCaseService:
                     expected_answers=expected_answers,
                     metadata=case_data.get("metadata", {})
                 )
-                
-                await self.test_case_repo.create(test_case)
-                success_count += 1
+                test_cases.append(test_case)
+                case_indices.append(idx)
                 
             except Exception as e:
                 failed_records.append({
@@ -259,6 +288,11 @@ class RetrieverTestCaseService:
                     "error": str(e)
                 })
         
+        # 批量写入（冲突按条目返回）
+        success_count = await _bulk_create_cases(
+            self.test_case_repo, test_cases, case_indices, cases_data, failed_records
+        )
+        
         # 更新测试集的用例数量
         if success_count > 0:
             test_set.case_count += success_count
@@ -499,8 +533,9 @@ class GenerationTestCaseService:
         if not test_set:
             raise NotFoundException(message=f"测试集不存在: {test_set_id}")
         
-        success_count = 0
         failed_records = []
+        test_cases = []
+        case_indices = []
         
         for idx, case_data in enumerate(cases_data):
             try:
@@ -514,9 +549,8 @@ class GenerationTestCaseService:
                     reference_contexts=case_data.get("reference_contexts", []),
                     metadata=case_data.get("metadata", {})
                 )
-                
-                await self.test_case_repo.create(test_case)
-                success_count += 1
+                test_cases.append(test_case)
+                case_indices.append(idx)
                 
             except Exception as e:
                 failed_records.append({
@@ -525,6 +559,11 @@ class GenerationTestCaseService:
                     "error": str(e)
                 })
         
+        # 批量写入（冲突按条目返回）
+        success_count = await _bulk_create_cases(
+            self.test_case_repo, test_cases, case_indices, cases_data, failed_records
+        )
+        
         # 更新测试集的用例数量
         if success_count > 0:
             test_set.case_count += success_count
@@ -15,12 +15,19 @@ from app.models.test import (
 )
 from app.schemas.test import ImportTestSetToKnowledgeBaseRequest, ImportPreviewResponse
 from app.repositories.factory import RepositoryFactory
-from app.core.exceptions import NotFoundException
+from app.core.exceptions import NotFoundException, ConflictException
+from app.config import settings
 from app.services.document import DocumentService
 from app.services.knowledge_base import KnowledgeBaseService
 from app.services.document_processor import DocumentProcessor
 from app.services.rag_service import RAGService
-from app.models.document import DocumentChunk, DocumentStatus
+from app.services.token_cache_service import get_token_cache_service
+from app.models.document import Document, DocumentChunk, DocumentStatus
+from app.services.task_queue_service import TaskCheckpoint
+from app.services.task_cancellation import CancellationToken, TaskCancelledError, run_cancellable
+from app.services.task_progress import (
+    PROGRESS_KIND_IMPORT_TASK, ProgressThrottle, publish_progress, import_task_progress_event
+)
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +41,8 @@ class TestSetImportService:
         self.import_task_repo = RepositoryFactory.create_import_task_repository()
         self.retriever_case_repo = RepositoryFactory.create_retriever_test_case_repository()
         self.generation_case_repo = RepositoryFactory.create_generation_test_case_repository()
+        self.doc_repo = RepositoryFactory.create_document_repository()
+        self.chunk_repo = RepositoryFactory.create_document_chunk_repository()
         self.document_service = DocumentService()
         self.kb_service = KnowledgeBaseService()
     
@@ -56,16 +65,11 @@ class TestSetImportService:
         # 提取所有答案文本
         answers = await self._extract_answers_from_test_set(test_set_id, test_set.test_type)
         
-        # 检查已存在的文档（基于external_id）
-        existing_count = 0
-        for answer in answers:
-            external_id = answer["external_id"]
-            # 检查知识库中是否存在该external_id的文档
-            doc_repo = RepositoryFactory.create_document_repository()
-            filters = {"kb_id": kb_id, "external_id": external_id}
-            existing_docs = await doc_repo.get_all(skip=0, limit=1, filters=filters)
-            if existing_docs:
-                existing_count += 1
+        # 检查已存在的文档（基于external_id，一次查询）
+        existing_docs = await self._get_existing_documents(
+            kb_id, [answer["external_id"] for answer in answers]
+        )
+        existing_count = sum(1 for answer in answers if answer["external_id"] in existing_docs)
         
         total_answers = len(answers)
         new_docs = total_answers - existing_count
@@ -82,7 +86,16 @@ class TestSetImportService:
         test_set_id: str,
         request: ImportTestSetToKnowledgeBaseRequest
     ) -> ImportTask:
-        """导入测试集到知识库（异步任务）"""
+        """
+        导入测试集到知识库（异步任务）
+        
+        同一测试集导入同一知识库的任务在排队或执行时，重复提交返回已有的导入任务；
+        幂等键不包含update_existing，选项不同时不会另起一个并发写入相同文档的任务，而是拒绝提交
+        
+        Raises:
+            NotFoundException: 测试集或知识库不存在
+            ConflictException: 已有导入任务在进行中，且update_existing与本次请求不同
+        """
         # 验证测试集存在
         test_set = await self.test_set_repo.get_by_id(test_set_id)
         if not test_set:
@@ -133,32 +146,77 @@ class TestSetImportService:
         await self.import_task_repo.create(import_task)
         
         # 创建任务队列任务，由task_executor异步执行
-        from app.services.task_queue_service import TaskQueueService
+        # 同一测试集导入同一知识库的任务在排队或执行时，重复提交合并到已有任务
+        from app.services.task_queue_service import TaskQueueService, task_idempotency_key
         from app.models.task_queue import TaskType
         
         task_service = TaskQueueService()
-        await task_service.create_task(
+        queue_task = await task_service.create_task(
             task_type=TaskType.TEST_SET_IMPORT,
             payload={
                 "import_task_id": import_task_id,
+                "kb_id": request.kb_id,
                 "update_existing": request.update_existing
-            }
+            },
+            idempotency_key=task_idempotency_key(
+                TaskType.TEST_SET_IMPORT, {"test_set_id": test_set_id, "kb_id": request.kb_id}
+            )
         )
         
+        existing_import_task_id = queue_task.payload.get("import_task_id")
+        if existing_import_task_id != import_task_id:
+            existing_import_task = await self.import_task_repo.get_by_id(existing_import_task_id)
+            if existing_import_task:
+                await self.import_task_repo.delete(import_task_id)
+                existing_update_existing = queue_task.payload.get("update_existing", False)
+                if existing_update_existing != request.update_existing:
+                    raise ConflictException(
+                        message=(
+                            f"测试集 {test_set_id} 导入知识库 {request.kb_id} 的任务已在进行中，"
+                            f"但选项不同（update_existing={existing_update_existing}），请等待其完成后再提交"
+                        ),
+                        details={
+                            "import_task_id": existing_import_task_id,
+                            "update_existing": existing_update_existing
+                        }
+                    )
+                logger.info(f"测试集 {test_set_id} 导入知识库 {request.kb_id} 的任务已在进行中，返回已有导入任务: {existing_import_task_id}")
+                return existing_import_task
+        
         return import_task
     
-    async def _execute_import_task(self, import_task_id: str, update_existing: bool):
-        """执行导入任务（后台异步）"""
+    async def _execute_import_task(
+        self,
+        import_task_id: str,
+        update_existing: bool,
+        checkpoint: Optional[TaskCheckpoint] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ):
+        """
+        执行导入任务（后台异步）
+        
+        Args:
+            import_task_id: 导入任务ID
+            update_existing: 是否更新已存在的文档
+            checkpoint: 任务队列检查点，每批完成后保存游标，重试时跳过已处理的批次
+            cancel_token: 取消令牌，每批开始前检查，取消时中断进行中的批次
+        
+        Raises:
+            TaskCancelledError: 任务被取消（按需清理本次新建的文档及其分块和向量）
+        """
         import_task = await self.import_task_repo.get_by_id(import_task_id)
         if not import_task:
             logger.error(f"导入任务不存在: {import_task_id}")
             return
         
+        state = checkpoint.state if checkpoint else {}
+        created_doc_ids: List[str] = []
         try:
-            # 更新任务状态为运行中
+            # 更新任务状态为运行中（从检查点继续时保留首次开始时间）
             import_task.status = "running"
-            import_task.started_at = datetime.now()
-            await self.import_task_repo.update(import_task_id, import_task)
+            if not state or not import_task.started_at:
+                import_task.started_at = datetime.now()
+            await self._update_import_task(import_task)
             
             # 提取答案文本
             test_set = await self.test_set_repo.get_by_id(import_task.test_set_id)
@@ -168,105 +226,198 @@ class TestSetImportService:
             )
             
             import_task.total_docs = len(answers)
-            await self.import_task_repo.update(import_task_id, import_task)
+            await self._update_import_task(import_task)
             
-            # 批量导入文档
+            # 一次查询解析所有已存在的external_id
+            existing_docs = await self._get_existing_documents(
+                import_task.kb_id, [answer["external_id"] for answer in answers]
+            )
+            
+            # 按批导入文档：批量建档、批量嵌入/稀疏编码、批量写入向量库
             imported_count = 0
             failed_count = 0
+            processed_count = 0
+            batch_size = max(1, settings.TEST_SET_IMPORT_BATCH_SIZE)
+            progress_throttle = ProgressThrottle()
+            source = f"test_set_import_{import_task.test_set_id}"
+            
+            # 检查点与当前答案数一致时从游标继续（测试集被修改过则从头导入）
+            if state.get("total") == len(answers):
+                processed_count = state.get("next_index", 0)
+                imported_count = state.get("imported", 0)
+                failed_count = state.get("failed", 0)
+                logger.info(f"导入任务 {import_task_id} 从检查点继续: {processed_count}/{len(answers)}")
             
-            for i, answer in enumerate(answers):
+            for batch_start in range(processed_count, len(answers), batch_size):
+                batch = answers[batch_start:batch_start + batch_size]
                 try:
-                    external_id = answer["external_id"]
-                    content = answer["content"]
-                    
-                    # 检查文档是否已存在
-                    doc_repo = RepositoryFactory.create_document_repository()
-                    filters = {"kb_id": import_task.kb_id, "external_id": external_id}
-                    existing_docs = await doc_repo.get_all(skip=0, limit=1, filters=filters)
-                    
-                    if existing_docs and update_existing:
-                        # 更新已存在的文档
-                        doc = existing_docs[0]
-                        doc.content = content
-                        doc.metadata = answer.get("metadata", {})
-                        await doc_repo.update(doc.id, doc)
-                        
-                        # 删除旧的chunks并重新处理文档
-                        try:
-                            await self._delete_document_chunks(doc.id)
-                            await self._process_imported_document(doc, import_task.kb_id)
-                            imported_count += 1
-                        except Exception as e:
-                            logger.error(f"处理文档失败 {doc.id}: {e}", exc_info=True)
-                            failed_count += 1
-                    elif not existing_docs:
-                        # 创建新文档
-                        documents_dict = {external_id: content}
-                        created_docs, failed_docs = await self.document_service.batch_create_documents_from_dict(
-                            kb_id=import_task.kb_id,
-                            documents=documents_dict,
-                            source=f"test_set_import_{import_task.test_set_id}"
-                        )
-                        if created_docs:
-                            # 文档创建时已经设置了external_id，只需要更新metadata
-                            doc = created_docs[0]
-                            if doc.metadata:
-                                doc.metadata.update(answer.get("metadata", {}))
-                            else:
-                                doc.metadata = answer.get("metadata", {})
-                            await doc_repo.update(doc.id, doc)
-                            
-                            # 处理文档：不分块，直接写入向量库
-                            try:
-                                await self._process_imported_document(doc, import_task.kb_id)
-                                imported_count += 1
-                            except Exception as e:
-                                logger.error(f"处理文档失败 {doc.id}: {e}", exc_info=True)
-                                failed_count += 1
-                        else:
-                            failed_count += 1
-                    else:
-                        # 跳过（已存在但不更新）
-                        pass
-                    
-                    # 更新进度
-                    progress = (i + 1) / len(answers)
-                    import_task.progress = progress
-                    import_task.imported_docs = imported_count
-                    import_task.failed_docs = failed_count
-                    await self.import_task_repo.update(import_task_id, import_task)
-                    
+                    batch_imported, batch_failed = await run_cancellable(
+                        self._import_answer_batch(
+                            batch, existing_docs, import_task.kb_id, update_existing, source, created_doc_ids
+                        ),
+                        cancel_token
+                    )
+                    imported_count += batch_imported
+                    failed_count += batch_failed
+                except TaskCancelledError:
+                    raise
                 except Exception as e:
-                    logger.error(f"导入文档失败: {e}", exc_info=True)
-                    failed_count += 1
-                    import_task.failed_docs = failed_count
+                    logger.error(f"导入批次失败 [{batch_start}, {batch_start + len(batch)}): {e}", exc_info=True)
+                    failed_count += len(batch)
+                
+                # 每批发布一次进度事件，按节流间隔写库
+                processed_count += len(batch)
+                import_task.progress = processed_count / len(answers)
+                import_task.imported_docs = imported_count
+                import_task.failed_docs = failed_count
+                await publish_progress(PROGRESS_KIND_IMPORT_TASK, import_task_id, import_task_progress_event(import_task))
+                if progress_throttle.due():
                     await self.import_task_repo.update(import_task_id, import_task)
+                if checkpoint:
+                    await checkpoint.save(
+                        {
+                            "total": len(answers),
+                            "next_index": processed_count,
+                            "imported": imported_count,
+                            "failed": failed_count
+                        },
+                        progress=import_task.progress
+                    )
+                logger.info(
+                    f"导入任务 {import_task_id} 进度: {processed_count}/{len(answers)}，"
+                    f"成功 {imported_count}，失败 {failed_count}"
+                )
             
             # 完成任务
             import_task.status = "completed"
             import_task.completed_at = datetime.now()
             import_task.progress = 1.0
-            await self.import_task_repo.update(import_task_id, import_task)
+            await self._update_import_task(import_task)
             
+        except TaskCancelledError as e:
+            logger.info(f"导入任务 {import_task_id} 已取消: {e.reason}")
+            if e.cleanup and created_doc_ids:
+                await self._delete_document_chunks(created_doc_ids)
+                await self.doc_repo.bulk_delete(created_doc_ids)
+                logger.info(f"已清理导入任务 {import_task_id} 本次新建的 {len(created_doc_ids)} 个文档")
+            import_task.status = "failed"
+            import_task.error_message = e.reason
+            import_task.completed_at = datetime.now()
+            await self._update_import_task(import_task)
+            raise
         except Exception as e:
             logger.error(f"导入任务执行失败: {e}", exc_info=True)
             import_task.status = "failed"
             import_task.error_message = str(e)
             import_task.completed_at = datetime.now()
-            await self.import_task_repo.update(import_task_id, import_task)
+            await self._update_import_task(import_task)
+    
+    async def _update_import_task(self, import_task: ImportTask):
+        """写库并发布导入任务状态事件（状态变化时调用，不节流）"""
+        await self.import_task_repo.update(import_task.id, import_task)
+        await publish_progress(PROGRESS_KIND_IMPORT_TASK, import_task.id, import_task_progress_event(import_task))
+    
+    async def _get_existing_documents(
+        self,
+        kb_id: str,
+        external_ids: List[str]
+    ) -> Dict[str, Document]:
+        """
+        一次查询解析知识库中已存在的external_id
+        
+        Returns:
+            {external_id: 文档}
+        """
+        if not external_ids:
+            return {}
+        
+        docs = await self.doc_repo.get_by_field_values(
+            "external_id", external_ids, filters={"kb_id": kb_id}
+        )
+        return {doc.external_id: doc for doc in docs}
+    
+    async def _import_answer_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        existing_docs: Dict[str, Document],
+        kb_id: str,
+        update_existing: bool,
+        source: str,
+        created_doc_ids: Optional[List[str]] = None
+    ) -> Tuple[int, int]:
+        """
+        导入一批答案
+        
+        Args:
+            created_doc_ids: 新建文档ID的收集列表（文档建档后立即追加，取消时用于清理）
+        
+        Returns:
+            (成功数量, 失败数量)
+        """
+        updated_docs = []
+        new_contents = {}
+        new_metadata = {}
+        
+        for answer in batch:
+            external_id = answer["external_id"]
+            doc = existing_docs.get(external_id)
+            if doc:
+                if update_existing:
+                    doc.content = answer["content"]
+                    doc.metadata = answer.get("metadata", {})
+                    updated_docs.append(doc)
+                # 已存在但不更新则跳过
+            else:
+                new_contents[external_id] = answer["content"]
+                new_metadata[external_id] = answer.get("metadata", {})
+        
+        failed_count = 0
+        
+        # 已存在的文档：批量更新内容，并删除旧的chunks和向量
+        if updated_docs:
+            await self.doc_repo.bulk_update(updated_docs)
+            await self._delete_document_chunks([doc.id for doc in updated_docs])
+        
+        # 新文档：批量创建
+        created_docs = []
+        if new_contents:
+            created_docs, failed_docs = await self.document_service.batch_create_documents_from_dict(
+                kb_id=kb_id,
+                documents=new_contents,
+                source=source,
+                metadata_map=new_metadata
+            )
+            failed_count += len(failed_docs)
+            for doc in created_docs:
+                existing_docs[doc.external_id] = doc
+            if created_doc_ids is not None:
+                created_doc_ids.extend(doc.id for doc in created_docs)
+        
+        documents = updated_docs + created_docs
+        if not documents:
+            return 0, failed_count
+        
+        indexed_count = await self._process_imported_documents(documents, kb_id)
+        failed_count += len(documents) - indexed_count
+        
+        return indexed_count, failed_count
     
     async def _extract_answers_from_test_set(
         self,
         test_set_id: str,
         test_type: str
     ) -> List[Dict[str, Any]]:
-        """从测试集中提取所有答案文本"""
+        """
+        从测试集中提取所有答案文本
+        
+        用例按ID排序，答案顺序在多次执行间保持一致（导入检查点按位置记录游标）
+        """
         answers = []
         
         if test_type == "retrieval":
             # 获取所有检索器测试用例
             filters = {"test_set_id": test_set_id}
-            cases = await self.retriever_case_repo.get_all(skip=0, limit=10000, filters=filters)
+            cases = await self.retriever_case_repo.get_all(skip=0, limit=10000, filters=filters, order_by="id")
             
             for case in cases:
                 for idx, expected_answer in enumerate(case.expected_answers):
@@ -288,7 +439,7 @@ class TestSetImportService:
         elif test_type == "generation":
             # 获取所有生成测试用例
             filters = {"test_set_id": test_set_id}
-            cases = await self.generation_case_repo.get_all(skip=0, limit=10000, filters=filters)
+            cases = await self.generation_case_repo.get_all(skip=0, limit=10000, filters=filters, order_by="id")
             
             for case in cases:
                 # 生成用例的reference_answer作为一个文档
@@ -394,11 +545,14 @@ class TestSetImportService:
         
         return result, total
     
-    async def cancel_import_task(self, import_task_id: str) -> bool:
+    async def cancel_import_task(self, import_task_id: str, cleanup: bool = False) -> bool:
         """终止导入任务
         
+        同时取消任务队列中对应的任务，执行器在当前批次边界停止并中断进行中的嵌入和写入
+        
         Args:
             import_task_id: 导入任务ID
+            cleanup: 是否删除本次执行已新建的文档及其分块和向量
             
         Returns:
             是否成功终止
@@ -418,121 +572,173 @@ class TestSetImportService:
             import_task.started_at = datetime.now()
         import_task.completed_at = datetime.now()
         
-        await self.import_task_repo.update(import_task_id, import_task)
+        await self._update_import_task(import_task)
+        
+        from app.services.task_queue_service import TaskQueueService
+        from app.models.task_queue import TaskType
+        
+        task_service = TaskQueueService()
+        for task in await task_service.find_active_tasks(TaskType.TEST_SET_IMPORT, "import_task_id", import_task_id):
+            await task_service.cancel_task(task.id, import_task.error_message, cleanup=cleanup)
         logger.info(f"导入任务 {import_task_id} 已被终止")
         
         return True
     
-    async def _delete_document_chunks(self, document_id: str):
+    async def _delete_document_chunks(self, document_ids: List[str]):
         """
-        删除文档的所有chunks和对应的向量
+        批量删除文档的所有chunks和对应的向量
         
         Args:
-            document_id: 文档ID
+            document_ids: 文档ID列表
         """
-        chunk_repo = RepositoryFactory.create_document_chunk_repository()
-        filters = {"document_id": document_id}
-        chunks = await chunk_repo.get_all(skip=0, limit=10000, filters=filters)
-        
-        if not chunks:
-            return
-        
-        # 获取知识库ID（从第一个chunk获取）
-        kb_id = chunks[0].kb_id
-        
-        # 收集所有vector_id
-        vector_ids = []
-        for chunk in chunks:
-            if chunk.vector_id:
-                vector_ids.append(chunk.vector_id)
-        
-        # 从向量库中删除向量
-        if vector_ids:
-            try:
-                kb = await self.kb_service.get_knowledge_base(kb_id)
-                if kb:
-                    from app.services.vector_db_service import VectorDBServiceFactory
-                    vector_db = VectorDBServiceFactory.create(kb.vector_db_type)
-                    await vector_db.delete_vectors(kb_id, vector_ids)
-                    logger.info(f"已从向量库删除 {len(vector_ids)} 个向量")
-            except Exception as e:
-                logger.warning(f"从向量库删除向量失败: {e}", exc_info=True)
-        
-        # 删除chunk记录
-        for chunk in chunks:
-            await chunk_repo.delete(chunk.id)
-        
-        logger.info(f"已删除文档 {document_id} 的 {len(chunks)} 个chunks")
+        await self.document_service.delete_document_chunks(document_ids)
     
-    async def _process_imported_document(self, document, kb_id: str):
+    async def _process_imported_documents(self, documents: List[Document], kb_id: str) -> int:
         """
-        处理导入的文档：不分块，直接写入向量库（测试集导入场景）
+        批量处理导入的文档：不分块，整批写入向量库（测试集导入场景）
         
         Args:
-            document: 文档对象
+            documents: 文档对象列表
             kb_id: 知识库ID
+        
+        Returns:
+            处理成功的文档数量（分块记录创建失败或向量索引写入失败的文档计为失败）
         """
         # 获取知识库配置
         kb = await self.kb_service.get_knowledge_base(kb_id)
         if not kb:
             raise NotFoundException(message=f"知识库不存在: {kb_id}")
         
-        # 获取schema配置
-        kb_schema = await self.kb_service.get_knowledge_base_schema(kb_id)
+        # 1. 为每个文档创建单个DocumentChunk记录（代表整个文档）
+        doc_chunks = []
+        indexed_docs = []
+        texts = []
+        metadata_list = []
+        
+        for document in documents:
+            content = document.content or ""
+            if not content:
+                logger.warning(f"文档 {document.id} 内容为空，跳过处理")
+                continue
+            
+            chunk_id = f"chunk_{uuid.uuid4().hex[:12]}"
+            token_count = DocumentProcessor.estimate_tokens(content)
+            
+            doc_chunks.append(DocumentChunk(
+                id=chunk_id,
+                document_id=document.id,
+                kb_id=kb_id,
+                chunk_index=0,  # 测试集导入场景只有一个chunk，索引为0
+                content=content,
+                start_pos=0,
+                end_pos=len(content),
+                token_count=token_count,
+                metadata={}
+            ))
+            indexed_docs.append(document)
+            
+            # 2. 准备元数据（单个文档作为一个向量）
+            metadata = {
+                "document_id": document.id,
+                "chunk_id": chunk_id,
+                "content": content,
+                "char_count": len(content),
+                "token_count": token_count,
+                "source": document.metadata.get("source", "import"),
+                "external_id": document.external_id,
+            }
+            # 添加文档的metadata
+            if document.metadata:
+                metadata.update(document.metadata)
+            
+            texts.append(content)
+            metadata_list.append(metadata)
+        
+        if not doc_chunks:
+            return len(documents)
+        
+        created_chunks, failed_chunks = await self.chunk_repo.bulk_create(doc_chunks)
+        failed_count = 0
+        
+        # 分块记录创建失败的文档不写入向量库（否则向量没有对应的分块记录），计为失败
+        if failed_chunks:
+            logger.warning(f"{len(failed_chunks)} 个chunk记录创建失败: {failed_chunks[:3]}")
+            created_ids = {chunk.id for chunk in created_chunks}
+            chunk_failed_docs = []
+            kept = []
+            for doc_chunk, document, text, metadata in zip(doc_chunks, indexed_docs, texts, metadata_list):
+                if doc_chunk.id in created_ids:
+                    kept.append((doc_chunk, document, text, metadata))
+                else:
+                    document.status = DocumentStatus.FAILED
+                    document.error_message = "分块记录创建失败"
+                    chunk_failed_docs.append(document)
+            await self.doc_repo.bulk_update(chunk_failed_docs)
+            failed_count += len(chunk_failed_docs)
+            
+            doc_chunks = [item[0] for item in kept]
+            indexed_docs = [item[1] for item in kept]
+            texts = [item[2] for item in kept]
+            metadata_list = [item[3] for item in kept]
+            if not doc_chunks:
+                return len(documents) - failed_count
+        
+        # 3. 使用RAGService整批写入向量索引（嵌入、稀疏编码和upsert均按批进行）
+        try:
+            rag_service = RAGService(kb_id=kb_id)
+            await rag_service.write_index(texts, metadata_list=metadata_list)
+        except Exception as e:
+            logger.error(f"批量写入向量索引失败（{len(texts)} 个文档）: {e}", exc_info=True)
+            await self._discard_unindexed_chunks(kb, doc_chunks)
+            for document in indexed_docs:
+                document.status = DocumentStatus.FAILED
+                document.error_message = str(e)
+            await self.doc_repo.bulk_update(indexed_docs)
+            return len(documents) - failed_count - len(indexed_docs)
+        
+        # 缓存分块分词结果
+        try:
+            await get_token_cache_service().index_chunks(
+                kb_id, [chunk.id for chunk in doc_chunks], [chunk.content for chunk in doc_chunks]
+            )
+        except Exception as e:
+            logger.warning(f"写入分块token缓存失败（检索时将重新分词）: {e}")
         
-        # 1. 获取文档内容（不分块）
-        content = document.content or ""
-        if not content:
-            logger.warning(f"文档 {document.id} 内容为空，跳过处理")
-            return
+        # 4. 批量更新chunk的vector_id和is_indexed
+        for doc_chunk in doc_chunks:
+            doc_chunk.vector_id = doc_chunk.id
+            doc_chunk.is_indexed = True
+        await self.chunk_repo.bulk_update(doc_chunks)
         
-        # 2. 创建单个DocumentChunk记录（代表整个文档）
-        chunk_repo = RepositoryFactory.create_document_chunk_repository()
-        chunk_id = f"chunk_{uuid.uuid4().hex[:12]}"
-        token_count = DocumentProcessor.estimate_tokens(content)
-        
-        doc_chunk = DocumentChunk(
-            id=chunk_id,
-            document_id=document.id,
-            kb_id=kb_id,
-            chunk_index=0,  # 测试集导入场景只有一个chunk，索引为0
-            content=content,
-            start_pos=0,
-            end_pos=len(content),
-            token_count=token_count,
-            metadata={}
-        )
+        # 批量更新文档状态
+        for document in indexed_docs:
+            document.status = DocumentStatus.COMPLETED
+            document.chunk_count = 1  # 测试集导入场景只有一个chunk
+        await self.doc_repo.bulk_update(indexed_docs)
         
-        await chunk_repo.create(doc_chunk)
-        
-        # 3. 准备元数据（单个文档作为一个向量）
-        metadata = {
-            "document_id": document.id,
-            "chunk_id": doc_chunk.id,
-            "content": content,
-            "char_count": len(content),
-            "token_count": token_count,
-            "source": document.metadata.get("source", "import"),
-            "external_id": document.external_id,
-        }
-        # 添加文档的metadata
-        if document.metadata:
-            metadata.update(document.metadata)
-        
-        # 4. 使用RAGService写入向量索引（整个文档作为一个向量）
-        rag_service = RAGService(kb_id=kb_id)
-        write_result = await rag_service.write_index([content], metadata_list=[metadata])
-        
-        # 5. 更新chunk的vector_id和is_indexed
-        doc_chunk.vector_id = doc_chunk.id
-        doc_chunk.is_indexed = True
-        await chunk_repo.update(doc_chunk.id, doc_chunk)
-        
-        # 更新文档状态
-        document.status = DocumentStatus.COMPLETED
-        document.chunk_count = 1  # 测试集导入场景只有一个chunk
-        doc_repo = RepositoryFactory.create_document_repository()
-        await doc_repo.update(document.id, document)
-        
-        logger.info(f"文档 {document.id} 处理完成: 整个文档已写入向量库（不分块）")
-
+        logger.info(f"批量处理完成: {len(indexed_docs)} 个文档已整体写入向量库（不分块）")
+        
+        return len(documents) - failed_count
+    
+    async def _discard_unindexed_chunks(self, kb, doc_chunks: List[DocumentChunk]):
+        """
+        删除向量索引写入失败的分块记录，以及写入中途已upsert的向量（尽力而为）
+        
+        Args:
+            kb: 知识库对象
+            doc_chunks: 本批创建的分块列表
+        """
+        chunk_ids = [chunk.id for chunk in doc_chunks]
+        try:
+            from app.models.knowledge_base import VectorDBType
+            from app.services.vector_db_service import VectorDBServiceFactory
+            vector_db = VectorDBServiceFactory.create(
+                VectorDBType(kb.vector_db_type),
+                config=kb.vector_db_config if kb.vector_db_config else None
+            )
+            await vector_db.delete_vectors(kb.id, chunk_ids)
+        except Exception as e:
+            logger.warning(f"删除写入失败批次的向量失败: {e}", exc_info=True)
+        
+        await self.chunk_repo.bulk_delete(chunk_ids)
+        logger.info(f"已删除 {len(chunk_ids)} 个未写入向量索引的分块记录")
@@ -0,0 +1,477 @@
+"""
+分块token缓存服务
+索引时对每个分块分词一次，按知识库以数组形式持久化（词ID流 + 词ID/词频），
+关键词检索、词频统计直接读取，不再对整个知识库重复分词
+"""
+
+from typing import List, Dict, Tuple, Optional, Set
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.core.singleton import singleton
+from app.services.tokenizer_service import get_tokenizer_service
+
+logger = logging.getLogger(__name__)
+
+# 词ID与词频的存储类型
+TERM_ID_DTYPE = np.uint32
+TERM_COUNT_DTYPE = np.uint32
+
+# 单个分块的token数据: (词ID流, 去重后的词ID, 对应词频)
+ChunkTokens = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# 其他分词配置版本的缓存目录超过该时长(秒)未写入时清理（各进程的分词配置可能暂时不同，不立即删除）
+STALE_VERSION_SECONDS = 24 * 3600
+
+
+@dataclass
+class ChunkTokenTable:
+    """
+    一组分块的token数据（CSR布局）
+    
+    第i个分块的词ID流为 stream[stream_indptr[i]:stream_indptr[i+1]]，
+    去重词ID及词频为 term_ids/term_counts[term_indptr[i]:term_indptr[i+1]]
+    """
+    chunk_ids: List[str]
+    vocab: List[str]
+    term_index: Dict[str, int]
+    stream_indptr: np.ndarray
+    stream: np.ndarray
+    term_indptr: np.ndarray
+    term_ids: np.ndarray
+    term_counts: np.ndarray
+    
+    @property
+    def lengths(self) -> np.ndarray:
+        """每个分块的token数"""
+        return np.diff(self.stream_indptr)
+    
+    def tokens(self, index: int) -> List[str]:
+        """还原第index个分块的分词结果（保持原顺序）"""
+        start, end = self.stream_indptr[index], self.stream_indptr[index + 1]
+        return [self.vocab[term_id] for term_id in self.stream[start:end].tolist()]
+    
+    def lookup(self, tokens: List[str]) -> np.ndarray:
+        """词 → 词ID（词表中不存在的词跳过）"""
+        return np.asarray(
+            [self.term_index[token] for token in tokens if token in self.term_index],
+            dtype=np.int64
+        )
+    
+    def doc_freq(self) -> np.ndarray:
+        """每个词ID出现在多少个分块中"""
+        return np.bincount(self.term_ids, minlength=len(self.vocab))
+    
+    def word_freq(self, top_k: Optional[int] = None) -> Dict[str, int]:
+        """
+        统计词频
+        
+        Args:
+            top_k: 返回频率最高的K个词（None表示返回全部）
+        
+        Returns:
+            词频字典 {词: 频率}
+        """
+        freq = np.bincount(self.term_ids, weights=self.term_counts, minlength=len(self.vocab))
+        order = np.flatnonzero(freq)
+        order = order[np.argsort(-freq[order], kind="stable")]
+        if top_k:
+            order = order[:top_k]
+        return {self.vocab[term_id]: int(freq[term_id]) for term_id in order.tolist()}
+
+
+class _KBTokenStore:
+    """
+    单个知识库在一个分词配置版本下的token存储
+    
+    目录结构（<kb_id>/<分词配置版本>/）:
+        vocab.txt     词表（每行一个词，行号即词ID，只追加）
+        seg_*.npz     分块数据段（每次写入追加一个段，删除分块时压缩为单段）
+    
+    版本在目录名中：运行时修改停用词后各进程的配置版本可能暂时不同，各自读写自己版本的目录，
+    不会删除对方的缓存，也不会把旧配置的分词结果写入新版本的目录。
+    
+    API进程（检索时补写）和执行器进程（索引时写入）会同时写同一个目录：
+    写入在跨进程文件锁（与目录同级的 <版本>.lock）内进行，并先同步其他进程已写入的词表和数据段，
+    再分配词ID和段号，保证各进程的词ID一致、不会覆盖或删除彼此的数据段
+    """
+    
+    def __init__(self, directory: Path, version: str):
+        self.directory = directory
+        self.version = version
+        self.lock_path = directory.parent / f"{directory.name}.lock"
+        self.vocab: List[str] = []
+        self.term_index: Dict[str, int] = {}
+        self.entries: Dict[str, ChunkTokens] = {}
+        self.lock = threading.Lock()
+        self._vocab_bytes = 0
+        self._segments: Set[str] = set()
+        self._next_segment = 0
+    
+    # ========== 持久化 ==========
+    
+    def load(self):
+        """从磁盘加载，并清理长时间未写入的其他配置版本的目录"""
+        with _file_lock(self.lock_path):
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._reload()
+        self._prune_stale_versions()
+    
+    def _prune_stale_versions(self):
+        """删除同一知识库下其他配置版本中超过STALE_VERSION_SECONDS未写入的目录（以及旧版布局的文件）"""
+        now = time.time()
+        for path in self.directory.parent.iterdir():
+            if path == self.directory or path.suffix == ".lock":
+                continue
+            try:
+                if path.is_dir():
+                    if now - path.stat().st_mtime < STALE_VERSION_SECONDS:
+                        continue
+                    with _file_lock(path.parent / f"{path.name}.lock"):
+                        shutil.rmtree(path, ignore_errors=True)
+                    logger.info(f"清理过期的token缓存版本: {path}")
+                else:
+                    # 旧版布局直接把词表和数据段放在知识库目录下
+                    path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"清理token缓存失败: {path}, {e}")
+    
+    def sync(self):
+        """同步其他进程写入的词表和数据段（持有共享文件锁，调用方持有self.lock）"""
+        with _file_lock(self.lock_path, shared=True):
+            self._refresh()
+    
+    def _reload(self):
+        """完整读取词表和全部数据段（调用方持有文件锁）"""
+        self.vocab = []
+        self.term_index = {}
+        self.entries = {}
+        self._vocab_bytes = 0
+        self._segments = set()
+        self._next_segment = 0
+        self._read_vocab()
+        self._read_segments()
+    
+    def _refresh(self):
+        """
+        增量同步磁盘上的变化（调用方持有文件锁）
+        
+        词表只追加，读取新增的行；数据段读取新出现的段。
+        已读过的段被删除（其他进程删除分块后压缩）或词表变短（缓存被重建）时完整重新加载
+        """
+        vocab_file = self.directory / "vocab.txt"
+        vocab_bytes = vocab_file.stat().st_size if vocab_file.exists() else 0
+        if vocab_bytes < self._vocab_bytes:
+            self._reload()
+            return
+        self._read_vocab()
+        if not self._read_segments():
+            self._reload()
+    
+    def _read_vocab(self):
+        """读取词表中尚未读取的完整行"""
+        vocab_file = self.directory / "vocab.txt"
+        if not vocab_file.exists():
+            return
+        with open(vocab_file, 'rb') as f:
+            f.seek(self._vocab_bytes)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for term in data[:end].decode('utf-8').split('\n')[:-1]:
+            self.term_index[term] = len(self.vocab)
+            self.vocab.append(term)
+        self._vocab_bytes += end
+    
+    def _read_segments(self) -> bool:
+        """
+        读取新出现的数据段
+        
+        Returns:
+            已读过的段是否都还存在（False表示需要完整重新加载）
+        """
+        names = {segment_file.name for segment_file in self.directory.glob("seg_*.npz")}
+        if self._segments - names:
+            return False
+        for name in sorted(names - self._segments):
+            segment_file = self.directory / name
+            self._next_segment = max(self._next_segment, int(segment_file.stem[4:]) + 1)
+            with np.load(segment_file) as data:
+                chunk_ids = data["chunk_ids"].tolist()
+                streams = np.split(data["stream"], data["stream_indptr"][1:-1])
+                term_ids = np.split(data["term_ids"], data["term_indptr"][1:-1])
+                term_counts = np.split(data["term_counts"], data["term_indptr"][1:-1])
+            for chunk_id, stream, ids, counts in zip(chunk_ids, streams, term_ids, term_counts):
+                self.entries[chunk_id] = (stream, ids, counts)
+            self._segments.add(name)
+        return True
+    
+    def _write_segment(self, chunk_ids: List[str], entries: List[ChunkTokens]) -> Path:
+        """写入一个数据段（先写临时文件再替换，避免读到半个文件；调用方持有文件锁）"""
+        path = self.directory / f"seg_{self._next_segment:08d}.npz"
+        self._next_segment += 1
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                chunk_ids=np.asarray(chunk_ids, dtype=np.str_),
+                stream_indptr=_indptr([entry[0] for entry in entries]),
+                stream=_concat([entry[0] for entry in entries], TERM_ID_DTYPE),
+                term_indptr=_indptr([entry[1] for entry in entries]),
+                term_ids=_concat([entry[1] for entry in entries], TERM_ID_DTYPE),
+                term_counts=_concat([entry[2] for entry in entries], TERM_COUNT_DTYPE),
+            )
+        os.replace(tmp_path, path)
+        self._segments.add(path.name)
+        return path
+    
+    # ========== 读写 ==========
+    
+    def add(self, chunk_ids: List[str], tokens_list: List[List[str]], skip_existing: bool = False):
+        """
+        写入分块的分词结果（新词追加到词表）
+        
+        Args:
+            chunk_ids: 分块ID列表
+            tokens_list: 对应的分词结果
+            skip_existing: 跳过同步后已存在的分块（检索时补写，其他进程可能已写入）
+        """
+        with _file_lock(self.lock_path):
+            self._refresh()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if skip_existing:
+                pairs = [(chunk_id, tokens) for chunk_id, tokens in zip(chunk_ids, tokens_list) if chunk_id not in self.entries]
+                if not pairs:
+                    return
+                chunk_ids = [chunk_id for chunk_id, _ in pairs]
+                tokens_list = [tokens for _, tokens in pairs]
+            
+            vocab_start = len(self.vocab)
+            entries: List[ChunkTokens] = []
+            for tokens in tokens_list:
+                stream = np.empty(len(tokens), dtype=TERM_ID_DTYPE)
+                for i, token in enumerate(tokens):
+                    term_id = self.term_index.get(token)
+                    if term_id is None:
+                        term_id = self.term_index[token] = len(self.vocab)
+                        self.vocab.append(token)
+                    stream[i] = term_id
+                ids, counts = np.unique(stream, return_counts=True)
+                entries.append((stream, ids, counts.astype(TERM_COUNT_DTYPE)))
+            
+            # 先追加词表再写数据段，保证段中的词ID在词表中都存在
+            if len(self.vocab) > vocab_start:
+                data = ''.join(f"{term}\n" for term in self.vocab[vocab_start:]).encode('utf-8')
+                with open(self.directory / "vocab.txt", 'ab') as f:
+                    f.write(data)
+                self._vocab_bytes += len(data)
+            self._write_segment(chunk_ids, entries)
+            self.entries.update(zip(chunk_ids, entries))
+    
+    def remove(self, chunk_ids: List[str]) -> int:
+        """删除分块并把剩余数据（含其他进程写入的分块）压缩为单个数据段"""
+        with _file_lock(self.lock_path):
+            self._refresh()
+            removed = sum(1 for chunk_id in chunk_ids if self.entries.pop(chunk_id, None) is not None)
+            if removed:
+                old_segments = [self.directory / name for name in self._segments]
+                self._segments = set()
+                live_ids = list(self.entries)
+                if live_ids:
+                    self._write_segment(live_ids, [self.entries[chunk_id] for chunk_id in live_ids])
+                for segment_file in old_segments:
+                    segment_file.unlink(missing_ok=True)
+            return removed
+    
+    def table(self, chunk_ids: List[str]) -> ChunkTokenTable:
+        """按给定顺序组装分块的token数据（调用方保证分块均已缓存）"""
+        entries = [self.entries[chunk_id] for chunk_id in chunk_ids]
+        return ChunkTokenTable(
+            chunk_ids=list(chunk_ids),
+            vocab=self.vocab,
+            term_index=self.term_index,
+            stream_indptr=_indptr([entry[0] for entry in entries]),
+            stream=_concat([entry[0] for entry in entries], TERM_ID_DTYPE),
+            term_indptr=_indptr([entry[1] for entry in entries]),
+            term_ids=_concat([entry[1] for entry in entries], TERM_ID_DTYPE),
+            term_counts=_concat([entry[2] for entry in entries], TERM_COUNT_DTYPE),
+        )
+
+
+@contextmanager
+def _file_lock(lock_path: Path, shared: bool = False):
+    """跨进程文件锁（shared为True时为共享读锁；不支持fcntl的平台上退化为无锁）"""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _indptr(arrays: List[np.ndarray]) -> np.ndarray:
+    """由各段长度构建CSR行指针"""
+    indptr = np.zeros(len(arrays) + 1, dtype=np.int64)
+    if arrays:
+        np.cumsum([len(array) for array in arrays], out=indptr[1:])
+    return indptr
+
+
+def _concat(arrays: List[np.ndarray], dtype) -> np.ndarray:
+    """拼接数组（空列表时返回空数组）"""
+    return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
+
+
+@singleton
+class TokenCacheService:
+    """分块token缓存服务"""
+    
+    def __init__(self):
+        self.root = Path(settings.TOKEN_CACHE_PATH)
+        self.max_loaded_kbs = max(1, settings.TOKEN_CACHE_MAX_KBS)
+        self.tokenizer = get_tokenizer_service()
+        self._stores: "OrderedDict[str, _KBTokenStore]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _get_store(self, kb_id: str) -> _KBTokenStore:
+        """获取知识库的存储（按LRU保留最近使用的若干个在内存中；分词配置变化时重建）"""
+        version = self.tokenizer.config_version
+        with self._lock:
+            store = self._stores.get(kb_id)
+            if store is not None and store.version == version:
+                self._stores.move_to_end(kb_id)
+                return store
+            # 在服务锁内加载，避免并发请求拿到尚未加载完成的存储
+            store = _KBTokenStore(self.root / kb_id / version, version)
+            store.load()
+            self._stores[kb_id] = store
+            while len(self._stores) > self.max_loaded_kbs:
+                self._stores.popitem(last=False)
+            return store
+    
+    async def index_chunks(self, kb_id: str, chunk_ids: List[str], texts: List[str]):
+        """
+        对分块分词并写入缓存（索引时调用）
+        
+        Args:
+            kb_id: 知识库ID
+            chunk_ids: 分块ID列表
+            texts: 分块内容列表
+        """
+        if not chunk_ids:
+            return
+        tokens_list = await self.tokenizer.abatch_tokenize(texts)
+        store = await asyncio.to_thread(self._get_store, kb_id)
+        
+        def _add_sync():
+            with store.lock:
+                store.add(chunk_ids, tokens_list)
+        
+        await asyncio.to_thread(_add_sync)
+    
+    async def get_table(self, kb_id: str, chunk_ids: List[str], texts: List[str]) -> ChunkTokenTable:
+        """
+        读取分块的token数据，未缓存的分块（如缓存建立前已索引的分块）即时分词并补写
+        
+        Args:
+            kb_id: 知识库ID
+            chunk_ids: 分块ID列表
+            texts: 与chunk_ids对应的分块内容（仅用于补写未缓存的分块）
+        
+        Returns:
+            按chunk_ids顺序组装的token数据
+        """
+        store = await asyncio.to_thread(self._get_store, kb_id)
+        
+        def _missing_sync():
+            # 先同步其他进程（如独立执行器）写入的分块，再判断哪些需要补写
+            with store.lock:
+                store.sync()
+                return [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in store.entries]
+        
+        missing = await asyncio.to_thread(_missing_sync)
+        if missing:
+            logger.info(f"token缓存未命中 {len(missing)}/{len(chunk_ids)} 个分块，补充分词: {kb_id}")
+            tokens_list = await self.tokenizer.abatch_tokenize([texts[i] for i in missing])
+            
+            def _add_sync():
+                with store.lock:
+                    store.add([chunk_ids[i] for i in missing], tokens_list, skip_existing=True)
+            
+            await asyncio.to_thread(_add_sync)
+        
+        def _table_sync():
+            with store.lock:
+                return store.table(chunk_ids)
+        
+        return await asyncio.to_thread(_table_sync)
+    
+    async def get_word_freq(
+        self,
+        kb_id: str,
+        chunk_ids: List[str],
+        texts: List[str],
+        top_k: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        统计分块的词频
+        
+        Args:
+            kb_id: 知识库ID
+            chunk_ids: 分块ID列表
+            texts: 与chunk_ids对应的分块内容
+            top_k: 返回频率最高的K个词（None表示返回全部）
+        
+        Returns:
+            词频字典 {词: 频率}
+        """
+        table = await self.get_table(kb_id, chunk_ids, texts)
+        return table.word_freq(top_k)
+    
+    async def remove_chunks(self, kb_id: str, chunk_ids: List[str]) -> int:
+        """
+        删除分块的缓存
+        
+        Args:
+            kb_id: 知识库ID
+            chunk_ids: 分块ID列表
+        
+        Returns:
+            删除的分块数
+        """
+        if not chunk_ids:
+            return 0
+        store = await asyncio.to_thread(self._get_store, kb_id)
+        
+        def _remove_sync():
+            with store.lock:
+                return store.remove(chunk_ids)
+        
+        return await asyncio.to_thread(_remove_sync)
+    
+    async def drop_knowledge_base(self, kb_id: str):
+        """删除知识库的全部token缓存"""
+        with self._lock:
+            self._stores.pop(kb_id, None)
+        await asyncio.to_thread(shutil.rmtree, self.root / kb_id, True)
+
+
+def get_token_cache_service() -> TokenCacheService:
+    """获取分块token缓存服务单例"""
+    return TokenCacheService()
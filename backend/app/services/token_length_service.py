@@ -0,0 +1,183 @@
+"""
+Token长度服务
+使用嵌入模型对应的本地分词器文件批量计算token数，按文本哈希缓存；
+未配置分词器文件时回退到向量化估算
+"""
+
+from typing import List, Optional, Dict, Callable, Tuple, Any
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.core.singleton import singleton
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入 HuggingFace tokenizers
+try:
+    from tokenizers import Tokenizer
+    TOKENIZERS_AVAILABLE = True
+except ImportError:
+    TOKENIZERS_AVAILABLE = False
+
+
+def estimate_token_count(text: str) -> float:
+    """
+    估算token数量（向量化计数，不逐字符构建列表）
+    中文: 1字 ≈ 1.5 tokens
+    其他字符: 4字符 ≈ 1 token
+    """
+    if not text:
+        return 0.0
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    chinese_chars = int(np.count_nonzero((codes >= 0x4E00) & (codes <= 0x9FFF)))
+    return chinese_chars * 1.5 + (len(codes) - chinese_chars) / 4
+
+
+@singleton
+class TokenLengthService:
+    """Token长度服务"""
+    
+    def __init__(self):
+        self.tokenizer_dir = Path(settings.TOKENIZER_PATH)
+        self.cache_size = settings.TOKEN_LENGTH_CACHE_SIZE
+        self._tokenizers: Dict[str, Any] = {}
+        self._cache: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _resolve_model(self, model_name: Optional[str]) -> str:
+        return model_name or settings.OLLAMA_EMBEDDING_MODEL
+    
+    def _get_tokenizer(self, model_name: str):
+        """
+        加载模型对应的分词器（结果缓存，找不到时缓存None）
+        
+        查找顺序: TOKENIZER_PATH/<模型名>/tokenizer.json、TOKENIZER_PATH/<模型名>.json，
+        模型名中的 ':' 和 '/' 替换为 '_'
+        """
+        if model_name in self._tokenizers:
+            return self._tokenizers[model_name]
+        
+        tokenizer = None
+        safe_name = model_name.replace(":", "_").replace("/", "_")
+        candidates = [
+            self.tokenizer_dir / safe_name / "tokenizer.json",
+            self.tokenizer_dir / f"{safe_name}.json",
+        ]
+        tokenizer_file = next((path for path in candidates if path.exists()), None)
+        
+        if tokenizer_file and TOKENIZERS_AVAILABLE:
+            try:
+                tokenizer = Tokenizer.from_file(str(tokenizer_file))
+                tokenizer.no_truncation()
+                tokenizer.no_padding()
+                logger.info(f"已加载分词器: {model_name} ({tokenizer_file})")
+            except Exception as e:
+                logger.warning(f"加载分词器失败: {tokenizer_file}, {e}，将使用估算")
+        elif tokenizer_file:
+            logger.warning("tokenizers未安装，将使用估算的token数")
+        else:
+            logger.info(f"未找到模型 {model_name} 的分词器文件，将使用估算的token数")
+        
+        self._tokenizers[model_name] = tokenizer
+        return tokenizer
+    
+    def has_tokenizer(self, model_name: Optional[str] = None) -> bool:
+        """是否有模型对应的真实分词器"""
+        return self._get_tokenizer(self._resolve_model(model_name)) is not None
+    
+    def count_tokens(self, text: str, model_name: Optional[str] = None) -> int:
+        """
+        计算单个文本的token数
+        
+        Args:
+            text: 文本
+            model_name: 嵌入模型名称（默认 OLLAMA_EMBEDDING_MODEL）
+        
+        Returns:
+            token数
+        """
+        return self.batch_count([text], model_name)[0]
+    
+    def batch_count(self, texts: List[str], model_name: Optional[str] = None) -> List[int]:
+        """
+        批量计算token数（命中缓存的直接返回，未命中的一次批量编码）
+        
+        Args:
+            texts: 文本列表
+            model_name: 嵌入模型名称（默认 OLLAMA_EMBEDDING_MODEL）
+        
+        Returns:
+            token数列表
+        """
+        model_name = self._resolve_model(model_name)
+        keys = [(model_name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()) for text in texts]
+        results: List[Optional[int]] = [None] * len(texts)
+        
+        missing: List[int] = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    results[i] = cached
+        
+        if missing:
+            tokenizer = self._get_tokenizer(model_name)
+            missing_texts = [texts[i] for i in missing]
+            if tokenizer is not None:
+                encodings = tokenizer.encode_batch(missing_texts, add_special_tokens=False)
+                counts = [len(encoding.ids) for encoding in encodings]
+            else:
+                counts = [int(round(estimate_token_count(text))) for text in missing_texts]
+            
+            with self._lock:
+                for i, count in zip(missing, counts):
+                    results[i] = count
+                    self._cache[keys[i]] = count
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        return results  # type: ignore[return-value]
+    
+    def get_counter(self, model_name: Optional[str] = None) -> Callable[[str], int]:
+        """获取单文本计数函数（用于分块器按token计量）"""
+        model_name = self._resolve_model(model_name)
+        return lambda text: self.batch_count([text], model_name)[0]
+    
+    def truncate(self, text: str, max_tokens: int, model_name: Optional[str] = None) -> str:
+        """
+        将文本截断到不超过max_tokens个token
+        
+        Args:
+            text: 文本
+            max_tokens: 最大token数
+            model_name: 嵌入模型名称
+        
+        Returns:
+            截断后的文本（未超限时原样返回）
+        """
+        model_name = self._resolve_model(model_name)
+        token_count = self.count_tokens(text, model_name)
+        if token_count <= max_tokens:
+            return text
+        
+        tokenizer = self._get_tokenizer(model_name)
+        if tokenizer is not None:
+            encoding = tokenizer.encode(text, add_special_tokens=False)
+            return text[:encoding.offsets[max_tokens - 1][1]]
+        
+        # 无分词器时按比例截断
+        return text[:max(1, int(len(text) * max_tokens / token_count))]
+
+
+def get_token_length_service() -> TokenLengthService:
+    """获取Token长度服务单例"""
+    return TokenLengthService()
@@ -1,16 +1,94 @@
 """
 分词服务
-提供中文分词功能（基于jieba）
+提供中文分词功能（基于jieba）；大批量分词在多进程池中执行
 """
 
-from typing import List, Dict, Set, Optional
+from typing import List, Dict, Set, Optional, Tuple, Iterable
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import hashlib
+import multiprocessing
 import logging
+import os
+import threading
+from app.config import settings
 from app.core.singleton import singleton
+from app.services.cpu_pools import start_workers, pool_workers
 
 logger = logging.getLogger(__name__)
 
 
+def _cut(jieba_module, text: str, mode: str, stop_words: Optional[Set[str]]) -> List[str]:
+    """
+    分词并过滤（主进程与分词子进程共用）
+    
+    Args:
+        jieba_module: 已加载的jieba模块
+        text: 输入文本
+        mode: 分词模式 (default, search, all)
+        stop_words: 停用词集合，None表示不过滤停用词
+    
+    Returns:
+        分词结果列表
+    """
+    if not text or not text.strip():
+        return []
+    
+    # 根据模式分词
+    if mode == "default":
+        tokens = jieba_module.cut(text)
+    elif mode == "search":
+        tokens = jieba_module.cut_for_search(text)
+    elif mode == "all":
+        tokens = jieba_module.cut(text, cut_all=True)
+    else:
+        raise ValueError(f"不支持的分词模式: {mode}")
+    
+    # 过滤空白和单字符
+    tokens = [t for t in (token.strip() for token in tokens) if len(t) > 1]
+    
+    # 过滤停用词
+    if stop_words:
+        tokens = [t for t in tokens if t not in stop_words]
+    
+    return tokens
+
+
+# ========== 分词子进程中执行的函数（需为模块级函数以便序列化） ==========
+
+_worker_jieba = None
+_worker_stop_words: Set[str] = set()
+
+
+def _init_tokenizer_worker(stop_words: Set[str], user_dicts: List[str]):
+    """子进程初始化：加载jieba主词典、用户词典和停用词，每个进程只执行一次"""
+    global _worker_jieba, _worker_stop_words
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+    jieba.initialize()
+    for dict_path in user_dicts:
+        jieba.load_userdict(dict_path)
+    _worker_jieba = jieba
+    _worker_stop_words = stop_words
+
+
+def _tokenize_slice(texts: List[str], mode: str, use_stop_words: bool) -> List[List[str]]:
+    """在子进程中对一片文本分词"""
+    stop_words = _worker_stop_words if use_stop_words else None
+    return [_cut(_worker_jieba, text, mode, stop_words) for text in texts]
+
+
+def _word_freq_slice(texts: List[str], mode: str, use_stop_words: bool) -> Counter:
+    """在子进程中统计一片文本的词频（只回传计数，减少进程间传输）"""
+    stop_words = _worker_stop_words if use_stop_words else None
+    word_freq: Counter = Counter()
+    for text in texts:
+        word_freq.update(_cut(_worker_jieba, text, mode, stop_words))
+    return word_freq
+
+
 @singleton
 class TokenizerService:
     """分词服务"""
@@ -39,6 +117,17 @@ class TokenizerService:
         
         # 延迟加载jieba
         self._jieba = None
+        
+        # 已加载的用户词典（分词子进程初始化时重新加载）
+        self.user_dicts: List[str] = []
+        
+        # 分词进程池（懒加载；停用词或用户词典变化后重建）
+        self.pool_workers = pool_workers("tokenizer")
+        self.pool_min_texts = settings.TOKENIZER_POOL_MIN_TEXTS
+        self.pool_slice_chars = max(1, settings.TOKENIZER_POOL_SLICE_CHARS)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._config_version: Optional[str] = None
     
     @property
     def jieba(self):
@@ -73,36 +162,53 @@ class TokenizerService:
         Returns:
             分词结果列表
         """
-        if not text or not text.strip():
-            return []
+        return _cut(self.jieba, text, mode, self.stop_words if use_stop_words else None)
+    
+    def batch_tokenize(
+        self,
+        texts: List[str],
+        mode: str = "default",
+        use_stop_words: bool = True
+    ) -> List[List[str]]:
+        """
+        批量分词（文本量较大时在分词进程池中并行执行）
         
-        # 根据模式分词
-        if mode == "default":
-            tokens = list(self.jieba.cut(text))
-        elif mode == "search":
-            tokens = list(self.jieba.cut_for_search(text))
-        elif mode == "all":
-            tokens = list(self.jieba.cut(text, cut_all=True))
+        Args:
+            texts: 文本列表
+            mode: 分词模式
+            use_stop_words: 是否过滤停用词
+            
+        Returns:
+            分词结果列表
+        """
+        if not self._use_pool(texts):
+            results = [self.tokenize(text, mode=mode, use_stop_words=use_stop_words) for text in texts]
         else:
-            raise ValueError(f"不支持的分词模式: {mode}")
-        
-        # 过滤空白和单字符
-        tokens = [t.strip() for t in tokens if t.strip() and len(t.strip()) > 1]
-        
-        # 过滤停用词
-        if use_stop_words:
-            tokens = [t for t in tokens if t not in self.stop_words]
+            pieces, owners = self._split_inputs(texts)
+            try:
+                executor = self._get_executor()
+                futures = [
+                    executor.submit(_tokenize_slice, pieces[start:end], mode, use_stop_words)
+                    for start, end in self._slice_ranges(pieces)
+                ]
+                piece_tokens = [tokens for future in futures for tokens in future.result()]
+                results = self._merge_pieces(piece_tokens, owners, len(texts))
+            except BrokenProcessPool:
+                self._reset_executor()
+                logger.warning("分词进程池异常退出，回退到当前线程分词")
+                results = [self.tokenize(text, mode=mode, use_stop_words=use_stop_words) for text in texts]
         
-        return tokens
+        logger.info(f"批量分词完成: {len(texts)} 个文本")
+        return results
     
-    def batch_tokenize(
+    async def abatch_tokenize(
         self,
         texts: List[str],
         mode: str = "default",
         use_stop_words: bool = True
     ) -> List[List[str]]:
         """
-        批量分词
+        异步批量分词（不阻塞事件循环）
         
         Args:
             texts: 文本列表
@@ -112,12 +218,144 @@ class TokenizerService:
         Returns:
             分词结果列表
         """
-        results = []
-        for text in texts:
-            tokens = self.tokenize(text, mode=mode, use_stop_words=use_stop_words)
-            results.append(tokens)
+        if not self._use_pool(texts):
+            return await asyncio.to_thread(self.batch_tokenize, texts, mode, use_stop_words)
         
+        pieces, owners = self._split_inputs(texts)
+        loop = asyncio.get_running_loop()
+        try:
+            executor = self._get_executor()
+            slice_results = await asyncio.gather(*[
+                loop.run_in_executor(executor, _tokenize_slice, pieces[start:end], mode, use_stop_words)
+                for start, end in self._slice_ranges(pieces)
+            ])
+        except BrokenProcessPool:
+            self._reset_executor()
+            logger.warning("分词进程池异常退出，回退到线程分词")
+            return await asyncio.to_thread(
+                lambda: [self.tokenize(text, mode=mode, use_stop_words=use_stop_words) for text in texts]
+            )
+        
+        piece_tokens = [tokens for result in slice_results for tokens in result]
         logger.info(f"批量分词完成: {len(texts)} 个文本")
+        return self._merge_pieces(piece_tokens, owners, len(texts))
+    
+    # ========== 分词进程池 ==========
+    
+    def _use_pool(self, texts: List[str]) -> bool:
+        """是否使用进程池（进程数为1或文本量小时，进程间传输的开销大于收益）"""
+        if self.pool_workers <= 1 or self.pool_min_texts <= 0:
+            return False
+        return len(texts) >= self.pool_min_texts or sum(len(text) for text in texts) >= self.pool_slice_chars
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """懒加载分词进程池（使用spawn，避免在多线程进程中fork）"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.pool_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_tokenizer_worker,
+                    initargs=(set(self.stop_words), list(self.user_dicts))
+                )
+            return self._executor
+    
+    @property
+    def config_version(self) -> str:
+        """
+        分词配置版本（停用词和用户词典的摘要）
+        
+        用于判断按分块缓存的分词结果是否仍然有效，配置变化后版本随之变化。
+        """
+        if self._config_version is None:
+            digest = hashlib.blake2b(digest_size=8)
+            for word in sorted(self.stop_words):
+                digest.update(word.encode("utf-8") + b"\0")
+            for dict_path in self.user_dicts:
+                mtime = os.path.getmtime(dict_path) if os.path.exists(dict_path) else 0
+                digest.update(f"{dict_path}:{mtime}".encode("utf-8") + b"\0")
+            self._config_version = digest.hexdigest()
+        return self._config_version
+    
+    async def warm_up(self) -> int:
+        """
+        预先启动全部分词进程（进程初始化时加载jieba词典、用户词典和停用词）
+        
+        Returns:
+            已启动的进程数（不使用进程池时为0）
+        """
+        if self.pool_workers <= 1 or self.pool_min_texts <= 0:
+            return 0
+        return await start_workers(self._get_executor(), self.pool_workers)
+    
+    def _reset_executor(self):
+        """丢弃当前进程池（停用词/用户词典变化或子进程崩溃后调用），下次使用时按新配置重建"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+            self._config_version = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self):
+        """关闭分词进程池"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _split_inputs(self, texts: List[str]) -> Tuple[List[str], List[int]]:
+        """
+        将超长文本在换行处切成多段，使单个文本也能分散到多个进程
+        
+        jieba按换行等非汉字字符切分句块后逐块分词，在换行处切分不改变分词结果。
+        
+        Returns:
+            (片段列表, 每个片段所属的文本下标)
+        """
+        pieces: List[str] = []
+        owners: List[int] = []
+        for index, text in enumerate(texts):
+            for piece in self._split_text(text):
+                pieces.append(piece)
+                owners.append(index)
+        return pieces, owners
+    
+    def _split_text(self, text: str) -> Iterable[str]:
+        """按换行把文本切成不超过 pool_slice_chars 的片段（无换行可切时保留整段）"""
+        if len(text) <= self.pool_slice_chars:
+            yield text
+            return
+        start = 0
+        while len(text) - start > self.pool_slice_chars:
+            cut = text.rfind('\n', start, start + self.pool_slice_chars)
+            if cut <= start:
+                cut = text.find('\n', start + self.pool_slice_chars)
+                if cut == -1:
+                    break
+            yield text[start:cut + 1]
+            start = cut + 1
+        if start < len(text):
+            yield text[start:]
+    
+    def _slice_ranges(self, pieces: List[str]) -> List[Tuple[int, int]]:
+        """按字符量把片段分成子进程任务，每个任务约 pool_slice_chars 个字符"""
+        ranges: List[Tuple[int, int]] = []
+        start, chars = 0, 0
+        for i, piece in enumerate(pieces):
+            if i > start and chars + len(piece) > self.pool_slice_chars:
+                ranges.append((start, i))
+                start, chars = i, 0
+            chars += len(piece)
+        if start < len(pieces):
+            ranges.append((start, len(pieces)))
+        return ranges
+    
+    @staticmethod
+    def _merge_pieces(piece_tokens: List[List[str]], owners: List[int], count: int) -> List[List[str]]:
+        """按片段所属下标拼回每个文本的分词结果"""
+        results: List[List[str]] = [[] for _ in range(count)]
+        for owner, tokens in zip(owners, piece_tokens):
+            results[owner].extend(tokens)
         return results
     
     def extract_keywords(
@@ -175,13 +413,64 @@ class TokenizerService:
         Returns:
             词频字典 {词: 频率}
         """
-        all_tokens = []
-        for text in texts:
-            tokens = self.tokenize(text, use_stop_words=use_stop_words)
-            all_tokens.extend(tokens)
+        return self.count_word_freq(
+            self.batch_tokenize(texts, use_stop_words=use_stop_words),
+            top_k=top_k
+        )
+    
+    async def aget_word_freq(
+        self,
+        texts: List[str],
+        top_k: Optional[int] = None,
+        use_stop_words: bool = True
+    ) -> Dict[str, int]:
+        """
+        异步统计词频（文本量较大时各子进程分别计数后合并）
+        
+        Args:
+            texts: 文本列表
+            top_k: 返回频率最高的K个词（None表示返回全部）
+            use_stop_words: 是否过滤停用词
+            
+        Returns:
+            词频字典 {词: 频率}
+        """
+        if not self._use_pool(texts):
+            return await asyncio.to_thread(self.get_word_freq, texts, top_k, use_stop_words)
+        
+        pieces, _ = self._split_inputs(texts)
+        loop = asyncio.get_running_loop()
+        try:
+            executor = self._get_executor()
+            counters = await asyncio.gather(*[
+                loop.run_in_executor(executor, _word_freq_slice, pieces[start:end], "default", use_stop_words)
+                for start, end in self._slice_ranges(pieces)
+            ])
+        except BrokenProcessPool:
+            self._reset_executor()
+            logger.warning("分词进程池异常退出，回退到线程分词")
+            return await asyncio.to_thread(self.get_word_freq, texts, top_k, use_stop_words)
+        
+        word_freq: Counter = Counter()
+        for counter in counters:
+            word_freq.update(counter)
+        return dict(word_freq.most_common(top_k)) if top_k else dict(word_freq)
+    
+    @staticmethod
+    def count_word_freq(tokens_list: List[List[str]], top_k: Optional[int] = None) -> Dict[str, int]:
+        """
+        根据已有的分词结果统计词频
         
-        # 统计词频
-        word_freq = Counter(all_tokens)
+        Args:
+            tokens_list: 分词结果列表
+            top_k: 返回频率最高的K个词（None表示返回全部）
+            
+        Returns:
+            词频字典 {词: 频率}
+        """
+        word_freq: Counter = Counter()
+        for tokens in tokens_list:
+            word_freq.update(tokens)
         
         # 返回top_k
         if top_k:
@@ -194,6 +483,7 @@ class TokenizerService:
         if isinstance(words, list):
             words = set(words)
         self.stop_words.update(words)
+        self._reset_executor()
         logger.info(f"添加 {len(words)} 个停用词")
     
     def remove_stop_words(self, words: Set[str] | List[str]):
@@ -201,6 +491,7 @@ class TokenizerService:
         if isinstance(words, list):
             words = set(words)
         self.stop_words -= words
+        self._reset_executor()
         logger.info(f"移除 {len(words)} 个停用词")
     
     def load_stop_words_file(self, file_path: str):
@@ -214,6 +505,7 @@ class TokenizerService:
             with open(file_path, 'r', encoding='utf-8') as f:
                 words = {line.strip() for line in f if line.strip()}
             self.stop_words.update(words)
+            self._reset_executor()
             logger.info(f"从文件加载 {len(words)} 个停用词")
         except Exception as e:
             logger.error(f"加载停用词文件失败: {e}")
@@ -227,6 +519,8 @@ class TokenizerService:
         """
         try:
             self.jieba.load_userdict(dict_path)
+            self.user_dicts.append(dict_path)
+            self._reset_executor()
             logger.info(f"加载用户词典: {dict_path}")
         except Exception as e:
             logger.error(f"加载用户词典失败: {e}")
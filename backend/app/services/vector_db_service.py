@@ -3,8 +3,11 @@
 支持多种向量数据库
 """
 
-from typing import List, Dict, Any, Optional, Union, Sequence
+from typing import List, Dict, Any, Optional, Union, Sequence, Callable, Tuple
 from abc import ABC, abstractmethod
+import asyncio
+import inspect
+import logging
 import uuid
 
 from app.models.knowledge_base import VectorDBType
@@ -27,6 +30,18 @@ except ImportError:
     QDRANT_AVAILABLE = False
     print("Warning: qdrant-client not installed. Qdrant functionality will be disabled.")
 
+logger = logging.getLogger(__name__)
+
+# 集合是否使用命名向量的缓存：(host, port, collection_name) -> bool
+_NAMED_VECTOR_LAYOUTS: Dict[Tuple[str, int, str], bool] = {}
+
+
+def _sparse_arrays_to_lists(value: Any) -> Any:
+    """{"indices": 数组, "values": 数组} → 列表格式，其他值原样返回"""
+    if isinstance(value, dict) and hasattr(value.get("indices"), "tolist"):
+        return {"indices": value["indices"].tolist(), "values": value["values"].tolist()}
+    return value
+
 
 class BaseVectorDBService(ABC):
     """向量数据库服务抽象基类"""
@@ -289,6 +304,7 @@ class QdrantService(BaseVectorDBService):
                         self.client.delete_collection(collection_name)
                     elif existing_dimension:
                         # 维度匹配，直接返回
+                        self._remember_vector_layout(collection_name, isinstance(vectors_config, dict))
                         return
             except Exception:
                 # 无法获取维度信息，重新创建集合
@@ -442,6 +458,7 @@ class QdrantService(BaseVectorDBService):
                 collection_name=collection_name,
                 vectors_config=vectors_config
             )
+        self._remember_vector_layout(collection_name, has_sparse_vectors or has_named_vectors)
         
         # 为标量字段创建payload索引
         for field in schema_fields:
@@ -475,6 +492,7 @@ class QdrantService(BaseVectorDBService):
     
     async def delete_collection(self, collection_name: str):
         """删除集合"""
+        self._remember_vector_layout(collection_name, None)
         try:
             self.client.delete_collection(collection_name)
         except Exception:
@@ -486,87 +504,163 @@ class QdrantService(BaseVectorDBService):
         collection_name: str,
         vectors: List[Union[List[float], Dict[str, Any]]],  # 支持稠密向量和稀疏向量
         metadatas: List[Dict[str, Any]],
-        ids: List[str]
+        ids: List[str],
+        batch_size: Optional[int] = None,
+        parallel: Optional[int] = None,
+        wait: bool = True,
+        progress_callback: Optional[Callable[[int, int], Any]] = None
     ):
-        """插入向量"""
-        # 首先检查集合配置，确定是否使用命名向量
+        """
+        插入向量（分批并发写入）
+        
+        Args:
+            collection_name: 集合名称
+            vectors: 向量列表
+            metadatas: 元数据列表
+            ids: ID列表
+            batch_size: 每批点数（默认 QDRANT_UPSERT_BATCH_SIZE）
+            parallel: 并发写入批数（默认 QDRANT_UPSERT_PARALLEL）
+            wait: 是否在返回前确保所有写入已生效
+            progress_callback: 进度回调 (已写入数量, 总数量)，可以是协程函数
+        """
+        total = len(vectors)
+        if total == 0:
+            return
+        
+        batch_size = max(1, batch_size or settings.QDRANT_UPSERT_BATCH_SIZE)
+        parallel = max(1, parallel or settings.QDRANT_UPSERT_PARALLEL)
+        use_named_vectors = await self._uses_named_vectors(collection_name)
+        
+        ranges = [(start, min(start + batch_size, total)) for start in range(0, total, batch_size)]
+        semaphore = asyncio.Semaphore(parallel)
+        written_count = 0
+        
+        async def upload(start: int, end: int, wait_for_result: bool):
+            nonlocal written_count
+            async with semaphore:
+                points = self._build_points(
+                    vectors[start:end], metadatas[start:end], ids[start:end], use_named_vectors
+                )
+                await self._upsert_with_retry(collection_name, points, wait_for_result)
+            
+            written_count += end - start
+            if progress_callback:
+                result = progress_callback(written_count, total)
+                if inspect.isawaitable(result):
+                    await result
+        
+        # 除最后一批外并发写入且不等待生效（wait=False）；
+        # 最后一批在其余批次确认后以wait=True写入，作为一致性屏障（Qdrant按WAL顺序应用更新）
+        tasks = [asyncio.create_task(upload(start, end, False)) for start, end in ranges[:-1]]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        
+        last_start, last_end = ranges[-1]
+        await upload(last_start, last_end, wait)
+    
+    async def _uses_named_vectors(self, collection_name: str) -> bool:
+        """集合是否使用命名向量（结果按集合缓存，避免每次写入都查询集合配置）"""
+        cache_key = (self.host, self.port, collection_name)
+        if cache_key in _NAMED_VECTOR_LAYOUTS:
+            return _NAMED_VECTOR_LAYOUTS[cache_key]
+        
         use_named_vectors = False
-        has_sparse_vectors = False
         try:
-            collection_info = self.client.get_collection(collection_name)
+            collection_info = await asyncio.to_thread(self.client.get_collection, collection_name)
             if hasattr(collection_info, 'config') and hasattr(collection_info.config, 'params'):
-                vectors_config = collection_info.config.params.vectors
                 # 如果是字典形式的向量配置，说明使用了命名向量
-                if isinstance(vectors_config, dict):
-                    use_named_vectors = True
-                    # 检查是否有稀疏向量配置
-                    has_sparse_vectors = any("sparse" in key.lower() for key in vectors_config.keys())
+                use_named_vectors = isinstance(collection_info.config.params.vectors, dict)
         except Exception:
-            # 如果无法获取集合信息，默认不使用命名向量
+            # 如果无法获取集合信息，默认不使用命名向量（不缓存，下次重新获取）
+            return False
+        
+        _NAMED_VECTOR_LAYOUTS[cache_key] = use_named_vectors
+        return use_named_vectors
+    
+    def _remember_vector_layout(self, collection_name: str, use_named_vectors: Optional[bool]):
+        """记录（或在传入None时清除）集合的向量配置形式"""
+        cache_key = (self.host, self.port, collection_name)
+        if use_named_vectors is None:
+            _NAMED_VECTOR_LAYOUTS.pop(cache_key, None)
+        else:
+            _NAMED_VECTOR_LAYOUTS[cache_key] = use_named_vectors
+    
+    @staticmethod
+    def _to_point_id(point_id: Any) -> Union[int, str]:
+        """
+        转换为Qdrant合法的点ID
+        
+        非负整数（或数字字符串）保持为整数，UUID保持不变，
+        其他字符串通过uuid5映射为确定性的UUID，使写入和删除使用同一ID
+        """
+        if point_id is None or point_id == "":
+            return str(uuid.uuid4())
+        
+        try:
+            int_id = int(point_id)
+            if int_id >= 0:
+                return int_id
+        except (ValueError, TypeError):
             pass
         
-        # 创建点结构
+        point_id = str(point_id)
+        try:
+            uuid.UUID(point_id)
+            return point_id
+        except ValueError:
+            return str(uuid.uuid5(uuid.NAMESPACE_OID, point_id))
+    
+    def _build_points(
+        self,
+        vectors: List[Union[List[float], Dict[str, Any]]],
+        metadatas: List[Dict[str, Any]],
+        ids: List[Any],
+        use_named_vectors: bool
+    ) -> List[Any]:
+        """构建一批PointStruct"""
         points = []
-        for i, (vector, metadata, point_id) in enumerate(zip(vectors, metadatas, ids)):
-            # 如果没有提供ID，生成一个UUID
-            if not point_id:
-                point_id = str(uuid.uuid4())
-            else:
-                # 确保ID是有效的Qdrant ID格式
-                # 如果是数字字符串，转换为整数；否则保持为字符串（UUID格式）
-                try:
-                    # 尝试转换为整数
-                    int_id = int(point_id)
-                    if int_id >= 0:  # 确保是非负整数
-                        point_id = int_id
-                    else:
-                        # 负数转换为UUID
-                        point_id = str(uuid.uuid4())
-                except ValueError:
-                    # 不是数字，保持为字符串（假设是UUID格式）
-                    # 验证是否为有效的UUID格式，如果不是则生成UUID
-                    try:
-                        uuid.UUID(point_id)
-                    except ValueError:
-                        # 不是有效的UUID，生成新的UUID
-                        point_id = str(uuid.uuid4())
-            
-            # 根据Qdrant的要求处理metadata
-            processed_payload = self._process_payload_for_qdrant(metadata)
-            
+        for vector, metadata, point_id in zip(vectors, metadatas, ids):
             # 处理向量格式 - 支持命名向量和稀疏向量
             processed_vector: Union[List[float], Dict[str, Union[List[float], Any]]] = vector
-            if use_named_vectors:
-                # 如果已经是字典格式，直接使用（假设前端/API已经正确构建）
-                if isinstance(vector, dict):
-                    processed_vector = vector
-                    # 调试日志：显示向量字段
-                    if i == 0:  # 只打印第一个点的信息
-                        print(f"Insert vector {i}: Using dict format with keys: {list(vector.keys())}")
-                        for key, val in vector.items():
-                            if isinstance(val, dict) and 'indices' in val and 'values' in val:
-                                print(f"  - {key}: sparse vector with {len(val['indices'])} non-zero elements")
-                            elif isinstance(val, list):
-                                print(f"  - {key}: dense vector with dimension {len(val)}")
+            if use_named_vectors and not isinstance(vector, dict):
                 # 如果是普通向量列表，包装为命名向量（默认使用"dense"）
-                elif isinstance(vector, list):
-                    processed_vector = {"dense": vector}
-                else:
-                    # 其他情况，尝试转换为列表并包装
-                    processed_vector = {"dense": list(vector) if not isinstance(vector, list) else vector}
+                processed_vector = {"dense": list(vector)}
+            elif isinstance(vector, dict):
+                # 数组格式的稀疏向量转为列表（qdrant-client只接受Python数值）
+                processed_vector = {name: _sparse_arrays_to_lists(value) for name, value in vector.items()}
             
-            point = self.PointStruct(
-                id=point_id,
+            points.append(self.PointStruct(
+                id=self._to_point_id(point_id),
                 vector=processed_vector,
-                payload=processed_payload
-            )
-            points.append(point)
-        
-        # 批量插入
-        self.client.upsert(
-            collection_name=collection_name,
-            points=points
-        )
+                payload=self._process_payload_for_qdrant(metadata)
+            ))
+        return points
+    
+    async def _upsert_with_retry(self, collection_name: str, points: List[Any], wait: bool):
+        """写入一批点，失败时按指数退避重试"""
+        max_retries = settings.QDRANT_UPSERT_MAX_RETRIES
+        for attempt in range(max_retries + 1):
+            try:
+                await asyncio.to_thread(
+                    self.client.upsert,
+                    collection_name=collection_name,
+                    points=points,
+                    wait=wait
+                )
+                return
+            except Exception as e:
+                if attempt >= max_retries:
+                    raise
+                delay = settings.QDRANT_UPSERT_RETRY_BACKOFF * (2 ** attempt)
+                logger.warning(
+                    f"Qdrant写入失败（第{attempt + 1}次，{len(points)}个点），{delay:.1f}秒后重试: {e}"
+                )
+                await asyncio.sleep(delay)
     
     def _process_payload_for_qdrant(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -813,46 +907,17 @@ class QdrantService(BaseVectorDBService):
     
     async def delete_vectors(self, collection_name: str, ids: List[str]):
         """删除向量"""
-        # 处理ID格式以适配Qdrant的要求
-        processed_ids = []
-        for id_str in ids:
-            try:
-                # 尝试转换为整数
-                int_id = int(id_str)
-                if int_id >= 0:  # 确保是非负整数
-                    processed_ids.append(int_id)
-                else:
-                    # 负数使用原字符串
-                    processed_ids.append(id_str)
-            except ValueError:
-                # 不是数字，验证是否为有效的UUID格式
-                try:
-                    uuid.UUID(id_str)
-                    processed_ids.append(id_str)
-                except ValueError:
-                    # 不是有效的UUID，跳过这个ID
-                    continue
+        if not ids:
+            return
         
-        # 使用filter方式删除，通过ID匹配
-        from qdrant_client.models import Filter, FieldCondition, MatchAny
-        try:
-            self.client.delete(
-                collection_name=collection_name,
-                points_selector=Filter(
-                    must=[
-                        FieldCondition(
-                            key="id",
-                            match=MatchAny(any=processed_ids)
-                        )
-                    ]
-                )
-            )
-        except Exception as e:
-            # 如果filter方式失败，尝试直接传入ID列表
-            self.client.delete(
-                collection_name=collection_name,
-                points_selector=processed_ids  # type: ignore
-            )
+        # 与写入时使用相同的ID映射
+        from qdrant_client.models import PointIdsList
+        processed_ids = [self._to_point_id(id_str) for id_str in ids if id_str]
+        await asyncio.to_thread(
+            self.client.delete,
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=processed_ids)
+        )
 
 
 class MilvusService(BaseVectorDBService):
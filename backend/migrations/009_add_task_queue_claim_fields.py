@@ -0,0 +1,75 @@
+"""
+迁移脚本 009：为任务队列添加认领与租约字段
+添加字段：worker_id, lease_expires_at, heartbeat_at
+添加索引：idx_task_queue_status_created（按状态取最早的待执行任务）
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text, inspect
+from app.database import SessionLocal
+
+
+def migrate():
+    """
+    为task_queue表添加认领与租约字段
+    
+    新增字段：
+    - worker_id: 认领任务的执行器ID
+    - lease_expires_at: 租约到期时间
+    - heartbeat_at: 最近一次心跳时间
+    """
+    db = SessionLocal()
+    
+    try:
+        # 获取当前表的列信息
+        inspector = inspect(db.bind)
+        columns = [col['name'] for col in inspector.get_columns('task_queue')]
+        indexes = [index['name'] for index in inspector.get_indexes('task_queue')]
+        
+        print("当前task_queue表中的列:", columns)
+        
+        # 检查并添加缺失的字段
+        fields_to_add = [
+            ('worker_id', "VARCHAR(100) NULL", "认领任务的执行器ID"),
+            ('lease_expires_at', "DATETIME NULL", "租约到期时间"),
+            ('heartbeat_at', "DATETIME NULL", "最近一次心跳时间"),
+        ]
+        
+        added_count = 0
+        for field_name, field_def, field_desc in fields_to_add:
+            if field_name not in columns:
+                print(f"添加字段 {field_name}（{field_desc}）...")
+                db.execute(text(f"ALTER TABLE task_queue ADD COLUMN {field_name} {field_def}"))
+                added_count += 1
+            else:
+                print(f"字段 {field_name} 已存在，跳过")
+        
+        if 'idx_task_queue_status_created' not in indexes:
+            print("添加索引 idx_task_queue_status_created...")
+            db.execute(text("CREATE INDEX idx_task_queue_status_created ON task_queue (status, created_at)"))
+            added_count += 1
+        else:
+            print("索引 idx_task_queue_status_created 已存在，跳过")
+        
+        if added_count > 0:
+            db.commit()
+            print(f"迁移完成：共添加 {added_count} 个字段/索引")
+        else:
+            print("所有字段已存在，无需迁移")
+    
+    except Exception as e:
+        db.rollback()
+        print(f"迁移失败: {e}")
+        raise
+    
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
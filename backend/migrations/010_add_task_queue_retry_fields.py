@@ -0,0 +1,71 @@
+"""
+迁移脚本 010：为任务队列添加重试退避与死信支持
+添加字段：next_run_at
+修改字段：status 枚举增加 dead_letter
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text, inspect
+from app.database import SessionLocal
+
+
+def migrate():
+    """
+    为task_queue表添加重试退避字段，并为状态枚举增加死信状态
+    
+    新增字段：
+    - next_run_at: 最早可执行时间（重试退避）
+    """
+    db = SessionLocal()
+    
+    try:
+        # 获取当前表的列信息
+        inspector = inspect(db.bind)
+        columns = {col['name']: col for col in inspector.get_columns('task_queue')}
+        
+        print("当前task_queue表中的列:", list(columns.keys()))
+        
+        changed_count = 0
+        if 'next_run_at' not in columns:
+            print("添加字段 next_run_at（最早可执行时间）...")
+            db.execute(text("ALTER TABLE task_queue ADD COLUMN next_run_at DATETIME NULL"))
+            changed_count += 1
+        else:
+            print("字段 next_run_at 已存在，跳过")
+        
+        # 状态枚举：沿用表中已有取值的大小写（004为小写取值，create_all建表时为枚举名）
+        enums = list(getattr(columns['status']['type'], 'enums', None) or [])
+        if enums and not any(value.lower() == 'dead_letter' for value in enums):
+            dead_letter = 'DEAD_LETTER' if all(value.isupper() for value in enums) else 'dead_letter'
+            enum_values = ", ".join(f"'{value}'" for value in enums + [dead_letter])
+            default = next(value for value in enums if value.lower() == 'pending')
+            print(f"修改字段 status，增加枚举值 {dead_letter}...")
+            db.execute(text(
+                f"ALTER TABLE task_queue MODIFY COLUMN status ENUM({enum_values}) NOT NULL DEFAULT '{default}'"
+            ))
+            changed_count += 1
+        else:
+            print("status 枚举已包含 dead_letter，跳过")
+        
+        if changed_count > 0:
+            db.commit()
+            print(f"迁移完成：共修改 {changed_count} 个字段")
+        else:
+            print("所有字段已存在，无需迁移")
+    
+    except Exception as e:
+        db.rollback()
+        print(f"迁移失败: {e}")
+        raise
+    
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,67 @@
+"""
+迁移脚本 011：为任务队列添加优先级字段
+添加字段：priority
+添加索引：idx_task_queue_status_priority（按优先级、创建时间取待执行任务）
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text, inspect
+from app.database import SessionLocal
+
+
+def migrate():
+    """
+    为task_queue表添加优先级字段
+    
+    新增字段：
+    - priority: 优先级（越大越先执行，默认0）
+    """
+    db = SessionLocal()
+    
+    try:
+        # 获取当前表的列信息
+        inspector = inspect(db.bind)
+        columns = [col['name'] for col in inspector.get_columns('task_queue')]
+        indexes = [index['name'] for index in inspector.get_indexes('task_queue')]
+        
+        print("当前task_queue表中的列:", columns)
+        
+        changed_count = 0
+        if 'priority' not in columns:
+            print("添加字段 priority（优先级）...")
+            db.execute(text("ALTER TABLE task_queue ADD COLUMN priority INT NOT NULL DEFAULT 0"))
+            changed_count += 1
+        else:
+            print("字段 priority 已存在，跳过")
+        
+        if 'idx_task_queue_status_priority' not in indexes:
+            print("添加索引 idx_task_queue_status_priority...")
+            db.execute(text(
+                "CREATE INDEX idx_task_queue_status_priority ON task_queue (status, priority, created_at)"
+            ))
+            changed_count += 1
+        else:
+            print("索引 idx_task_queue_status_priority 已存在，跳过")
+        
+        if changed_count > 0:
+            db.commit()
+            print(f"迁移完成：共添加 {changed_count} 个字段/索引")
+        else:
+            print("所有字段已存在，无需迁移")
+    
+    except Exception as e:
+        db.rollback()
+        print(f"迁移失败: {e}")
+        raise
+    
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,50 @@
+"""
+迁移脚本 012：为任务队列添加检查点字段
+添加字段：checkpoint
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text, inspect
+from app.database import SessionLocal
+
+
+def migrate():
+    """
+    为task_queue表添加检查点字段
+    
+    新增字段：
+    - checkpoint: 进度游标（JSON），重试或租约回收后从此处继续执行
+    """
+    db = SessionLocal()
+    
+    try:
+        # 获取当前表的列信息
+        inspector = inspect(db.bind)
+        columns = [col['name'] for col in inspector.get_columns('task_queue')]
+        
+        print("当前task_queue表中的列:", columns)
+        
+        if 'checkpoint' not in columns:
+            print("添加字段 checkpoint（检查点）...")
+            db.execute(text("ALTER TABLE task_queue ADD COLUMN checkpoint JSON NULL"))
+            db.commit()
+            print("迁移完成：已添加 checkpoint 字段")
+        else:
+            print("字段 checkpoint 已存在，无需迁移")
+    
+    except Exception as e:
+        db.rollback()
+        print(f"迁移失败: {e}")
+        raise
+    
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
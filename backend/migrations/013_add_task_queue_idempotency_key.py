@@ -0,0 +1,67 @@
+"""
+迁移脚本 013：为任务队列添加幂等键字段
+添加字段：idempotency_key
+添加索引：idx_task_queue_idempotency（按幂等键查找待执行或执行中的任务）
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text, inspect
+from app.database import SessionLocal
+
+
+def migrate():
+    """
+    为task_queue表添加幂等键字段
+    
+    新增字段：
+    - idempotency_key: 幂等键（任务类型+规范化payload的SHA-256），重复提交时合并到已有任务
+    """
+    db = SessionLocal()
+    
+    try:
+        # 获取当前表的列信息
+        inspector = inspect(db.bind)
+        columns = [col['name'] for col in inspector.get_columns('task_queue')]
+        indexes = [index['name'] for index in inspector.get_indexes('task_queue')]
+        
+        print("当前task_queue表中的列:", columns)
+        
+        changed_count = 0
+        if 'idempotency_key' not in columns:
+            print("添加字段 idempotency_key（幂等键）...")
+            db.execute(text("ALTER TABLE task_queue ADD COLUMN idempotency_key VARCHAR(64) NULL"))
+            changed_count += 1
+        else:
+            print("字段 idempotency_key 已存在，跳过")
+        
+        if 'idx_task_queue_idempotency' not in indexes:
+            print("添加索引 idx_task_queue_idempotency...")
+            db.execute(text(
+                "CREATE INDEX idx_task_queue_idempotency ON task_queue (idempotency_key, status)"
+            ))
+            changed_count += 1
+        else:
+            print("索引 idx_task_queue_idempotency 已存在，跳过")
+        
+        if changed_count > 0:
+            db.commit()
+            print(f"迁移完成：共添加 {changed_count} 个字段/索引")
+        else:
+            print("所有字段已存在，无需迁移")
+    
+    except Exception as e:
+        db.rollback()
+        print(f"迁移失败: {e}")
+        raise
+    
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
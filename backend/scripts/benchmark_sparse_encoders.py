@@ -0,0 +1,254 @@
+"""
+稀疏编码器基准测试脚本
+在T2Ranking数据集（与测试集导入脚本相同的数据文件和问题）上对比各稀疏向量方法：
+文档编码吞吐、查询编码延迟、向量大小，以及稀疏点积检索的召回率和MRR
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+from typing import Dict, List, Tuple, Set
+
+import numpy as np
+
+# 添加项目根目录到 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.t2ranking_test_set_import import (
+    QUERIES_PATH,
+    COLLECTION_PATH,
+    QRELS_PATH,
+    MAX_QUERIES,
+    load_queries,
+    load_collection,
+    load_qrels,
+)
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 基准测试配置
+METHODS = ["bm25", "splade"]
+NUM_DISTRACTORS = 5000  # 除相关文档外随机抽取的干扰文档数（全量集合在CPU上编码耗时过长）
+MIN_RELEVANCE = 2.0  # qrels中relevance不低于该值的文档视为相关
+RECALL_KS = [10, 100]
+MRR_K = 10
+DOC_BATCH_SIZE = 256
+RANDOM_SEED = 42
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_sparse_encoders_result.json")
+
+
+def build_corpus(
+    queries: Dict[str, str],
+    collection: Dict[str, str],
+    qrels: Dict[str, List[Tuple[str, float]]]
+) -> Tuple[List[str], List[str], Dict[str, Set[int]]]:
+    """
+    构建评测语料：所选问题的全部qrels文档 + 随机干扰文档
+    
+    Args:
+        queries: 查询字典 {query_id: query_text}
+        collection: 文档集合 {doc_id: document_content}
+        qrels: 关联关系 {query_id: [(doc_id, relevance), ...]}
+    
+    Returns:
+        (文档ID列表, 文档文本列表, {query_id: 相关文档下标集合})
+    """
+    doc_ids: List[str] = []
+    positions: Dict[str, int] = {}
+    
+    def add(doc_id: str):
+        if doc_id not in positions and doc_id in collection:
+            positions[doc_id] = len(doc_ids)
+            doc_ids.append(doc_id)
+    
+    for query_id in queries:
+        for doc_id, _ in qrels.get(query_id, []):
+            add(doc_id)
+    
+    rng = random.Random(RANDOM_SEED)
+    for doc_id in rng.sample(list(collection.keys()), min(NUM_DISTRACTORS, len(collection))):
+        add(doc_id)
+    
+    relevant = {
+        query_id: {
+            positions[doc_id] for doc_id, relevance in qrels.get(query_id, [])
+            if relevance >= MIN_RELEVANCE and doc_id in positions
+        }
+        for query_id in queries
+    }
+    relevant = {query_id: docs for query_id, docs in relevant.items() if docs}
+    return doc_ids, [collection[doc_id] for doc_id in doc_ids], relevant
+
+
+class SparseIndex:
+    """内存倒排索引（稀疏点积打分）"""
+    
+    def __init__(self, vectors: List[Dict[str, np.ndarray]]):
+        lengths = np.fromiter((len(vector["indices"]) for vector in vectors), dtype=np.int64, count=len(vectors))
+        doc_rows = np.repeat(np.arange(len(vectors), dtype=np.int64), lengths)
+        indices = np.concatenate([vector["indices"] for vector in vectors]) if vectors else np.array([], dtype=np.uint32)
+        values = np.concatenate([vector["values"] for vector in vectors]) if vectors else np.array([], dtype=np.float32)
+        
+        # 按词下标排序后，每个词的倒排列表为一段连续区间
+        order = np.argsort(indices, kind="stable")
+        self.terms, starts = np.unique(indices[order], return_index=True)
+        self.starts = np.append(starts, len(order))
+        self.doc_rows = doc_rows[order]
+        self.values = values[order]
+        self.num_docs = len(vectors)
+    
+    def search(self, query_vector: Dict[str, np.ndarray], top_k: int) -> np.ndarray:
+        """返回得分最高的top_k个文档下标（按得分降序）"""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        positions = np.searchsorted(self.terms, query_vector["indices"])
+        for position, index, weight in zip(positions, query_vector["indices"], query_vector["values"]):
+            if position < len(self.terms) and self.terms[position] == index:
+                start, end = self.starts[position], self.starts[position + 1]
+                # 同一向量内下标不重复，每个文档在一个倒排列表中只出现一次
+                scores[self.doc_rows[start:end]] += weight * self.values[start:end]
+        
+        top_k = min(top_k, self.num_docs)
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[scores[candidates] > 0]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def benchmark_method(
+    method: str,
+    queries: Dict[str, str],
+    doc_texts: List[str],
+    relevant: Dict[str, Set[int]]
+) -> Dict[str, float]:
+    """
+    测试单个稀疏向量方法
+    
+    Args:
+        method: 稀疏向量方法（bm25, splade）
+        queries: 查询字典
+        doc_texts: 语料文本列表
+        relevant: {query_id: 相关文档下标集合}
+    
+    Returns:
+        指标字典
+    """
+    from app.services.sparse_vector_service import SparseVectorServiceFactory
+    from app.services.sparse_hashing import to_sparse_arrays
+    
+    load_start = time.perf_counter()
+    sparse_service = SparseVectorServiceFactory.create(method)
+    load_seconds = time.perf_counter() - load_start
+    
+    # 1. 文档编码（与索引写入相同的整批接口）
+    encode_start = time.perf_counter()
+    doc_vectors: List[Dict[str, np.ndarray]] = []
+    for start in range(0, len(doc_texts), DOC_BATCH_SIZE):
+        doc_vectors.extend(sparse_service.encode_documents_batch(doc_texts[start:start + DOC_BATCH_SIZE]))
+        logger.info(f"[{method}] 已编码 {len(doc_vectors)}/{len(doc_texts)} 个文档")
+    encode_seconds = time.perf_counter() - encode_start
+    
+    index = SparseIndex(doc_vectors)
+    
+    # 2. 逐条查询编码（与在线检索相同，单条调用）并检索
+    max_k = max(RECALL_KS + [MRR_K])
+    query_latencies: List[float] = []
+    recalls = {k: [] for k in RECALL_KS}
+    reciprocal_ranks: List[float] = []
+    query_nnz: List[int] = []
+    
+    for query_id, relevant_docs in relevant.items():
+        query_start = time.perf_counter()
+        query_vector = to_sparse_arrays([sparse_service.generate_query_sparse_vector(queries[query_id])])[0]
+        query_latencies.append(time.perf_counter() - query_start)
+        query_nnz.append(len(query_vector["indices"]))
+        
+        ranked = index.search(query_vector, max_k).tolist()
+        for k in RECALL_KS:
+            recalls[k].append(len(relevant_docs & set(ranked[:k])) / len(relevant_docs))
+        reciprocal_ranks.append(next(
+            (1.0 / (rank + 1) for rank, doc in enumerate(ranked[:MRR_K]) if doc in relevant_docs),
+            0.0
+        ))
+    
+    latencies_ms = np.array(query_latencies) * 1000
+    result = {
+        "load_seconds": round(load_seconds, 3),
+        "doc_encode_seconds": round(encode_seconds, 3),
+        "docs_per_second": round(len(doc_texts) / encode_seconds, 1) if encode_seconds > 0 else 0.0,
+        "avg_doc_nnz": round(float(np.mean([len(vector["indices"]) for vector in doc_vectors])), 1),
+        "avg_query_nnz": round(float(np.mean(query_nnz)), 1),
+        "query_latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "query_latency_p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        f"mrr@{MRR_K}": round(float(np.mean(reciprocal_ranks)), 4),
+    }
+    for k in RECALL_KS:
+        result[f"recall@{k}"] = round(float(np.mean(recalls[k])), 4)
+    return result
+
+
+def main():
+    """主函数"""
+    try:
+        logger.info("=" * 60)
+        logger.info("稀疏编码器基准测试（T2Ranking）")
+        logger.info("=" * 60)
+        
+        # 1. 加载数据文件并构建评测语料
+        logger.info("\n【步骤1】加载数据文件...")
+        queries = load_queries(QUERIES_PATH, max_queries=MAX_QUERIES)
+        collection = load_collection(COLLECTION_PATH)
+        qrels = load_qrels(QRELS_PATH)
+        
+        doc_ids, doc_texts, relevant = build_corpus(queries, collection, qrels)
+        del collection
+        logger.info(f"评测语料: {len(doc_texts)} 个文档, {len(relevant)} 个有相关文档的问题")
+        
+        # 2. 逐个方法测试（依赖或模型缺失的方法跳过）
+        results = {}
+        for method in METHODS:
+            logger.info(f"\n【步骤2】测试方法: {method}")
+            try:
+                results[method] = benchmark_method(method, queries, doc_texts, relevant)
+            except (FileNotFoundError, RuntimeError, ValueError) as e:
+                logger.warning(f"跳过方法 {method}: {e}")
+        
+        if not results:
+            logger.error("❌ 没有可测试的稀疏向量方法")
+            return 1
+        
+        # 3. 输出对比结果
+        metrics = list(next(iter(results.values())).keys())
+        logger.info("\n" + "=" * 60)
+        logger.info(f"{'指标':<24}" + "".join(f"{method:>14}" for method in results))
+        for metric in metrics:
+            logger.info(f"{metric:<24}" + "".join(f"{results[method][metric]:>14}" for method in results))
+        logger.info("=" * 60)
+        
+        with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
+            json.dump({
+                "num_docs": len(doc_texts),
+                "num_queries": len(relevant),
+                "min_relevance": MIN_RELEVANCE,
+                "results": results
+            }, f, ensure_ascii=False, indent=2)
+        logger.info(f"✅ 结果已保存: {OUTPUT_PATH}")
+    
+    except FileNotFoundError as e:
+        logger.error(f"❌ 文件不存在: {e}")
+        return 1
+    except Exception as e:
+        logger.error(f"❌ 基准测试失败: {e}", exc_info=True)
+        return 1
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,17 @@
 """
 任务执行器主程序
-独立进程，接收HTTP通知并并发执行任务
+独立进程，接收HTTP或MQ通知并轮询认领任务，并发执行
 """
 
 import asyncio
 import logging
-from typing import Dict
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 from app.config import settings
-from app.models.task_queue import TaskQueue, TaskStatus
-from app.repositories.factory import RepositoryFactory
-from app.services.task_executor_service import TaskExecutorService
+from app.services.task_worker import get_task_executor
+from app.services.cpu_pools import warm_up_cpu_pools, shutdown_cpu_pools
 
 # 配置日志
 logging.basicConfig(
@@ -35,90 +33,6 @@ class NotifyRequest(BaseModel):
     task_id: str
 
 
-class TaskExecutor:
-    """任务执行器"""
-    
-    def __init__(self, max_concurrent: int = 5):
-        """
-        初始化任务执行器
-        
-        Args:
-            max_concurrent: 最大并发数
-        """
-        self.semaphore = asyncio.Semaphore(max_concurrent)
-        self.running_tasks: Dict[str, asyncio.Task] = {}
-        self.task_repo = RepositoryFactory.create_task_queue_repository()
-        self.executor_service = TaskExecutorService()
-    
-    async def process_task(self, task_id: str) -> None:
-        """
-        处理单个任务（带并发控制）
-        
-        Args:
-            task_id: 任务ID
-        """
-        async with self.semaphore:  # 获取信号量，控制并发
-            try:
-                # 从数据库获取任务
-                task = await self.task_repo.get_by_id(task_id)
-                if not task:
-                    logger.warning(f"任务不存在: task_id={task_id}")
-                    return
-                
-                # 检查任务状态，避免重复执行
-                if task.status != TaskStatus.PENDING:
-                    logger.info(
-                        f"任务状态不是pending，跳过执行: "
-                        f"task_id={task_id}, status={task.status.value}"
-                    )
-                    return
-                
-                # 执行任务
-                await self.executor_service.execute_task(task)
-                
-            except Exception as e:
-                logger.error(
-                    f"任务执行异常: task_id={task_id}, error={str(e)}",
-                    exc_info=True
-                )
-    
-    async def handle_notify(self, task_id: str) -> None:
-        """
-        接收HTTP通知，异步执行任务
-        
-        Args:
-            task_id: 任务ID
-        """
-        # 检查任务是否已在运行
-        if task_id in self.running_tasks:
-            logger.info(f"任务已在执行中，跳过: task_id={task_id}")
-            return
-        
-        # 创建异步任务（不阻塞）
-        task = asyncio.create_task(self.process_task(task_id))
-        self.running_tasks[task_id] = task
-        
-        # 任务完成后清理
-        def cleanup(t):
-            self.running_tasks.pop(task_id, None)
-        
-        task.add_done_callback(cleanup)
-        logger.info(f"已接收任务通知: task_id={task_id}")
-
-
-# 全局executor实例
-_executor: TaskExecutor = None
-
-
-def get_executor() -> TaskExecutor:
-    """获取全局executor实例"""
-    global _executor
-    if _executor is None:
-        max_concurrent = getattr(settings, 'TASK_EXECUTOR_MAX_CONCURRENT', 5)
-        _executor = TaskExecutor(max_concurrent=max_concurrent)
-    return _executor
-
-
 @app.on_event("startup")
 async def startup_event():
     """启动事件"""
@@ -126,19 +40,47 @@ async def startup_event():
     logger.info(f"🚀 启动 {settings.APP_NAME} Task Executor v{settings.APP_VERSION}")
     logger.info(f"📍 地址: http://{settings.HOST}:8001")
     logger.info(f"🔄 最大并发数: {getattr(settings, 'TASK_EXECUTOR_MAX_CONCURRENT', 5)}")
+    
+    # 启动通知消费（mq）、轮询（认领通知丢失、重试到期的待执行任务）和过期租约回收
+    executor = get_task_executor()
+    executor.start()
+    logger.info(f"🆔 执行器ID: {executor.worker_id}，轮询间隔: {settings.TASK_POLL_INTERVAL}s")
     logger.info("="*60)
+    
+    # 后台预热CPU进程池（分词、稀疏编码、文档解析），不阻塞服务启动
+    if settings.TASK_EXECUTOR_WARM_UP_POOLS:
+        asyncio.create_task(warm_up_cpu_pools())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """关闭事件"""
+    await get_task_executor().stop()
+    from app.services.task_notifier.factory import TaskNotifierFactory
+    await TaskNotifierFactory.close()
+    from app.services.task_progress import TaskProgressHub
+    await TaskProgressHub().close()
+    from app.services.sparse_vector_service import SparseVectorServiceFactory
+    SparseVectorServiceFactory.flush_all()
+    shutdown_cpu_pools()
 
 
 @app.get("/health")
 async def health_check():
-    """健康检查接口"""
-    executor = get_executor()
+    """健康检查接口（含并发、通知准入和任务队列深度指标）"""
+    executor = get_task_executor()
+    try:
+        queue_depth = await executor.task_queue_service.get_queue_depth()
+    except Exception as e:
+        logger.warning(f"读取任务队列深度失败: {str(e)}")
+        queue_depth = None
     return JSONResponse(
         content={
             "status": "healthy",
             "service": "task_executor",
-            "max_concurrent": executor.semaphore._value,
-            "running_tasks": len(executor.running_tasks)
+            "worker_id": executor.worker_id,
+            **executor.stats(),
+            "queue_depth": queue_depth
         }
     )
 
@@ -156,14 +98,39 @@ async def notify_handler(request: NotifyRequest):
     if not task_id:
         raise HTTPException(status_code=400, detail="task_id不能为空")
     
-    executor = get_executor()
-    await executor.handle_notify(task_id)
+    executor = get_task_executor()
+    scheduled = await executor.handle_notify(task_id)
     
+    # 并发已满时任务留在数据库队列中，槽位释放后按优先级调度
     return JSONResponse(
         content={
-            "status": "accepted",
+            "status": "accepted" if scheduled else "deferred",
             "task_id": task_id,
-            "message": "任务已接收"
+            "message": "任务已接收" if scheduled else "执行器繁忙，任务已在队列中等待调度"
+        }
+    )
+
+
+@app.post("/internal/cancel")
+async def cancel_handler(request: NotifyRequest):
+    """
+    接收任务取消通知接口
+    
+    Args:
+        request: 通知请求，包含task_id
+    """
+    task_id = request.task_id
+    
+    if not task_id:
+        raise HTTPException(status_code=400, detail="task_id不能为空")
+    
+    executor = get_task_executor()
+    cancelled = await executor.handle_cancel(task_id)
+    
+    return JSONResponse(
+        content={
+            "status": "cancelling" if cancelled else "not_running",
+            "task_id": task_id
         }
     )
 